@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Motore di riscrittura strutturata del codice delle strategie.
+Le trasformazioni (indicatori, parametri, minimal_roi/stoploss, condizioni di
+entrata, filtri di trend) individuano i nodi con `ast` e modificano solo i
+segmenti di sorgente interessati: formattazione e commenti del resto del file
+restano intatti, ogni trasformazione è idempotente e il risultato viene
+verificato con `ast.parse` dopo ogni modifica, quindi compila sempre.
+"""
+
+import ast
+import difflib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PARAMETER_TYPES = ('IntParameter', 'DecimalParameter', 'RealParameter',
+                   'CategoricalParameter', 'BooleanParameter')
+
+
+class CodeTransformError(Exception):
+    """Il codice di partenza non è analizzabile."""
+
+
+# ----------------------------------------------------------------------
+# Utility per modifiche per segmenti di sorgente
+# ----------------------------------------------------------------------
+
+def line_offsets(code: str) -> List[int]:
+    """Offset di carattere di inizio di ogni riga (più la fine del testo)."""
+    offsets, total = [0], 0
+    for line in code.splitlines(keepends=True):
+        total += len(line)
+        offsets.append(total)
+    return offsets
+
+
+def node_position(code_lines: List[str], offsets: List[int], line: int, col: int) -> int:
+    """Converte (riga, colonna in byte UTF-8) di ast in offset di carattere."""
+    text = code_lines[line - 1] if line - 1 < len(code_lines) else ""
+    return offsets[line - 1] + len(text.encode("utf-8")[:col].decode("utf-8", errors="ignore"))
+
+
+def apply_edits(code: str, edits: List[Tuple[int, int, str]]) -> str:
+    """Applica sostituzioni (start, end, testo) dal fondo verso l'inizio."""
+    for start, end, text in sorted(edits, key=lambda e: e[0], reverse=True):
+        code = code[:start] + text + code[end:]
+    return code
+
+
+def unified_diff(original: str, modified: str, name: str = "strategy.py") -> str:
+    """Diff unificato tra due versioni del codice."""
+    return "".join(difflib.unified_diff(
+        original.splitlines(keepends=True), modified.splitlines(keepends=True),
+        fromfile=f"a/{name}", tofile=f"b/{name}"
+    ))
+
+
+# ----------------------------------------------------------------------
+# Motore di riscrittura
+# ----------------------------------------------------------------------
+
+@dataclass
+class RewriteResult:
+    """Risultato di una sequenza di trasformazioni."""
+    original: str
+    code: str
+    changes: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return self.code != self.original
+
+    def diff(self, name: str = "strategy.py") -> str:
+        return unified_diff(self.original, self.code, name)
+
+
+def _literal(value: Any) -> str:
+    """Rappresentazione sorgente di un valore Python semplice."""
+    if isinstance(value, dict):
+        items = ", ".join(f"{_literal(k)}: {_literal(v)}" for k, v in value.items())
+        return "{" + items + "}"
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return repr(value)
+
+
+def _assigned_names(stmt: ast.stmt) -> List[str]:
+    if isinstance(stmt, ast.Assign):
+        return [t.id for t in stmt.targets if isinstance(t, ast.Name)]
+    if isinstance(stmt, ast.AnnAssign) and isinstance(stmt.target, ast.Name):
+        return [stmt.target.id]
+    return []
+
+
+def _call_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name):
+            return func.id
+        if isinstance(func, ast.Attribute):
+            return func.attr
+    return None
+
+
+def _dataframe_column(node: ast.AST) -> Optional[str]:
+    """Nome colonna se node è dataframe['col']."""
+    if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+            and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)):
+        return node.slice.value
+    return None
+
+
+def _mask_operands(node: ast.expr) -> List[ast.expr]:
+    """Operandi di una maschera combinata con &."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        return _mask_operands(node.left) + _mask_operands(node.right)
+    return [node]
+
+
+class StrategyRewriter:
+    """
+    Applica trasformazioni strutturate al codice di una strategia Freqtrade.
+
+    Ogni metodo restituisce True se ha modificato il codice, False se lo stato
+    richiesto era già presente (idempotenza) o non applicabile.
+    """
+
+    def __init__(self, code: str):
+        try:
+            ast.parse(code)
+        except SyntaxError as e:
+            raise CodeTransformError(f"Codice non analizzabile: {e}") from e
+        self.original = code
+        self.code = code
+        self.changes: List[str] = []
+
+    # -- infrastruttura -------------------------------------------------
+
+    def _tree(self) -> ast.Module:
+        return ast.parse(self.code)
+
+    def _commit(self, edits: List[Tuple[int, int, str]], description: str) -> bool:
+        """Applica le modifiche solo se il risultato resta codice valido."""
+        if not edits:
+            return False
+        candidate = apply_edits(self.code, edits)
+        if candidate == self.code:
+            return False
+        try:
+            ast.parse(candidate)
+        except SyntaxError as e:
+            logger.warning(f"⚠️ Trasformazione scartata ({description}): {e}")
+            return False
+        self.code = candidate
+        self.changes.append(description)
+        return True
+
+    def _span(self, node: ast.AST, whole_lines: bool = False) -> Tuple[int, int]:
+        lines = self.code.splitlines(keepends=True)
+        offsets = line_offsets(self.code)
+        if whole_lines:
+            return offsets[node.lineno - 1], offsets[node.end_lineno]
+        return (node_position(lines, offsets, node.lineno, node.col_offset),
+                node_position(lines, offsets, node.end_lineno, node.end_col_offset))
+
+    def _line_start(self, lineno: int) -> int:
+        return line_offsets(self.code)[lineno - 1]
+
+    def _indent_of(self, node: ast.AST) -> str:
+        line = self.code.splitlines()[node.lineno - 1]
+        return line[:len(line) - len(line.lstrip())]
+
+    def _strategy_class(self, tree: ast.Module) -> Optional[ast.ClassDef]:
+        classes = [n for n in tree.body if isinstance(n, ast.ClassDef)]
+        for cls in classes:
+            if any((isinstance(b, ast.Name) and b.id == 'IStrategy') or
+                   (isinstance(b, ast.Attribute) and b.attr == 'IStrategy') for b in cls.bases):
+                return cls
+        return classes[0] if classes else None
+
+    def _method(self, tree: ast.Module, name: str) -> Optional[ast.FunctionDef]:
+        cls = self._strategy_class(tree)
+        if cls is None:
+            return None
+        for stmt in cls.body:
+            if isinstance(stmt, ast.FunctionDef) and stmt.name == name:
+                return stmt
+        return None
+
+    def _class_assignment(self, cls: ast.ClassDef, name: str) -> Optional[ast.stmt]:
+        for stmt in cls.body:
+            if name in _assigned_names(stmt):
+                return stmt
+        return None
+
+    def _insert_in_class_header(self, cls: ast.ClassDef, lines_src: List[str], description: str) -> bool:
+        """Inserisce righe dopo l'ultima assegnazione di classe (prima dei metodi)."""
+        anchor = None
+        for stmt in cls.body:
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                break
+            anchor = stmt
+        if anchor is not None:
+            indent = self._indent_of(anchor)
+            position = line_offsets(self.code)[anchor.end_lineno]
+        else:
+            first = cls.body[0]
+            indent = self._indent_of(first)
+            position = self._line_start(first.lineno)
+        text = "".join(f"{indent}{line}\n" for line in lines_src)
+        return self._commit([(position, position, text)], description)
+
+    def _insert_before_return(self, method: ast.FunctionDef, statements: List[str], description: str) -> bool:
+        """Inserisce istruzioni prima del `return` finale del metodo."""
+        last = method.body[-1]
+        indent = self._indent_of(method.body[0]) if method.body else "        "
+        if isinstance(last, ast.Return):
+            position = self._line_start(last.lineno)
+        else:
+            position = line_offsets(self.code)[last.end_lineno]
+        text = "".join(f"{indent}{line}\n" if line else "\n" for line in statements)
+        return self._commit([(position, position, text)], description)
+
+    # -- import ---------------------------------------------------------
+
+    def ensure_import(self, module: str, names: List[str]) -> bool:
+        """Garantisce `from module import names` (aggiunge solo i nomi mancanti)."""
+        tree = self._tree()
+        imported = {alias.asname or alias.name for node in ast.walk(tree)
+                    if isinstance(node, ast.ImportFrom) for alias in node.names}
+        missing = [n for n in names if n not in imported]
+        if not missing:
+            return False
+        for node in tree.body:
+            if isinstance(node, ast.ImportFrom) and node.module == module and not any(a.name == '*' for a in node.names):
+                new_names = [a.name if not a.asname else f"{a.name} as {a.asname}" for a in node.names] + missing
+                start, end = self._span(node)
+                return self._commit([(start, end, f"from {module} import {', '.join(new_names)}")],
+                                    f"import {', '.join(missing)} da {module}")
+        return self._insert_import(f"from {module} import {', '.join(missing)}", f"import {', '.join(missing)} da {module}")
+
+    def ensure_module_import(self, module: str, alias: Optional[str] = None) -> bool:
+        """Garantisce `import module [as alias]`."""
+        tree = self._tree()
+        bound = alias or module.split('.')[0]
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import) and any((a.asname or a.name.split('.')[0]) == bound for a in node.names):
+                return False
+        statement = f"import {module}" + (f" as {alias}" if alias else "")
+        return self._insert_import(statement, statement)
+
+    def _insert_import(self, statement: str, description: str) -> bool:
+        tree = self._tree()
+        imports = [n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+        if imports:
+            position = line_offsets(self.code)[imports[-1].end_lineno]
+        elif tree.body and isinstance(tree.body[0], ast.Expr) and isinstance(tree.body[0].value, ast.Constant):
+            position = line_offsets(self.code)[tree.body[0].end_lineno]
+        else:
+            position = 0
+        return self._commit([(position, position, statement + "\n")], description)
+
+    # -- attributi e parametri -----------------------------------------
+
+    def set_class_attribute(self, name: str, value: Any) -> bool:
+        """Imposta (o aggiunge) un attributo di classe, es. stoploss o minimal_roi."""
+        tree = self._tree()
+        cls = self._strategy_class(tree)
+        if cls is None:
+            return False
+        stmt = self._class_assignment(cls, name)
+        if stmt is not None:
+            try:
+                if ast.literal_eval(stmt.value) == value and type(ast.literal_eval(stmt.value)) == type(value):
+                    return False
+            except (ValueError, SyntaxError, TypeError):
+                pass
+            start, end = self._span(stmt.value)
+            return self._commit([(start, end, _literal(value))], f"{name} = {_literal(value)}")
+        return self._insert_in_class_header(cls, [f"{name} = {_literal(value)}"], f"{name} = {_literal(value)}")
+
+    def get_class_attribute(self, name: str) -> Any:
+        """Valore letterale di un attributo di classe (None se assente o non letterale)."""
+        cls = self._strategy_class(self._tree())
+        stmt = self._class_assignment(cls, name) if cls else None
+        if stmt is None:
+            return None
+        try:
+            return ast.literal_eval(stmt.value)
+        except (ValueError, SyntaxError):
+            return None
+
+    def set_parameter_default(self, name: str, value: Any) -> bool:
+        """
+        Imposta il default di un parametro hyperopt (IntParameter(..., default=x))
+        oppure il valore di un attributo semplice con lo stesso nome.
+        """
+        tree = self._tree()
+        cls = self._strategy_class(tree)
+        stmt = self._class_assignment(cls, name) if cls else None
+        if stmt is None:
+            return False
+        call = stmt.value
+        if isinstance(call, ast.Call) and _call_name(call) in PARAMETER_TYPES:
+            if _call_name(call) == 'IntParameter' and isinstance(value, float) and value.is_integer():
+                value = int(value)
+            default = next((k for k in call.keywords if k.arg == 'default'), None)
+            if default is not None:
+                try:
+                    if ast.literal_eval(default.value) == value:
+                        return False
+                except (ValueError, SyntaxError):
+                    pass
+                start, end = self._span(default.value)
+                return self._commit([(start, end, _literal(value))], f"{name}.default = {_literal(value)}")
+            # Nessun default esplicito: aggiunto come ultimo argomento keyword
+            start, end = self._span(call)
+            source = self.code[start:end]
+            closing = source.rstrip().rfind(')')
+            insertion = start + closing
+            separator = ", " if (call.args or call.keywords) else ""
+            return self._commit([(insertion, insertion, f"{separator}default={_literal(value)}")],
+                                f"{name}.default = {_literal(value)}")
+        return self.set_class_attribute(name, value)
+
+    def add_parameter(self, name: str, parameter_type: str, low: Any, high: Any, default: Any, space: str) -> bool:
+        """Aggiunge un parametro hyperopt se non esiste già."""
+        cls = self._strategy_class(self._tree())
+        if cls is None or self._class_assignment(cls, name) is not None:
+            return False
+        self.ensure_import('freqtrade.strategy', [parameter_type])
+        cls = self._strategy_class(self._tree())
+        line = f'{name} = {parameter_type}({low}, {high}, default={_literal(default)}, space="{space}")'
+        return self._insert_in_class_header(cls, [line], f"parametro {name}")
+
+    # -- indicatori e condizioni ---------------------------------------
+
+    def assigned_columns(self, method_name: str = 'populate_indicators') -> List[str]:
+        """Colonne del dataframe assegnate in un metodo."""
+        method = self._method(self._tree(), method_name)
+        if method is None:
+            return []
+        columns = []
+        for node in ast.walk(method):
+            if isinstance(node, ast.Assign):
+                for target in node.targets:
+                    column = _dataframe_column(target)
+                    if column:
+                        columns.append(column)
+        return columns
+
+    def add_indicator(self, columns: List[str], statements: List[str],
+                      method_name: str = 'populate_indicators') -> bool:
+        """
+        Aggiunge le istruzioni che calcolano uno o più indicatori, se mancanti.
+
+        Args:
+            columns: Colonne prodotte dalle istruzioni (usate per l'idempotenza)
+            statements: Istruzioni sorgente (senza indentazione)
+            method_name: Metodo in cui inserirle
+        """
+        existing = set(self.assigned_columns(method_name))
+        if all(column in existing for column in columns):
+            return False
+        method = self._method(self._tree(), method_name)
+        if method is None:
+            return False
+        return self._insert_before_return(method, statements, f"indicatori {', '.join(columns)}")
+
+    def add_signal_rule(self, condition: str, column: str = 'enter_long',
+                        method_name: str = 'populate_entry_trend') -> bool:
+        """Aggiunge `dataframe.loc[condition, column] = 1` se una regola equivalente non esiste."""
+        method = self._method(self._tree(), method_name)
+        if method is None:
+            return False
+        # La regola esiste già se una maschera contiene tutte le sue condizioni
+        wanted = {ast.dump(op) for op in _mask_operands(ast.parse(condition, mode='eval').body)}
+        for mask, target_column in self._signal_masks(method):
+            if target_column == column and wanted <= {ast.dump(op) for op in _mask_operands(mask)}:
+                return False
+        dataframe = method.args.args[1].arg if len(method.args.args) > 1 else 'dataframe'
+        statement = f"{dataframe}.loc[{condition}, '{column}'] = 1"
+        return self._insert_before_return(method, [statement], f"regola {column}: {condition}")
+
+    def add_condition_to_signals(self, condition: str, column: str = 'enter_long',
+                                 method_name: str = 'populate_entry_trend') -> bool:
+        """Aggiunge (in AND) una condizione di conferma a tutte le regole di una colonna."""
+        method = self._method(self._tree(), method_name)
+        if method is None:
+            return False
+        condition_node = ast.parse(condition, mode='eval').body
+        wanted = ast.dump(condition_node)
+        edits = []
+        for mask, target_column in self._signal_masks(method):
+            if target_column != column:
+                continue
+            if any(ast.dump(op) == wanted for op in _mask_operands(mask)):
+                continue
+            start, end = self._span(mask)
+            original = self.code[start:end]
+            edits.append((start, end, f"({original}) & ({condition})"))
+        return self._commit(edits, f"conferma {column}: {condition}")
+
+    def _signal_masks(self, method: ast.FunctionDef) -> List[Tuple[ast.expr, str]]:
+        """Coppie (maschera, colonna) delle assegnazioni dataframe.loc[mask, 'col'] = ..."""
+        masks = []
+        for node in ast.walk(method):
+            if not isinstance(node, ast.Assign):
+                continue
+            for target in node.targets:
+                if (isinstance(target, ast.Subscript) and isinstance(target.value, ast.Attribute)
+                        and target.value.attr == 'loc' and isinstance(target.slice, ast.Tuple)
+                        and len(target.slice.elts) == 2 and isinstance(target.slice.elts[1], ast.Constant)):
+                    masks.append((target.slice.elts[0], target.slice.elts[1].value))
+        return masks
+
+    def result(self) -> RewriteResult:
+        return RewriteResult(original=self.original, code=self.code, changes=list(self.changes))
@@ -8,7 +8,9 @@ import re
 import ast
 import time
 from typing import Dict, List, Any, Optional
-from llm_utils import query_ollama_fast
+from llm_utils import query_ollama_fast, FAST_NUM_PREDICT
+from context_budget import count_tokens
+from deadlines import DeadlineExceeded, call_timeout
 from .timeout_manager import get_optimal_timeout, record_performance
 
 class FreqTradeCodeConverter:
@@ -168,37 +170,50 @@ class {class_name}(IStrategy):
         prompt = self._create_freqtrade_prompt(description, strategy_name, strategy_type, extracted_info)
         
         # Calcola timeout ottimale
+        prompt_tokens = count_tokens(prompt)
         timeout = get_optimal_timeout(
             model=self.default_model,
             phase="code_conversion",
             complexity="normal",
-            strategy_type=strategy_type
+            strategy_type=strategy_type,
+            prompt_tokens=prompt_tokens,
+            num_predict=FAST_NUM_PREDICT
         )
         
         start_time = time.time()
         success = False
+        deadline_exceeded = False
         
         try:
-            print(f"⚡ Invio richiesta a {self.default_model} (timeout: {timeout}s)...")
+            # Timeout effettivo: mai oltre la scadenza corrente della pipeline
+            timeout = call_timeout(timeout)
+            print(f"⚡ Invio richiesta a {self.default_model} (timeout: {timeout:.0f}s)...")
             code = query_ollama_fast(prompt, self.default_model, timeout=timeout)
             print(f"✅ Risposta ricevuta da {self.default_model}")
             success = True
             return self._clean_generated_code(code)
+        except DeadlineExceeded as e:
+            # Nessuna richiesta inviata: non è un campione di durata per la politica di timeout
+            deadline_exceeded = True
+            print(f"⏰ {e}")
+            return self._generate_template_code(strategy_name, strategy_type, extracted_info)
         except Exception as e:
             print(f"❌ Errore nella generazione codice: {e}")
             print("🔄 Fallback a template predefinito...")
             return self._generate_template_code(strategy_name, strategy_type, extracted_info)
         finally:
             # Registra performance
-            actual_time = time.time() - start_time
-            record_performance(
-                model=self.default_model,
-                phase="code_conversion",
-                strategy_type=strategy_type,
-                actual_time=actual_time,
-                success=success,
-                timeout_used=timeout
-            )
+            if not deadline_exceeded:
+                actual_time = time.time() - start_time
+                record_performance(
+                    model=self.default_model,
+                    phase="code_conversion",
+                    strategy_type=strategy_type,
+                    actual_time=actual_time,
+                    success=success,
+                    timeout_used=timeout,
+                    prompt_tokens=prompt_tokens
+                )
     
     def _create_freqtrade_prompt(self, 
                                description: str, 
@@ -5,6 +5,7 @@ Approccio a due stadi: generazione testuale + conversione in codice.
 """
 
 from llm_utils import query_ollama, query_ollama_fast, get_model_speed_ranking, get_optimal_timeout, estimate_prompt_complexity
+from deadlines import StagePlan, deadline_scope
 from .two_stage_generator import TwoStageGenerator
 import re
 
@@ -221,24 +222,31 @@ class GeneratorAgent:
     def _generate_hybrid_strategy(self, prompt: str, model: str, timeout: int, strategy_name: str) -> str:
         """
         Approccio ibrido: prima prova generazione diretta, poi conversione testuale.
+        Il timeout è una scadenza unica per i due tentativi: il secondo riceve
+        tutto il tempo lasciato dal primo.
         """
-        try:
-            # Tentativo 1: Generazione diretta di codice
-            print("🔄 Tentativo 1: Generazione diretta di codice...")
-            direct_code = self._generate_direct_strategy(prompt, model, timeout // 2, strategy_name)
-            
-            # Valida il codice generato
-            if self.converter.validate_and_fix_code(direct_code, strategy_name) != direct_code:
-                print("⚠️ Codice diretto non valido, tentativo conversione testuale...")
-                return self._generate_text_to_code_strategy(prompt, model, timeout // 2, strategy_name)
-            else:
-                print("✅ Codice diretto valido!")
-                return direct_code
+        plan = StagePlan({"direct": 1.0, "text_to_code": 1.0})
+        with deadline_scope(timeout, "hybrid"):
+            try:
+                # Tentativo 1: Generazione diretta di codice
+                print("🔄 Tentativo 1: Generazione diretta di codice...")
+                with plan.stage("direct"):
+                    direct_code = self._generate_direct_strategy(prompt, model, timeout, strategy_name)
                 
-        except Exception as e:
-            print(f"❌ Errore generazione diretta: {e}")
-            print("🔄 Fallback: conversione testuale...")
-            return self._generate_text_to_code_strategy(prompt, model, timeout, strategy_name)
+                # Valida il codice generato
+                if self.converter.validate_and_fix_code(direct_code, strategy_name) != direct_code:
+                    print("⚠️ Codice diretto non valido, tentativo conversione testuale...")
+                    with plan.stage("text_to_code"):
+                        return self._generate_text_to_code_strategy(prompt, model, timeout, strategy_name)
+                else:
+                    print("✅ Codice diretto valido!")
+                    return direct_code
+                    
+            except Exception as e:
+                print(f"❌ Errore generazione diretta: {e}")
+                print("🔄 Fallback: conversione testuale...")
+                with plan.stage("text_to_code"):
+                    return self._generate_text_to_code_strategy(prompt, model, timeout, strategy_name)
     
     def _generate_direct_strategy(self, prompt: str, model: str, timeout: int, strategy_name: str) -> str:
         """
@@ -433,4 +441,4 @@ class {strategy_name}(IStrategy):
         """
         Restituisce una strategia futures di default.
         """
-            return self._get_default_strategy(strategy_name) 
\ No newline at end of file
+        return self._get_default_strategy(strategy_name) 
\ No newline at end of file
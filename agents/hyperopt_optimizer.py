@@ -8,14 +8,19 @@ import os
 import json
 import logging
 import subprocess
+import time
 import tempfile
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 from dataclasses import dataclass
 import re
 
-from llm_utils import query_ollama_fast
+from llm_utils import query_ollama_fast, FAST_NUM_PREDICT
+from context_budget import fit_prompt
+from pipeline_metrics import HYPEROPT_EPOCHS, HYPEROPT_EPOCHS_PER_SECOND
+from pipeline_tracing import span, traced
 from .strategy_converter import StrategyConverter
+from .code_rewriter import StrategyRewriter, CodeTransformError
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +62,7 @@ class HyperoptLLMOptimizer:
             'hyperopt_spaces': ['buy', 'sell', 'roi', 'stoploss'],
             'hyperopt_timeout': 1800,  # 30 minuti
             'llm_timeout': 300,  # 5 minuti
+            'llm_max_ctx': 4096,  # contesto massimo per i prompt con il codice della strategia
             'min_improvement_threshold': 0.05
         }
     
@@ -64,11 +70,15 @@ class HyperoptLLMOptimizer:
         """
         Ottimizza la strategia usando Hyperopt + LLM.
         """
+        if strategy_name is None:
+            strategy_name = self._extract_strategy_name(strategy_code)
+        
+        with span("hyperopt", strategy=strategy_name):
+            return self._optimize_strategy(strategy_code, backtest_results, strategy_name)
+    
+    def _optimize_strategy(self, strategy_code: str, backtest_results: dict[str, float], strategy_name: str) -> CombinedOptimizationResult:
+        original_score = backtest_results.get('total_return', 0.0)
         try:
-            if strategy_name is None:
-                strategy_name = self._extract_strategy_name(strategy_code)
-            
-            original_score = backtest_results.get('total_return', 0.0)
             logger.info(f"🔧 Ottimizzazione combinata strategia {strategy_name} (score attuale: {original_score})")
             
             # Step 1: Hyperopt per ottimizzazione parametri
@@ -129,10 +139,12 @@ class HyperoptLLMOptimizer:
                 error_message=str(e)
             )
     
+    @traced("hyperopt.freqtrade")
     def _run_hyperopt(self, strategy_code: str, strategy_name: str) -> HyperoptResult:
         """
         Esegue Hyperopt per ottimizzare i parametri della strategia.
         """
+        hyperopt_start = time.time()
         try:
             # Salva strategia temporaneamente
             temp_strategy_file = f"user_data/strategies/{strategy_name.lower()}_temp.py"
@@ -187,6 +199,12 @@ class HyperoptLLMOptimizer:
                 # Estrai risultati da output
                 best_params, best_score = self._extract_hyperopt_results(result.stdout)
                 
+                epochs = self.config['hyperopt_epochs']
+                elapsed = time.time() - hyperopt_start
+                HYPEROPT_EPOCHS.labels(strategy=strategy_name).inc(epochs)
+                if elapsed > 0:
+                    HYPEROPT_EPOCHS_PER_SECOND.labels(strategy=strategy_name).set(epochs / elapsed)
+                
                 return HyperoptResult(
                     best_params=best_params,
                     best_score=best_score,
@@ -263,40 +281,33 @@ class HyperoptLLMOptimizer:
         Applica i parametri ottimizzati da Hyperopt al codice della strategia.
         """
         try:
-            modified_code = strategy_code
+            rewriter = StrategyRewriter(strategy_code)
             
             # Applica parametri ROI
             if 'roi' in best_params:
-                roi_value = best_params['roi']
-                modified_code = re.sub(
-                    r'minimal_roi\s*=\s*\{[^}]*\}',
-                    f'minimal_roi = {{"0": {roi_value}}}',
-                    modified_code
-                )
+                rewriter.set_class_attribute('minimal_roi', {"0": best_params['roi']})
             
             # Applica parametri stoploss
             if 'stoploss' in best_params:
-                stoploss_value = best_params['stoploss']
-                modified_code = re.sub(
-                    r'stoploss\s*=\s*[-\d.]+',
-                    f'stoploss = {stoploss_value}',
-                    modified_code
-                )
+                rewriter.set_class_attribute('stoploss', best_params['stoploss'])
             
-            # Applica parametri buy/sell
+            # Applica parametri buy/sell come default dei parametri ottimizzabili
             for param, value in best_params.items():
                 if param.startswith('buy_') or param.startswith('sell_'):
-                    # Cerca e sostituisci parametri nelle condizioni
-                    pattern = rf'{param}\s*=\s*[-\d.]+'
-                    replacement = f'{param} = {value}'
-                    modified_code = re.sub(pattern, replacement, modified_code)
+                    if not rewriter.set_parameter_default(param, value):
+                        logger.debug(f"Parametro {param} invariato o non presente nella strategia")
             
-            return modified_code
+            result = rewriter.result()
+            if result.changed:
+                logger.info(f"🔧 Parametri Hyperopt applicati: {', '.join(result.changes)}")
+                logger.debug(f"Diff parametri Hyperopt:\n{result.diff()}")
+            return result.code
             
-        except Exception as e:
+        except CodeTransformError as e:
             logger.error(f"❌ Errore nell'applicazione parametri Hyperopt: {e}")
             return strategy_code
     
+    @traced("hyperopt.llm_improvements", strategy_arg=None)
     def _generate_llm_improvements(self, strategy_code: str, backtest_results: dict[str, float], hyperopt_result: HyperoptResult) -> List[str]:
         """
         Genera miglioramenti logici usando LLM dopo Hyperopt.
@@ -316,8 +327,13 @@ class HyperoptLLMOptimizer:
     
     def _create_llm_prompt(self, strategy_code: str, backtest_results: dict[str, float], hyperopt_result: HyperoptResult) -> str:
         """
-        Crea prompt per LLM dopo Hyperopt.
+        Crea prompt per LLM dopo Hyperopt, comprimendo il codice solo se non entra nel contesto.
         """
+        return fit_prompt(lambda code: self._render_llm_prompt(code, backtest_results, hyperopt_result),
+                          strategy_code, num_predict=FAST_NUM_PREDICT,
+                          max_ctx=self.config['llm_max_ctx'], label="strategia")
+
+    def _render_llm_prompt(self, strategy_code: str, backtest_results: dict[str, float], hyperopt_result: HyperoptResult) -> str:
         return f"""
 Analizza questa strategia di trading che è stata ottimizzata con Hyperopt e suggerisci miglioramenti logici.
 
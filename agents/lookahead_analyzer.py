@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Analizzatore statico di lookahead bias e vettorizzazione per le strategie generate.
+Individua nei metodi populate_* gli shift negativi (dati futuri), le finestre
+centrate, l'indicizzazione riga per riga e i loop non vettorizzati
+(iterrows, itertuples, apply(axis=1), for su range(len(dataframe))).
+I loop più comuni vengono riscritti in pandas vettorizzato prima che la
+strategia occupi capacità di backtest. Shift negativi e finestre centrate non
+vengono riscritti: invertirli cambierebbe la logica della strategia, quindi
+restano errori da segnalare.
+"""
+
+import ast
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from .code_rewriter import apply_edits as _apply_edits, line_offsets as _line_offsets
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CodeIssue:
+    """Problema rilevato nel codice di una strategia."""
+    kind: str       # lookahead, loop
+    rule: str       # negative_shift, centered_window, future_index, last_row, iterrows, row_apply, python_loop
+    line: int
+    method: str
+    message: str
+    severity: str = "warning"
+
+
+@dataclass
+class AnalysisReport:
+    """Risultato dell'analisi (ed eventuale riscrittura) di una strategia."""
+    code: str
+    issues: List[CodeIssue] = field(default_factory=list)
+    remaining_issues: List[CodeIssue] = field(default_factory=list)
+    rewrites: List[str] = field(default_factory=list)
+
+    @property
+    def has_lookahead(self) -> bool:
+        """True se restano accessi a dati futuri dopo le correzioni."""
+        return any(issue.kind == "lookahead" for issue in self.remaining_issues)
+
+    @property
+    def lookahead_errors(self) -> List[CodeIssue]:
+        """Letture certe di dati futuri (shift negativi, finestre centrate, indici futuri)."""
+        return [issue for issue in self.remaining_issues if issue.kind == "lookahead" and issue.severity == "error"]
+
+
+class LookaheadBiasError(ValueError):
+    """La strategia legge dati futuri: va scartata, non corretta."""
+
+    def __init__(self, report: AnalysisReport):
+        self.report = report
+        details = "; ".join(f"{i.method} riga {i.line}: {i.message}" for i in report.lookahead_errors)
+        super().__init__(f"Lookahead bias: {details}")
+
+
+class _CannotVectorize(Exception):
+    pass
+
+
+def _shift_periods(call: ast.Call) -> Optional[int]:
+    """Restituisce i periodi costanti di una chiamata .shift(), se determinabili."""
+    node = call.args[0] if call.args else None
+    for keyword in call.keywords:
+        if keyword.arg == "periods":
+            node = keyword.value
+    if node is None:
+        return 1
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    if (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+            and isinstance(node.operand, ast.Constant) and isinstance(node.operand.value, int)):
+        return -node.operand.value
+    return None
+
+
+def _index_offset(node: ast.expr, index_var: str) -> Optional[int]:
+    """Offset costante rispetto alla variabile di loop (i -> 0, i - 1 -> -1, i + 2 -> 2)."""
+    if isinstance(node, ast.Name) and node.id == index_var:
+        return 0
+    if (isinstance(node, ast.BinOp) and isinstance(node.left, ast.Name) and node.left.id == index_var
+            and isinstance(node.right, ast.Constant) and isinstance(node.right.value, int)):
+        if isinstance(node.op, ast.Add):
+            return node.right.value
+        if isinstance(node.op, ast.Sub):
+            return -node.right.value
+    return None
+
+
+def _uses_name(node: ast.AST, name: str) -> bool:
+    return any(isinstance(n, ast.Name) and n.id == name for n in ast.walk(node))
+
+
+def _keyword_true(call: ast.Call, name: str, values=(True,)) -> bool:
+    return any(k.arg == name and isinstance(k.value, ast.Constant) and k.value.value in values
+               for k in call.keywords)
+
+
+class _IssueVisitor(ast.NodeVisitor):
+    """Raccoglie i problemi nei metodi populate_*."""
+
+    def __init__(self):
+        self.issues: List[CodeIssue] = []
+        self.method: Optional[str] = None
+        self.loop_vars: List[str] = []
+
+    def _add(self, node: ast.AST, kind: str, rule: str, message: str, severity: str = "warning"):
+        self.issues.append(CodeIssue(kind, rule, getattr(node, "lineno", 0), self.method or "", message, severity))
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        if not node.name.startswith("populate_"):
+            return
+        previous, self.method = self.method, node.name
+        self.generic_visit(node)
+        self.method = previous
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node: ast.Call):
+        if self.method and isinstance(node.func, ast.Attribute):
+            attr = node.func.attr
+            if attr == "shift":
+                periods = _shift_periods(node)
+                if periods is not None and periods < 0:
+                    self._add(node, "lookahead", "negative_shift",
+                              f"shift({periods}) legge candele future", "error")
+            elif attr == "rolling" and _keyword_true(node, "center"):
+                self._add(node, "lookahead", "centered_window",
+                          "rolling(center=True) usa candele future", "error")
+            elif attr in ("iterrows", "itertuples"):
+                self._add(node, "loop", "iterrows", f"{attr}() itera riga per riga")
+            elif attr == "apply" and _keyword_true(node, "axis", (1, "columns")):
+                self._add(node, "loop", "row_apply", "apply(axis=1) esegue Python per ogni riga")
+        self.generic_visit(node)
+
+    def visit_For(self, node: ast.For):
+        if not self.method:
+            return self.generic_visit(node)
+        iter_node = node.iter
+        is_range_len = (isinstance(iter_node, ast.Call) and isinstance(iter_node.func, ast.Name)
+                        and iter_node.func.id == "range"
+                        and any(isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == "len"
+                                for n in ast.walk(iter_node)))
+        if is_range_len:
+            self._add(node, "loop", "python_loop", "loop for su range(len(dataframe)) non vettorizzato")
+        pushed = isinstance(node.target, ast.Name)
+        if pushed:
+            self.loop_vars.append(node.target.id)
+        self.generic_visit(node)
+        if pushed:
+            self.loop_vars.pop()
+
+    def visit_Subscript(self, node: ast.Subscript):
+        if self.method:
+            index = node.slice
+            if isinstance(index, ast.Tuple) and index.elts:
+                index = index.elts[0]
+            for var in self.loop_vars:
+                offset = _index_offset(index, var)
+                if offset is not None and offset > 0:
+                    self._add(node, "lookahead", "future_index",
+                              f"indice {var} + {offset} legge righe future", "error")
+            if (not self.loop_vars and isinstance(node.value, ast.Attribute) and node.value.attr == "iloc"
+                    and isinstance(index, ast.UnaryOp) and isinstance(index.op, ast.USub)):
+                self._add(node, "lookahead", "last_row",
+                          "iloc[-N] applica l'ultimo valore della serie a tutto il dataframe")
+        self.generic_visit(node)
+
+
+def _and_prefix(first: ast.expr, condition: ast.expr) -> ast.expr:
+    """first & condition, mantenendo piatta una catena di & già esistente."""
+    if isinstance(condition, ast.BinOp) and isinstance(condition.op, ast.BitAnd):
+        return ast.BinOp(left=_and_prefix(first, condition.left), op=ast.BitAnd(), right=condition.right)
+    return ast.BinOp(left=first, op=ast.BitAnd(), right=condition)
+
+
+class _LoopVectorizer:
+    """Riscrive i loop riga per riga più comuni in assegnazioni vettorizzate."""
+
+    def __init__(self, loop: ast.For):
+        self.loop = loop
+        self.dataframe: Optional[str] = None
+        self.index_var: Optional[str] = None
+        self.row_var: Optional[str] = None
+        self.start = 0
+        self.assigned: set = set()
+
+    def vectorize(self) -> Optional[List[str]]:
+        """Restituisce le nuove istruzioni (sorgente) o None se il loop non è riconosciuto."""
+        try:
+            self._detect_loop_shape()
+            # Colonne scritte nel loop: una condizione che le legge è una ricorrenza
+            # (dipende dai valori aggiornati dalle iterazioni precedenti) e non è vettorizzabile
+            self.assigned = {self._target_column(assign.targets[0])
+                             for stmt in self.loop.body if isinstance(stmt, ast.If)
+                             for assign in stmt.body
+                             if isinstance(assign, ast.Assign) and len(assign.targets) == 1}
+            statements = []
+            for stmt in self.loop.body:
+                if isinstance(stmt, ast.Pass):
+                    continue
+                if not isinstance(stmt, ast.If) or stmt.orelse:
+                    raise _CannotVectorize()
+                condition = self._vec(stmt.test)
+                if self.start:
+                    # range(K, len(dataframe)): le prime K righe non vengono mai scritte
+                    first_rows = ast.Compare(
+                        left=ast.Attribute(value=ast.Name(id=self.dataframe, ctx=ast.Load()), attr="index",
+                                           ctx=ast.Load()),
+                        ops=[ast.GtE()], comparators=[ast.Constant(value=self.start)])
+                    condition = _and_prefix(first_rows, condition)
+                for assign in stmt.body:
+                    if not isinstance(assign, ast.Assign) or len(assign.targets) != 1:
+                        raise _CannotVectorize()
+                    if not isinstance(assign.value, ast.Constant):
+                        raise _CannotVectorize()
+                    column = self._target_column(assign.targets[0])
+                    target = ast.Subscript(
+                        value=ast.Attribute(value=ast.Name(id=self.dataframe, ctx=ast.Load()), attr="loc", ctx=ast.Load()),
+                        slice=ast.Tuple(elts=[condition, ast.Constant(value=column)], ctx=ast.Load()),
+                        ctx=ast.Store()
+                    )
+                    statements.append(ast.unparse(ast.Assign(targets=[target], value=assign.value, lineno=0)))
+            return statements or None
+        except _CannotVectorize:
+            return None
+
+    def _detect_loop_shape(self):
+        iter_node, target = self.loop.iter, self.loop.target
+        if self.loop.orelse:
+            raise _CannotVectorize()
+        # for i in range(len(dataframe)) / range(k, len(dataframe))
+        if (isinstance(iter_node, ast.Call) and isinstance(iter_node.func, ast.Name) and iter_node.func.id == "range"
+                and isinstance(target, ast.Name) and iter_node.args):
+            last = iter_node.args[-1] if len(iter_node.args) <= 2 else None
+            if (isinstance(last, ast.Call) and isinstance(last.func, ast.Name) and last.func.id == "len"
+                    and len(last.args) == 1 and isinstance(last.args[0], ast.Name)):
+                if len(iter_node.args) == 2:
+                    first = iter_node.args[0]
+                    if not (isinstance(first, ast.Constant) and type(first.value) is int and first.value >= 0):
+                        raise _CannotVectorize()
+                    self.start = first.value
+                self.dataframe = last.args[0].id
+                self.index_var = target.id
+                return
+        # for index, row in dataframe.iterrows()
+        if (isinstance(iter_node, ast.Call) and isinstance(iter_node.func, ast.Attribute)
+                and iter_node.func.attr == "iterrows" and isinstance(iter_node.func.value, ast.Name)
+                and isinstance(target, ast.Tuple) and len(target.elts) == 2
+                and all(isinstance(e, ast.Name) for e in target.elts)):
+            self.dataframe = iter_node.func.value.id
+            self.index_var, self.row_var = target.elts[0].id, target.elts[1].id
+            return
+        raise _CannotVectorize()
+
+    def _column(self, column: str, offset: int = 0) -> ast.expr:
+        """dataframe['col'] (con shift per offset negativi)."""
+        if offset > 0:
+            raise _CannotVectorize()  # accesso a righe future: resta segnalato
+        if column in self.assigned:
+            raise _CannotVectorize()  # ricorrenza sulla colonna assegnata dal loop
+        node = ast.Subscript(value=ast.Name(id=self.dataframe, ctx=ast.Load()),
+                             slice=ast.Constant(value=column), ctx=ast.Load())
+        if offset < 0:
+            node = ast.Call(func=ast.Attribute(value=node, attr="shift", ctx=ast.Load()),
+                            args=[ast.Constant(value=-offset)], keywords=[])
+        return node
+
+    def _series_column(self, node: ast.expr) -> Optional[str]:
+        """Nome colonna se node è dataframe['col']."""
+        if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == self.dataframe
+                and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)):
+            return node.slice.value
+        return None
+
+    def _cell(self, node: ast.Subscript) -> Optional[Tuple[str, int]]:
+        """Riconosce l'accesso a una cella della riga corrente: (colonna, offset)."""
+        index = node.slice
+        value = node.value
+        # dataframe['col'].iloc[i] / dataframe['col'][i] / dataframe['col'].at[i]
+        if isinstance(value, ast.Attribute) and value.attr in ("iloc", "loc", "at"):
+            column = self._series_column(value.value)
+            offset = _index_offset(index, self.index_var)
+            if column is not None and offset is not None:
+                return column, offset
+            # dataframe.loc[i, 'col'] / dataframe.at[i, 'col']
+            if (isinstance(value.value, ast.Name) and value.value.id == self.dataframe
+                    and isinstance(index, ast.Tuple) and len(index.elts) == 2
+                    and isinstance(index.elts[1], ast.Constant) and isinstance(index.elts[1].value, str)):
+                row_index = index.elts[0]
+                # dataframe.loc[dataframe.index[i], 'col']
+                if (isinstance(row_index, ast.Subscript) and isinstance(row_index.value, ast.Attribute)
+                        and row_index.value.attr == "index"):
+                    row_index = row_index.slice
+                offset = _index_offset(row_index, self.index_var)
+                if offset is not None and value.attr != "iloc":
+                    return index.elts[1].value, offset
+        column = self._series_column(value)
+        offset = _index_offset(index, self.index_var)
+        if column is not None and offset is not None:
+            return column, offset
+        # dataframe.iloc[i]['col']
+        if (isinstance(value, ast.Subscript) and isinstance(value.value, ast.Attribute) and value.value.attr == "iloc"
+                and isinstance(value.value.value, ast.Name) and value.value.value.id == self.dataframe
+                and isinstance(index, ast.Constant) and isinstance(index.value, str)):
+            offset = _index_offset(value.slice, self.index_var)
+            if offset is not None:
+                return index.value, offset
+        # row['col'] (iterrows)
+        if (self.row_var and isinstance(value, ast.Name) and value.id == self.row_var
+                and isinstance(index, ast.Constant) and isinstance(index.value, str)):
+            return index.value, 0
+        return None
+
+    def _target_column(self, target: ast.expr) -> str:
+        if isinstance(target, ast.Subscript):
+            cell = self._cell(target)
+            if cell is not None and cell[1] == 0:
+                return cell[0]
+        raise _CannotVectorize()
+
+    def _vec(self, node: ast.expr) -> ast.expr:
+        """Trasforma un'espressione scalare della riga in un'espressione su Series."""
+        if isinstance(node, ast.BoolOp):
+            op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+            values = [self._vec(v) for v in node.values]
+            result = values[0]
+            for value in values[1:]:
+                result = ast.BinOp(left=result, op=op, right=value)
+            return result
+        if isinstance(node, ast.Compare):
+            parts, left = [], self._vec(node.left)
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self._vec(comparator)
+                parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+                left = right
+            result = parts[0]
+            for part in parts[1:]:
+                result = ast.BinOp(left=result, op=ast.BitAnd(), right=part)
+            return result
+        if isinstance(node, ast.UnaryOp):
+            op = ast.Invert() if isinstance(node.op, ast.Not) else node.op
+            return ast.UnaryOp(op=op, operand=self._vec(node.operand))
+        if isinstance(node, ast.BinOp):
+            return ast.BinOp(left=self._vec(node.left), op=node.op, right=self._vec(node.right))
+        if isinstance(node, ast.Subscript):
+            cell = self._cell(node)
+            if cell is not None:
+                return self._column(*cell)
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == self.row_var:
+            return self._column(node.attr)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "abs" and len(node.args) == 1:
+            return ast.Call(func=ast.Attribute(value=self._vec(node.args[0]), attr="abs", ctx=ast.Load()),
+                            args=[], keywords=[])
+        if isinstance(node, (ast.Constant, ast.Name, ast.Attribute)):
+            # Costanti e parametri (self.buy_rsi.value) restano invariati
+            for var in filter(None, (self.index_var, self.row_var)):
+                if _uses_name(node, var):
+                    raise _CannotVectorize()
+            return node
+        raise _CannotVectorize()
+
+
+class LookaheadAnalyzer:
+    """
+    Segnala il lookahead bias e vettorizza i loop riga per riga nelle strategie.
+    """
+
+    def __init__(self, vectorize_loops: bool = True):
+        self.vectorize_loops = vectorize_loops
+
+    def find_issues(self, code: str) -> List[CodeIssue]:
+        """Restituisce i problemi rilevati (lista vuota se il codice non è analizzabile)."""
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return []
+        visitor = _IssueVisitor()
+        visitor.visit(tree)
+        return sorted(visitor.issues, key=lambda i: i.line)
+
+    def analyze(self, code: str) -> AnalysisReport:
+        """
+        Analizza il codice e vettorizza i loop riconosciuti. Le letture di
+        dati futuri non vengono corrette e restano in remaining_issues.
+
+        Args:
+            code: Codice della strategia
+
+        Returns:
+            AnalysisReport con codice (eventualmente riscritto), problemi iniziali e residui
+        """
+        report = AnalysisReport(code=code, issues=self.find_issues(code))
+        if not report.issues:
+            return report
+
+        current = code
+        if self.vectorize_loops:
+            current = self._vectorize_loops(current, report)
+
+        report.code = current
+        report.remaining_issues = self.find_issues(current)
+        return report
+
+    def _populate_nodes(self, tree: ast.AST, node_type) -> List[Tuple[str, ast.AST]]:
+        nodes = []
+        for func in ast.walk(tree):
+            if isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)) and func.name.startswith("populate_"):
+                nodes.extend((func.name, n) for n in ast.walk(func) if isinstance(n, node_type))
+        return nodes
+
+    def _vectorize_loops(self, code: str, report: AnalysisReport) -> str:
+        tree = ast.parse(code)
+        lines = code.splitlines(keepends=True)
+        offsets = _line_offsets(code)
+        edits = []
+        for method, loop in self._populate_nodes(tree, ast.For):
+            statements = _LoopVectorizer(loop).vectorize()
+            if not statements:
+                continue
+            indent = lines[loop.lineno - 1][:len(lines[loop.lineno - 1]) - len(lines[loop.lineno - 1].lstrip())]
+            start = offsets[loop.lineno - 1]
+            end = offsets[loop.end_lineno]
+            new_text = "".join(f"{indent}{stmt}\n" for stmt in statements)
+            edits.append((start, end, new_text))
+            report.rewrites.append(f"{method} riga {loop.lineno}: loop riscritto in {len(statements)} assegnazioni vettorizzate")
+        return self._checked(code, _apply_edits(code, edits), report, len(edits))
+
+    def _checked(self, original: str, rewritten: str, report: AnalysisReport, count: int) -> str:
+        """Accetta la riscrittura solo se il risultato è ancora codice valido."""
+        if not count:
+            return original
+        try:
+            ast.parse(rewritten)
+            return rewritten
+        except SyntaxError as e:
+            logger.warning(f"⚠️ Riscrittura scartata, codice non valido: {e}")
+            del report.rewrites[-count:]
+            return original
+
+
+def analyze_strategy_code(code: str) -> AnalysisReport:
+    """Funzione helper per analizzare il codice di una strategia e vettorizzarne i loop."""
+    return LookaheadAnalyzer().analyze(code)
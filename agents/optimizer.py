@@ -12,11 +12,55 @@ from datetime import datetime
 from dataclasses import dataclass
 import ast
 
-from llm_utils import query_ollama, query_ollama_fast
+from llm_utils import query_ollama, query_ollama_fast, FAST_NUM_PREDICT
+from context_budget import fit_prompt
 from .strategy_converter import StrategyConverter
+from .code_rewriter import StrategyRewriter, RewriteResult, CodeTransformError, unified_diff
 
 logger = logging.getLogger(__name__)
 
+# Indicatori base: colonna -> (colonne prodotte, istruzioni)
+BASE_INDICATORS = {
+    'rsi': (['rsi'], ["dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)"]),
+    'macd': (['macd', 'macdsignal'], [
+        "macd = ta.MACD(dataframe)",
+        "dataframe['macd'] = macd['macd']",
+        "dataframe['macdsignal'] = macd['macdsignal']",
+    ]),
+    'atr': (['atr'], ["dataframe['atr'] = ta.ATR(dataframe, timeperiod=14)"]),
+    'ema_short': (['ema_short'], ["dataframe['ema_short'] = ta.EMA(dataframe, timeperiod=9)"]),
+    'ema_long': (['ema_long'], ["dataframe['ema_long'] = ta.EMA(dataframe, timeperiod=21)"]),
+    'sma_50': (['sma_50'], ["dataframe['sma_50'] = ta.SMA(dataframe, timeperiod=50)"]),
+    'bbands': (['bb_lowerband', 'bb_upperband', 'bb_middleband'], [
+        "bollinger = ta.BBANDS(dataframe, timeperiod=20)",
+        "dataframe['bb_lowerband'] = bollinger['lowerband']",
+        "dataframe['bb_upperband'] = bollinger['upperband']",
+        "dataframe['bb_middleband'] = bollinger['middleband']",
+    ]),
+    'volume_sma': (['volume_sma'], ["dataframe['volume_sma'] = dataframe['volume'].rolling(20).mean()"]),
+    'price_change': (['price_change'], ["dataframe['price_change'] = dataframe['close'].pct_change()"]),
+}
+
+# Impostazioni di gestione del rischio (trailing stop e segnali di uscita)
+RISK_SETTINGS = {
+    'trailing_stop': True,
+    'trailing_stop_positive': 0.008,
+    'trailing_stop_positive_offset': 0.015,
+    'trailing_only_offset_is_reached': True,
+    'use_exit_signal': True,
+    'exit_profit_only': False,
+    'ignore_roi_if_entry_signal': False,
+}
+
+# Parametri ottimizzabili: nome -> (tipo, min, max, default, spazio)
+OPTIMIZABLE_PARAMETERS = {
+    'rsi_period': ('IntParameter', 10, 20, 14, 'buy'),
+    'rsi_oversold': ('IntParameter', 20, 35, 30, 'buy'),
+    'rsi_overbought': ('IntParameter', 65, 80, 70, 'sell'),
+    'atr_period': ('IntParameter', 10, 20, 14, 'buy'),
+    'atr_multiplier': ('DecimalParameter', 1.0, 3.0, 2.0, 'buy'),
+}
+
 @dataclass
 class OptimizationResult:
     """Risultato dell'ottimizzazione di una strategia."""
@@ -36,12 +80,14 @@ class OptimizerAgent:
     def __init__(self, default_model: str = "phi3"):
         self.default_model = default_model
         self.converter = StrategyConverter()
+        self.last_rewrite: Optional[RewriteResult] = None
         
         # Configurazione ottimizzazione
         self.optimization_config = {
             'min_improvement_threshold': 0.05,  # 5% miglioramento minimo
             'max_optimization_attempts': 3,
             'optimization_timeout': 600,  # 10 minuti
+            'llm_max_ctx': 4096,  # contesto massimo per i prompt con il codice della strategia
             'enable_parameter_optimization': True,
             'enable_logic_optimization': True,
             'enable_risk_management_optimization': True
@@ -81,12 +127,11 @@ class OptimizerAgent:
                 strategy_code, optimization_suggestions, strategy_name
             )
             
-            # Valida il codice ottimizzato
+            # Le trasformazioni strutturate producono sempre codice analizzabile:
+            # nessun ciclo di validazione/correzione sul risultato
             if optimized_code != strategy_code:
-                validated_code = self.converter.validate_and_fix_code(optimized_code, strategy_name)
-                
                 # Calcola le modifiche apportate
-                changes = self._calculate_changes(strategy_code, validated_code)
+                changes = self._calculate_changes(strategy_code, optimized_code)
                 
                 return OptimizationResult(
                     original_score=original_score,
@@ -240,12 +285,18 @@ class OptimizerAgent:
     def _create_optimization_prompt(self, strategy_code: str, backtest_results: dict[str, float], analysis: dict[str, Any]) -> str:
         """
         Crea un prompt specifico per l'ottimizzazione della strategia.
+        Il codice viene compresso solo se il prompt non entra nel contesto.
         """
+        return fit_prompt(lambda code: self._render_optimization_prompt(code, backtest_results, analysis),
+                          strategy_code, num_predict=FAST_NUM_PREDICT,
+                          max_ctx=self.optimization_config['llm_max_ctx'], label="strategia")
+
+    def _render_optimization_prompt(self, strategy_code: str, backtest_results: dict[str, float], analysis: dict[str, Any]) -> str:
         return f"""
 Analizza questa strategia di trading FreqTrade e suggerisci miglioramenti specifici.
 
 CODICE STRATEGIA:
-{strategy_code[:1000]}...
+{strategy_code}
 
 RISULTATI BACKTEST:
 - Total Return: {backtest_results.get('total_return', 0.0)}
@@ -333,185 +384,122 @@ Rispondi con una lista numerata di suggerimenti specifici e implementabili.
     def _apply_optimizations(self, strategy_code: str, suggestions: List[str], strategy_name: str) -> str:
         """
         Applica le ottimizzazioni suggerite al codice della strategia.
+        
+        Le modifiche sono trasformazioni strutturate e idempotenti
+        (vedi StrategyRewriter): il codice risultante è sempre analizzabile.
         """
-        optimized_code = strategy_code
+        try:
+            rewriter = StrategyRewriter(strategy_code)
+        except CodeTransformError as e:
+            logger.warning(f"⚠️ Impossibile ottimizzare {strategy_name}: {e}")
+            return strategy_code
         
         for suggestion in suggestions:
             try:
                 # Applica ottimizzazioni specifiche
                 if "condizioni di entrata" in suggestion.lower():
-                    optimized_code = self._optimize_entry_conditions(optimized_code)
+                    self._optimize_entry_conditions(rewriter)
                     
                 elif "gestione del rischio" in suggestion.lower() or "stop loss" in suggestion.lower():
-                    optimized_code = self._optimize_risk_management(optimized_code)
+                    self._optimize_risk_management(rewriter)
                     
                 elif "indicatori" in suggestion.lower():
-                    optimized_code = self._optimize_indicators(optimized_code)
+                    self._optimize_indicators(rewriter)
                     
                 elif "parametri" in suggestion.lower():
-                    optimized_code = self._optimize_parameters(optimized_code)
+                    self._optimize_parameters(rewriter)
                     
                 elif "trend" in suggestion.lower() or "momentum" in suggestion.lower():
-                    optimized_code = self._optimize_trend_filters(optimized_code)
+                    self._optimize_trend_filters(rewriter)
                     
             except Exception as e:
                 logger.warning(f"Errore nell'applicazione ottimizzazione '{suggestion}': {e}")
                 continue
-                
-        return optimized_code
+        
+        self.last_rewrite = rewriter.result()
+        if self.last_rewrite.changed:
+            logger.info(f"🔧 {strategy_name}: {len(self.last_rewrite.changes)} trasformazioni applicate")
+        return self.last_rewrite.code
     
-    def _optimize_entry_conditions(self, strategy_code: str) -> str:
+    def _ensure_base_indicators(self, rewriter: StrategyRewriter, columns: List[str]) -> None:
         """
-        Ottimizza le condizioni di entrata della strategia.
+        Aggiunge gli indicatori base richiesti (se mancanti) in populate_indicators.
         """
-        # Aggiungi condizioni di entrata più sofisticate
-        entry_improvements = """
-        # Condizioni di entrata ottimizzate
-        dataframe.loc[
-            (dataframe['rsi'] < 30) & 
-            (dataframe['macd'] > dataframe['macdsignal']) &
-            (dataframe['close'] > dataframe['close'].shift(1)),
-            'enter_long'
-        ] = 1
-        
-        # Entrata su breakout
-        dataframe.loc[
-            (dataframe['close'] > dataframe['close'].shift(1) * 1.01) &
-            (dataframe['volume'] > dataframe['volume'].rolling(20).mean()),
-            'enter_long'
-        ] = 1
+        rewriter.ensure_module_import('talib.abstract', 'ta')
+        for column in columns:
+            columns_group, statements = BASE_INDICATORS[column]
+            rewriter.add_indicator(columns_group, statements)
+    
+    def _optimize_entry_conditions(self, rewriter: StrategyRewriter) -> bool:
         """
+        Ottimizza le condizioni di entrata della strategia.
         
-        # Sostituisci le condizioni di entrata esistenti
-        if "enter_long" in strategy_code:
-            strategy_code = re.sub(
-                r"dataframe\.loc\[.*?enter_long.*?\] = 1",
-                entry_improvements.strip(),
-                strategy_code,
-                flags=re.DOTALL
-            )
-            
-        return strategy_code
+        Viene aggiunta un'entrata su breakout con volume e tutte le regole
+        di entrata ricevono la conferma MACD.
+        """
+        self._ensure_base_indicators(rewriter, ['rsi', 'macd', 'volume_sma'])
+        changed = rewriter.add_signal_rule(
+            "(dataframe['close'] > dataframe['close'].shift(1) * 1.01) & "
+            "(dataframe['volume'] > dataframe['volume_sma'])",
+            column='enter_long'
+        )
+        changed |= rewriter.add_condition_to_signals(
+            "dataframe['macd'] > dataframe['macdsignal']", column='enter_long'
+        )
+        return changed
     
-    def _optimize_risk_management(self, strategy_code: str) -> str:
+    def _optimize_risk_management(self, rewriter: StrategyRewriter) -> bool:
         """
         Ottimizza la gestione del rischio della strategia.
         """
-        # Migliora stop loss e trailing stop
-        risk_improvements = """
-    stoploss = -0.015  # Stop loss più stretto
-    trailing_stop = True
-    trailing_stop_positive = 0.008
-    trailing_stop_positive_offset = 0.015
-    trailing_only_offset_is_reached = True
-    
-    # Stop loss dinamico basato su ATR
-    use_exit_signal = True
-    exit_profit_only = False
-    ignore_roi_if_entry_signal = False
-        """
+        changed = False
+        # Stop loss più stretto solo se quello attuale è più largo
+        current_stoploss = rewriter.get_class_attribute('stoploss')
+        if not isinstance(current_stoploss, (int, float)) or current_stoploss < -0.015:
+            changed |= rewriter.set_class_attribute('stoploss', -0.015)
         
-        # Sostituisci la configurazione del rischio
-        strategy_code = re.sub(
-            r"stoploss = -0\.02.*?trailing_only_offset_is_reached = True",
-            risk_improvements.strip(),
-            strategy_code,
-            flags=re.DOTALL
-        )
-        
-        return strategy_code
+        for name, value in RISK_SETTINGS.items():
+            changed |= rewriter.set_class_attribute(name, value)
+        return changed
     
-    def _optimize_indicators(self, strategy_code: str) -> str:
-        """
-        Ottimizza gli indicatori della strategia.
-        """
-        # Aggiungi indicatori utili
-        indicator_improvements = """
-        # Indicatori base
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
-        macd = ta.MACD(dataframe)
-        dataframe['macd'] = macd['macd']
-        dataframe['macdsignal'] = macd['macdsignal']
-        dataframe['atr'] = ta.ATR(dataframe, timeperiod=14)
-        
-        # Indicatori aggiuntivi per ottimizzazione
-        dataframe['ema_short'] = ta.EMA(dataframe, timeperiod=9)
-        dataframe['ema_long'] = ta.EMA(dataframe, timeperiod=21)
-        dataframe['sma_50'] = ta.SMA(dataframe, timeperiod=50)
-        
-        # Bollinger Bands
-        bollinger = ta.BBANDS(dataframe, timeperiod=20)
-        dataframe['bb_lowerband'] = bollinger['lowerband']
-        dataframe['bb_upperband'] = bollinger['upperband']
-        dataframe['bb_middleband'] = bollinger['middleband']
-        
-        # Volume e momentum
-        dataframe['volume_sma'] = dataframe['volume'].rolling(20).mean()
-        dataframe['price_change'] = dataframe['close'].pct_change()
+    def _optimize_indicators(self, rewriter: StrategyRewriter) -> bool:
         """
+        Ottimizza gli indicatori della strategia aggiungendo quelli mancanti.
         
-        # Sostituisci gli indicatori esistenti
-        if "populate_indicators" in strategy_code:
-            strategy_code = re.sub(
-                r"def populate_indicators\(self, dataframe: DataFrame, metadata: dict\) -> DataFrame:.*?return dataframe",
-                f"def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:\n        {indicator_improvements.strip()}\n        return dataframe",
-                strategy_code,
-                flags=re.DOTALL
-            )
-            
-        return strategy_code
+        Gli indicatori già calcolati dalla strategia non vengono toccati.
+        """
+        before = len(rewriter.changes)
+        self._ensure_base_indicators(rewriter, list(BASE_INDICATORS))
+        return len(rewriter.changes) > before
     
-    def _optimize_parameters(self, strategy_code: str) -> str:
+    def _optimize_parameters(self, rewriter: StrategyRewriter) -> bool:
         """
         Ottimizza i parametri della strategia rendendoli configurabili.
         """
-        # Aggiungi parametri ottimizzabili
-        parameter_improvements = """
-    # Parametri ottimizzabili
-    rsi_period = IntParameter(10, 20, default=14, space="buy")
-    rsi_oversold = IntParameter(20, 35, default=30, space="buy")
-    rsi_overbought = IntParameter(65, 80, default=70, space="sell")
+        changed = False
+        for name, (parameter_type, low, high, default, space) in OPTIMIZABLE_PARAMETERS.items():
+            changed |= rewriter.add_parameter(name, parameter_type, low, high, default, space)
+        return changed
     
-    # Parametri ATR
-    atr_period = IntParameter(10, 20, default=14, space="buy")
-    atr_multiplier = DecimalParameter(1.0, 3.0, default=2.0, space="buy")
-        """
-        
-        # Aggiungi parametri se non esistono
-        if "IntParameter" not in strategy_code:
-            # Trova la posizione dopo la definizione della classe
-            class_end = strategy_code.find("def populate_indicators")
-            if class_end != -1:
-                strategy_code = strategy_code[:class_end] + parameter_improvements + "\n    \n    " + strategy_code[class_end:]
-                
-        return strategy_code
-    
-    def _optimize_trend_filters(self, strategy_code: str) -> str:
+    def _optimize_trend_filters(self, rewriter: StrategyRewriter) -> bool:
         """
         Ottimizza i filtri di trend della strategia.
         """
-        # Aggiungi filtri di trend
-        trend_improvements = """
-        # Filtri di trend
-        dataframe['trend_up'] = (
-            (dataframe['ema_short'] > dataframe['ema_long']) &
-            (dataframe['close'] > dataframe['sma_50'])
-        )
-        
-        dataframe['momentum_positive'] = (
-            (dataframe['macd'] > dataframe['macd'].shift(1)) &
-            (dataframe['rsi'] > 50)
-        )
-        """
-        
-        # Aggiungi filtri se non esistono
-        if "trend_up" not in strategy_code:
-            # Trova la posizione dopo gli indicatori
-            indicators_end = strategy_code.find("return dataframe")
-            if indicators_end != -1:
-                strategy_code = strategy_code[:indicators_end] + trend_improvements + "\n        " + strategy_code[indicators_end:]
-                
-        return strategy_code
+        self._ensure_base_indicators(rewriter, ['rsi', 'macd', 'ema_short', 'ema_long', 'sma_50'])
+        changed = rewriter.add_indicator(['trend_up'], [
+            "# Filtri di trend",
+            "dataframe['trend_up'] = (",
+            "    (dataframe['ema_short'] > dataframe['ema_long']) &",
+            "    (dataframe['close'] > dataframe['sma_50'])",
+            ")",
+        ])
+        changed |= rewriter.add_indicator(['momentum_positive'], [
+            "dataframe['momentum_positive'] = (",
+            "    (dataframe['macd'] > dataframe['macd'].shift(1)) &",
+            "    (dataframe['rsi'] > 50)",
+            ")",
+        ])
+        return changed
     
     def _calculate_changes(self, original_code: str, optimized_code: str) -> Dict[str, Any]:
         """
@@ -522,22 +510,31 @@ Rispondi con una lista numerata di suggerimenti specifici e implementabili.
             'lines_modified': 0,
             'indicators_added': [],
             'conditions_modified': [],
-            'parameters_added': []
+            'parameters_added': [],
+            'transformations': list(self.last_rewrite.changes) if self.last_rewrite else [],
+            'diff': unified_diff(original_code, optimized_code),
+            'optimized_code': optimized_code
         }
         
         # Conta le linee
         original_lines = len(original_code.split('\n'))
         optimized_lines = len(optimized_code.split('\n'))
         changes['lines_added'] = optimized_lines - original_lines
+        changes['lines_modified'] = sum(
+            1 for line in changes['diff'].splitlines()
+            if line.startswith('-') and not line.startswith('---')
+        )
         
         # Identifica indicatori aggiunti
         original_indicators = re.findall(r"dataframe\['([^']+)'\]", original_code)
         optimized_indicators = re.findall(r"dataframe\['([^']+)'\]", optimized_code)
         changes['indicators_added'] = list(set(optimized_indicators) - set(original_indicators))
         
-        # Identifica parametri aggiunti
-        if "IntParameter" not in original_code and "IntParameter" in optimized_code:
-            changes['parameters_added'].append("Parametri ottimizzabili")
+        for description in changes['transformations']:
+            if description.startswith('parametro '):
+                changes['parameters_added'].append(description.split(' ', 1)[1])
+            elif description.startswith(('regola ', 'conferma ')):
+                changes['conditions_modified'].append(description)
             
         return changes
     
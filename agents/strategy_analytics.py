@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Motore di analisi incrementale delle strategie generate dagli LLM.
+L'analisi di ogni file dipende solo dal contenuto: viene messa in cache per
+hash e calcolata in un process pool solo per i file nuovi o modificati.
+Gli aggregati (modelli, tipi, indicatori, problemi, metriche di qualità)
+sono contatori aggiornati sommando e sottraendo il contributo dei singoli
+file, quindi una nuova analisi costa in proporzione ai file cambiati.
+"""
+
+import os
+import re
+import json
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+from agents.strategy_validation_service import content_hash, extract_facts
+
+logger = logging.getLogger(__name__)
+
+# Incrementare quando cambia il contenuto dell'analisi per file
+ANALYSIS_VERSION = 1
+
+KNOWN_MODELS = ['cogito', 'mistral', 'phi', 'llama', 'cooperative']
+KNOWN_TYPES = ['scalping', 'volatility', 'momentum', 'breakout', 'adaptive']
+LLM_FILE_MARKERS = ['llm', 'cogito', 'mistral', 'phi', 'cooperative', 'contest']
+
+TIMESTAMP_RE = re.compile(r'(\d{8}_\d{6})')
+ENTRY_PATTERNS = [re.compile(r"dataframe\.loc\[(.*?), 'enter_long'\] = 1", re.DOTALL),
+                  re.compile(r"dataframe\['enter_long'\] = (.*?)", re.DOTALL)]
+EXIT_PATTERNS = [re.compile(r"dataframe\.loc\[(.*?), 'exit_long'\] = 1", re.DOTALL),
+                 re.compile(r"dataframe\['exit_long'\] = (.*?)", re.DOTALL)]
+DOCSTRING_RE = re.compile(r'""".*?"""', re.DOTALL)
+COMMENT_RE = re.compile(r'#.*')
+TYPE_HINT_RE = re.compile(r':\s*(DataFrame|dict|str|int|float)')
+ERROR_HANDLING_RE = re.compile(r'try:|except:')
+# Pattern separati: "for " contiene "or " e va contato due volte come in passato
+COMPLEXITY_PATTERNS = [re.compile(p) for p in (r'if\s+', r'for\s+', r'while\s+', r'and\s+', r'or\s+')]
+
+
+def is_llm_strategy_file(filename: str) -> bool:
+    """Riconosce i file di strategia generati da LLM (nome modello o timestamp)."""
+    if not filename.endswith('.py') or filename.startswith('__'):
+        return False
+    lower = filename.lower()
+    return any(marker in lower for marker in LLM_FILE_MARKERS) or bool(TIMESTAMP_RE.search(filename))
+
+
+def describe_filename(filename: str) -> Dict[str, str]:
+    """Modello, tipo e data di generazione ricavati dal nome del file."""
+    lower = filename.lower()
+    date_match = TIMESTAMP_RE.search(filename)
+    return {
+        'filename': filename,
+        'model_used': next((m for m in KNOWN_MODELS if m in lower), "unknown"),
+        'strategy_type': next((t for t in KNOWN_TYPES if t in lower), "unknown"),
+        'generation_date': date_match.group(1) if date_match else "unknown"
+    }
+
+
+def _code_quality(content: str) -> Dict[str, Any]:
+    return {
+        'has_docstrings': bool(DOCSTRING_RE.search(content)),
+        'has_comments': COMMENT_RE.search(content) is not None,
+        'has_logging': 'logger' in content,
+        'has_type_hints': bool(TYPE_HINT_RE.search(content)),
+        'has_error_handling': bool(ERROR_HANDLING_RE.search(content)),
+        'code_complexity': sum(len(p.findall(content)) for p in COMPLEXITY_PATTERNS)
+    }
+
+
+def _strengths_and_issues(analysis: Dict[str, Any]):
+    indicators = len(analysis['indicators_used'])
+    complexity = analysis['code_quality']['code_complexity']
+
+    if indicators > 2:
+        analysis['strengths'].append("Usa multipli indicatori")
+    if analysis['risk_management'].get('trailing_stop'):
+        analysis['strengths'].append("Ha trailing stop")
+    if analysis['optimization_params']:
+        analysis['strengths'].append("Parametri ottimizzabili")
+    if analysis['code_quality']['has_docstrings']:
+        analysis['strengths'].append("Documentazione presente")
+
+    if indicators < 2:
+        analysis['potential_issues'].append("Troppo pochi indicatori")
+    if not analysis['risk_management'].get('stoploss'):
+        analysis['potential_issues'].append("Manca stoploss")
+    if not analysis['entry_conditions']:
+        analysis['potential_issues'].append("Condizioni di entrata mancanti")
+    if not analysis['exit_conditions']:
+        analysis['potential_issues'].append("Condizioni di uscita mancanti")
+    if complexity < 3:
+        analysis['potential_issues'].append("Strategia troppo semplice")
+    if complexity > 20:
+        analysis['potential_issues'].append("Strategia troppo complessa")
+
+
+def analyze_content(content: str) -> Dict[str, Any]:
+    """
+    Analizza il codice di una strategia (indipendente dal nome del file).
+
+    Args:
+        content: Codice sorgente della strategia
+
+    Returns:
+        Dizionario serializzabile in JSON con l'analisi
+    """
+    analysis = {
+        'file_size': len(content),
+        'lines_of_code': len(content.split('\n')),
+        'syntax_valid': False,
+        'class_name': None,
+        'indicators_used': [],
+        'entry_conditions': [],
+        'exit_conditions': [],
+        'risk_management': {},
+        'optimization_params': [],
+        'code_quality': {},
+        'potential_issues': [],
+        'strengths': []
+    }
+
+    facts = extract_facts(content)
+    analysis['syntax_valid'] = facts.syntax_valid
+    if not facts.syntax_valid:
+        analysis['potential_issues'].append(facts.syntax_error)
+        return analysis
+
+    analysis['class_name'] = facts.class_name
+    analysis['indicators_used'] = list(facts.indicators)
+    for pattern in ENTRY_PATTERNS:
+        analysis['entry_conditions'].extend(pattern.findall(content))
+    for pattern in EXIT_PATTERNS:
+        analysis['exit_conditions'].extend(pattern.findall(content))
+
+    for attribute, key in (('stoploss', 'stoploss'), ('trailing_stop', 'trailing_stop'), ('minimal_roi', 'roi')):
+        if attribute in facts.class_attributes:
+            analysis['risk_management'][key] = True
+
+    analysis['optimization_params'] = list(facts.parameters)
+    analysis['code_quality'] = _code_quality(content)
+    _strengths_and_issues(analysis)
+    return analysis
+
+
+def _analyze_job(job: Tuple[str, str]) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """Job per il process pool: analizza un contenuto già letto."""
+    digest, content = job
+    try:
+        return digest, analyze_content(content), None
+    except Exception as e:
+        return digest, None, str(e)
+
+
+@dataclass
+class StrategyAggregate:
+    """Contatori aggregati, aggiornabili per singolo file in entrambe le direzioni."""
+    total_strategies: int = 0
+    syntax_valid_count: int = 0
+    complexity_sum: int = 0
+    models_used: Counter = field(default_factory=Counter)
+    strategy_types: Counter = field(default_factory=Counter)
+    common_indicators: Counter = field(default_factory=Counter)
+    common_issues: Counter = field(default_factory=Counter)
+    quality: Counter = field(default_factory=Counter)
+
+    def add(self, analysis: Dict[str, Any]):
+        self._apply(analysis, 1)
+
+    def remove(self, analysis: Dict[str, Any]):
+        self._apply(analysis, -1)
+
+    def _apply(self, analysis: Dict[str, Any], sign: int):
+        quality = analysis.get('code_quality', {})
+        self.total_strategies += sign
+        self.syntax_valid_count += sign * bool(analysis['syntax_valid'])
+        self.complexity_sum += sign * quality.get('code_complexity', 0)
+
+        _bump(self.models_used, [analysis['model_used']], sign)
+        _bump(self.strategy_types, [analysis['strategy_type']], sign)
+        _bump(self.common_indicators, analysis['indicators_used'], sign)
+        _bump(self.common_issues, analysis['potential_issues'], sign)
+        _bump(self.quality, [name for name, present in (
+            ('has_docstrings', quality.get('has_docstrings', False)),
+            ('has_optimization', bool(analysis.get('optimization_params'))),
+            ('has_risk_management', bool(analysis.get('risk_management')))) if present], sign)
+
+    def to_report(self) -> Dict[str, Any]:
+        """Aggregato nel formato del report di analisi."""
+        if self.total_strategies <= 0:
+            return {}
+        return {
+            'total_strategies': self.total_strategies,
+            'syntax_valid_count': self.syntax_valid_count,
+            'models_used': dict(self.models_used),
+            'strategy_types': dict(self.strategy_types),
+            'common_indicators': dict(self.common_indicators),
+            'common_issues': dict(self.common_issues),
+            'quality_metrics': {
+                'avg_complexity': self.complexity_sum / self.total_strategies,
+                'has_docstrings': self.quality['has_docstrings'],
+                'has_optimization': self.quality['has_optimization'],
+                'has_risk_management': self.quality['has_risk_management']
+            }
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_strategies': self.total_strategies,
+            'syntax_valid_count': self.syntax_valid_count,
+            'complexity_sum': self.complexity_sum,
+            'models_used': dict(self.models_used),
+            'strategy_types': dict(self.strategy_types),
+            'common_indicators': dict(self.common_indicators),
+            'common_issues': dict(self.common_issues),
+            'quality': dict(self.quality)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StrategyAggregate":
+        aggregate = cls(data['total_strategies'], data['syntax_valid_count'], data['complexity_sum'])
+        for name in ('models_used', 'strategy_types', 'common_indicators', 'common_issues', 'quality'):
+            setattr(aggregate, name, Counter(data.get(name, {})))
+        return aggregate
+
+
+def _bump(counter: Counter, keys: Iterable[Any], sign: int):
+    """Aggiorna un contatore eliminando le chiavi che scendono a zero."""
+    for key in keys:
+        counter[key] += sign
+        if counter[key] <= 0:
+            del counter[key]
+
+
+class StrategyAnalyticsEngine:
+    """
+    Analisi incrementale di una directory di strategie.
+
+    La cache contiene le analisi per hash di contenuto, l'indice dei file
+    (mtime/dimensione/hash) e gli aggregati: i file invariati non vengono
+    riletti, quelli modificati o rimossi aggiornano solo il proprio contributo.
+    """
+
+    def __init__(self, strategies_dir: str = "user_data/strategies",
+                 cache_file: Optional[str] = "user_data/strategy_analysis_cache.json",
+                 max_workers: Optional[int] = None, parallel_threshold: int = 8):
+        self.strategies_dir = strategies_dir
+        self.cache_file = cache_file
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.parallel_threshold = parallel_threshold
+
+        self.analysis_by_hash: Dict[str, Dict[str, Any]] = {}
+        self.file_index: Dict[str, Dict[str, Any]] = {}
+        self.aggregate = StrategyAggregate()
+        self.stats = {'unchanged': 0, 'analyzed': 0, 'reused': 0, 'removed': 0}
+        self._dirty = False
+
+        self._load_cache()
+
+    @property
+    def _root(self) -> str:
+        return os.path.abspath(self.strategies_dir)
+
+    def _load_cache(self):
+        """Carica la cache persistita, se compatibile con versione e directory."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != ANALYSIS_VERSION or data.get('root') != self._root:
+                return
+            self.analysis_by_hash = data.get('analyses', {})
+            self.file_index = data.get('files', {})
+            self.aggregate = StrategyAggregate.from_dict(data['aggregate'])
+            if self.aggregate.total_strategies != len(self.file_index):
+                raise ValueError("aggregato non coerente con l'indice dei file")
+        except Exception as e:
+            logger.warning(f"⚠️ Cache di analisi non leggibile, verrà ricostruita: {e}")
+            self.analysis_by_hash = {}
+            self.file_index = {}
+            self.aggregate = StrategyAggregate()
+
+    def save_cache(self):
+        """Salva la cache su disco (solo se modificata)."""
+        if not self.cache_file or not self._dirty:
+            return
+        live_hashes = {entry['hash'] for entry in self.file_index.values()}
+        analyses = {h: a for h, a in self.analysis_by_hash.items() if h in live_hashes}
+        try:
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{self.cache_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': ANALYSIS_VERSION, 'root': self._root, 'analyses': analyses,
+                           'files': self.file_index, 'aggregate': self.aggregate.to_dict()}, f)
+            os.replace(tmp_path, self.cache_file)
+            self.analysis_by_hash = analyses
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"⚠️ Impossibile salvare la cache di analisi: {e}")
+
+    def find_strategy_files(self) -> Dict[str, os.stat_result]:
+        """Strategie LLM presenti nella directory, con il relativo stat."""
+        found = {}
+        try:
+            with os.scandir(self.strategies_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and is_llm_strategy_file(entry.name):
+                        found[os.path.abspath(entry.path)] = entry.stat()
+        except FileNotFoundError:
+            pass
+        return found
+
+    def file_analysis(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Analisi completa (contenuto + nome file) di un file indicizzato."""
+        entry = self.file_index.get(os.path.abspath(file_path))
+        if not entry or entry['hash'] not in self.analysis_by_hash:
+            return None
+        return {**describe_filename(os.path.basename(file_path)), **self.analysis_by_hash[entry['hash']]}
+
+    def refresh(self, save: bool = True) -> bool:
+        """
+        Sincronizza cache e aggregati con la directory.
+
+        Args:
+            save: Se salvare la cache su disco al termine
+
+        Returns:
+            True se almeno un file è stato aggiunto, modificato o rimosso
+        """
+        current = self.find_strategy_files()
+        changed_paths = []
+        for path, stat in current.items():
+            entry = self.file_index.get(path)
+            if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                self.stats['unchanged'] += 1
+            else:
+                changed_paths.append(path)
+
+        removed = [path for path in self.file_index if path not in current]
+        for path in removed:
+            self._forget(path)
+        self.stats['removed'] += len(removed)
+
+        if changed_paths:
+            self._index_files(changed_paths, current)
+
+        changed = bool(removed or changed_paths)
+        if changed:
+            logger.info(f"📊 Analisi strategie: {len(changed_paths)} file aggiornati, "
+                        f"{len(removed)} rimossi, {len(current) - len(changed_paths)} invariati")
+        if save:
+            self.save_cache()
+        return changed
+
+    def _forget(self, path: str):
+        """Rimuove il contributo di un file da indice e aggregati."""
+        previous = self.file_analysis(path)
+        if previous is not None:
+            self.aggregate.remove(previous)
+        self.file_index.pop(path, None)
+        self._dirty = True
+
+    def _index_files(self, paths: List[str], stats: Dict[str, os.stat_result]):
+        """Legge i file cambiati e analizza in parallelo i contenuti mai visti."""
+        contents: Dict[str, str] = {}
+        hashes: Dict[str, str] = {}
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"⚠️ Impossibile leggere {path}: {e}")
+                if path in self.file_index:
+                    self._forget(path)
+                continue
+            digest = content_hash(content)
+            hashes[path] = digest
+            if digest not in self.analysis_by_hash:
+                contents.setdefault(digest, content)
+
+        self.stats['reused'] += len(hashes) - len(contents)
+        for digest, analysis, error in self._analyze_many(list(contents.items())):
+            if error is not None:
+                logger.warning(f"⚠️ Analisi fallita per il contenuto {digest[:12]}: {error}")
+                continue
+            self.analysis_by_hash[digest] = analysis
+            self.stats['analyzed'] += 1
+
+        for path, digest in hashes.items():
+            if path in self.file_index:
+                self._forget(path)
+            if digest not in self.analysis_by_hash:
+                continue
+            stat = stats[path]
+            self.file_index[path] = {'hash': digest, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            self.aggregate.add(self.file_analysis(path))
+            self._dirty = True
+
+    def _analyze_many(self, jobs: List[Tuple[str, str]]) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """Analizza più contenuti, con process pool sopra la soglia."""
+        if len(jobs) < self.parallel_threshold or self.max_workers <= 1:
+            return [_analyze_job(job) for job in jobs]
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                chunksize = max(1, len(jobs) // (self.max_workers * 4))
+                return list(executor.map(_analyze_job, jobs, chunksize=chunksize))
+        except Exception as e:
+            logger.warning(f"⚠️ Process pool non disponibile, analisi seriale: {e}")
+            return [_analyze_job(job) for job in jobs]
+
+    def individual_strategies(self) -> Dict[str, Dict[str, Any]]:
+        """Analisi dei singoli file, per percorso."""
+        results = {}
+        for path in sorted(self.file_index):
+            analysis = self.file_analysis(path)
+            if analysis is not None:
+                results[os.path.join(self.strategies_dir, os.path.basename(path))] = analysis
+        return results
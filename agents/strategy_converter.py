@@ -9,6 +9,9 @@ from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 import logging
 
+from .lookahead_analyzer import LookaheadAnalyzer, LookaheadBiasError, AnalysisReport
+from pipeline_tracing import traced
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -32,6 +35,8 @@ class StrategyConverter:
         self.template_strategy = self._load_template()
         self.indicator_mapping = self._load_indicator_mapping()
         self.condition_mapping = self._load_condition_mapping()
+        self.lookahead_analyzer = LookaheadAnalyzer()
+        self.last_code_analysis: Optional[AnalysisReport] = None
     
     def convert_text_to_strategy(self, text_description: str, strategy_name: str = "LLMStrategy") -> str:
         """
@@ -62,6 +67,7 @@ class StrategyConverter:
             logger.error(f"Errore nella conversione: {e}")
             return self._generate_fallback_strategy(strategy_name=strategy_name)
     
+    @traced("validation")
     def validate_and_fix_code(self, strategy_code: str, strategy_name: str = "LLMStrategy") -> str:
         """
         Valida e corregge codice FreqTrade generato da LLM.
@@ -77,6 +83,9 @@ class StrategyConverter:
             # Parsing sintattico
             ast.parse(strategy_code)
             
+            # Lookahead bias e loop non vettorizzati (con riscrittura automatica)
+            strategy_code = self._check_lookahead_and_loops(strategy_code)
+            
             # Validazione specifica FreqTrade
             if self._validate_freqtrade_specifics(strategy_code):
                 # Correggi il nome della classe se necessario
@@ -88,10 +97,38 @@ class StrategyConverter:
         except SyntaxError as e:
             logger.error(f"Errore di sintassi: {e}")
             return self._fix_syntax_errors(strategy_code, strategy_name)
+        except LookaheadBiasError as e:
+            logger.error(f"❌ Strategia scartata: {e}")
+            return self._generate_fallback_strategy(strategy_name=strategy_name)
         except Exception as e:
             logger.error(f"Errore di validazione: {e}")
             return self._generate_fallback_strategy(strategy_name=strategy_name)
     
+    @traced("validation.lookahead", strategy_arg=None)
+    def _check_lookahead_and_loops(self, strategy_code: str) -> str:
+        """
+        Analizza i metodi populate_* per lookahead bias e loop riga per riga.
+        
+        Returns:
+            Codice con i loop vettorizzati
+            
+        Raises:
+            LookaheadBiasError: se il codice legge dati futuri (shift negativi,
+                finestre centrate, indici futuri nei loop)
+        """
+        report = self.lookahead_analyzer.analyze(strategy_code)
+        self.last_code_analysis = report
+        
+        for rewrite in report.rewrites:
+            logger.info(f"🔧 Correzione automatica: {rewrite}")
+        for issue in report.remaining_issues:
+            icon = "❌" if issue.severity == "error" else "⚠️"
+            logger.warning(f"{icon} {issue.method} riga {issue.line}: {issue.message}")
+        
+        if report.lookahead_errors:
+            raise LookaheadBiasError(report)
+        return report.code
+    
     def _extract_components(self, text: str) -> StrategyComponents:
         """Estrae i componenti della strategia dal testo."""
         components = StrategyComponents(
@@ -233,6 +270,7 @@ class StrategyConverter:
         
         return code
     
+    @traced("validation.fix")
     def _fix_strategy_code(self, code: str, strategy_name: str) -> str:
         """Corregge errori comuni nel codice."""
         # Rimuovi commenti problematici
@@ -247,6 +285,7 @@ class StrategyConverter:
         
         return code
     
+    @traced("validation.fix_syntax")
     def _fix_syntax_errors(self, code: str, strategy_name: str) -> str:
         """Corregge errori di sintassi comuni."""
         # Rimuovi caratteri problematici
@@ -1,9 +1,10 @@
 import os
 import re
 import shutil
-import ast
 from typing import Optional, Tuple, List
 
+from .strategy_validation_service import get_validation_service
+
 def get_class_name_from_file(file_path: str) -> Optional[str]:
     """Estrae il nome della classe dalla strategia."""
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -35,14 +36,10 @@ def fix_class_name(file_path: str, correct_class_name: str) -> bool:
     return changed
 
 def validate_python_syntax(file_path: str) -> Tuple[bool, Optional[str]]:
-    """Valida la sintassi Python del file."""
+    """Valida la sintassi Python del file (cache condivisa per hash di contenuto)."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code = f.read()
-        ast.parse(code)
-        return True, None
-    except SyntaxError as e:
-        return False, f"Errore di sintassi alla riga {e.lineno}: {e.msg}"
+        facts = get_validation_service().validate_file(file_path)
+        return facts.syntax_valid, facts.syntax_error
     except Exception as e:
         return False, str(e)
 
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Sandbox per lo smoke test delle strategie generate.
+Un pool di processi worker pre-riscaldati (pandas, talib e freqtrade.strategy già
+importati) importa la strategia candidata ed esegue i metodi populate_* su una
+piccola serie OHLCV sintetica o in cache, restituendo un verdetto in millisecondi.
+Ogni worker gira con limiti di risorse e timeout per singolo task, così una
+strategia rotta non costa l'avvio di un backtest Freqtrade completo.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import select
+import logging
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+ENTRY_COLUMNS = ['enter_long', 'enter_short', 'buy']
+EXIT_COLUMNS = ['exit_long', 'exit_short', 'sell']
+
+# Dipendenze dell'ambiente Freqtrade: se mancano nel worker il test viene saltato, non fallito
+ENVIRONMENT_PACKAGES = {'pandas', 'numpy', 'talib', 'freqtrade', 'technical'}
+
+
+@dataclass
+class SmokeTestResult:
+    """Verdetto dello smoke test di una strategia."""
+    file_path: str
+    status: str  # passed, failed, timeout, skipped
+    class_name: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    entry_signals: int = 0
+    exit_signals: int = 0
+    max_nan_ratio: float = 0.0
+    duration_ms: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        """True se la strategia non è stata scartata (skipped non blocca)."""
+        return self.status in ('passed', 'skipped')
+
+
+class _Worker:
+    """Processo worker con protocollo JSON a righe su stdin/stdout."""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.tasks_done = 0
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(settings)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        # Il worker annuncia le dipendenze caricate quando è pronto
+        ready = self._read_line(settings.get('startup_timeout', 60))
+        self.capabilities = json.loads(ready) if ready else {}
+
+    def _read_line(self, timeout: float) -> Optional[str]:
+        """Legge una riga dallo stdout del worker entro il timeout."""
+        readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not readable:
+            return None
+        line = self.process.stdout.readline()
+        return line or None
+
+    def run(self, task: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
+        """Invia un task e attende il verdetto (None se il worker non risponde)."""
+        try:
+            self.process.stdin.write(json.dumps(task) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return None
+        line = self._read_line(timeout)
+        self.tasks_done += 1
+        return json.loads(line) if line else None
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self):
+        """Termina il worker."""
+        if self.is_alive():
+            self.process.kill()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class StrategySandboxPool:
+    """
+    Pool di worker pre-riscaldati per lo smoke test delle strategie.
+    """
+
+    def __init__(self,
+                 workers: int = 2,
+                 task_timeout: float = 10.0,
+                 memory_limit_mb: int = 2048,
+                 candles: int = 500,
+                 ohlcv_file: Optional[str] = None,
+                 max_nan_ratio: float = 0.5,
+                 max_tasks_per_worker: int = 50):
+        self.size = max(1, workers)
+        self.task_timeout = task_timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.settings = {
+            'memory_limit_mb': memory_limit_mb,
+            'candles': candles,
+            'ohlcv_file': ohlcv_file,
+            'max_nan_ratio': max_nan_ratio,
+            'task_timeout': task_timeout
+        }
+
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    def start(self):
+        """Avvia e pre-riscalda i worker."""
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(_Worker(self.settings))
+            self._started = True
+        logger.info(f"✅ Sandbox strategie avviata con {self.size} worker")
+
+    def close(self):
+        """Arresta tutti i worker."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _checkout(self) -> _Worker:
+        if not self._started:
+            self.start()
+        worker = self._idle.get()
+        if not worker.is_alive() or worker.tasks_done >= self.max_tasks_per_worker:
+            worker.kill()
+            worker = _Worker(self.settings)
+        return worker
+
+    def _checkin(self, worker: _Worker):
+        if self._closed:
+            worker.kill()
+        else:
+            self._idle.put(worker)
+
+    def smoke_test(self, file_path: str, class_name: Optional[str] = None) -> SmokeTestResult:
+        """
+        Esegue lo smoke test di una strategia.
+
+        Args:
+            file_path: Percorso del file della strategia
+            class_name: Classe da testare (default: prima sottoclasse di IStrategy)
+
+        Returns:
+            SmokeTestResult con il verdetto
+        """
+        worker = self._checkout()
+        start = time.time()
+        task = {'path': os.path.abspath(file_path), 'class_name': class_name}
+        # Il worker applica il proprio timeout: qui si lascia un margine prima di ucciderlo
+        reply = worker.run(task, self.task_timeout + 5)
+
+        if reply is None:
+            # Worker bloccato o morto (es. limite di memoria): si sostituisce
+            hung = worker.is_alive()
+            worker.kill()
+            self._checkin(_Worker(self.settings) if not self._closed else worker)
+            return SmokeTestResult(
+                file_path=file_path,
+                status='timeout' if hung else 'failed',
+                class_name=class_name,
+                errors=["Worker bloccato oltre il timeout" if hung
+                        else f"Worker terminato (exit code {worker.process.returncode})"],
+                duration_ms=(time.time() - start) * 1000
+            )
+
+        self._checkin(worker)
+        result = SmokeTestResult(file_path=file_path, **reply)
+        if not result.passed:
+            logger.warning(f"⚠️ Smoke test {os.path.basename(file_path)}: {result.status} - {result.errors[:1]}")
+        return result
+
+    def smoke_test_many(self, file_paths: List[str]) -> Dict[str, SmokeTestResult]:
+        """Esegue lo smoke test di più strategie in parallelo sui worker del pool."""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            results = executor.map(self.smoke_test, file_paths)
+            return dict(zip(file_paths, results))
+
+
+# ----------------------------------------------------------------------
+# Lato worker (eseguito nel sottoprocesso)
+# ----------------------------------------------------------------------
+
+class _TaskTimeout(BaseException):
+    """Timeout del task: BaseException perché un `except Exception` della strategia non lo intercetti."""
+
+
+def _apply_resource_limits(memory_limit_mb: int):
+    """Applica limiti di memoria e dimensione file al worker."""
+    try:
+        import resource
+    except ImportError:
+        return
+    try:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        # Le strategie non devono scrivere file di grandi dimensioni
+        resource.setrlimit(resource.RLIMIT_FSIZE, (10 * 1024 * 1024, 10 * 1024 * 1024))
+    except (ValueError, OSError):
+        pass
+
+
+def _load_ohlcv(pd, np, settings: Dict[str, Any]):
+    """Carica OHLCV dal file in cache o genera una serie sintetica deterministica."""
+    candles = settings.get('candles', 500)
+    ohlcv_file = settings.get('ohlcv_file')
+    if ohlcv_file and os.path.exists(ohlcv_file):
+        if ohlcv_file.endswith('.feather'):
+            df = pd.read_feather(ohlcv_file)
+        else:
+            df = pd.DataFrame(json.load(open(ohlcv_file)),
+                              columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+            df['date'] = pd.to_datetime(df['date'], unit='ms', utc=True)
+        return df.tail(candles).reset_index(drop=True)
+
+    rng = np.random.default_rng(42)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, candles)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.002, candles)) * close
+    return pd.DataFrame({
+        'date': pd.date_range('2024-01-01', periods=candles, freq='5min', tz='UTC'),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.uniform(100, 1000, candles)
+    })
+
+
+def _find_strategy_class(module, class_name: Optional[str], istrategy):
+    """Individua la classe della strategia nel modulo importato."""
+    if class_name and hasattr(module, class_name):
+        return getattr(module, class_name)
+    for value in vars(module).values():
+        if not isinstance(value, type) or value.__module__ != module.__name__:
+            continue
+        if istrategy is not None and issubclass(value, istrategy):
+            return value
+        if istrategy is None and hasattr(value, 'populate_indicators'):
+            return value
+    return None
+
+
+def _instantiate(cls):
+    """Istanzia la strategia con una configurazione minima."""
+    try:
+        return cls({'dry_run': True, 'stake_currency': 'USDT', 'timeframe': getattr(cls, 'timeframe', '5m')})
+    except Exception:
+        instance = cls.__new__(cls)
+        instance.config = {}
+        return instance
+
+
+def _run_task(task: Dict[str, Any], deps: Dict[str, Any], settings: Dict[str, Any], counter: List[int]) -> Dict[str, Any]:
+    """Importa la strategia ed esegue i populate_* sui dati di prova."""
+    import importlib.util
+
+    result = {'status': 'passed', 'class_name': task.get('class_name'), 'errors': [], 'warnings': [],
+              'entry_signals': 0, 'exit_signals': 0, 'max_nan_ratio': 0.0}
+
+    counter[0] += 1
+    module_name = f"_sandbox_strategy_{counter[0]}"
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, task['path'])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    except _TaskTimeout:
+        raise
+    except ModuleNotFoundError as e:
+        sys.modules.pop(module_name, None)
+        if (e.name or '').split('.')[0] in ENVIRONMENT_PACKAGES:
+            result['status'] = 'skipped'
+            result['warnings'].append(f"Dipendenza non disponibile nel worker: {e.name}")
+        else:
+            result['status'] = 'failed'
+            result['errors'].append(f"Import fallito: {type(e).__name__}: {e}")
+        return result
+    except BaseException as e:
+        sys.modules.pop(module_name, None)
+        result['status'] = 'failed'
+        result['errors'].append(f"Import fallito: {type(e).__name__}: {e}")
+        return result
+
+    try:
+        cls = _find_strategy_class(module, task.get('class_name'), deps.get('IStrategy'))
+        if cls is None:
+            result['status'] = 'failed'
+            result['errors'].append("Nessuna classe IStrategy trovata")
+            return result
+        result['class_name'] = cls.__name__
+
+        pd = deps.get('pandas')
+        if pd is None:
+            result['status'] = 'skipped'
+            result['warnings'].append("pandas non disponibile nel worker: esecuzione populate_* saltata")
+            return result
+
+        strategy = _instantiate(cls)
+        metadata = {'pair': 'BTC/USDT:USDT'}
+        dataframe = deps['ohlcv'].copy()
+        base_columns = set(dataframe.columns)
+
+        dataframe = strategy.populate_indicators(dataframe, metadata)
+        if not isinstance(dataframe, pd.DataFrame):
+            raise TypeError("populate_indicators non restituisce un DataFrame")
+
+        entry = getattr(strategy, 'populate_entry_trend', None) or getattr(strategy, 'populate_buy_trend')
+        exit_ = getattr(strategy, 'populate_exit_trend', None) or getattr(strategy, 'populate_sell_trend')
+        dataframe = entry(dataframe, metadata)
+        dataframe = exit_(dataframe, metadata)
+        if not isinstance(dataframe, pd.DataFrame):
+            raise TypeError("populate_*_trend non restituisce un DataFrame")
+    finally:
+        sys.modules.pop(module_name, None)
+
+    # Colonne di segnale
+    entry_cols = [c for c in ENTRY_COLUMNS if c in dataframe.columns]
+    exit_cols = [c for c in EXIT_COLUMNS if c in dataframe.columns]
+    if not entry_cols:
+        result['errors'].append("Nessuna colonna di entrata (enter_long/enter_short)")
+    if not exit_cols:
+        result['warnings'].append("Nessuna colonna di uscita (exit_long/exit_short)")
+    for col in entry_cols + exit_cols:
+        values = set(dataframe[col].dropna().unique().tolist())
+        if not values <= {0, 1, True, False}:
+            result['errors'].append(f"Valori non validi nella colonna {col}: {sorted(map(str, values))[:5]}")
+    result['entry_signals'] = int(sum(dataframe[c].fillna(0).astype(bool).sum() for c in entry_cols))
+    result['exit_signals'] = int(sum(dataframe[c].fillna(0).astype(bool).sum() for c in exit_cols))
+    if entry_cols and result['entry_signals'] == 0:
+        result['warnings'].append("Nessun segnale di entrata sui dati di prova")
+
+    # NaN negli indicatori dopo il periodo di warmup
+    startup = int(getattr(strategy, 'startup_candle_count', 0) or 0)
+    indicator_cols = [c for c in dataframe.columns
+                      if c not in base_columns and c not in ENTRY_COLUMNS + EXIT_COLUMNS
+                      and not c.startswith(('enter_', 'exit_'))]
+    window = dataframe.iloc[startup:]
+    if indicator_cols and len(window):
+        ratios = window[indicator_cols].isna().mean()
+        result['max_nan_ratio'] = float(ratios.max())
+        too_sparse = [c for c, r in ratios.items() if r > settings.get('max_nan_ratio', 0.5)]
+        if too_sparse:
+            result['errors'].append(f"Indicatori con troppi NaN: {too_sparse[:5]}")
+
+    if result['errors']:
+        result['status'] = 'failed'
+    return result
+
+
+def _worker_main(settings: Dict[str, Any]):
+    """Loop del worker: legge task JSON da stdin e scrive verdetti su stdout."""
+    import signal
+
+    # Il protocollo usa un descrittore dedicato: le print delle strategie vanno su stderr
+    protocol = os.fdopen(os.dup(1), 'w', buffering=1)
+    os.dup2(2, 1)
+
+    # Pre-riscaldamento: import pesanti una sola volta per worker
+    deps: Dict[str, Any] = {'pandas': None, 'IStrategy': None}
+    try:
+        import numpy as np
+        import pandas as pd
+        try:
+            deps['ohlcv'] = _load_ohlcv(pd, np, settings)
+        except Exception:
+            deps['ohlcv'] = _load_ohlcv(pd, np, dict(settings, ohlcv_file=None))
+        deps['pandas'] = pd
+    except Exception:
+        deps['pandas'] = None
+    try:
+        import talib  # noqa: F401
+        import talib.abstract  # noqa: F401
+    except Exception:
+        pass
+    try:
+        from freqtrade.strategy import IStrategy
+        deps['IStrategy'] = IStrategy
+    except Exception:
+        pass
+
+    # I limiti si applicano dopo gli import, ai soli task delle strategie
+    _apply_resource_limits(settings.get('memory_limit_mb', 2048))
+
+    protocol.write(json.dumps({
+        'pandas': deps['pandas'] is not None,
+        'freqtrade': deps['IStrategy'] is not None,
+        'talib': 'talib' in sys.modules
+    }) + "\n")
+
+    def _on_timeout(signum, frame):
+        raise _TaskTimeout()
+
+    signal.signal(signal.SIGALRM, _on_timeout)
+    timeout = float(settings.get('task_timeout', 10.0))
+    counter = [0]
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        task = json.loads(line)
+        start = time.time()
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            reply = _run_task(task, deps, settings, counter)
+        except _TaskTimeout:
+            reply = {'status': 'timeout', 'class_name': task.get('class_name'),
+                     'errors': [f"Timeout dopo {timeout}s"], 'warnings': []}
+        except MemoryError:
+            reply = {'status': 'failed', 'class_name': task.get('class_name'),
+                     'errors': ["Limite di memoria superato"], 'warnings': []}
+        except BaseException as e:
+            reply = {'status': 'failed', 'class_name': task.get('class_name'),
+                     'errors': [f"{type(e).__name__}: {e}"], 'warnings': []}
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        reply['duration_ms'] = (time.time() - start) * 1000
+        protocol.write(json.dumps(reply, default=str) + "\n")
+
+
+# Istanza globale del pool
+_pool_instance: Optional[StrategySandboxPool] = None
+
+
+def get_sandbox_pool(**kwargs) -> StrategySandboxPool:
+    """Ottiene l'istanza globale del pool di sandbox."""
+    global _pool_instance
+    if _pool_instance is None:
+        _pool_instance = StrategySandboxPool(**kwargs)
+    return _pool_instance
+
+
+def smoke_test_strategy(file_path: str, class_name: Optional[str] = None) -> SmokeTestResult:
+    """Funzione helper per lo smoke test con il pool globale."""
+    return get_sandbox_pool().smoke_test(file_path, class_name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "--worker":
+        _worker_main(json.loads(sys.argv[2]))
+    else:
+        # Uso da riga di comando: smoke test dei file indicati
+        with StrategySandboxPool() as pool:
+            for path, verdict in pool.smoke_test_many(sys.argv[1:]).items():
+                icon = "✅" if verdict.passed else "❌"
+                print(f"{icon} {os.path.basename(path)}: {verdict.status} "
+                      f"({verdict.duration_ms:.0f} ms) {'; '.join(verdict.errors)}")
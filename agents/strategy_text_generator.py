@@ -7,7 +7,9 @@ Prima fase: genera logica di trading in linguaggio naturale
 import random
 import time
 from typing import Dict, List, Any, Optional
-from llm_utils import query_ollama_fast
+from llm_utils import query_ollama_fast, FAST_NUM_PREDICT
+from context_budget import count_tokens
+from deadlines import DeadlineExceeded, call_timeout
 from .timeout_manager import get_optimal_timeout, record_performance
 
 class StrategyTextGenerator:
@@ -77,37 +79,50 @@ class StrategyTextGenerator:
         prompt = self._create_description_prompt(template, complexity, style, randomization)
         
         # Calcola timeout ottimale
+        prompt_tokens = count_tokens(prompt)
         timeout = get_optimal_timeout(
             model=self.default_model,
             phase="text_generation",
             complexity=complexity,
-            strategy_type=strategy_type
+            strategy_type=strategy_type,
+            prompt_tokens=prompt_tokens,
+            num_predict=FAST_NUM_PREDICT
         )
         
         start_time = time.time()
         success = False
+        deadline_exceeded = False
         
         try:
-            print(f"⚡ Invio richiesta a {self.default_model} (timeout: {timeout}s)...")
+            # Timeout effettivo: mai oltre la scadenza corrente della pipeline
+            timeout = call_timeout(timeout)
+            print(f"⚡ Invio richiesta a {self.default_model} (timeout: {timeout:.0f}s)...")
             description = query_ollama_fast(prompt, self.default_model, timeout=timeout)
             print(f"✅ Risposta ricevuta da {self.default_model}")
             success = True
             return self._clean_description(description)
+        except DeadlineExceeded as e:
+            # Nessuna richiesta inviata: non è un campione di durata per la politica di timeout
+            deadline_exceeded = True
+            print(f"⏰ {e}")
+            return self._generate_fallback_description(template, strategy_type)
         except Exception as e:
             print(f"❌ Errore nella generazione descrizione: {e}")
             print("🔄 Fallback a descrizione predefinita...")
             return self._generate_fallback_description(template, strategy_type)
         finally:
             # Registra performance
-            actual_time = time.time() - start_time
-            record_performance(
-                model=self.default_model,
-                phase="text_generation",
-                strategy_type=strategy_type,
-                actual_time=actual_time,
-                success=success,
-                timeout_used=timeout
-            )
+            if not deadline_exceeded:
+                actual_time = time.time() - start_time
+                record_performance(
+                    model=self.default_model,
+                    phase="text_generation",
+                    strategy_type=strategy_type,
+                    actual_time=actual_time,
+                    success=success,
+                    timeout_used=timeout,
+                    prompt_tokens=prompt_tokens
+                )
     
     def _create_description_prompt(self, template: Dict[str, Any], complexity: str, style: str, randomization: float) -> str:
         """Crea il prompt per la generazione della descrizione."""
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Servizio di validazione condiviso per le strategie Freqtrade.
+Ogni file viene letto e analizzato con `ast` una sola volta per hash di contenuto;
+i fatti estratti (classe, base IStrategy, metodi populate_*, indicatori, parametri)
+sono messi in cache su disco e riusati da tutti gli script di validazione e analisi.
+"""
+
+import os
+import re
+import ast
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Incrementare quando cambia la struttura di StrategyFacts
+CACHE_VERSION = 1
+
+POPULATE_METHODS = ['populate_indicators', 'populate_entry_trend', 'populate_exit_trend']
+PARAMETER_TYPES = {'IntParameter', 'DecimalParameter', 'RealParameter',
+                   'CategoricalParameter', 'BooleanParameter'}
+INDICATOR_MODULES = {'ta', 'talib'}
+RISK_ATTRIBUTES = ['minimal_roi', 'stoploss', 'trailing_stop', 'timeframe', 'can_short']
+
+
+@dataclass
+class StrategyFacts:
+    """Fatti estratti dall'AST di una strategia."""
+    content_hash: str
+    syntax_valid: bool
+    syntax_error: Optional[str] = None
+    class_name: Optional[str] = None
+    class_names: List[str] = field(default_factory=list)
+    has_istrategy_class: bool = False
+    populate_methods: List[str] = field(default_factory=list)
+    methods: List[str] = field(default_factory=list)
+    indicators: List[str] = field(default_factory=list)
+    imports: List[str] = field(default_factory=list)
+    parameters: List[str] = field(default_factory=list)
+    class_attributes: List[str] = field(default_factory=list)
+    lines_of_code: int = 0
+    file_size: int = 0
+
+    @property
+    def missing_populate_methods(self) -> List[str]:
+        """Metodi populate_* obbligatori non definiti."""
+        return [m for m in POPULATE_METHODS if m not in self.populate_methods]
+
+    def has_import(self, module: str) -> bool:
+        """Verifica se un modulo (o un suo sottomodulo) è importato."""
+        return any(imp == module or imp.startswith(module + '.') for imp in self.imports)
+
+
+def content_hash(code: str) -> str:
+    """Calcola l'hash del contenuto di una strategia."""
+    return hashlib.sha256(code.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+def _base_name(node: ast.expr) -> Optional[str]:
+    """Nome della classe base (IStrategy o modulo.IStrategy)."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def extract_facts(code: str) -> StrategyFacts:
+    """
+    Analizza il codice di una strategia ed estrae i fatti strutturali.
+
+    Args:
+        code: Codice sorgente della strategia
+
+    Returns:
+        StrategyFacts con i fatti estratti (anche per codice non valido)
+    """
+    facts = StrategyFacts(
+        content_hash=content_hash(code),
+        syntax_valid=False,
+        lines_of_code=len(code.split('\n')),
+        file_size=len(code)
+    )
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        facts.syntax_error = f"Errore di sintassi alla riga {e.lineno}: {e.msg}"
+    except Exception as e:
+        facts.syntax_error = f"Errore generico: {str(e)}"
+    else:
+        facts.syntax_valid = True
+        _collect_tree_facts(tree, facts)
+        return facts
+
+    # Codice non analizzabile: recupera almeno il nome della classe dal testo
+    class_match = re.search(r'class\s+(\w+)\s*\(IStrategy\)', code)
+    if class_match:
+        facts.class_name = class_match.group(1)
+        facts.class_names = [facts.class_name]
+    return facts
+
+
+def _collect_tree_facts(tree: ast.Module, facts: StrategyFacts):
+    """Popola i fatti a partire da un AST valido."""
+    imports = set()
+    indicators = set()
+    strategy_class = None
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            imports.add(node.module)
+        elif isinstance(node, ast.ClassDef):
+            facts.class_names.append(node.name)
+            if strategy_class is None and any(_base_name(b) == 'IStrategy' for b in node.bases):
+                strategy_class = node
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+              and isinstance(node.func.value, ast.Name) and node.func.value.id in INDICATOR_MODULES):
+            indicators.add(node.func.attr)
+
+    facts.imports = sorted(imports)
+    facts.indicators = sorted(indicators)
+
+    if strategy_class is None:
+        facts.class_name = facts.class_names[0] if facts.class_names else None
+        return
+
+    facts.class_name = strategy_class.name
+    facts.has_istrategy_class = True
+
+    for stmt in strategy_class.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            facts.methods.append(stmt.name)
+        elif isinstance(stmt, (ast.Assign, ast.AnnAssign)):
+            targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+            names = [t.id for t in targets if isinstance(t, ast.Name)]
+            facts.class_attributes.extend(names)
+            value = stmt.value
+            if (isinstance(value, ast.Call) and _base_name(value.func) in PARAMETER_TYPES):
+                facts.parameters.extend(names)
+
+    facts.populate_methods = [m for m in facts.methods if m.startswith('populate_')]
+
+
+def _read_and_extract(file_path: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """Job per il process pool: legge il file ed estrae i fatti."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            code = f.read()
+        return file_path, asdict(extract_facts(code)), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+class StrategyValidationService:
+    """
+    Servizio di validazione con cache incrementale per hash di contenuto.
+
+    La cache è indicizzata due volte: per hash del contenuto (i fatti) e per
+    percorso (mtime/dimensione/hash), così i file non modificati non vengono
+    nemmeno riletti. L'istanza globale è condivisa tra il callback del
+    watcher e i chiamanti in primo piano: cache e statistiche sono protette
+    da un lock, l'analisi dei file avviene fuori dal lock.
+    """
+
+    def __init__(self, cache_file: Optional[str] = "user_data/strategy_validation_cache.json",
+                 max_workers: Optional[int] = None, parallel_threshold: int = 8):
+        self.cache_file = cache_file
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.parallel_threshold = parallel_threshold
+
+        self.facts_by_hash: Dict[str, StrategyFacts] = {}
+        self.file_index: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'hits': 0, 'misses': 0}
+        self._dirty = False
+        self._lock = threading.RLock()
+
+        self._load_cache()
+
+    def _load_cache(self):
+        """Carica la cache persistita, se compatibile."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != CACHE_VERSION:
+                return
+            self.facts_by_hash = {h: StrategyFacts(**f) for h, f in data.get('facts', {}).items()}
+            self.file_index = data.get('files', {})
+        except Exception as e:
+            logger.warning(f"⚠️ Cache di validazione non leggibile, verrà ricostruita: {e}")
+            self.facts_by_hash = {}
+            self.file_index = {}
+
+    def save_cache(self):
+        """Salva la cache su disco (solo se modificata)."""
+        with self._lock:
+            if not self.cache_file or not self._dirty:
+                return
+            # Mantiene solo i fatti ancora referenziati da un file indicizzato
+            live_hashes = {entry['hash'] for entry in self.file_index.values()}
+            facts = {h: asdict(f) for h, f in self.facts_by_hash.items() if h in live_hashes}
+            try:
+                cache_dir = os.path.dirname(self.cache_file)
+                if cache_dir:
+                    os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f"{self.cache_file}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({'version': CACHE_VERSION, 'facts': facts, 'files': self.file_index}, f)
+                os.replace(tmp_path, self.cache_file)
+                self._dirty = False
+            except Exception as e:
+                logger.warning(f"⚠️ Impossibile salvare la cache di validazione: {e}")
+
+    def _cached_for_path(self, file_path: str) -> Optional[StrategyFacts]:
+        """Restituisce i fatti in cache se il file non è cambiato (mtime e dimensione)."""
+        entry = self.file_index.get(os.path.abspath(file_path))
+        if not entry:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            return None
+        return self.facts_by_hash.get(entry['hash'])
+
+    def _remember(self, file_path: str, facts: StrategyFacts):
+        """Registra i fatti di un file nella cache."""
+        self.facts_by_hash[facts.content_hash] = facts
+        try:
+            stat = os.stat(file_path)
+            self.file_index[os.path.abspath(file_path)] = {
+                'hash': facts.content_hash,
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size
+            }
+        except OSError:
+            pass
+        self._dirty = True
+
+    def validate_code(self, code: str) -> StrategyFacts:
+        """Valida codice già in memoria (cache per hash di contenuto)."""
+        digest = content_hash(code)
+        with self._lock:
+            facts = self.facts_by_hash.get(digest)
+            if facts is not None:
+                self.stats['hits'] += 1
+                return facts
+            self.stats['misses'] += 1
+        facts = extract_facts(code)
+        with self._lock:
+            return self.facts_by_hash.setdefault(digest, facts)
+
+    def validate_file(self, file_path: str) -> StrategyFacts:
+        """
+        Valida un singolo file (solleva OSError/UnicodeDecodeError se illeggibile).
+
+        Args:
+            file_path: Percorso della strategia
+
+        Returns:
+            StrategyFacts del contenuto corrente del file
+        """
+        with self._lock:
+            facts = self._cached_for_path(file_path)
+            if facts is not None:
+                self.stats['hits'] += 1
+                return facts
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            code = f.read()
+        facts = self.validate_code(code)
+        with self._lock:
+            self._remember(file_path, facts)
+        return facts
+
+    def validate_files(self, file_paths: Iterable[str], save: bool = True) -> Dict[str, StrategyFacts]:
+        """
+        Valida più file in parallelo, rianalizzando solo quelli modificati.
+
+        Args:
+            file_paths: Percorsi delle strategie
+            save: Se salvare la cache su disco al termine
+
+        Returns:
+            Dizionario percorso -> StrategyFacts (i file illeggibili sono omessi)
+        """
+        results: Dict[str, StrategyFacts] = {}
+        changed: List[str] = []
+        pending: List[str] = []
+        hits = 0
+
+        with self._lock:
+            for file_path in file_paths:
+                facts = self._cached_for_path(file_path)
+                if facts is not None:
+                    hits += 1
+                    results[file_path] = facts
+                else:
+                    changed.append(file_path)
+
+        # File rinominati, copiati o toccati: il contenuto può essere già in cache
+        for file_path in changed:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    digest = content_hash(f.read())
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"⚠️ Impossibile leggere {file_path}: {e}")
+                continue
+            with self._lock:
+                facts = self.facts_by_hash.get(digest)
+                if facts is not None:
+                    hits += 1
+                    self._remember(file_path, facts)
+                    results[file_path] = facts
+                else:
+                    pending.append(file_path)
+
+        extracted = self._extract_many(pending) if pending else []
+
+        with self._lock:
+            self.stats['hits'] += hits
+            self.stats['misses'] += len(pending)
+            for file_path, facts_dict, error in extracted:
+                if error is not None:
+                    logger.warning(f"⚠️ Impossibile leggere {file_path}: {error}")
+                    continue
+                facts = StrategyFacts(**facts_dict)
+                self._remember(file_path, facts)
+                results[file_path] = facts
+        if changed:
+            logger.info(f"📊 Validazione: {len(pending)} file analizzati, {hits} dalla cache")
+
+        if save:
+            self.save_cache()
+        return results
+
+    def _extract_many(self, file_paths: List[str]) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+        """Estrae i fatti di più file, con process pool sopra la soglia."""
+        if len(file_paths) < self.parallel_threshold or self.max_workers <= 1:
+            return [_read_and_extract(p) for p in file_paths]
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                chunksize = max(1, len(file_paths) // (self.max_workers * 4))
+                return list(executor.map(_read_and_extract, file_paths, chunksize=chunksize))
+        except Exception as e:
+            # Ambiente senza multiprocessing disponibile: ripiega sul seriale
+            logger.warning(f"⚠️ Process pool non disponibile, validazione seriale: {e}")
+            return [_read_and_extract(p) for p in file_paths]
+
+
+# Istanza globale del servizio
+_service_instance: Optional[StrategyValidationService] = None
+
+
+def get_validation_service() -> StrategyValidationService:
+    """Ottiene l'istanza globale del servizio di validazione."""
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = StrategyValidationService()
+    return _service_instance
@@ -4,27 +4,187 @@ Gestore di timeout adattivo per il sistema a due stadi
 Ottimizza i timeout basandosi su modello, complessità e performance storiche
 """
 
+import math
 import time
 import json
 import os
+import threading
+from dataclasses import dataclass
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 
+# Istogramma logaritmico delle latenze: bucket i = [1s * 1.15^i, 1s * 1.15^(i+1))
+LATENCY_MIN_SECONDS = 1.0
+LATENCY_BUCKET_RATIO = 1.15
+LATENCY_BUCKETS = 72          # fino a ~6 ore
+HISTORY_DECAY = 0.95          # peso dei campioni precedenti a ogni nuova osservazione (emivita ~14 chiamate)
+MIN_HISTORY_WEIGHT = 3.0      # peso minimo per fidarsi dei quantili
+THROUGHPUT_ALPHA = 0.2        # EWMA dei token/s riportati da Ollama
+
+QUANTILE_MARGIN = 1.25        # margine sul p99
+THROUGHPUT_MARGIN = 1.5       # margine sul tempo atteso per num_predict token
+TIMEOUT_CENSOR_FACTOR = 1.5   # una chiamata scaduta sarebbe durata almeno il timeout: la si registra più lunga
+MIN_TIMEOUT = 30
+MAX_TIMEOUT = 7200
+
+# Unica tabella dei timeout iniziali (usati finché non ci sono misure), per modello o famiglia
+BASE_TIMEOUTS = {
+    "phi3": 600,            # 10 minuti
+    "phi3:mini": 600,
+    "llama2": 1200,         # 20 minuti
+    "llama3.2:3b": 1200,
+    "llama3.2:8b": 2400,    # 40 minuti
+    "mistral": 1800,        # 30 minuti
+    "mistral:7b-instruct-q4_0": 1800,
+    "cogito:3b": 900,       # 15 minuti
+    "cogito:8b": 3000,      # 50 minuti
+}
+DEFAULT_BASE_TIMEOUT = 1800
+
+
+def base_timeout(model: str) -> int:
+    """Timeout iniziale del modello: nome esatto, poi famiglia (parte prima di ':')."""
+    if model.endswith(":latest"):
+        model = model[:-len(":latest")]
+    return BASE_TIMEOUTS.get(model, BASE_TIMEOUTS.get(model.split(":")[0], DEFAULT_BASE_TIMEOUT))
+
+
+def token_bucket(prompt_tokens: Optional[int]) -> str:
+    """Fascia di token del prompt (potenze di due da 256); '*' se sconosciuta."""
+    if not prompt_tokens:
+        return "*"
+    bucket = 256
+    while bucket < prompt_tokens:
+        bucket *= 2
+    return f"<={bucket}"
+
+
+class DecayedQuantiles:
+    """
+    Quantili in streaming delle latenze di una chiave.
+
+    Istogramma a bucket logaritmici con decadimento esponenziale: ogni
+    nuova osservazione riduce il peso delle precedenti, così p95/p99
+    seguono i cambiamenti (modello più caldo, GPU condivisa) in poche chiamate.
+    """
+
+    def __init__(self, decay: float = HISTORY_DECAY):
+        self.decay = decay
+        self.weights: Dict[int, float] = {}
+        self.total_seconds = 0.0   # somma pesata, per la media
+        self.attempts = 0.0
+        self.successes = 0.0
+
+    @property
+    def weight(self) -> float:
+        return sum(self.weights.values())
+
+    @staticmethod
+    def _bucket(seconds: float) -> int:
+        if seconds <= LATENCY_MIN_SECONDS:
+            return 0
+        index = int(math.log(seconds / LATENCY_MIN_SECONDS, LATENCY_BUCKET_RATIO))
+        return min(index, LATENCY_BUCKETS - 1)
+
+    def _decay_all(self):
+        self.weights = {i: w * self.decay for i, w in self.weights.items() if w * self.decay > 1e-4}
+        self.total_seconds *= self.decay
+        self.attempts *= self.decay
+        self.successes *= self.decay
+
+    def observe(self, seconds: Optional[float], success: bool = True):
+        """Registra una chiamata; seconds None conta solo per il tasso di successo."""
+        self._decay_all()
+        self.attempts += 1
+        if success:
+            self.successes += 1
+        if seconds is not None:
+            index = self._bucket(seconds)
+            self.weights[index] = self.weights.get(index, 0.0) + 1.0
+            self.total_seconds += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.weight
+        if total <= 0:
+            return None
+        target = q * total
+        cumulative = 0.0
+        for index in sorted(self.weights):
+            w = self.weights[index]
+            if cumulative + w >= target:
+                fraction = (target - cumulative) / w
+                return LATENCY_MIN_SECONDS * LATENCY_BUCKET_RATIO ** (index + fraction)
+            cumulative += w
+        return LATENCY_MIN_SECONDS * LATENCY_BUCKET_RATIO ** (max(self.weights) + 1)
+
+    @property
+    def mean(self) -> Optional[float]:
+        total = self.weight
+        return self.total_seconds / total if total > 0 else None
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts > 0 else 1.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "weights": {str(i): round(w, 6) for i, w in self.weights.items()},
+            "total_seconds": round(self.total_seconds, 3),
+            "attempts": round(self.attempts, 6),
+            "successes": round(self.successes, 6),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DecayedQuantiles":
+        hist = cls()
+        hist.weights = {int(i): float(w) for i, w in data.get("weights", {}).items()}
+        hist.total_seconds = float(data.get("total_seconds", 0.0))
+        hist.attempts = float(data.get("attempts", 0.0))
+        hist.successes = float(data.get("successes", 0.0))
+        return hist
+
+
+@dataclass
+class ModelThroughput:
+    """Velocità di un modello dalle metriche eval di Ollama (EWMA)."""
+    eval_tps: float = 0.0        # token generati al secondo
+    prompt_tps: float = 0.0      # token di prompt valutati al secondo
+    load_seconds: float = 0.0    # caricamento del modello
+    samples: int = 0
+
+    def observe(self, payload: Dict[str, Any], alpha: float = THROUGHPUT_ALPHA):
+        eval_seconds = (payload.get("eval_duration") or 0) / 1e9
+        prompt_seconds = (payload.get("prompt_eval_duration") or 0) / 1e9
+        if not payload.get("eval_count") or eval_seconds <= 0:
+            return
+        first = self.samples == 0
+
+        def ewma(old: float, value: float) -> float:
+            return value if first or old <= 0 else (1 - alpha) * old + alpha * value
+
+        self.eval_tps = ewma(self.eval_tps, payload["eval_count"] / eval_seconds)
+        if payload.get("prompt_eval_count") and prompt_seconds > 0:
+            self.prompt_tps = ewma(self.prompt_tps, payload["prompt_eval_count"] / prompt_seconds)
+        self.load_seconds = ewma(self.load_seconds, (payload.get("load_duration") or 0) / 1e9)
+        self.samples += 1
+
+    def expected_seconds(self, prompt_tokens: int, num_predict: int) -> Optional[float]:
+        """Tempo atteso per valutare il prompt e generare num_predict token."""
+        if self.eval_tps <= 0:
+            return None
+        prompt_time = prompt_tokens / self.prompt_tps if self.prompt_tps > 0 else 0.0
+        return self.load_seconds + prompt_time + num_predict / self.eval_tps
+
+
 class TimeoutManager:
     def __init__(self, config_file: str = "timeout_config.json"):
         self.config_file = config_file
-        self.performance_history = self._load_performance_history()
-        
-        # Timeout di base per diversi modelli
-        self.base_timeouts = {
-            "phi3:mini": 1200,      # 20 minuti
-            "phi3": 1800,           # 30 minuti
-            "mistral:7b-instruct-q4_0": 2400,  # 40 minuti
-            "cogito:8b": 3000,      # 50 minuti
-            "cogito:3b": 900,       # 15 minuti
-            "llama3.2:3b": 1200,    # 20 minuti
-            "llama3.2:8b": 2400,    # 40 minuti
-        }
+        self._lock = threading.RLock()
+        self.latency: Dict[str, DecayedQuantiles] = {}
+        self.throughput: Dict[str, ModelThroughput] = {}
+        
+        # Timeout di base per diversi modelli (solo finché non ci sono misure)
+        self.base_timeouts = dict(BASE_TIMEOUTS)
         
         # Moltiplicatori per complessità
         self.complexity_multipliers = {
@@ -36,49 +196,76 @@ class TimeoutManager:
         # Moltiplicatori per fase
         self.phase_multipliers = {
             "text_generation": 0.8,    # Descrizione testuale più veloce
-            "code_conversion": 1.2     # Conversione codice più lenta
+            "code_conversion": 1.2,    # Conversione codice più lenta
+            "cooperative": 1.5         # Strategie complete nei round cooperativi
         }
+        
+        self._load_performance_history()
+    
+    @staticmethod
+    def _key(model: str, phase: str, strategy_type: str = "*", prompt_tokens: Optional[int] = None) -> str:
+        return f"{model}|{phase}|{strategy_type}|{token_bucket(prompt_tokens)}"
+    
+    def _lookup_keys(self, model: str, phase: str, strategy_type: str, prompt_tokens: Optional[int]) -> List[str]:
+        """Dalla chiave più specifica all'aggregato per (modello, fase)."""
+        keys = [self._key(model, phase, strategy_type, prompt_tokens), self._key(model, phase)]
+        return list(dict.fromkeys(keys))
     
     def get_optimal_timeout(self, 
                           model: str, 
                           phase: str = "text_generation",
                           complexity: str = "normal",
-                          strategy_type: str = "volatility") -> int:
+                          strategy_type: str = "volatility",
+                          prompt_tokens: Optional[int] = None,
+                          num_predict: Optional[int] = None) -> int:
         """
         Calcola il timeout ottimale basato su modello, fase e complessità.
         
+        Con storia sufficiente usa il p95/p99 delle latenze recenti per
+        (modello, fase, tipo strategia, fascia di token del prompt); con le
+        metriche eval del modello anche il tempo atteso per num_predict token.
+        Senza misure ricade sui timeout di base.
+        
         Args:
             model: Nome del modello LLM
             phase: Fase del processo (text_generation, code_conversion)
             complexity: Livello di complessità (simple, normal, complex)
             strategy_type: Tipo di strategia
+            prompt_tokens: Token del prompt (per la fascia e il tempo di valutazione)
+            num_predict: Token di risposta richiesti
             
         Returns:
             Timeout in secondi
         """
+        with self._lock:
+            estimates = []
+            history = next((self.latency[k] for k in self._lookup_keys(model, phase, strategy_type, prompt_tokens)
+                            if k in self.latency and self.latency[k].weight >= MIN_HISTORY_WEIGHT), None)
+            if history is not None:
+                estimates.append(max(history.quantile(0.99) * QUANTILE_MARGIN, history.quantile(0.95) * 1.5))
+            
+            throughput = self.throughput.get(model)
+            expected = throughput.expected_seconds(prompt_tokens or 0, num_predict) if throughput and num_predict else None
+            if expected is not None:
+                estimates.append(expected * THROUGHPUT_MARGIN)
+        
+        if estimates:
+            adjusted_timeout = max(estimates)
+            # Se molte chiamate recenti falliscono, allarga
+            if history is not None and history.success_rate < 0.7:
+                adjusted_timeout *= 1.3
+            source = "storia" if history is not None else "token/s"
+        else:
+            # Nessuna misura: timeout di base con moltiplicatori
+            base = self.base_timeouts.get(model) or base_timeout(model)
+            complexity_mult = self.complexity_multipliers.get(complexity, 1.0)
+            phase_mult = self.phase_multipliers.get(phase, 1.0)
+            adjusted_timeout = base * complexity_mult * phase_mult
+            source = "base"
         
-        # Timeout di base per il modello
-        base_timeout = self.base_timeouts.get(model, 1800)
-        
-        # Applica moltiplicatori
-        complexity_mult = self.complexity_multipliers.get(complexity, 1.0)
-        phase_mult = self.phase_multipliers.get(phase, 1.0)
-        
-        # Calcola timeout base
-        calculated_timeout = int(base_timeout * complexity_mult * phase_mult)
-        
-        # Aggiusta basandosi sulla performance storica
-        adjusted_timeout = self._adjust_based_on_history(
-            model, phase, strategy_type, calculated_timeout
-        )
-        
-        # Limiti di sicurezza
-        min_timeout = 600   # 10 minuti minimo
-        max_timeout = 7200  # 2 ore massimo
-        
-        final_timeout = max(min_timeout, min(max_timeout, adjusted_timeout))
+        final_timeout = int(max(MIN_TIMEOUT, min(MAX_TIMEOUT, math.ceil(adjusted_timeout))))
         
-        print(f"⏱️ Timeout calcolato per {model} ({phase}): {final_timeout}s")
+        print(f"⏱️ Timeout calcolato per {model} ({phase}, {source}): {final_timeout}s")
         return final_timeout
     
     def record_performance(self, 
@@ -87,7 +274,8 @@ class TimeoutManager:
                          strategy_type: str,
                          actual_time: float,
                          success: bool,
-                         timeout_used: int):
+                         timeout_used: int,
+                         prompt_tokens: Optional[int] = None):
         """
         Registra la performance per migliorare i timeout futuri.
         
@@ -98,99 +286,56 @@ class TimeoutManager:
             actual_time: Tempo effettivo impiegato
             success: Se l'operazione è riuscita
             timeout_used: Timeout utilizzato
+            prompt_tokens: Token del prompt inviato
         """
+        timed_out = not success and actual_time >= timeout_used * 0.95
+        if success:
+            sample = actual_time
+        elif timed_out:
+            # Durata vera sconosciuta ma almeno pari al timeout
+            sample = max(actual_time, timeout_used) * TIMEOUT_CENSOR_FACTOR
+        else:
+            sample = None  # errore rapido: conta solo per il tasso di successo
         
-        key = f"{model}_{phase}_{strategy_type}"
-        
-        if key not in self.performance_history:
-            self.performance_history[key] = {
-                'times': [],
-                'successes': [],
-                'timeouts': [],
-                'last_updated': datetime.now().isoformat()
-            }
-        
-        # Aggiungi dati
-        self.performance_history[key]['times'].append(actual_time)
-        self.performance_history[key]['successes'].append(success)
-        self.performance_history[key]['timeouts'].append(timeout_used)
-        self.performance_history[key]['last_updated'] = datetime.now().isoformat()
-        
-        # Mantieni solo gli ultimi 20 record
-        if len(self.performance_history[key]['times']) > 20:
-            self.performance_history[key]['times'] = self.performance_history[key]['times'][-20:]
-            self.performance_history[key]['successes'] = self.performance_history[key]['successes'][-20:]
-            self.performance_history[key]['timeouts'] = self.performance_history[key]['timeouts'][-20:]
-        
-        # Salva
-        self._save_performance_history()
+        with self._lock:
+            for key in self._lookup_keys(model, phase, strategy_type, prompt_tokens):
+                self.latency.setdefault(key, DecayedQuantiles()).observe(sample, success)
+            self._save_performance_history()
         
         print(f"📊 Performance registrata: {model} ({phase}) - {actual_time:.1f}s - Successo: {success}")
     
-    def _adjust_based_on_history(self, 
-                                model: str, 
-                                phase: str, 
-                                strategy_type: str, 
-                                base_timeout: int) -> int:
-        """Aggiusta il timeout basandosi sulla performance storica."""
-        
-        key = f"{model}_{phase}_{strategy_type}"
-        
-        if key not in self.performance_history:
-            return base_timeout
-        
-        history = self.performance_history[key]
-        
-        if not history['times']:
-            return base_timeout
-        
-        # Calcola statistiche
-        avg_time = sum(history['times']) / len(history['times'])
-        success_rate = sum(history['successes']) / len(history['successes'])
-        
-        # Se il success rate è basso, aumenta il timeout
-        if success_rate < 0.7:
-            adjustment = 1.3  # +30%
-        elif success_rate > 0.9:
-            adjustment = 0.9  # -10%
-        else:
-            adjustment = 1.0
-        
-        # Se il tempo medio è molto più alto del timeout, aumenta
-        if avg_time > base_timeout * 0.8:
-            adjustment *= 1.2
-        
-        adjusted_timeout = int(base_timeout * adjustment)
-        
-        print(f"📈 Aggiustamento basato su storia: {base_timeout}s → {adjusted_timeout}s")
-        return adjusted_timeout
+    def record_eval_metrics(self, model: str, payload: Dict[str, Any]):
+        """Aggiorna i token/s del modello con le metriche di una risposta /api/generate."""
+        with self._lock:
+            self.throughput.setdefault(model, ModelThroughput()).observe(payload)
     
     def get_model_recommendations(self) -> Dict[str, Any]:
         """Restituisce raccomandazioni sui modelli basate sulla performance."""
         
         recommendations = {}
         
-        for key, history in self.performance_history.items():
-            if not history['times']:
-                continue
-            
-            model, phase, strategy_type = key.split('_', 2)
-            
-            avg_time = sum(history['times']) / len(history['times'])
-            success_rate = sum(history['successes']) / len(history['successes'])
-            
-            if model not in recommendations:
-                recommendations[model] = {
-                    'phases': {},
-                    'overall_success_rate': 0,
-                    'overall_avg_time': 0
+        with self._lock:
+            for key, history in self.latency.items():
+                model, phase, strategy_type, bucket = key.split('|')
+                if strategy_type != "*" or history.mean is None:
+                    continue
+                
+                if model not in recommendations:
+                    recommendations[model] = {
+                        'phases': {},
+                        'overall_success_rate': 0,
+                        'overall_avg_time': 0
+                    }
+                
+                recommendations[model]['phases'][phase] = {
+                    'avg_time': history.mean,
+                    'p95_time': history.quantile(0.95),
+                    'success_rate': history.success_rate,
+                    'recommended_timeout': int(history.quantile(0.99) * QUANTILE_MARGIN)
                 }
-            
-            recommendations[model]['phases'][phase] = {
-                'avg_time': avg_time,
-                'success_rate': success_rate,
-                'recommended_timeout': int(avg_time * 1.2)  # 20% di margine
-            }
+                throughput = self.throughput.get(model)
+                if throughput and throughput.eval_tps:
+                    recommendations[model]['tokens_per_second'] = throughput.eval_tps
         
         # Calcola statistiche generali per modello
         for model, data in recommendations.items():
@@ -201,29 +346,55 @@ class TimeoutManager:
         
         return recommendations
     
-    def _load_performance_history(self) -> Dict[str, Any]:
-        """Carica la storia delle performance da file."""
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"⚠️ Errore nel caricamento performance history: {e}")
-        
-        return {}
+    def _load_performance_history(self):
+        """Carica la storia delle performance da file (anche nel vecchio formato a liste)."""
+        if not os.path.exists(self.config_file):
+            return
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Errore nel caricamento performance history: {e}")
+            return
+        
+        if data.get('version') == 2:
+            self.latency = {k: DecayedQuantiles.from_dict(v) for k, v in data.get('latency', {}).items()}
+            self.throughput = {m: ModelThroughput(**v) for m, v in data.get('throughput', {}).items()}
+            return
+        
+        # Vecchio formato: '<modello>_<fase>_<tipo>' con le ultime 20 durate
+        for key, history in data.items():
+            phase = next((p for p in self.phase_multipliers if f"_{p}_" in key), None)
+            if phase is None or not isinstance(history, dict):
+                continue
+            model, strategy_type = key.split(f"_{phase}_", 1)
+            for actual_time, success in zip(history.get('times', []), history.get('successes', [])):
+                for new_key in self._lookup_keys(model, phase, strategy_type, None):
+                    self.latency.setdefault(new_key, DecayedQuantiles()).observe(
+                        actual_time if success else None, success)
     
     def _save_performance_history(self):
-        """Salva la storia delle performance su file."""
+        """Salva la storia delle performance su file (scrittura atomica)."""
+        data = {
+            'version': 2,
+            'last_updated': datetime.now().isoformat(),
+            'latency': {k: h.to_dict() for k, h in self.latency.items()},
+            'throughput': {m: vars(t) for m, t in self.throughput.items()}
+        }
+        tmp_path = f"{self.config_file}.tmp"
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.performance_history, f, indent=2, ensure_ascii=False)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.config_file)
         except Exception as e:
             print(f"⚠️ Errore nel salvataggio performance history: {e}")
     
     def reset_performance_history(self):
         """Resetta la storia delle performance."""
-        self.performance_history = {}
-        self._save_performance_history()
+        with self._lock:
+            self.latency = {}
+            self.throughput = {}
+            self._save_performance_history()
         print("🔄 Performance history resettata")
 
 # Istanza globale
@@ -232,15 +403,22 @@ timeout_manager = TimeoutManager()
 def get_optimal_timeout(model: str, 
                        phase: str = "text_generation",
                        complexity: str = "normal",
-                       strategy_type: str = "volatility") -> int:
+                       strategy_type: str = "volatility",
+                       prompt_tokens: Optional[int] = None,
+                       num_predict: Optional[int] = None) -> int:
     """Funzione helper per ottenere timeout ottimale."""
-    return timeout_manager.get_optimal_timeout(model, phase, complexity, strategy_type)
+    return timeout_manager.get_optimal_timeout(model, phase, complexity, strategy_type, prompt_tokens, num_predict)
 
 def record_performance(model: str, 
                       phase: str,
                       strategy_type: str,
                       actual_time: float,
                       success: bool,
-                      timeout_used: int):
+                      timeout_used: int,
+                      prompt_tokens: Optional[int] = None):
     """Funzione helper per registrare performance."""
-    timeout_manager.record_performance(model, phase, strategy_type, actual_time, success, timeout_used) 
\ No newline at end of file
+    timeout_manager.record_performance(model, phase, strategy_type, actual_time, success, timeout_used, prompt_tokens)
+
+def record_eval_metrics(model: str, payload: Dict[str, Any]):
+    """Funzione helper per aggiornare i token/s di un modello."""
+    timeout_manager.record_eval_metrics(model, payload) 
\ No newline at end of file
@@ -11,13 +11,21 @@ from typing import Dict, List, Any, Optional
 from .strategy_text_generator import StrategyTextGenerator
 from .freqtrade_code_converter import FreqTradeCodeConverter
 from .strategy_postprocess import postprocess_strategy
+from pipeline_tracing import span
+from deadlines import StagePlan, deadline_scope
+
+# Tempo massimo per generare una strategia, ripartito tra le fasi
+GENERATION_DEADLINE_SECONDS = 1200
+STAGE_WEIGHTS = {"stage1_text": 1.0, "stage2_code": 2.0}
 
 class TwoStageGenerator:
     def __init__(self, 
                  text_model: str = "phi3:mini",
-                 code_model: str = "mistral:7b-instruct-q4_0"):
+                 code_model: str = "mistral:7b-instruct-q4_0",
+                 deadline_seconds: Optional[float] = GENERATION_DEADLINE_SECONDS):
         self.text_generator = StrategyTextGenerator(default_model=text_model)
         self.code_converter = FreqTradeCodeConverter(default_model=code_model)
+        self.deadline_seconds = deadline_seconds
         
     def generate_strategy(self, 
                          strategy_type: str = "volatility",
@@ -28,6 +36,11 @@ class TwoStageGenerator:
         """
         Genera una strategia usando l'approccio a due stadi.
         
+        L'intera generazione ha una scadenza (deadline_seconds, o quella
+        del chiamante se più stretta): la fase 1 riceve un terzo del tempo
+        rimasto, la fase 2 tutto quello che resta. Una fase che sfora ricade
+        sul proprio fallback senza bloccare la successiva.
+        
         Args:
             strategy_type: Tipo di strategia
             complexity: Livello di complessità
@@ -44,25 +57,30 @@ class TwoStageGenerator:
         
         print(f"🔄 Generazione strategia {strategy_type} con approccio a due stadi...")
         
-        # Fase 1: Genera descrizione testuale
-        print("📝 Fase 1: Generazione descrizione testuale...")
-        description = self.text_generator.generate_strategy_description(
-            strategy_type=strategy_type,
-            complexity=complexity,
-            style=style,
-            randomization=randomization
-        )
-        
-        # Fase 2: Converti in codice FreqTrade
-        print("🔧 Fase 2: Conversione in codice FreqTrade...")
-        code = self.code_converter.convert_description_to_code(
-            description=description,
-            strategy_name=strategy_name,
-            strategy_type=strategy_type
-        )
-        
-        # Salva la strategia
-        file_path = self._save_strategy(strategy_name, code, description)
+        plan = StagePlan(STAGE_WEIGHTS)
+        with span("generation", strategy=strategy_name, strategy_type=strategy_type, complexity=complexity), \
+                deadline_scope(self.deadline_seconds, "generation"):
+            # Fase 1: Genera descrizione testuale
+            print("📝 Fase 1: Generazione descrizione testuale...")
+            with span("generation.stage1_text", model=self.text_generator.default_model), plan.stage("stage1_text"):
+                description = self.text_generator.generate_strategy_description(
+                    strategy_type=strategy_type,
+                    complexity=complexity,
+                    style=style,
+                    randomization=randomization
+                )
+            
+            # Fase 2: Converti in codice FreqTrade
+            print("🔧 Fase 2: Conversione in codice FreqTrade...")
+            with span("generation.stage2_code", model=self.code_converter.default_model), plan.stage("stage2_code"):
+                code = self.code_converter.convert_description_to_code(
+                    description=description,
+                    strategy_name=strategy_name,
+                    strategy_type=strategy_type
+                )
+            
+            # Salva la strategia
+            file_path = self._save_strategy(strategy_name, code, description)
         
         return {
             'strategy_name': strategy_name,
@@ -4,10 +4,10 @@ Analizza i problemi delle strategie non valide
 """
 
 import os
-import re
-import ast
 from typing import Dict, List, Tuple
 
+from agents.strategy_validation_service import get_validation_service
+
 def analyze_strategy_problems(file_path: str) -> Dict[str, any]:
     """Analizza i problemi di una singola strategia."""
     filename = os.path.basename(file_path)
@@ -18,10 +18,12 @@ def analyze_strategy_problems(file_path: str) -> Dict[str, any]:
             content = f.read()
             lines = content.split('\n')
         
+        # Fatti estratti una sola volta per contenuto (cache condivisa)
+        facts = get_validation_service().validate_code(content)
+        
         # Problema 1: Nome classe con caratteri non validi
-        class_match = re.search(r'class\s+(\w+)\(IStrategy\):', content)
-        if class_match:
-            class_name = class_match.group(1)
+        class_name = facts.class_name if (facts.has_istrategy_class or not facts.syntax_valid) else None
+        if class_name:
             if not class_name.replace('_', '').isalnum():
                 problems.append(f"Nome classe con caratteri non validi: {class_name}")
         
@@ -52,12 +54,8 @@ def analyze_strategy_problems(file_path: str) -> Dict[str, any]:
                     problems.append(f"Indentazione mancante alla riga {i}: '{stripped}'")
         
         # Problema 3: Sintassi Python
-        try:
-            ast.parse(content)
-        except SyntaxError as e:
-            problems.append(f"Errore di sintassi alla riga {e.lineno}: {e.msg}")
-        except Exception as e:
-            problems.append(f"Errore generico: {str(e)}")
+        if not facts.syntax_valid:
+            problems.append(facts.syntax_error)
         
         return {
             'filename': filename,
@@ -90,6 +88,9 @@ def main():
     
     print(f"📊 Strategie non valide trovate: {len(broken_files)}")
     
+    # Parsing parallelo e incrementale prima dell'analisi riga per riga
+    get_validation_service().validate_files(broken_files)
+    
     # Analizza ogni strategia
     all_problems = []
     problem_types = {}
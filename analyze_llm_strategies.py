@@ -5,36 +5,32 @@ Identifica punti deboli e aree di miglioramento
 """
 
 import os
-import re
 import json
-import ast
-from typing import Dict, List, Any, Tuple
-from datetime import datetime
-from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from agents.strategy_analytics import StrategyAnalyticsEngine
 
 class LLMStrategyAnalyzer:
-    def __init__(self):
-        self.strategies_dir = "user_data/strategies"
+    def __init__(self, strategies_dir: str = "user_data/strategies",
+                 cache_file: Optional[str] = "user_data/strategy_analysis_cache.json"):
+        self.strategies_dir = strategies_dir
+        self.engine = StrategyAnalyticsEngine(strategies_dir, cache_file=cache_file)
         self.analysis_results = {}
+        self.changed = False
         
     def analyze_all_strategies(self) -> Dict[str, Any]:
         """Analizza tutte le strategie generate dagli LLM."""
         print("🔍 Analisi delle strategie generate dagli LLM...")
         
-        # Trova tutte le strategie
-        strategy_files = self._find_strategy_files()
-        print(f"📁 Trovate {len(strategy_files)} strategie")
-        
-        # Analizza ogni strategia
-        for file_path in strategy_files:
-            try:
-                analysis = self._analyze_single_strategy(file_path)
-                self.analysis_results[file_path] = analysis
-            except Exception as e:
-                print(f"❌ Errore nell'analisi di {file_path}: {e}")
+        # Solo i file nuovi o modificati vengono letti e analizzati (in parallelo);
+        # gli aggregati sono aggiornati con il contributo dei file cambiati
+        self.changed = self.engine.refresh()
+        self.analysis_results = self.engine.individual_strategies()
+        stats = self.engine.stats
+        print(f"📁 Trovate {len(self.analysis_results)} strategie "
+              f"({stats['analyzed']} analizzate, {stats['unchanged'] + stats['reused']} dalla cache)")
         
-        # Analisi aggregata
-        aggregate_analysis = self._create_aggregate_analysis()
+        aggregate_analysis = self.engine.aggregate.to_report()
         
         return {
             'individual_strategies': self.analysis_results,
@@ -42,242 +38,6 @@ class LLMStrategyAnalyzer:
             'recommendations': self._generate_recommendations(aggregate_analysis)
         }
     
-    def _find_strategy_files(self) -> List[str]:
-        """Trova tutti i file di strategia generati dagli LLM."""
-        strategy_files = []
-        
-        if not os.path.exists(self.strategies_dir):
-            return strategy_files
-        
-        for file in os.listdir(self.strategies_dir):
-            if file.endswith('.py') and not file.startswith('__'):
-                # Filtra strategie generate da LLM (contengono timestamp o nomi di modelli)
-                if any(pattern in file.lower() for pattern in [
-                    'llm', 'cogito', 'mistral', 'phi', 'cooperative', 'contest'
-                ]) or re.search(r'\d{8}_\d{6}', file):
-                    strategy_files.append(os.path.join(self.strategies_dir, file))
-        
-        return strategy_files
-    
-    def _analyze_single_strategy(self, file_path: str) -> Dict[str, Any]:
-        """Analizza una singola strategia."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        filename = os.path.basename(file_path)
-        
-        analysis = {
-            'filename': filename,
-            'file_size': len(content),
-            'lines_of_code': len(content.split('\n')),
-            'syntax_valid': False,
-            'class_name': None,
-            'indicators_used': [],
-            'entry_conditions': [],
-            'exit_conditions': [],
-            'risk_management': {},
-            'optimization_params': [],
-            'code_quality': {},
-            'potential_issues': [],
-            'strengths': [],
-            'model_used': self._extract_model_name(filename),
-            'strategy_type': self._extract_strategy_type(filename),
-            'generation_date': self._extract_generation_date(filename)
-        }
-        
-        # Analisi sintassi
-        try:
-            ast.parse(content)
-            analysis['syntax_valid'] = True
-        except SyntaxError as e:
-            analysis['potential_issues'].append(f"Errore di sintassi: {e}")
-        
-        # Analisi del contenuto
-        if analysis['syntax_valid']:
-            self._analyze_strategy_content(content, analysis)
-        
-        return analysis
-    
-    def _analyze_strategy_content(self, content: str, analysis: Dict[str, Any]):
-        """Analizza il contenuto della strategia."""
-        # Estrai nome classe
-        class_match = re.search(r'class\s+(\w+)', content)
-        if class_match:
-            analysis['class_name'] = class_match.group(1)
-        
-        # Analizza indicatori
-        indicators = re.findall(r'ta\.(\w+)\(', content)
-        analysis['indicators_used'] = list(set(indicators))
-        
-        # Analizza condizioni di entrata
-        entry_patterns = [
-            r"dataframe\.loc\[(.*?), 'enter_long'\] = 1",
-            r"dataframe\['enter_long'\] = (.*?)",
-        ]
-        for pattern in entry_patterns:
-            matches = re.findall(pattern, content, re.DOTALL)
-            analysis['entry_conditions'].extend(matches)
-        
-        # Analizza condizioni di uscita
-        exit_patterns = [
-            r"dataframe\.loc\[(.*?), 'exit_long'\] = 1",
-            r"dataframe\['exit_long'\] = (.*?)",
-        ]
-        for pattern in exit_patterns:
-            matches = re.findall(pattern, content, re.DOTALL)
-            analysis['exit_conditions'].extend(matches)
-        
-        # Analizza gestione del rischio
-        if 'stoploss' in content:
-            analysis['risk_management']['stoploss'] = True
-        if 'trailing_stop' in content:
-            analysis['risk_management']['trailing_stop'] = True
-        if 'minimal_roi' in content:
-            analysis['risk_management']['roi'] = True
-        
-        # Analizza parametri di ottimizzazione
-        opt_params = re.findall(r'(\w+)\s*=\s*IntParameter|DecimalParameter', content)
-        analysis['optimization_params'] = opt_params
-        
-        # Analizza qualità del codice
-        analysis['code_quality'] = self._analyze_code_quality(content)
-        
-        # Identifica punti di forza e debolezza
-        self._identify_strengths_weaknesses(content, analysis)
-    
-    def _analyze_code_quality(self, content: str) -> Dict[str, Any]:
-        """Analizza la qualità del codice."""
-        quality = {
-            'has_docstrings': bool(re.search(r'""".*?"""', content, re.DOTALL)),
-            'has_comments': len(re.findall(r'#.*', content)) > 0,
-            'has_logging': 'logger' in content,
-            'has_type_hints': bool(re.search(r':\s*(DataFrame|dict|str|int|float)', content)),
-            'has_error_handling': bool(re.search(r'try:|except:', content)),
-            'code_complexity': self._calculate_complexity(content)
-        }
-        return quality
-    
-    def _calculate_complexity(self, content: str) -> int:
-        """Calcola la complessità del codice."""
-        complexity = 0
-        complexity += len(re.findall(r'if\s+', content))
-        complexity += len(re.findall(r'for\s+', content))
-        complexity += len(re.findall(r'while\s+', content))
-        complexity += len(re.findall(r'and\s+', content))
-        complexity += len(re.findall(r'or\s+', content))
-        return complexity
-    
-    def _identify_strengths_weaknesses(self, content: str, analysis: Dict[str, Any]):
-        """Identifica punti di forza e debolezza."""
-        # Punti di forza
-        if len(analysis['indicators_used']) > 2:
-            analysis['strengths'].append("Usa multipli indicatori")
-        if analysis['risk_management'].get('trailing_stop'):
-            analysis['strengths'].append("Ha trailing stop")
-        if analysis['optimization_params']:
-            analysis['strengths'].append("Parametri ottimizzabili")
-        if analysis['code_quality']['has_docstrings']:
-            analysis['strengths'].append("Documentazione presente")
-        
-        # Punti deboli
-        if len(analysis['indicators_used']) < 2:
-            analysis['potential_issues'].append("Troppo pochi indicatori")
-        if not analysis['risk_management'].get('stoploss'):
-            analysis['potential_issues'].append("Manca stoploss")
-        if not analysis['entry_conditions']:
-            analysis['potential_issues'].append("Condizioni di entrata mancanti")
-        if not analysis['exit_conditions']:
-            analysis['potential_issues'].append("Condizioni di uscita mancanti")
-        if analysis['code_quality']['code_complexity'] < 3:
-            analysis['potential_issues'].append("Strategia troppo semplice")
-        if analysis['code_quality']['code_complexity'] > 20:
-            analysis['potential_issues'].append("Strategia troppo complessa")
-    
-    def _extract_model_name(self, filename: str) -> str:
-        """Estrae il nome del modello dal filename."""
-        models = ['cogito', 'mistral', 'phi', 'llama', 'cooperative']
-        for model in models:
-            if model in filename.lower():
-                return model
-        return "unknown"
-    
-    def _extract_strategy_type(self, filename: str) -> str:
-        """Estrae il tipo di strategia dal filename."""
-        types = ['scalping', 'volatility', 'momentum', 'breakout', 'adaptive']
-        for strategy_type in types:
-            if strategy_type in filename.lower():
-                return strategy_type
-        return "unknown"
-    
-    def _extract_generation_date(self, filename: str) -> str:
-        """Estrae la data di generazione dal filename."""
-        date_match = re.search(r'(\d{8}_\d{6})', filename)
-        if date_match:
-            return date_match.group(1)
-        return "unknown"
-    
-    def _create_aggregate_analysis(self) -> Dict[str, Any]:
-        """Crea un'analisi aggregata di tutte le strategie."""
-        if not self.analysis_results:
-            return {}
-        
-        aggregate = {
-            'total_strategies': len(self.analysis_results),
-            'syntax_valid_count': sum(1 for a in self.analysis_results.values() if a['syntax_valid']),
-            'models_used': {},
-            'strategy_types': {},
-            'common_indicators': {},
-            'common_issues': {},
-            'quality_metrics': {
-                'avg_complexity': 0,
-                'has_docstrings': 0,
-                'has_optimization': 0,
-                'has_risk_management': 0
-            }
-        }
-        
-        # Analizza modelli e tipi
-        for analysis in self.analysis_results.values():
-            model = analysis['model_used']
-            strategy_type = analysis['strategy_type']
-            
-            aggregate['models_used'][model] = aggregate['models_used'].get(model, 0) + 1
-            aggregate['strategy_types'][strategy_type] = aggregate['strategy_types'].get(strategy_type, 0) + 1
-        
-        # Analizza indicatori comuni
-        all_indicators = []
-        for analysis in self.analysis_results.values():
-            all_indicators.extend(analysis['indicators_used'])
-        
-        for indicator in all_indicators:
-            aggregate['common_indicators'][indicator] = aggregate['common_indicators'].get(indicator, 0) + 1
-        
-        # Analizza problemi comuni
-        all_issues = []
-        for analysis in self.analysis_results.values():
-            all_issues.extend(analysis['potential_issues'])
-        
-        for issue in all_issues:
-            aggregate['common_issues'][issue] = aggregate['common_issues'].get(issue, 0) + 1
-        
-        # Calcola metriche di qualità
-        total_complexity = sum(a.get('code_quality', {}).get('code_complexity', 0) for a in self.analysis_results.values())
-        aggregate['quality_metrics']['avg_complexity'] = total_complexity / len(self.analysis_results) if self.analysis_results else 0
-        
-        aggregate['quality_metrics']['has_docstrings'] = sum(
-            1 for a in self.analysis_results.values() if a.get('code_quality', {}).get('has_docstrings', False)
-        )
-        
-        aggregate['quality_metrics']['has_optimization'] = sum(
-            1 for a in self.analysis_results.values() if a.get('optimization_params', [])
-        )
-        
-        aggregate['quality_metrics']['has_risk_management'] = sum(
-            1 for a in self.analysis_results.values() if a.get('risk_management', {})
-        )
-        
-        return aggregate
-    
     def _generate_recommendations(self, aggregate_analysis: Dict[str, Any]) -> List[str]:
         """Genera raccomandazioni basate sull'analisi."""
         recommendations = []
@@ -372,11 +132,17 @@ def main():
     analysis = analyzer.analyze_all_strategies()
     analyzer.print_analysis_report(analysis)
     
-    # Salva l'analisi in JSON
-    with open('llm_strategies_analysis.json', 'w') as f:
+    # Salva l'analisi in JSON solo se qualche strategia è cambiata
+    output_file = 'llm_strategies_analysis.json'
+    if not analyzer.changed and os.path.exists(output_file):
+        print(f"\n💾 Nessuna strategia cambiata, {output_file} già aggiornato")
+        return
+    tmp_path = f"{output_file}.tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(analysis, f, indent=2, default=str)
+    os.replace(tmp_path, output_file)
     
-    print(f"\n💾 Analisi salvata in: llm_strategies_analysis.json")
+    print(f"\n💾 Analisi salvata in: {output_file}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -8,57 +8,64 @@ import os
 import time
 import json
 import logging
-import schedule
 import signal
 import sys
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
+from functools import cached_property
+import importlib.util
 import threading
 import queue
 import re
 
-from agents.generator import GeneratorAgent
-from agents.strategy_converter import StrategyConverter
-from agents.optimizer import OptimizerAgent
-from freqtrade_utils import FreqtradeManager
+import pipeline_metrics
+import pipeline_tracing
 
-# Importa il Dry Run Manager
-try:
-    from dry_run_manager import DryRunManager, DryRunConfig
-    DRY_RUN_MANAGER_AVAILABLE = True
-except ImportError:
-    DRY_RUN_MANAGER_AVAILABLE = False
-    print("⚠️ DryRunManager non disponibile, dry run automatico disabilitato")
+# I componenti pesanti (agenti LLM, Freqtrade, monitor con Flask/psutil, schedule)
+# vengono importati solo al primo utilizzo: in questo modo `--status` e i comandi
+# di gestione partono in pochi millisecondi senza costruire l'intera pipeline.
 
-# Importa il monitor dei backtest
-try:
-    from backtest_monitor import BacktestMonitor
-    BACKTEST_MONITOR_AVAILABLE = True
-except ImportError:
-    BACKTEST_MONITOR_AVAILABLE = False
-    print("⚠️ BacktestMonitor non disponibile, monitoraggio backtest disabilitato")
 
-# Importa l'esportatore di strategie live
-try:
-    from live_strategies_exporter import LiveStrategiesExporter, LiveStrategyConfig
-    LIVE_EXPORTER_AVAILABLE = True
-except ImportError:
-    LIVE_EXPORTER_AVAILABLE = False
-    print("⚠️ LiveStrategiesExporter non disponibile, esportazione live disabilitata")
+def _module_available(module_name: str) -> bool:
+    """Verifica se un modulo è installato senza importarlo."""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
 
-# Configurazione logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('background_agent.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Disponibilità dei componenti opzionali (l'import effettivo è differito).
+# Gli avvisi passano dal logger (stderr): l'output di `--status` resta JSON puro.
+DRY_RUN_MANAGER_AVAILABLE = _module_available("dry_run_manager")
+if not DRY_RUN_MANAGER_AVAILABLE:
+    logger.warning("⚠️ DryRunManager non disponibile, dry run automatico disabilitato")
+
+BACKTEST_MONITOR_AVAILABLE = _module_available("backtest_monitor")
+if not BACKTEST_MONITOR_AVAILABLE:
+    logger.warning("⚠️ BacktestMonitor non disponibile, monitoraggio backtest disabilitato")
+
+LIVE_EXPORTER_AVAILABLE = _module_available("live_strategies_exporter")
+if not LIVE_EXPORTER_AVAILABLE:
+    logger.warning("⚠️ LiveStrategiesExporter non disponibile, esportazione live disabilitata")
+
+METADATA_FILE = "strategies_metadata.json"
+
+
+def configure_logging():
+    """Configura il logging dell'agente (file + console)."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('background_agent.log'),
+            logging.StreamHandler()
+        ]
+    )
+
 # Variabile globale per l'agente
 _agent_instance = None
 
@@ -73,9 +80,10 @@ def signal_handler(signum, frame):
     logger.info("✅ Arresto completato")
     sys.exit(0)
 
-# Registra i gestori di segnale
-signal.signal(signal.SIGINT, signal_handler)   # Ctrl+C
-signal.signal(signal.SIGTERM, signal_handler)  # kill
+def install_signal_handlers():
+    """Registra i gestori di segnale (solo quando l'agente viene avviato)."""
+    signal.signal(signal.SIGINT, signal_handler)   # Ctrl+C
+    signal.signal(signal.SIGTERM, signal_handler)  # kill
 
 @dataclass
 class StrategyMetadata:
@@ -97,12 +105,6 @@ class BackgroundAgent:
     
     def __init__(self, config_path: str = "background_config.json"):
         self.config = self._load_config(config_path)
-        self.generator = GeneratorAgent()
-        self.converter = StrategyConverter()
-        # Usa il modello configurato per l'ottimizzazione
-        optimization_model = self.config.get('model_selection', {}).get('optimization', 'cogito:8b')
-        self.optimizer = OptimizerAgent(default_model=optimization_model)
-        self.freqtrade = FreqtradeManager()
         
         # Stato dell'agente
         self.is_running = False
@@ -126,44 +128,163 @@ class BackgroundAgent:
         self.dry_run_max_trades = dry_run_config.get('max_open_trades', 3)
         self.dry_run_pairs = dry_run_config.get('pairs', ["BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT"])
         self.dry_run_risk_limits = dry_run_config.get('risk_limits', {})
+        # "shared": tutte le strategie nello stesso processo (DryRunHost)
+        self.dry_run_mode = dry_run_config.get('mode', 'freqtrade')
+        
+        # Endpoint /metrics (Prometheus) dell'intera pipeline
+        self.metrics_config = self.config.get('metrics', {})
+        self.metrics_server = None
+        
+        # Span per strategia: generazione → validazione → backtest → hyperopt → export
+        tracing_config = self.config.get('tracing', {})
+        if tracing_config.get('enabled', False):
+            pipeline_tracing.configure_tracing(tracing_config.get('path'))
         
         self.max_strategies = self.config.get('max_strategies', 50)
         self.generation_interval = self.config.get('generation_interval', 3600)  # 1 ora
         
-        # Inizializza il monitor dei backtest se disponibile
-        self.backtest_monitor = None
-        if BACKTEST_MONITOR_AVAILABLE:
-            try:
-                self.backtest_monitor = BacktestMonitor()
-                logger.info("✅ BacktestMonitor integrato nel Background Agent")
-            except Exception as e:
-                logger.warning(f"⚠️ Errore nell'inizializzazione BacktestMonitor: {e}")
-                self.backtest_monitor = None
-        
-        # Inizializza il Dry Run Manager se disponibile
-        self.dry_run_manager = None
-        if DRY_RUN_MANAGER_AVAILABLE:
-            try:
-                self.dry_run_manager = DryRunManager()
-                logger.info("✅ DryRunManager integrato nel Background Agent")
-            except Exception as e:
-                logger.warning(f"⚠️ Errore nell'inizializzazione DryRunManager: {e}")
-                self.dry_run_manager = None
+        # I componenti (generatore, convertitore, ottimizzatore, Freqtrade, monitor,
+        # dry run, esportatore live) vengono costruiti pigramente al primo accesso
+    
+    # ------------------------------------------------------------------
+    # Componenti costruiti al primo utilizzo
+    # ------------------------------------------------------------------
+    
+    @cached_property
+    def generator(self):
+        """Generatore di strategie (costruito al primo utilizzo)."""
+        from agents.generator import GeneratorAgent
+        return GeneratorAgent()
+    
+    @cached_property
+    def converter(self):
+        """Convertitore/validatore di codice (costruito al primo utilizzo)."""
+        from agents.strategy_converter import StrategyConverter
+        return StrategyConverter()
+    
+    @cached_property
+    def optimizer(self):
+        """Ottimizzatore con il modello configurato (costruito al primo utilizzo)."""
+        from agents.optimizer import OptimizerAgent
+        optimization_model = self.config.get('model_selection', {}).get('optimization', 'cogito:8b')
+        return OptimizerAgent(default_model=optimization_model)
+    
+    @cached_property
+    def freqtrade(self):
+        """Gestore Freqtrade (costruito al primo utilizzo)."""
+        from freqtrade_utils import FreqtradeManager
+        return FreqtradeManager()
+    
+    @cached_property
+    def backtest_monitor(self):
+        """Monitor dei backtest, None se non disponibile."""
+        if not BACKTEST_MONITOR_AVAILABLE:
+            return None
+        try:
+            from backtest_monitor import BacktestMonitor
+            monitor = BacktestMonitor()
+            logger.info("✅ BacktestMonitor integrato nel Background Agent")
+            return monitor
+        except Exception as e:
+            logger.warning(f"⚠️ Errore nell'inizializzazione BacktestMonitor: {e}")
+            return None
+    
+    @cached_property
+    def dry_run_manager(self):
+        """Dry Run Manager, None se non disponibile."""
+        if not DRY_RUN_MANAGER_AVAILABLE:
+            return None
+        try:
+            from dry_run_manager import DryRunManager
+            manager = DryRunManager(
+                mode=self.dry_run_mode,
+                host_settings=self.config.get('dry_run', {}).get('host', {}),
+                risk_poll_interval=self.config.get('dry_run', {}).get('risk_poll_interval', 5.0)
+            )
+            # Controllo rischi continuo sui dry run attivi
+            manager.start_monitoring()
+            logger.info("✅ DryRunManager integrato nel Background Agent")
+            return manager
+        except Exception as e:
+            logger.warning(f"⚠️ Errore nell'inizializzazione DryRunManager: {e}")
+            return None
+    
+    @cached_property
+    def live_exporter(self):
+        """Esportatore di strategie live, None se non disponibile."""
+        if not LIVE_EXPORTER_AVAILABLE:
+            return None
+        try:
+            from live_strategies_exporter import LiveStrategiesExporter, LiveStrategyConfig
+            live_config = LiveStrategyConfig(
+                min_backtest_score=self.config.get('min_backtest_score', 0.1),
+                export_optimized_only=True,
+                max_live_strategies=10
+            )
+            exporter = LiveStrategiesExporter(live_config)
+            logger.info("✅ LiveStrategiesExporter integrato nel Background Agent")
+            return exporter
+        except Exception as e:
+            logger.warning(f"⚠️ Errore nell'inizializzazione LiveStrategiesExporter: {e}")
+            return None
+    
+    @cached_property
+    def sandbox_pool(self):
+        """Pool di worker per lo smoke test delle strategie, None se disabilitato."""
+        smoke_config = self.config.get('smoke_test', {})
+        if not smoke_config.get('enabled', True):
+            return None
+        try:
+            from agents.strategy_sandbox import StrategySandboxPool
+            return StrategySandboxPool(
+                workers=smoke_config.get('workers', 2),
+                task_timeout=smoke_config.get('timeout', 10.0),
+                memory_limit_mb=smoke_config.get('memory_limit_mb', 2048),
+                candles=smoke_config.get('candles', 500),
+                ohlcv_file=smoke_config.get('ohlcv_file')
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Errore nell'inizializzazione della sandbox strategie: {e}")
+            return None
+    
+    @cached_property
+    def strategy_watcher(self):
+        """Watcher di strategie e backtest: indice in memoria e hook sui file nuovi."""
+        from strategy_watcher import get_strategy_watcher, postprocess_new_strategy, validate_new_strategy
+        # Istanza condivisa: anche FreqtradeManager.list_strategies interroga lo stesso indice
+        watcher_config = self.config.get('watcher', {})
+        watcher = get_strategy_watcher()
+        watcher.poll_interval = watcher_config.get('poll_interval', watcher.poll_interval)
+        if watcher_config.get('postprocess', False):
+            watcher.on_created(postprocess_new_strategy)
+        elif self.auto_validation:
+            watcher.on_created(validate_new_strategy)
+        return watcher
+    
+    def _smoke_test_strategy(self, file_path: str, class_name: Optional[str] = None) -> bool:
+        """
+        Esegue lo smoke test di una strategia nella sandbox.
         
-        # Inizializza l'esportatore di strategie live se disponibile
-        self.live_exporter = None
-        if LIVE_EXPORTER_AVAILABLE:
-            try:
-                live_config = LiveStrategyConfig(
-                    min_backtest_score=self.config.get('min_backtest_score', 0.1),
-                    export_optimized_only=True,
-                    max_live_strategies=10
-                )
-                self.live_exporter = LiveStrategiesExporter(live_config)
-                logger.info("✅ LiveStrategiesExporter integrato nel Background Agent")
-            except Exception as e:
-                logger.warning(f"⚠️ Errore nell'inizializzazione LiveStrategiesExporter: {e}")
-                self.live_exporter = None
+        Returns:
+            False solo se la strategia fallisce (sandbox assente = nessun blocco)
+        """
+        if not self.sandbox_pool or not os.path.exists(file_path):
+            return True
+        try:
+            verdict = self.sandbox_pool.smoke_test(file_path, class_name)
+        except Exception as e:
+            logger.warning(f"⚠️ Smoke test non eseguito per {file_path}: {e}")
+            return True
+        if verdict.passed:
+            logger.info(f"✅ Smoke test {verdict.class_name or file_path}: {verdict.status} "
+                        f"({verdict.entry_signals} entrate, {verdict.duration_ms:.0f} ms)")
+        else:
+            logger.warning(f"❌ Smoke test {file_path} fallito ({verdict.status}): {'; '.join(verdict.errors)}")
+        return verdict.passed
+    
+    def _component_loaded(self, name: str) -> bool:
+        """Indica se un componente pigro è già stato costruito."""
+        return self.__dict__.get(name) is not None
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Carica la configurazione dell'agente."""
@@ -198,7 +319,7 @@ class BackgroundAgent:
     
     def _load_existing_metadata(self):
         """Carica i metadati delle strategie esistenti."""
-        metadata_file = "strategies_metadata.json"
+        metadata_file = METADATA_FILE
         if os.path.exists(metadata_file):
             try:
                 with open(metadata_file, 'r') as f:
@@ -217,7 +338,7 @@ class BackgroundAgent:
     
     def _save_metadata(self):
         """Salva i metadati delle strategie."""
-        metadata_file = "strategies_metadata.json"
+        metadata_file = METADATA_FILE
         try:
             # Converti datetime in stringhe per JSON
             data = {}
@@ -267,6 +388,7 @@ class BackgroundAgent:
                 use_hybrid=True,
                 strategy_name=strategy_name
             )
+            pipeline_metrics.STRATEGIES_GENERATED.labels(model=model, strategy_type=strategy_type).inc()
             
             # Validazione automatica
             if self.auto_validation:
@@ -276,6 +398,14 @@ class BackgroundAgent:
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(strategy_code)
             
+            # Smoke test in sandbox: scarta subito le strategie che andrebbero in errore in Freqtrade
+            validation_status = "validated" if self.auto_validation else "generated"
+            if self.auto_validation and not self._smoke_test_strategy(file_path, strategy_name):
+                validation_status = "smoke_failed"
+                pipeline_metrics.STRATEGIES_FAILED.labels(stage="smoke_test").inc()
+            elif self.auto_validation:
+                pipeline_metrics.STRATEGIES_VALIDATED.labels(stage="smoke_test").inc()
+            
             # Crea metadati
             metadata = StrategyMetadata(
                 name=strategy_name,
@@ -283,7 +413,7 @@ class BackgroundAgent:
                 strategy_type=strategy_type,
                 model_used=model,
                 generation_time=datetime.now(),
-                validation_status="validated" if self.auto_validation else "generated"
+                validation_status=validation_status
             )
             
             # Salva metadati
@@ -294,6 +424,7 @@ class BackgroundAgent:
             return metadata
             
         except Exception as e:
+            pipeline_metrics.STRATEGIES_FAILED.labels(stage="generation").inc()
             logger.error(f"❌ Errore nella generazione strategia {strategy_type}: {e}")
             return None
     
@@ -301,9 +432,19 @@ class BackgroundAgent:
         """
         Esegue backtest di una strategia e restituisce il punteggio.
         """
+        backtest_start = time.time()
         try:
             logger.info(f"Backtesting strategia: {strategy_name}")
             
+            # Evita di lanciare un backtest completo per strategie che non superano lo smoke test
+            metadata = self.strategies_metadata.get(strategy_name)
+            if metadata and not self._smoke_test_strategy(metadata.file_path, strategy_name):
+                metadata.validation_status = "smoke_failed"
+                self._save_metadata()
+                logger.warning(f"⚠️ Backtest {strategy_name} saltato: smoke test fallito")
+                pipeline_metrics.STRATEGIES_FAILED.labels(stage="backtest_smoke_test").inc()
+                return None
+            
             # Usa il monitor se disponibile
             if self.backtest_monitor:
                 backtest_id = self.backtest_monitor.start_backtest_with_monitoring(
@@ -349,6 +490,10 @@ class BackgroundAgent:
                 else:
                     score = None
             
+            pipeline_metrics.BACKTEST_SECONDS.labels(
+                status="completed" if score is not None else "failed"
+            ).observe(time.time() - backtest_start)
+            
             # Aggiorna metadati se il backtest è riuscito
             if score is not None:
                 if strategy_name in self.strategies_metadata:
@@ -363,6 +508,7 @@ class BackgroundAgent:
                 return None
                 
         except Exception as e:
+            pipeline_metrics.BACKTEST_SECONDS.labels(status="error").observe(time.time() - backtest_start)
             logger.error(f"❌ Errore backtest {strategy_name}: {e}")
             return None
     
@@ -467,6 +613,7 @@ class BackgroundAgent:
     
     def schedule_tasks(self):
         """Programma le attività automatiche."""
+        import schedule
         
         # Generazione periodica di strategie
         schedule.every(self.generation_interval).seconds.do(self.generate_periodic_strategies)
@@ -632,6 +779,20 @@ class BackgroundAgent:
         logger.info("🚀 Avvio Background Agent...")
         self.is_running = True
         
+        # Espone le metriche della pipeline
+        if self.metrics_config.get('enabled', True):
+            try:
+                self.metrics_server = pipeline_metrics.start_metrics_server(
+                    port=self.metrics_config.get('port', 9108),
+                    host=self.metrics_config.get('host', '127.0.0.1')
+                )
+            except OSError as e:
+                logger.warning(f"⚠️ Server metriche non avviato: {e}")
+        
+        # Indice delle strategie aggiornato dal filesystem invece di rescan periodici
+        if self.config.get('watcher', {}).get('enabled', True):
+            self.strategy_watcher.start()
+        
         # Avvia il monitoraggio dei backtest se disponibile
         if self.backtest_monitor:
             self.start_backtest_monitoring()
@@ -640,6 +801,8 @@ class BackgroundAgent:
         self.schedule_tasks()
         
         # Avvia thread per le attività programmate
+        import schedule
+        
         def run_scheduler():
             while self.is_running:
                 schedule.run_pending()
@@ -655,10 +818,21 @@ class BackgroundAgent:
         logger.info("🛑 Arresto Background Agent...")
         self.is_running = False
         
-        # Ferma il monitoraggio dei backtest
-        if self.backtest_monitor:
+        # Ferma il monitoraggio dei backtest (solo se già avviato)
+        if self._component_loaded('backtest_monitor'):
             self.stop_backtest_monitoring()
         
+        if self._component_loaded('strategy_watcher'):
+            self.strategy_watcher.stop()
+        
+        # Arresta i worker della sandbox
+        if self._component_loaded('sandbox_pool'):
+            self.sandbox_pool.close()
+        
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server = None
+        
         self._save_metadata()
         logger.info("✅ Background Agent arrestato")
     
@@ -856,10 +1030,74 @@ class BackgroundAgent:
         
         return status
 
+def read_persisted_status(config_path: str = "background_config.json",
+                          metadata_file: str = METADATA_FILE) -> Dict[str, Any]:
+    """
+    Restituisce lo stato dell'agente leggendo solo i file persistiti.
+    
+    Non costruisce l'agente né importa i componenti pesanti: è il percorso
+    usato da `--status` e da manage_background_agent.sh.
+    
+    Args:
+        config_path: File di configurazione dell'agente
+        metadata_file: File dei metadati delle strategie
+        
+    Returns:
+        Dizionario con conteggi delle strategie e configurazione
+    """
+    status = {
+        'config_file': config_path,
+        'config_present': os.path.exists(config_path),
+        'metadata_present': os.path.exists(metadata_file),
+        'total_strategies': 0,
+        'active_strategies': 0,
+        'validated_strategies': 0,
+        'optimized_strategies': 0,
+        'backtested_strategies': 0,
+        'config': {}
+    }
+    
+    if status['config_present']:
+        try:
+            with open(config_path, 'r') as f:
+                status['config'] = json.load(f)
+        except Exception as e:
+            status['config_error'] = str(e)
+    
+    if status['metadata_present']:
+        try:
+            with open(metadata_file, 'r') as f:
+                data = json.load(f)
+            strategies = list(data.values())
+            status['total_strategies'] = len(strategies)
+            status['active_strategies'] = sum(1 for s in strategies if s.get('is_active'))
+            status['validated_strategies'] = sum(1 for s in strategies if s.get('validation_status') == 'validated')
+            status['optimized_strategies'] = sum(1 for s in strategies if s.get('validation_status') == 'optimized')
+            status['backtested_strategies'] = sum(1 for s in strategies if s.get('backtest_score') is not None)
+        except Exception as e:
+            status['metadata_error'] = str(e)
+    
+    return status
+
 def main():
     """Funzione principale per testare l'agente."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Background Agent per strategie Freqtrade")
+    parser.add_argument("--config", default="background_config.json", help="File di configurazione")
+    parser.add_argument("--status", action="store_true",
+                        help="Mostra lo stato dai file persistiti senza avviare l'agente")
+    args = parser.parse_args()
+    
+    if args.status:
+        print(json.dumps(read_persisted_status(args.config), indent=2))
+        return
+    
     global _agent_instance
-    agent = BackgroundAgent()
+    configure_logging()
+    install_signal_handlers()
+    
+    agent = BackgroundAgent(args.config)
     _agent_instance = agent
     
     try:
@@ -879,4 +1117,4 @@ def main():
         _agent_instance = None
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
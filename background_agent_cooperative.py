@@ -15,9 +15,10 @@ import random
 import threading
 import queue
 import re
+import contextvars
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 
 # Importa tutto dal background agent originale
@@ -31,6 +32,9 @@ from agents.generator import GeneratorAgent
 from agents.strategy_converter import StrategyConverter
 from agents.optimizer import OptimizerAgent
 from freqtrade_utils import FreqtradeManager
+from prompt_sessions import PromptSessionPool
+from deadlines import deadline_scope
+from prompts.prompt_templates import get_template_library
 
 # Importa il monitor cooperativo se disponibile
 try:
@@ -42,7 +46,8 @@ except ImportError:
 
 # Importa le utility LLM
 try:
-    from llm_utils import query_ollama, query_ollama_fast, query_ollama_unlimited, query_ollama_cooperative
+    from llm_utils import (query_ollama, query_ollama_fast, query_ollama_unlimited, query_ollama_cooperative,
+                           query_ollama_session, COOPERATIVE_OPTIONS)
     LLM_UTILS_AVAILABLE = True
 except ImportError:
     LLM_UTILS_AVAILABLE = False
@@ -80,6 +85,14 @@ class CooperativeGeneratorAgent:
         self.use_llm_voting = self.cooperative_config.get('use_llm_voting', True)
         self.parallel_generation_count = self.cooperative_config.get('parallel_generation_count', 3)
         self.enable_contest_mode = self.cooperative_config.get('enable_contest_mode', True)
+        # Scadenza dell'intera generazione (due stadi + cooperazione); 0 = nessuna
+        deadline_minutes = self.cooperative_config.get('generation_deadline_minutes', 20)
+        self.generation_deadline = deadline_minutes * 60 if deadline_minutes else None
+        
+        # Istruzioni comuni una sola volta nel prompt di sistema: ogni round invia solo il proprio suffisso
+        self.prompt_sessions = PromptSessionPool(
+            get_template_library().render("cooperative_system"), COOPERATIVE_OPTIONS
+        ) if LLM_UTILS_AVAILABLE else None
         
         # Fallback al generatore standard (ora usa sistema a due stadi)
         self.standard_generator = GeneratorAgent()
@@ -100,7 +113,12 @@ class CooperativeGeneratorAgent:
         """
         Genera una strategia usando sistema a due stadi con cooperazione tra LLM.
         Fallback al generatore standard se la cooperazione non è disponibile.
+        Tutte le chiamate LLM condividono la scadenza generation_deadline_minutes.
         """
+        with deadline_scope(self.generation_deadline, "cooperative_generation"):
+            return self._generate_futures_strategy(strategy_type, use_hybrid, strategy_name)
+    
+    def _generate_futures_strategy(self, strategy_type: str, use_hybrid: bool, strategy_name: str | None) -> str:
         # Usa sistema a due stadi se disponibile
         if self.two_stage_available:
             logger.info(f"🔄 Generazione {strategy_type} con sistema a due stadi...")
@@ -119,36 +137,37 @@ class CooperativeGeneratorAgent:
         # Fallback alla cooperazione se disponibile
         if self.enable_cooperation and LLM_UTILS_AVAILABLE:
             logger.info("🤝 Usando generazione cooperativa...")
-        try:
-            # Avvia sessione cooperativa se il monitor è disponibile
-            session_id = ""
-            if COOPERATIVE_MONITOR_AVAILABLE:
-                session_id = track_cooperative_session(
-                    "cooperative_generation",
-                    strategy_type,
-                    self.strategy_generators
-                )
-            
-            logger.info(f"🤝 Generazione cooperativa per {strategy_type}")
-            
-            # Scegli il metodo di generazione cooperativa
-            if self.enable_contest_mode and len(self.strategy_generators) >= 2:
-                return self._generate_with_contest(strategy_type, use_hybrid, strategy_name, session_id)
-            elif self.use_llm_voting and len(self.strategy_generators) >= 2:
-                return self._generate_with_voting(strategy_type, use_hybrid, strategy_name, session_id)
-            else:
-                return self._generate_with_consensus(strategy_type, use_hybrid, strategy_name, session_id)
+            try:
+                # Avvia sessione cooperativa se il monitor è disponibile
+                session_id = ""
+                if COOPERATIVE_MONITOR_AVAILABLE:
+                    session_id = track_cooperative_session(
+                        "cooperative_generation",
+                        strategy_type,
+                        self.strategy_generators
+                    )
+            
+                logger.info(f"🤝 Generazione cooperativa per {strategy_type}")
+                self.prompt_sessions.reset()
+            
+                # Scegli il metodo di generazione cooperativa
+                if self.enable_contest_mode and len(self.strategy_generators) >= 2:
+                    return self._generate_with_contest(strategy_type, use_hybrid, strategy_name, session_id)
+                elif self.use_llm_voting and len(self.strategy_generators) >= 2:
+                    return self._generate_with_voting(strategy_type, use_hybrid, strategy_name, session_id)
+                else:
+                    return self._generate_with_consensus(strategy_type, use_hybrid, strategy_name, session_id)
                 
-        except Exception as e:
-            logger.error(f"❌ Errore nella generazione cooperativa: {e}")
+            except Exception as e:
+                logger.error(f"❌ Errore nella generazione cooperativa: {e}")
             
-            # Termina sessione cooperativa se attiva
-            if session_id and COOPERATIVE_MONITOR_AVAILABLE:
-                end_cooperative_session(session_id, "failed", {"error": str(e)})
+                # Termina sessione cooperativa se attiva
+                if session_id and COOPERATIVE_MONITOR_AVAILABLE:
+                    end_cooperative_session(session_id, "failed", {"error": str(e)})
             
         # Fallback finale al generatore standard
         logger.info("🔄 Fallback al generatore standard")
-            return self.standard_generator.generate_futures_strategy(strategy_type, use_hybrid, strategy_name)
+        return self.standard_generator.generate_futures_strategy(strategy_type, use_hybrid, strategy_name)
     
     def _generate_with_contest(self, strategy_type: str, use_hybrid: bool, strategy_name: str, session_id: str) -> str:
         """Genera strategia usando contest tra LLM."""
@@ -160,9 +179,11 @@ class CooperativeGeneratorAgent:
         # Genera strategie in parallelo
         threads = []
         for i, model in enumerate(self.strategy_generators):
+            # Ogni partecipante eredita la scadenza corrente
             thread = threading.Thread(
-                target=self._generate_contest_entry,
-                args=(model, strategy_type, use_hybrid, strategy_name, contest_results, session_id)
+                target=contextvars.copy_context().run,
+                args=(self._generate_contest_entry, model, strategy_type, use_hybrid, strategy_name,
+                      contest_results, session_id)
             )
             threads.append(thread)
             thread.start()
@@ -197,21 +218,11 @@ class CooperativeGeneratorAgent:
         try:
             logger.info(f"🤖 {model} partecipa al contest...")
             
-            prompt = f"""Crea la MIGLIORE strategia Freqtrade per {strategy_type} trading su futures crypto.
-Devi BATTERE gli altri LLM nel contest!
-
-Requisiti:
-- Strategia per {strategy_type} trading
-- Su futures crypto volatili
-- Codice Python completo e funzionante
-- Gestione rischio avanzata
-- Indicatori tecnici efficaci
-- Logica di entrata/uscita chiara
-
-Genera SOLO il codice Python della strategia, senza spiegazioni."""
+            prompt = f"""Contest: crea la MIGLIORE strategia per {strategy_type} trading.
+Devi BATTERE gli altri LLM nel contest!"""
 
             start_time = time.time()
-            response = query_ollama_cooperative(prompt, model, session_id)
+            response = query_ollama_session(self.prompt_sessions.session(model), prompt, session_id=session_id)
             duration = time.time() - start_time
             
             # Log della conversazione cooperativa
@@ -307,16 +318,22 @@ Genera SOLO il codice Python della strategia, senza spiegazioni."""
         # Usa il modello più potente per la sintesi finale
         synthesis_model = self.strategy_generators[0]
         
-        # Crea sintesi delle strategie
-        synthesis_prompt = f"""Analizza queste strategie per {strategy_type} trading e crea la migliore versione combinata:
+        # Crea sintesi delle strategie (quella del modello di sintesi è già nel suo contesto)
+        def voting_prompt(items: List[Dict], own: str) -> str:
+            strategies_text = "\n".join(f"=== Strategia {i+1} (da {s['model']}) ===\n{s['code']}\n"
+                                         for i, s in enumerate(items))
+            return f"""Analizza {own}queste strategie per {strategy_type} trading e crea la migliore versione combinata:
+
+{strategies_text}
 
-{chr(10).join([f"=== Strategia {i+1} (da {s['model']}) ===\n{s['code']}\n" for i, s in enumerate(strategies)])}
+Crea una strategia unificata che combini i migliori elementi di tutte le strategie."""
 
-Crea una strategia unificata che combini i migliori elementi di tutte le strategie.
-Genera SOLO il codice Python finale, senza spiegazioni."""
+        synthesis_prompt, fresh_prompt = self._synthesis_prompts(
+            synthesis_model, strategies, voting_prompt, "la tua strategia del round precedente e ")
 
         try:
-            final_strategy = query_ollama_cooperative(synthesis_prompt, synthesis_model, session_id)
+            final_strategy = query_ollama_session(self.prompt_sessions.session(synthesis_model), synthesis_prompt,
+                                                  session_id=session_id, fresh_prompt=fresh_prompt)
             
             # Valida il codice finale
             converter = StrategyConverter()
@@ -348,17 +365,21 @@ Genera SOLO il codice Python finale, senza spiegazioni."""
         
         # Sintesi consensuale
         synthesis_model = self.strategy_generators[0]
-        all_ideas_text = "\n\n".join([f"=== {idea['model']} ===\n{idea['idea']}" for idea in ideas])
-        
-        synthesis_prompt = f"""Analizza queste idee per una strategia {strategy_type}:
+
+        def consensus_prompt(items: List[Dict], own: str) -> str:
+            all_ideas_text = "\n\n".join([f"=== {idea['model']} ===\n{idea['idea']}" for idea in items])
+            return f"""Analizza {own}queste idee per una strategia {strategy_type}:
 
 {all_ideas_text}
 
-Crea una strategia Freqtrade completa che implementi il consenso tra queste idee.
-Genera SOLO il codice Python della strategia."""
+Crea una strategia Freqtrade completa che implementi il consenso tra queste idee."""
+
+        synthesis_prompt, fresh_prompt = self._synthesis_prompts(
+            synthesis_model, ideas, consensus_prompt, "le tue idee del round precedente e ")
 
         try:
-            consensus_strategy = query_ollama_cooperative(synthesis_prompt, synthesis_model, session_id)
+            consensus_strategy = query_ollama_session(self.prompt_sessions.session(synthesis_model), synthesis_prompt,
+                                                      session_id=session_id, fresh_prompt=fresh_prompt)
             
             # Valida il codice
             converter = StrategyConverter()
@@ -374,19 +395,10 @@ Genera SOLO il codice Python della strategia."""
                                  strategy_name: str, session_id: str) -> Optional[Dict]:
         """Genera una singola strategia con un modello."""
         try:
-            prompt = f"""Crea una strategia Freqtrade per {strategy_type} trading su futures crypto.
-
-Requisiti:
-- Strategia per {strategy_type} trading
-- Su futures crypto volatili
-- Codice Python completo e funzionante
-- Gestione rischio
-- Indicatori tecnici appropriati
-
-Genera SOLO il codice Python della strategia."""
+            prompt = f"Crea una strategia per {strategy_type} trading con indicatori tecnici appropriati."
 
             start_time = time.time()
-            response = query_ollama_cooperative(prompt, model, session_id)
+            response = query_ollama_session(self.prompt_sessions.session(model), prompt, session_id=session_id)
             duration = time.time() - start_time
             
             # Log della conversazione cooperativa
@@ -412,15 +424,15 @@ Genera SOLO il codice Python della strategia."""
     def _collect_strategy_idea(self, model: str, strategy_type: str, session_id: str) -> Optional[Dict]:
         """Raccoglie un'idea strategica da un modello."""
         try:
-            prompt = f"""Descrivi 3 idee chiave per una strategia di trading {strategy_type} su futures crypto:
+            prompt = f"""Descrivi 3 idee chiave per una strategia di trading {strategy_type}:
 1. Indicatori tecnici da usare
 2. Condizioni di entrata/uscita 
-3. Gestione del rischio
-
-Rispondi in modo conciso e pratico."""
+3. Gestione del rischio"""
 
             start_time = time.time()
-            response = query_ollama_fast(prompt, model, timeout=300)
+            # Stessa sessione della sintesi: le idee restano nel contesto del modello
+            response = query_ollama_session(self.prompt_sessions.session(model), prompt, num_predict=512,
+                                            timeout=300, session_id=session_id)
             duration = time.time() - start_time
             
             # Log della conversazione cooperativa
@@ -438,6 +450,21 @@ Rispondi in modo conciso e pratico."""
         except Exception as e:
             logger.error(f"❌ Errore con {model}: {e}")
             return None
+    
+    def _synthesis_prompts(self, synthesis_model: str, contributions: List[Dict],
+                           build: Callable[[List[Dict], str], str], own: str) -> Tuple[str, str]:
+        """
+        Prompt di sintesi con e senza contesto riportato.
+
+        Il contributo del modello di sintesi è già nel suo contesto e viene
+        omesso; se la sessione riparte senza contesto (anche per azzeramento
+        in `payload`) si usa il secondo prompt, che lo include.
+        """
+        others = [c for c in contributions if c['model'] != synthesis_model]
+        full = build(contributions, "")
+        if len(others) == len(contributions):
+            return full, full
+        return build(others, own), full
 
 
 class CooperativeBackgroundAgent(BackgroundAgent):
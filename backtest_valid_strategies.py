@@ -3,13 +3,13 @@
 Script per eseguire backtest solo delle strategie valide
 """
 
-import os
 import json
 import subprocess
-import glob
 from datetime import datetime
 from typing import List, Dict, Set
 
+from strategy_watcher import get_strategy_watcher
+
 def get_valid_strategies() -> List[str]:
     """Ottiene solo le strategie valide."""
     valid_strategies = [
@@ -27,23 +27,8 @@ def get_valid_strategies() -> List[str]:
 def get_backtested_strategies() -> Set[str]:
     """Ottiene l'elenco delle strategie già backtestate."""
     backtest_dir = "user_data/backtest_results"
-    if not os.path.exists(backtest_dir):
-        return set()
-    
-    backtested = set()
-    
-    # Controlla i file .json di backtest
-    for file_path in glob.glob(os.path.join(backtest_dir, "*.json")):
-        if file_path.endswith('.meta.json'):
-            continue
-        
-        filename = os.path.basename(file_path)
-        if filename.startswith('backtest-'):
-            # Estrai il nome della strategia dal filename
-            strategy_name = filename.replace('backtest-', '').split('-')[0]
-            backtested.add(strategy_name)
-    
-    return backtested
+    # Nomi ricavati dai file backtest-<strategia>-*.json indicizzati dal watcher
+    return get_strategy_watcher(backtest_dir=backtest_dir).backtested_strategies()
 
 def run_backtest_for_strategy(strategy_name: str) -> bool:
     """Esegue il backtest per una singola strategia."""
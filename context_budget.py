@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Budget di contesto per le richieste a Ollama.
+I token del prompt vengono misurati localmente (tokenizer `tiktoken` se
+installato, altrimenti una stima per pezzi simile alla pre-tokenizzazione
+BPE), così ogni richiesta usa il `num_ctx` più piccolo sufficiente invece
+di un valore fisso. Il codice delle strategie incluso nei prompt viene
+compresso a livelli (commenti e docstring, boilerplate, troncamento) solo
+quando non entra nel contesto.
+"""
+
+import ast
+import re
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+NUM_CTX_STEPS = (1024, 2048, 4096, 8192, 16384, 32768)
+MAX_NUM_CTX = 8192   # limite oltre il quale la memoria KV dei modelli locali diventa un problema
+CTX_MARGIN = 64      # token di sicurezza per template di sistema del modello ed errori di stima
+
+# Attributi di strategia Freqtrade irrilevanti per l'analisi della logica
+BOILERPLATE_ATTRS = {"plot_config", "order_types", "order_time_in_force", "protections", "informative_pairs"}
+MAX_LITERAL_ITEMS = 12
+
+# Parole, gruppi di cifre (i tokenizer recenti spezzano i numeri), punteggiatura,
+# a capo e indentazione; lo spazio singolo si fonde con la parola successiva
+_PIECES = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]|_|\n|[ \t]{2,}")
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    """Encoding tiktoken caricato al primo uso (può richiedere file non presenti offline)."""
+    global _encoding, _encoding_failed
+    if _encoding is None and TIKTOKEN_AVAILABLE and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_failed = True
+            logger.warning(f"⚠️ Tokenizer tiktoken non disponibile, uso la stima: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Numero di token di un testo: esatto con tiktoken, altrimenti stima prudente."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece[0].isalpha():
+            tokens += 1 + len(piece) // 6
+        elif piece[0] in " \t":
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+def choose_num_ctx(prompt_tokens: int, num_predict: int, min_ctx: int = NUM_CTX_STEPS[0],
+                   max_ctx: int = MAX_NUM_CTX, steps: Sequence[int] = NUM_CTX_STEPS) -> int:
+    """
+    Il più piccolo num_ctx (tra i gradini `steps`, da min_ctx a max_ctx)
+    che contiene prompt e risposta. I gradini limitano i valori distinti:
+    Ollama ricarica il modello quando num_ctx cambia.
+    """
+    needed = prompt_tokens + num_predict + CTX_MARGIN
+    candidates = [s for s in steps if min_ctx <= s <= max_ctx] or [max_ctx]
+    for size in candidates:
+        if size >= needed:
+            return size
+    logger.warning(f"⚠️ Prompt di ~{prompt_tokens} token + {num_predict} di risposta oltre num_ctx={candidates[-1]}")
+    return candidates[-1]
+
+
+def context_for_prompt(prompt: str, num_predict: int, min_ctx: int = NUM_CTX_STEPS[0],
+                       max_ctx: int = MAX_NUM_CTX) -> int:
+    """num_ctx per una richiesta, misurando il prompt."""
+    return choose_num_ctx(count_tokens(prompt), num_predict, min_ctx, max_ctx)
+
+
+class _StripDocstrings(ast.NodeTransformer):
+    """Rimuove le docstring; con elide_boilerplate sostituisce anche configurazioni e letterali lunghi con `...`."""
+
+    def __init__(self, elide_boilerplate: bool = False):
+        self.elide_boilerplate = elide_boilerplate
+
+    def _strip_body(self, node):
+        self.generic_visit(node)
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            body = body[1:] or [ast.Pass()]
+        node.body = body
+        return node
+
+    visit_Module = visit_ClassDef = visit_AsyncFunctionDef = _strip_body
+
+    def visit_Assign(self, node):
+        if not self.elide_boilerplate:
+            return node
+        names = {t.id for t in node.targets if isinstance(t, ast.Name)}
+        if names & BOILERPLATE_ATTRS or _literal_size(node.value) > MAX_LITERAL_ITEMS:
+            node.value = ast.Constant(value=...)
+        return node
+
+    def visit_FunctionDef(self, node):
+        node = self._strip_body(node)
+        if self.elide_boilerplate and node.name in BOILERPLATE_ATTRS:
+            node.body = [ast.Expr(value=ast.Constant(value=...))]
+        return node
+
+
+def _literal_size(node: ast.AST) -> int:
+    if isinstance(node, ast.Dict):
+        return len(node.keys)
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return len(node.elts)
+    return 0
+
+
+def _strip_comments_text(code: str) -> str:
+    """Ripiego per codice non analizzabile: righe di solo commento e righe vuote."""
+    lines = [line.rstrip() for line in code.splitlines()]
+    return "\n".join(line for line in lines if line.strip() and not line.lstrip().startswith("#"))
+
+
+def compress_code(code: str, level: int = 1) -> str:
+    """
+    Compressione del codice per livello:
+    0 invariato; 1 senza commenti, docstring e righe vuote;
+    2 anche senza boilerplate (plot_config, order_types, letterali lunghi).
+    """
+    if level <= 0:
+        return code
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return _strip_comments_text(code)
+    tree = _StripDocstrings(elide_boilerplate=level >= 2).visit(tree)
+    unparsed = ast.unparse(ast.fix_missing_locations(tree))
+    return "\n".join(line for line in unparsed.splitlines() if line.strip())
+
+
+def truncate_code(code: str, max_tokens: int) -> str:
+    """Tiene inizio e fine del codice entro max_tokens, segnalando le righe omesse."""
+    lines = code.splitlines()
+    head, tail = [], []
+    used = count_tokens("# ... [0000 righe omesse] ...\n")
+    i, j = 0, len(lines) - 1
+    head_open = tail_open = True
+    while i <= j and (head_open or tail_open):
+        # Due righe dall'inizio (classe, indicatori) per ogni riga dalla fine
+        take_head = head_open and (not tail_open or len(head) < 2 * (len(tail) + 1))
+        line = lines[i] if take_head else lines[j]
+        cost = count_tokens(line + "\n")
+        if used + cost > max_tokens:
+            if take_head:
+                head_open = False
+            else:
+                tail_open = False
+            continue
+        used += cost
+        if take_head:
+            head.append(line)
+            i += 1
+        else:
+            tail.insert(0, line)
+            j -= 1
+    omitted = j - i + 1
+    if omitted <= 0:
+        return code
+    return "\n".join(head + [f"# ... [{omitted} righe omesse] ..."] + tail)
+
+
+@dataclass
+class CodeFit:
+    """Codice adattato a un budget di token."""
+    code: str
+    tokens: int
+    level: int  # 0 originale, 1 senza commenti, 2 senza boilerplate, 3 troncato
+
+
+def fit_code(code: str, max_tokens: int) -> CodeFit:
+    """Il livello di compressione più basso che porta il codice entro max_tokens."""
+    for level in (0, 1, 2):
+        compressed = compress_code(code, level)
+        tokens = count_tokens(compressed)
+        if tokens <= max_tokens:
+            return CodeFit(compressed, tokens, level)
+    truncated = truncate_code(compressed, max(max_tokens, 0))
+    return CodeFit(truncated, count_tokens(truncated), 3)
+
+
+def fit_prompt(render: Callable[[str], str], code: str, num_predict: int, max_ctx: int = MAX_NUM_CTX,
+               label: Optional[str] = None) -> str:
+    """
+    Costruisce un prompt che incorpora `code` entro max_ctx: `render(codice)`
+    produce il prompt, il codice viene compresso solo se necessario.
+    """
+    overhead = count_tokens(render(""))
+    budget = max_ctx - num_predict - CTX_MARGIN - overhead
+    fitted = fit_code(code, budget)
+    if fitted.level:
+        logger.info(f"✂️ Codice{f' di {label}' if label else ''} compresso (livello {fitted.level}): "
+                    f"~{count_tokens(code)} → ~{fitted.tokens} token")
+    return render(fitted.code)
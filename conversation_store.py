@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Archivio persistente delle sessioni cooperative tra LLM.
+SQLite con indici su sessione, modello, ruolo e timestamp: le query per
+sessione e per modello sono lookup su indice, prompt e risposte sono
+salvati compressi e lo storico sopravvive ai riavvii senza occupare RAM.
+"""
+
+import json
+import zlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    session_type TEXT NOT NULL,
+    strategy_type TEXT,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    status TEXT NOT NULL,
+    participants TEXT,
+    results TEXT,
+    hardware_metrics TEXT,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_start_time ON sessions(start_time);
+CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions(status);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    role TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    duration REAL,
+    tokens_generated REAL,
+    validation_score REAL,
+    contest_score REAL,
+    prompt BLOB,
+    response BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_conversations_model ON conversations(model, role);
+CREATE INDEX IF NOT EXISTS idx_conversations_role ON conversations(role);
+CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp);
+
+CREATE TABLE IF NOT EXISTS consensus_rounds (
+    round_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    round_number INTEGER,
+    participants TEXT,
+    ideas_collected BLOB,
+    synthesis BLOB,
+    timestamp TEXT NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_consensus_session ON consensus_rounds(session_id, round_number);
+CREATE INDEX IF NOT EXISTS idx_consensus_timestamp ON consensus_rounds(timestamp);
+"""
+
+CONVERSATION_COLUMNS = ("conversation_id", "session_id", "model", "role", "timestamp", "duration",
+                        "tokens_generated", "validation_score", "contest_score")
+
+
+def _compress(text: Optional[str]) -> Optional[bytes]:
+    return zlib.compress(text.encode("utf-8"), 6) if text is not None else None
+
+
+def _decompress(blob: Optional[bytes]) -> Optional[str]:
+    return zlib.decompress(blob).decode("utf-8") if blob is not None else None
+
+
+def _timestamp(value: Any) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class ConversationStore:
+    """
+    Archivio SQLite di sessioni, conversazioni e round di consenso.
+
+    I record restituiti hanno la stessa forma di `asdict` sulle dataclass
+    del monitor cooperativo (timestamp come datetime).
+    """
+
+    def __init__(self, db_path: str = "cooperative_monitor.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            rows = cursor.fetchall()
+            if not query.lstrip().upper().startswith("SELECT"):
+                self._conn.commit()
+            return rows
+
+    # -- sessioni ----------------------------------------------------------
+
+    def save_session(self, session: Dict[str, Any]):
+        """Inserisce o aggiorna una sessione."""
+        self._execute(
+            """INSERT OR REPLACE INTO sessions
+               (session_id, session_type, strategy_type, start_time, end_time, status,
+                participants, results, hardware_metrics, duration)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (session["session_id"], session["session_type"], session.get("strategy_type"),
+             _timestamp(session["start_time"]), _timestamp(session.get("end_time")),
+             session.get("status", "running"),
+             json.dumps(session.get("participants") or []),
+             json.dumps(session.get("results") or {}, default=str),
+             json.dumps(session.get("hardware_metrics") or {}, default=str),
+             session.get("duration"))
+        )
+
+    def _session_from_row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "session_id": row["session_id"],
+            "session_type": row["session_type"],
+            "strategy_type": row["strategy_type"],
+            "start_time": _datetime(row["start_time"]),
+            "end_time": _datetime(row["end_time"]),
+            "status": row["status"],
+            "participants": json.loads(row["participants"] or "[]"),
+            "results": json.loads(row["results"] or "{}"),
+            "hardware_metrics": json.loads(row["hardware_metrics"] or "{}"),
+            "duration": row["duration"],
+        }
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
+        return self._session_from_row(rows[0]) if rows else None
+
+    def recent_sessions(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = self._execute("SELECT * FROM sessions ORDER BY start_time DESC LIMIT ?",
+                             (limit if limit is not None else -1,))
+        return [self._session_from_row(row) for row in rows]
+
+    def session_counts(self) -> Dict[str, int]:
+        """Numero di sessioni per stato."""
+        rows = self._execute("SELECT status, COUNT(*) AS n FROM sessions GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    def session_type_counts(self) -> Dict[str, int]:
+        rows = self._execute("SELECT session_type, COUNT(*) AS n FROM sessions GROUP BY session_type")
+        return {row["session_type"]: row["n"] for row in rows}
+
+    def participant_counts(self) -> Dict[str, int]:
+        """Numero di sessioni a cui ha partecipato ciascun modello."""
+        rows = self._execute(
+            """SELECT participant.value AS model, COUNT(*) AS n
+               FROM sessions, json_each(sessions.participants) AS participant
+               GROUP BY participant.value"""
+        )
+        return {row["model"]: row["n"] for row in rows}
+
+    def average_session_duration(self, status: str = "completed") -> float:
+        rows = self._execute("SELECT AVG(duration) AS d FROM sessions WHERE status = ?", (status,))
+        return rows[0]["d"] or 0.0
+
+    # -- conversazioni -----------------------------------------------------
+
+    def add_conversation(self, conversation: Dict[str, Any]):
+        """Salva una conversazione con prompt e risposta compressi."""
+        self._execute(
+            """INSERT OR REPLACE INTO conversations
+               (conversation_id, session_id, model, role, timestamp, duration, tokens_generated,
+                validation_score, contest_score, prompt, response)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (conversation["conversation_id"], conversation["session_id"], conversation["model"],
+             conversation["role"], _timestamp(conversation["timestamp"]), conversation.get("duration"),
+             conversation.get("tokens_generated"), conversation.get("validation_score"),
+             conversation.get("contest_score"), _compress(conversation.get("prompt")),
+             _compress(conversation.get("response")))
+        )
+
+    def _conversation_from_row(self, row: sqlite3.Row, include_text: bool) -> Dict[str, Any]:
+        record = {column: row[column] for column in CONVERSATION_COLUMNS}
+        record["timestamp"] = _datetime(record["timestamp"])
+        if include_text:
+            record["prompt"] = _decompress(row["prompt"])
+            record["response"] = _decompress(row["response"])
+        return record
+
+    def conversations_by_session(self, session_id: str, include_text: bool = True) -> List[Dict[str, Any]]:
+        columns = "*" if include_text else ", ".join(CONVERSATION_COLUMNS)
+        rows = self._execute(
+            f"SELECT {columns} FROM conversations WHERE session_id = ? ORDER BY timestamp", (session_id,)
+        )
+        return [self._conversation_from_row(row, include_text) for row in rows]
+
+    def recent_conversations(self, limit: Optional[int] = None, model: Optional[str] = None,
+                             role: Optional[str] = None) -> List[Dict[str, Any]]:
+        conditions, params = [], []
+        if model:
+            conditions.append("model = ?")
+            params.append(model)
+        if role:
+            conditions.append("role = ?")
+            params.append(role)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._execute(
+            f"SELECT * FROM conversations {where} ORDER BY timestamp DESC LIMIT ?",
+            tuple(params) + (limit if limit is not None else -1,)
+        )
+        return [self._conversation_from_row(row, True) for row in rows]
+
+    def model_stats(self, model: str) -> Dict[str, Any]:
+        """Statistiche aggregate di un modello (lookup sull'indice per modello)."""
+        rows = self._execute(
+            """SELECT role, COUNT(*) AS n, SUM(duration) AS total_duration,
+                      SUM(tokens_generated) AS tokens
+               FROM conversations WHERE model = ? GROUP BY role""",
+            (model,)
+        )
+        conversations = sum(row["n"] for row in rows)
+        total_duration = sum(row["total_duration"] or 0 for row in rows)
+        return {
+            "conversations": conversations,
+            "avg_duration": total_duration / conversations if conversations else 0,
+            "roles": {row["role"]: row["n"] for row in rows},
+            "total_tokens": sum(row["tokens"] or 0 for row in rows),
+        }
+
+    def count_conversations(self) -> int:
+        return self._execute("SELECT COUNT(*) AS n FROM conversations")[0]["n"]
+
+    # -- round di consenso -------------------------------------------------
+
+    def add_consensus_round(self, consensus_round: Dict[str, Any]):
+        self._execute(
+            """INSERT OR REPLACE INTO consensus_rounds
+               (round_id, session_id, round_number, participants, ideas_collected, synthesis, timestamp, duration)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (consensus_round["round_id"], consensus_round["session_id"], consensus_round.get("round_number"),
+             json.dumps(consensus_round.get("participants") or []),
+             _compress(json.dumps(consensus_round.get("ideas_collected") or {})),
+             _compress(consensus_round.get("synthesis")),
+             _timestamp(consensus_round.get("timestamp") or datetime.now()), consensus_round.get("duration"))
+        )
+
+    def _round_from_row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "round_id": row["round_id"],
+            "session_id": row["session_id"],
+            "round_number": row["round_number"],
+            "participants": json.loads(row["participants"] or "[]"),
+            "ideas_collected": json.loads(_decompress(row["ideas_collected"]) or "{}"),
+            "timestamp": _datetime(row["timestamp"]),
+            "duration": row["duration"],
+            "synthesis": _decompress(row["synthesis"]),
+        }
+
+    def rounds_by_session(self, session_id: str) -> List[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT * FROM consensus_rounds WHERE session_id = ? ORDER BY round_number", (session_id,)
+        )
+        return [self._round_from_row(row) for row in rows]
+
+    def recent_rounds(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = self._execute("SELECT * FROM consensus_rounds ORDER BY timestamp DESC LIMIT ?",
+                             (limit if limit is not None else -1,))
+        return [self._round_from_row(row) for row in rows]
+
+    def count_rounds(self) -> int:
+        return self._execute("SELECT COUNT(*) AS n FROM consensus_rounds")[0]["n"]
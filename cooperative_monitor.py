@@ -15,11 +15,13 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from pathlib import Path
 import queue
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 import webbrowser
 
 # Importa il monitor LLM esistente
 from llm_monitor import LLMMonitor, LLMRequest, ModelStatus
+from event_stream import EventBroker, parse_last_event_id
+from conversation_store import ConversationStore
 
 # Configurazione logging
 logging.basicConfig(
@@ -32,6 +34,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Anteprime inviate alla dashboard; il testo completo resta nell'archivio
+PROMPT_PREVIEW_CHARS = 500
+RESPONSE_PREVIEW_CHARS = 1000
+
+# Righe restituite dalle API di elenco (default e tetto massimo)
+DEFAULT_API_LIMIT = 50
+MAX_API_LIMIT = 500
+
 @dataclass
 class CooperativeSession:
     """Rappresenta una sessione cooperativa tra LLM."""
@@ -80,11 +90,10 @@ class CooperativeMonitor:
     Estende il monitor LLM esistente con funzionalità cooperative.
     """
     
-    def __init__(self, port: int = 8081):
+    def __init__(self, port: int = 8081, db_path: str = "cooperative_monitor.db"):
         self.port = port
-        self.sessions: Dict[str, CooperativeSession] = {}
-        self.conversations: Dict[str, LLMConversation] = {}
-        self.consensus_rounds: Dict[str, ConsensusRound] = {}
+        # Storico persistente: in memoria restano solo le sessioni attive
+        self.store = ConversationStore(db_path)
         self.active_sessions: Dict[str, CooperativeSession] = {}
         self.is_running = False
         self.flask_app = None
@@ -107,10 +116,14 @@ class CooperativeMonitor:
             },
             "start_time": datetime.now()
         }
+        self._load_stats()
         
         # Istanza del monitor LLM esistente
         self.llm_monitor = LLMMonitor(port=8080)
         
+        # Variazioni inviate in push alla dashboard cooperativa (SSE)
+        self.events = EventBroker()
+        
     def start(self):
         """Avvia il monitor cooperativo."""
         if self.is_running:
@@ -141,6 +154,7 @@ class CooperativeMonitor:
         if self.flask_thread:
             self.flask_thread.join(timeout=5)
         self.llm_monitor.stop()
+        self.store.close()
         logger.info("🛑 Cooperative Monitor fermato")
     
     def _start_cooperative_dashboard(self):
@@ -157,15 +171,27 @@ class CooperativeMonitor:
         
         @self.flask_app.route('/api/cooperative/sessions')
         def api_cooperative_sessions():
-            return jsonify([asdict(session) for session in self.sessions.values()])
+            limit = self._limit_arg()
+            return jsonify(self.store.recent_sessions(limit))
         
         @self.flask_app.route('/api/cooperative/conversations')
         def api_cooperative_conversations():
-            return jsonify([asdict(conv) for conv in self.conversations.values()])
+            limit = self._limit_arg()
+            return jsonify([self._preview(conv) for conv in self.store.recent_conversations(limit)])
+        
+        @self.flask_app.route('/api/cooperative/events')
+        def api_cooperative_events():
+            last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID'))
+            return Response(
+                stream_with_context(self.events.stream(last_event_id)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
         
         @self.flask_app.route('/api/cooperative/consensus')
         def api_cooperative_consensus():
-            return jsonify([asdict(round) for round in self.consensus_rounds.values()])
+            limit = self._limit_arg()
+            return jsonify(self.store.recent_rounds(limit))
         
         @self.flask_app.route('/api/cooperative/stats')
         def api_cooperative_stats():
@@ -177,27 +203,20 @@ class CooperativeMonitor:
         
         @self.flask_app.route('/api/cooperative/session/<session_id>')
         def api_session_details(session_id):
-            if session_id in self.sessions:
-                session = self.sessions[session_id]
-                session_data = asdict(session)
-                
-                # Aggiungi conversazioni della sessione
-                session_conversations = [
-                    asdict(conv) for conv in self.conversations.values()
-                    if conv.session_id == session_id
-                ]
-                session_data['conversations'] = session_conversations
-                
-                # Aggiungi round di consenso se presenti
-                session_consensus = [
-                    asdict(round) for round in self.consensus_rounds.values()
-                    if round.session_id == session_id
-                ]
-                session_data['consensus_rounds'] = session_consensus
-                
-                return jsonify(session_data)
-            else:
+            session_data = self.store.get_session(session_id)
+            if session_data is None:
                 return jsonify({"error": "Session not found"}), 404
+            
+            # Conversazioni e round di consenso della sessione (lookup su indice)
+            conversations = self.get_session_conversations(session_id)
+            session_data['conversation_log'] = [
+                {key: value for key, value in conv.items() if key not in ('prompt', 'response')}
+                for conv in conversations
+            ]
+            session_data['conversations'] = [self._preview(conv) for conv in conversations]
+            session_data['consensus_rounds'] = self.store.rounds_by_session(session_id)
+            
+            return jsonify(session_data)
         
         @self.flask_app.route('/api/cooperative/llm-status')
         def api_llm_status():
@@ -216,7 +235,7 @@ class CooperativeMonitor:
         
         # Avvia Flask in thread separato
         self.flask_thread = threading.Thread(
-            target=lambda: self.flask_app.run(host='0.0.0.0', port=self.port, debug=False),
+            target=lambda: self.flask_app.run(host='0.0.0.0', port=self.port, debug=False, threaded=True),
             daemon=True
         )
         self.flask_thread.start()
@@ -231,12 +250,11 @@ class CooperativeMonitor:
             strategy_type=strategy_type,
             start_time=datetime.now(),
             participants=participants,
-            conversation_log=[],
             results={},
             hardware_metrics={}
         )
         
-        self.sessions[session_id] = session
+        self.store.save_session(asdict(session))
         self.active_sessions[session_id] = session
         self.cooperative_stats["total_sessions"] += 1
         self.cooperative_stats["session_types"][session_type] += 1
@@ -247,6 +265,9 @@ class CooperativeMonitor:
                 self.cooperative_stats["most_used_models"][model] = 0
             self.cooperative_stats["most_used_models"][model] += 1
         
+        self.events.publish("session_started", asdict(session))
+        self._publish_stats()
+        
         logger.info(f"🤝 Avviata sessione cooperativa {session_id}: {session_type} per {strategy_type}")
         logger.info(f"   Partecipanti: {', '.join(participants)}")
         
@@ -254,8 +275,8 @@ class CooperativeMonitor:
     
     def end_cooperative_session(self, session_id: str, status: str = "completed", results: Dict[str, Any] = None):
         """Termina una sessione cooperativa."""
-        if session_id in self.sessions:
-            session = self.sessions[session_id]
+        session = self.active_sessions.pop(session_id, None)
+        if session is not None:
             session.end_time = datetime.now()
             session.status = status
             session.duration = (session.end_time - session.start_time).total_seconds()
@@ -263,9 +284,7 @@ class CooperativeMonitor:
             if results:
                 session.results = results
             
-            # Rimuovi dalle sessioni attive
-            if session_id in self.active_sessions:
-                del self.active_sessions[session_id]
+            self.store.save_session(asdict(session))
             
             # Aggiorna statistiche
             if status == "completed":
@@ -283,6 +302,9 @@ class CooperativeMonitor:
                         (self.cooperative_stats["avg_session_duration"] * (total_completed - 1) + session.duration) / total_completed
                     )
             
+            self.events.publish("session_ended", self._session_summary(session))
+            self._publish_stats()
+            
             logger.info(f"✅ Sessione cooperativa {session_id} terminata: {status} ({session.duration:.1f}s)")
     
     def log_conversation(self, session_id: str, model: str, role: str, prompt: str, response: str, 
@@ -296,8 +318,8 @@ class CooperativeMonitor:
             session_id=session_id,
             model=model,
             role=role,
-            prompt=prompt[:500] + "..." if len(prompt) > 500 else prompt,  # Tronca prompt lungo
-            response=response[:1000] + "..." if len(response) > 1000 else response,  # Tronca risposta lunga
+            prompt=prompt,
+            response=response,
             timestamp=datetime.now(),
             duration=duration,
             tokens_generated=len(response.split()) * 1.3,  # Stima approssimativa
@@ -305,20 +327,12 @@ class CooperativeMonitor:
             contest_score=contest_score
         )
         
-        self.conversations[conversation_id] = conversation
+        # Testo completo compresso nell'archivio, alla dashboard solo l'anteprima
+        self.store.add_conversation(asdict(conversation))
         self.cooperative_stats["total_conversations"] += 1
         
-        # Aggiungi alla sessione
-        if session_id in self.sessions:
-            self.sessions[session_id].conversation_log.append({
-                "conversation_id": conversation_id,
-                "model": model,
-                "role": role,
-                "timestamp": conversation.timestamp.isoformat(),
-                "duration": duration,
-                "validation_score": validation_score,
-                "contest_score": contest_score
-            })
+        self.events.publish("conversation", self._preview(asdict(conversation)))
+        self._publish_stats()
         
         logger.info(f"💬 Conversazione {conversation_id}: {model} ({role}) - {duration:.1f}s")
         
@@ -341,26 +355,72 @@ class CooperativeMonitor:
             duration=duration
         )
         
-        self.consensus_rounds[round_id] = consensus_round
+        self.store.add_consensus_round(asdict(consensus_round))
         self.cooperative_stats["total_consensus_rounds"] += 1
         
+        self.events.publish("consensus_round", asdict(consensus_round))
+        self._publish_stats()
+        
         logger.info(f"🤝 Round consenso {round_id}: {len(participants)} partecipanti, {duration:.1f}s")
         
         return round_id
     
     def update_hardware_metrics(self, session_id: str, metrics: Dict[str, Any]):
         """Aggiorna le metriche hardware per una sessione."""
-        if session_id in self.sessions:
-            self.sessions[session_id].hardware_metrics = metrics
+        session = self.active_sessions.get(session_id)
+        if session is not None:
+            session.hardware_metrics = metrics
+            self.store.save_session(asdict(session))
+    
+    def _publish_stats(self):
+        """Invia alla dashboard le statistiche cooperative aggiornate."""
+        self.events.publish("stats", self.cooperative_stats)
+    
+    @staticmethod
+    def _session_summary(session: CooperativeSession) -> Dict[str, Any]:
+        """Dati della sessione senza il log delle conversazioni (già inviato come eventi)."""
+        summary = asdict(session)
+        summary.pop("conversation_log", None)
+        return summary
+    
+    @staticmethod
+    def _limit_arg() -> int:
+        """Parametro ?limit= della richiesta, limitato a [1, MAX_API_LIMIT]."""
+        limit = request.args.get('limit', default=DEFAULT_API_LIMIT, type=int)
+        return max(1, min(limit, MAX_API_LIMIT))
+    
+    @staticmethod
+    def _preview(conversation: Dict[str, Any]) -> Dict[str, Any]:
+        """Conversazione con prompt e risposta troncati per la dashboard."""
+        preview = dict(conversation)
+        for key, limit in (("prompt", PROMPT_PREVIEW_CHARS), ("response", RESPONSE_PREVIEW_CHARS)):
+            text = preview.get(key)
+            if text and len(text) > limit:
+                preview[key] = text[:limit] + "..."
+        return preview
+    
+    def _load_stats(self):
+        """Ricostruisce le statistiche cumulative dall'archivio (sopravvivono ai riavvii)."""
+        stats = self.cooperative_stats
+        status_counts = self.store.session_counts()
+        stats["total_sessions"] = sum(status_counts.values())
+        stats["completed_sessions"] = status_counts.get("completed", 0)
+        stats["failed_sessions"] = status_counts.get("failed", 0)
+        stats["total_conversations"] = self.store.count_conversations()
+        stats["total_consensus_rounds"] = self.store.count_rounds()
+        stats["avg_session_duration"] = self.store.average_session_duration("completed")
+        stats["most_used_models"] = self.store.participant_counts()
+        for session_type, count in self.store.session_type_counts().items():
+            stats["session_types"][session_type] = count
     
     def get_cooperative_status(self) -> Dict[str, Any]:
         """Restituisce lo stato completo del monitor cooperativo."""
         return {
             "is_running": self.is_running,
             "active_sessions_count": len(self.active_sessions),
-            "total_sessions_count": len(self.sessions),
-            "total_conversations_count": len(self.conversations),
-            "total_consensus_rounds_count": len(self.consensus_rounds),
+            "total_sessions_count": self.cooperative_stats["total_sessions"],
+            "total_conversations_count": self.cooperative_stats["total_conversations"],
+            "total_consensus_rounds_count": self.cooperative_stats["total_consensus_rounds"],
             "cooperative_stats": self.cooperative_stats,
             "uptime": (datetime.now() - self.cooperative_stats["start_time"]).total_seconds(),
             "llm_monitor_status": self.llm_monitor.get_status()
@@ -368,49 +428,27 @@ class CooperativeMonitor:
     
     def get_session_conversations(self, session_id: str) -> List[Dict[str, Any]]:
         """Restituisce tutte le conversazioni di una sessione."""
-        return [
-            asdict(conv) for conv in self.conversations.values()
-            if conv.session_id == session_id
-        ]
+        return self.store.conversations_by_session(session_id)
     
     def get_model_cooperation_stats(self, model: str) -> Dict[str, Any]:
         """Restituisce le statistiche di cooperazione di un modello."""
-        model_conversations = [
-            conv for conv in self.conversations.values()
-            if conv.model == model
-        ]
-        
-        if not model_conversations:
+        stats = self.store.model_stats(model)
+        if not stats["conversations"]:
             return {"model": model, "conversations": 0, "avg_duration": 0}
-        
-        total_duration = sum(conv.duration for conv in model_conversations)
-        avg_duration = total_duration / len(model_conversations)
-        
-        roles = {}
-        for conv in model_conversations:
-            if conv.role not in roles:
-                roles[conv.role] = 0
-            roles[conv.role] += 1
-        
-        return {
-            "model": model,
-            "conversations": len(model_conversations),
-            "avg_duration": avg_duration,
-            "roles": roles,
-            "total_tokens": sum(conv.tokens_generated or 0 for conv in model_conversations)
-        }
+        return {"model": model, **stats}
     
     def export_conversation_log(self, session_id: str, format: str = "json") -> str:
         """Esporta il log delle conversazioni di una sessione."""
-        if session_id not in self.sessions:
+        session_data = self.store.get_session(session_id)
+        if session_data is None:
             return ""
         
-        session = self.sessions[session_id]
+        session = CooperativeSession(**session_data)
         conversations = self.get_session_conversations(session_id)
         
         if format == "json":
             log_data = {
-                "session": asdict(session),
+                "session": session_data,
                 "conversations": conversations
             }
             return json.dumps(log_data, indent=2, default=str)
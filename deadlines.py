@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Scadenze propagate lungo la pipeline di generazione.
+Un livello alto fissa quanto tempo ha a disposizione (ad esempio 20 minuti
+per generare una strategia); le fasi ricevono una quota del tempo rimasto
+e ogni chiamata LLM usa come timeout il minore tra la propria stima e il
+tempo residuo. La scadenza corrente viaggia in una ContextVar, quindi non
+va passata come parametro attraverso ogni funzione.
+"""
+
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+MIN_CALL_SECONDS = 5.0  # sotto questa soglia una chiamata LLM non ha senso
+
+
+class DeadlineExceeded(TimeoutError):
+    """Tempo della scadenza corrente esaurito prima di avviare un'operazione."""
+
+
+class Deadline:
+    """Istante limite, mai oltre quello della scadenza padre."""
+
+    def __init__(self, seconds: float, name: str = "pipeline", parent: Optional["Deadline"] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.clock = parent.clock if parent else clock
+        self.expires_at = self.clock() + max(0.0, seconds)
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def __repr__(self) -> str:
+        return f"Deadline({self.name!r}, remaining={self.remaining():.1f}s)"
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float], name: str = "pipeline") -> Iterator[Optional[Deadline]]:
+    """Nuova scadenza per il blocco; con seconds None resta quella corrente."""
+    if seconds is None:
+        yield _current.get()
+        return
+    deadline = Deadline(seconds, name, _current.get())
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def call_timeout(timeout: Optional[float], minimum: float = MIN_CALL_SECONDS) -> Optional[float]:
+    """
+    Timeout effettivo di una chiamata: il minore tra quello richiesto e il
+    tempo rimasto della scadenza corrente. Solleva DeadlineExceeded se il
+    tempo rimasto è sotto `minimum`.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline.remaining()
+    if remaining < minimum:
+        raise DeadlineExceeded(f"Scadenza '{deadline.name}' esaurita ({remaining:.1f}s rimasti)")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class StagePlan:
+    """
+    Ripartisce il tempo rimasto tra fasi in sequenza in proporzione ai pesi.
+
+    La quota di ogni fase si calcola quando la fase inizia, sul tempo
+    effettivamente rimasto: quello risparmiato da una fase veloce passa alle
+    successive, una fase lenta consuma solo la propria quota.
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = dict(weights)
+        self._started = set()
+
+    def share(self, name: str, remaining: float) -> float:
+        pending = sum(w for stage, w in self.weights.items() if stage not in self._started)
+        return remaining * self.weights[name] / pending if pending > 0 else remaining
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Optional[Deadline]]:
+        parent = _current.get()
+        if parent is None:
+            self._started.add(name)
+            yield None
+            return
+        seconds = self.share(name, parent.remaining())
+        self._started.add(name)
+        logger.debug(f"⏳ Fase {name}: {seconds:.0f}s su {parent.remaining():.0f}s rimasti")
+        with deadline_scope(seconds, name) as deadline:
+            yield deadline
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+Dry Run Host: paper trading di molte strategie in un solo processo.
+Un unico flusso di candele (riprodotto dallo store OHLCV locale di
+Freqtrade, con opzione di seguire gli aggiornamenti dei file) alimenta
+tutte le strategie registrate: ogni candela viene letta una volta e la
+finestra di dati viene costruita una volta per coppia, poi ciascuna
+strategia calcola i propri segnali e un conto simulato dedicato registra
+ingressi, uscite, stoploss e ROI. Niente processi freqtrade, config e DB
+separati per strategia.
+"""
+
+import os
+import json
+import gzip
+import heapq
+import logging
+import threading
+import importlib.util
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlite_pool import get_connection_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FEE = 0.0005
+MAX_STRATEGY_ERRORS = 5
+
+ENTRY_LONG_COLUMNS = ('enter_long', 'buy')
+EXIT_LONG_COLUMNS = ('exit_long', 'sell')
+
+
+@dataclass(frozen=True)
+class Candle:
+    """Candela OHLCV di una coppia (timestamp in millisecondi, apertura della candela)."""
+    pair: str
+    timestamp: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+TIMEFRAME_UNITS_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """Durata di un timeframe Freqtrade ("5m", "1h", "1d"...) in millisecondi."""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS_MS[timeframe[-1]]
+
+
+def ohlcv_filename(pair: str, timeframe: str, trading_mode: str = "futures") -> str:
+    """Nome del file OHLCV secondo la convenzione di Freqtrade (senza estensione)."""
+    base = pair.replace("/", "_").replace(":", "_")
+    return f"{base}-{timeframe}-futures" if trading_mode == "futures" else f"{base}-{timeframe}"
+
+
+def load_ohlcv_rows(path: str) -> List[List[float]]:
+    """Legge un file OHLCV Freqtrade (.json, .json.gz o .feather) come righe [ms, o, h, l, c, v]."""
+    if path.endswith(".feather"):
+        import pandas as pd
+        df = pd.read_feather(path)
+        dates = df['date'].astype('int64') // 1_000_000
+        return [[int(ts), *values] for ts, values in
+                zip(dates, df[['open', 'high', 'low', 'close', 'volume']].itertuples(index=False))]
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class OHLCVReplaySource:
+    """
+    Flusso di candele dallo store OHLCV locale, in ordine di tempo su tutte le coppie.
+
+    Con `follow=True`, esaurito lo storico, rilegge periodicamente i file
+    ed emette solo le candele nuove. `refresh`, se indicato, viene chiamato
+    con le coppie seguite prima di ogni lettura per aggiornare lo store
+    (es. `MarketDataSync.sync`). Le coppie si possono aggiungere a flusso
+    avviato con `add_pairs`.
+    """
+
+    EXTENSIONS = (".feather", ".json", ".json.gz")
+
+    def __init__(self, data_dir: str, pairs: List[str], timeframe: str = "5m", trading_mode: str = "futures",
+                 start_ms: Optional[int] = None, follow: bool = False, poll_interval: float = 60.0,
+                 refresh: Optional[Callable[[List[str]], Any]] = None):
+        self.data_dir = data_dir
+        self.pairs = list(pairs)
+        self.timeframe = timeframe
+        self.trading_mode = trading_mode
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.refresh = refresh
+        self._last_seen: Dict[str, int] = {pair: (start_ms or 0) - 1 for pair in self.pairs}
+        self._pairs_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add_pairs(self, pairs: Iterable[str], start_ms: Optional[int] = None) -> List[str]:
+        """Segue nuove coppie dalla candela `start_ms`; restituisce quelle effettivamente aggiunte."""
+        with self._pairs_lock:
+            added = [pair for pair in dict.fromkeys(pairs) if pair not in self._last_seen]
+            for pair in added:
+                self._last_seen[pair] = (start_ms or 0) - 1
+            self.pairs = self.pairs + added
+        return added
+
+    def find_file(self, pair: str) -> Optional[str]:
+        name = ohlcv_filename(pair, self.timeframe, self.trading_mode)
+        for directory in (os.path.join(self.data_dir, self.trading_mode), self.data_dir):
+            for extension in self.EXTENSIONS:
+                path = os.path.join(directory, name + extension)
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def _new_candles(self, pair: str) -> List[Candle]:
+        path = self.find_file(pair)
+        if path is None:
+            return []
+        try:
+            rows = load_ohlcv_rows(path)
+        except (OSError, ValueError, ImportError) as e:
+            logger.warning(f"⚠️ Dati OHLCV non leggibili per {pair}: {e}")
+            return []
+        last_seen = self._last_seen[pair]
+        candles = [Candle(pair, int(row[0]), *map(float, row[1:6])) for row in rows if int(row[0]) > last_seen]
+        if candles:
+            self._last_seen[pair] = candles[-1].timestamp
+        return candles
+
+    def poll(self) -> List[Candle]:
+        """Candele non ancora emesse per tutte le coppie, ordinate per timestamp."""
+        with self._pairs_lock:
+            pairs = list(self.pairs)
+        per_pair = [self._new_candles(pair) for pair in pairs]
+        return list(heapq.merge(*per_pair, key=lambda candle: candle.timestamp))
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh(self):
+        if self.refresh is None:
+            return
+        try:
+            with self._pairs_lock:
+                pairs = list(self.pairs)
+            self.refresh(pairs)
+        except Exception as e:
+            logger.warning(f"⚠️ Aggiornamento dati OHLCV fallito: {e}")
+
+    def __iter__(self) -> Iterator[Candle]:
+        while not self._stop.is_set():
+            self._refresh()
+            yield from self.poll()
+            if not self.follow:
+                return
+            self._stop.wait(self.poll_interval)
+
+
+@dataclass
+class SimulatedTrade:
+    """Trade simulato di una strategia."""
+    strategy_name: str
+    pair: str
+    is_short: bool
+    open_time: int
+    open_rate: float
+    amount: float
+    stake_amount: float
+    close_time: Optional[int] = None
+    close_rate: Optional[float] = None
+    exit_reason: Optional[str] = None
+    profit_abs: float = 0.0
+    profit_ratio: float = 0.0
+
+    def current_profit(self, rate: float) -> float:
+        change = (rate - self.open_rate) / self.open_rate
+        return -change if self.is_short else change
+
+
+@dataclass
+class StrategySignals:
+    enter_long: bool = False
+    exit_long: bool = False
+    enter_short: bool = False
+    exit_short: bool = False
+
+
+@dataclass
+class AccountStats:
+    """Statistiche cumulative del conto simulato, aggiornate a ogni trade chiuso."""
+    total_trades: int = 0
+    winning_trades: int = 0
+    total_profit: float = 0.0
+    consecutive_losses: int = 0
+    peak_balance: float = 0.0
+    max_drawdown: float = 0.0
+    current_drawdown: float = 0.0
+
+
+class PaperAccount:
+    """
+    Conto simulato di una strategia.
+
+    I segnali calcolati su una candela chiusa vengono eseguiti all'apertura
+    della candela successiva della stessa coppia; stoploss e ROI vengono
+    controllati sui massimi/minimi di ogni candela.
+    """
+
+    def __init__(self, strategy_name: str, wallet: float = 1000.0, stake_amount: float = 100.0,
+                 max_open_trades: int = 3, stoploss: float = -0.10,
+                 minimal_roi: Optional[Dict[Any, float]] = None, can_short: bool = False,
+                 fee: float = DEFAULT_FEE):
+        self.strategy_name = strategy_name
+        self.starting_balance = wallet
+        self.balance = wallet
+        self.stake_amount = stake_amount
+        self.max_open_trades = max_open_trades
+        self.stoploss = stoploss
+        self.minimal_roi = sorted(((int(k), float(v)) for k, v in (minimal_roi or {}).items()), reverse=True)
+        self.can_short = can_short
+        self.fee = fee
+        self.open_trades: Dict[str, SimulatedTrade] = {}
+        self.pending: Dict[str, str] = {}  # pair -> "enter_long" | "enter_short" | "exit"
+        self.stats = AccountStats(peak_balance=wallet)
+        self.last_prices: Dict[str, float] = {}
+
+    def _roi_target(self, minutes_open: float) -> Optional[float]:
+        for threshold, ratio in self.minimal_roi:
+            if minutes_open >= threshold:
+                return ratio
+        return None
+
+    def _open(self, candle: Candle, is_short: bool) -> Optional[SimulatedTrade]:
+        if len(self.open_trades) >= self.max_open_trades or self.balance < self.stake_amount:
+            return None
+        stake = self.stake_amount
+        self.balance -= stake
+        trade = SimulatedTrade(self.strategy_name, candle.pair, is_short, candle.timestamp, candle.open,
+                               amount=stake * (1 - self.fee) / candle.open, stake_amount=stake)
+        self.open_trades[candle.pair] = trade
+        return trade
+
+    def _close(self, trade: SimulatedTrade, timestamp: int, rate: float, reason: str) -> SimulatedTrade:
+        gross = trade.amount * rate
+        if trade.is_short:
+            gross = trade.stake_amount * (1 - self.fee) + trade.amount * (trade.open_rate - rate)
+        proceeds = gross * (1 - self.fee)
+        trade.close_time, trade.close_rate, trade.exit_reason = timestamp, rate, reason
+        trade.profit_abs = proceeds - trade.stake_amount
+        trade.profit_ratio = trade.profit_abs / trade.stake_amount
+        self.balance += proceeds
+        del self.open_trades[trade.pair]
+
+        stats = self.stats
+        stats.total_trades += 1
+        stats.total_profit += trade.profit_abs
+        if trade.profit_abs > 0:
+            stats.winning_trades += 1
+            stats.consecutive_losses = 0
+        else:
+            stats.consecutive_losses += 1
+        equity = self.starting_balance + stats.total_profit
+        stats.peak_balance = max(stats.peak_balance, equity)
+        stats.current_drawdown = (stats.peak_balance - equity) / stats.peak_balance if stats.peak_balance else 0.0
+        stats.max_drawdown = max(stats.max_drawdown, stats.current_drawdown)
+        return trade
+
+    def on_candle(self, candle: Candle, signals: Optional[StrategySignals]) -> List[SimulatedTrade]:
+        """Elabora una candela chiusa; restituisce i trade chiusi."""
+        closed = []
+        self.last_prices[candle.pair] = candle.close
+
+        # Ordini decisi sulla candela precedente: eseguiti all'apertura di questa
+        action = self.pending.pop(candle.pair, None)
+        trade = self.open_trades.get(candle.pair)
+        if action == "exit" and trade is not None:
+            closed.append(self._close(trade, candle.timestamp, candle.open, "exit_signal"))
+            trade = None
+        elif action in ("enter_long", "enter_short") and trade is None:
+            trade = self._open(candle, is_short=action == "enter_short")
+
+        if trade is not None:
+            worst = candle.high if trade.is_short else candle.low
+            stop_rate = trade.open_rate * (1 - self.stoploss) if trade.is_short else trade.open_rate * (1 + self.stoploss)
+            if trade.current_profit(worst) <= self.stoploss:
+                closed.append(self._close(trade, candle.timestamp, stop_rate, "stop_loss"))
+                trade = None
+            else:
+                target = self._roi_target((candle.timestamp - trade.open_time) / 60000)
+                if target is not None and trade.current_profit(candle.close) >= target:
+                    closed.append(self._close(trade, candle.timestamp, candle.close, "roi"))
+                    trade = None
+
+        if signals is not None:
+            if trade is not None:
+                if (signals.exit_short if trade.is_short else signals.exit_long):
+                    self.pending[candle.pair] = "exit"
+            elif signals.enter_long:
+                self.pending[candle.pair] = "enter_long"
+            elif signals.enter_short and self.can_short:
+                self.pending[candle.pair] = "enter_short"
+        return closed
+
+    def summary(self) -> Dict[str, Any]:
+        stats = self.stats
+        open_value = sum(t.stake_amount * (1 + t.current_profit(self.last_prices.get(t.pair, t.open_rate)))
+                         for t in self.open_trades.values())
+        return {
+            "strategy_name": self.strategy_name,
+            "balance": self.balance,
+            "equity": self.balance + open_value,
+            "total_return": stats.total_profit / self.starting_balance if self.starting_balance else 0.0,
+            "total_profit": stats.total_profit,
+            "total_trades": stats.total_trades,
+            "win_rate": stats.winning_trades / stats.total_trades if stats.total_trades else 0.0,
+            "max_drawdown": stats.max_drawdown,
+            "current_drawdown": stats.current_drawdown,
+            "consecutive_losses": stats.consecutive_losses,
+            "open_trades": len(self.open_trades),
+        }
+
+
+def _last_flag(frame, columns: Tuple[str, ...]) -> bool:
+    for column in columns:
+        if column in frame.columns:
+            value = frame[column].iloc[-1]
+            if value == value and value:  # esclude NaN
+                return True
+    return False
+
+
+class IStrategyRunner:
+    """Calcola i segnali di una strategia Freqtrade (IStrategy) sulla finestra condivisa."""
+
+    def __init__(self, strategy: Any):
+        self.strategy = strategy
+
+    @classmethod
+    def from_file(cls, path: str, class_name: Optional[str] = None) -> "IStrategyRunner":
+        """Importa la strategia dal file e la istanzia con una configurazione dry-run minima."""
+        module_name = f"_dry_run_host_{os.path.splitext(os.path.basename(path))[0]}"
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        strategy_class = getattr(module, class_name, None) if class_name else None
+        if strategy_class is None:
+            strategy_class = next((value for value in vars(module).values()
+                                   if isinstance(value, type) and value.__module__ == module_name
+                                   and hasattr(value, 'populate_indicators')), None)
+        if strategy_class is None:
+            raise ValueError(f"Nessuna classe IStrategy in {path}")
+        config = {'dry_run': True, 'stake_currency': 'USDT', 'runmode': 'dry_run',
+                  'timeframe': getattr(strategy_class, 'timeframe', '5m')}
+        return cls(strategy_class(config))
+
+    @property
+    def stoploss(self) -> float:
+        return float(getattr(self.strategy, 'stoploss', -0.10))
+
+    @property
+    def minimal_roi(self) -> Dict[Any, float]:
+        return dict(getattr(self.strategy, 'minimal_roi', {}) or {})
+
+    @property
+    def can_short(self) -> bool:
+        return bool(getattr(self.strategy, 'can_short', False))
+
+    @property
+    def startup_candle_count(self) -> int:
+        return int(getattr(self.strategy, 'startup_candle_count', 0) or 0)
+
+    def signals(self, pair: str, frame) -> StrategySignals:
+        metadata = {'pair': pair}
+        dataframe = self.strategy.populate_indicators(frame.copy(), metadata)
+        entry = getattr(self.strategy, 'populate_entry_trend', None) or self.strategy.populate_buy_trend
+        exit_ = getattr(self.strategy, 'populate_exit_trend', None) or self.strategy.populate_sell_trend
+        dataframe = exit_(entry(dataframe, metadata), metadata)
+        return StrategySignals(
+            enter_long=_last_flag(dataframe, ENTRY_LONG_COLUMNS),
+            exit_long=_last_flag(dataframe, EXIT_LONG_COLUMNS),
+            enter_short=_last_flag(dataframe, ('enter_short',)),
+            exit_short=_last_flag(dataframe, ('exit_short',)),
+        )
+
+
+def pandas_frame(window: Iterable[Candle]):
+    """Finestra di candele come DataFrame Freqtrade (date, open, high, low, close, volume)."""
+    import pandas as pd
+    candles = list(window)
+    frame = pd.DataFrame({
+        'date': pd.to_datetime([c.timestamp for c in candles], unit='ms', utc=True),
+        'open': [c.open for c in candles],
+        'high': [c.high for c in candles],
+        'low': [c.low for c in candles],
+        'close': [c.close for c in candles],
+        'volume': [c.volume for c in candles],
+    })
+    return frame
+
+
+@dataclass
+class _HostedStrategy:
+    runner: Any
+    account: PaperAccount
+    pairs: Optional[set] = None
+    errors: int = 0
+    status: str = "running"  # "running", "failed"
+    candles_processed: int = 0
+    last_error: Optional[str] = None
+
+
+class DryRunHost:
+    """
+    Ospita molte strategie sullo stesso flusso di candele.
+
+    Per ogni candela la finestra della coppia viene costruita una sola volta
+    (`frame_builder`, di default un DataFrame pandas) e condivisa da tutte le
+    strategie: ogni strategia ne riceve una copia tramite il proprio runner.
+    I trade chiusi vengono salvati nella tabella `host_trades` di `db_path`.
+
+    Le candele con timestamp precedente a `trade_from_ms` (o al valore in
+    `pair_trade_from_ms` per le coppie aggiunte dopo l'avvio) servono solo a
+    riempire le finestre (warm-up): nessun segnale e nessun ordine simulato.
+    """
+
+    def __init__(self, db_path: str = "dry_run.db", window: int = 300,
+                 frame_builder: Optional[Callable[[Iterable[Candle]], Any]] = None, fee: float = DEFAULT_FEE):
+        self.db_path = db_path
+        self.window = window
+        self.frame_builder = frame_builder or pandas_frame
+        self.fee = fee
+        self.strategies: Dict[str, _HostedStrategy] = {}
+        self.windows: Dict[str, Deque[Candle]] = {}
+        self.candles_processed = 0
+        self.last_candle: Optional[Candle] = None
+        self.trade_from_ms: Optional[int] = None
+        self.pair_trade_from_ms: Dict[str, int] = {}
+        self.warmup_candles = 0
+        self.source: Optional[OHLCVReplaySource] = None
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._trade_listeners: List[Callable[[SimulatedTrade], None]] = []
+        self._init_database()
+
+    def _init_database(self):
+        self.db = get_connection_manager(self.db_path)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS host_trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                strategy_name TEXT NOT NULL,
+                pair TEXT NOT NULL,
+                is_short INTEGER NOT NULL,
+                open_time INTEGER NOT NULL,
+                close_time INTEGER NOT NULL,
+                open_rate REAL NOT NULL,
+                close_rate REAL NOT NULL,
+                amount REAL NOT NULL,
+                stake_amount REAL NOT NULL,
+                profit_abs REAL NOT NULL,
+                profit_ratio REAL NOT NULL,
+                exit_reason TEXT
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS idx_host_trades_strategy ON host_trades(strategy_name, close_time)')
+
+    def _save_trades(self, trades: List[SimulatedTrade]):
+        if not trades:
+            return
+        self.db.executemany('''
+            INSERT INTO host_trades (strategy_name, pair, is_short, open_time, close_time, open_rate, close_rate,
+                                     amount, stake_amount, profit_abs, profit_ratio, exit_reason)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(t.strategy_name, t.pair, int(t.is_short), t.open_time, t.close_time, t.open_rate, t.close_rate,
+               t.amount, t.stake_amount, t.profit_abs, t.profit_ratio, t.exit_reason) for t in trades])
+
+    def add_trade_listener(self, listener: Callable[[SimulatedTrade], None]):
+        """Registra una callback chiamata per ogni trade chiuso."""
+        self._trade_listeners.append(listener)
+
+    # -- strategie ---------------------------------------------------------
+
+    def add_strategy(self, strategy_name: str, runner: Any, wallet: float = 1000.0, stake_amount: float = 100.0,
+                     max_open_trades: int = 3, pairs: Optional[List[str]] = None):
+        """Registra una strategia; stoploss, ROI e short vengono letti dal runner."""
+        account = PaperAccount(
+            strategy_name, wallet=wallet, stake_amount=stake_amount, max_open_trades=max_open_trades,
+            stoploss=getattr(runner, 'stoploss', -0.10), minimal_roi=getattr(runner, 'minimal_roi', None),
+            can_short=getattr(runner, 'can_short', False), fee=self.fee,
+        )
+        with self._lock:
+            self.strategies[strategy_name] = _HostedStrategy(runner, account, set(pairs) if pairs else None)
+        logger.info(f"🧪 Strategia {strategy_name} aggiunta al dry-run host ({len(self.strategies)} attive)")
+
+    def remove_strategy(self, strategy_name: str) -> Optional[Dict[str, Any]]:
+        """Rimuove una strategia e restituisce il riepilogo del suo conto."""
+        with self._lock:
+            hosted = self.strategies.pop(strategy_name, None)
+        return self._summary(strategy_name, hosted) if hosted else None
+
+    def _summary(self, strategy_name: str, hosted: _HostedStrategy) -> Dict[str, Any]:
+        summary = hosted.account.summary()
+        summary.update(status=hosted.status, errors=hosted.errors, last_error=hosted.last_error,
+                       candles_processed=hosted.candles_processed)
+        return summary
+
+    def get_summary(self, strategy_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            hosted = self.strategies.get(strategy_name)
+            return self._summary(strategy_name, hosted) if hosted else None
+
+    def get_all_summaries(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: self._summary(name, hosted) for name, hosted in self.strategies.items()}
+
+    # -- flusso di candele -------------------------------------------------
+
+    def process_candle(self, candle: Candle) -> List[SimulatedTrade]:
+        """Distribuisce una candela chiusa a tutte le strategie che seguono la coppia."""
+        window = self.windows.setdefault(candle.pair, deque(maxlen=self.window))
+        window.append(candle)
+        self.candles_processed += 1
+        self.last_candle = candle
+        trade_from_ms = self.pair_trade_from_ms.get(candle.pair, self.trade_from_ms)
+        if trade_from_ms is not None and candle.timestamp < trade_from_ms:
+            self.warmup_candles += 1
+            return []
+
+        with self._lock:
+            hosted_items = [(name, hosted) for name, hosted in self.strategies.items()
+                            if hosted.pairs is None or candle.pair in hosted.pairs]
+        if not hosted_items:
+            return []
+
+        frame = None
+        closed: List[SimulatedTrade] = []
+        for name, hosted in hosted_items:
+            signals = None
+            if hosted.status == "running":
+                startup = getattr(hosted.runner, 'startup_candle_count', 0)
+                if len(window) > startup:
+                    if frame is None:
+                        frame = self.frame_builder(window)
+                    try:
+                        signals = hosted.runner.signals(candle.pair, frame)
+                        hosted.errors = 0
+                    except Exception as e:
+                        hosted.errors += 1
+                        hosted.last_error = f"{type(e).__name__}: {e}"
+                        logger.warning(f"⚠️ Errore nei segnali di {name} su {candle.pair}: {hosted.last_error}")
+                        if hosted.errors >= MAX_STRATEGY_ERRORS:
+                            hosted.status = "failed"
+                            logger.error(f"❌ {name} disattivata dopo {hosted.errors} errori consecutivi")
+            hosted.candles_processed += 1
+            closed.extend(hosted.account.on_candle(candle, signals))
+
+        self._save_trades(closed)
+        for trade in closed:
+            for listener in self._trade_listeners:
+                try:
+                    listener(trade)
+                except Exception as e:
+                    logger.error(f"❌ Errore nel listener dei trade: {e}")
+        return closed
+
+    def run(self, source: Iterable[Candle]) -> int:
+        """Consuma il flusso di candele (bloccante); restituisce le candele elaborate."""
+        processed = 0
+        for candle in source:
+            self.process_candle(candle)
+            processed += 1
+        return processed
+
+    def start(self, source: OHLCVReplaySource):
+        """Avvia il consumo del flusso in un thread daemon."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.source = source
+        self._thread = threading.Thread(target=self.run, args=(source,), daemon=True, name="dry-run-host")
+        self._thread.start()
+        logger.info(f"✅ Dry-run host avviato su {len(source.pairs)} coppie ({source.timeframe})")
+
+    def stop(self, timeout: float = 5.0):
+        if self.source is not None:
+            self.source.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        logger.info("🛑 Dry-run host fermato")
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
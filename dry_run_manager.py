@@ -10,14 +10,70 @@ import sqlite3
 import logging
 import subprocess
 import time
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import queue
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 import threading
 import signal
 
+from pipeline_metrics import DRY_RUN_PNL
+from dry_run_host import DryRunHost, IStrategyRunner, OHLCVReplaySource, SimulatedTrade, timeframe_to_ms
+from market_data_sync import CCXT_AVAILABLE, CCXTFeed, MarketDataSync
+from dry_run_metrics import ClosedTrade, IncrementalPerformance, parse_close_time, read_freqtrade_trades_since
+from sqlite_pool import SQLiteConnectionManager, get_connection_manager
+
 logger = logging.getLogger(__name__)
 
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dry_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    strategy_name TEXT NOT NULL,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP,
+    status TEXT DEFAULT 'running',
+    config TEXT NOT NULL,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_dry_runs_strategy_status ON dry_runs(strategy_name, status);
+
+CREATE TABLE IF NOT EXISTS daily_metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    strategy_name TEXT NOT NULL,
+    date DATE NOT NULL,
+    total_return REAL,
+    sharpe_ratio REAL,
+    max_drawdown REAL,
+    win_rate REAL,
+    total_trades INTEGER,
+    consecutive_losses INTEGER,
+    daily_return REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_metrics_strategy_date ON daily_metrics(strategy_name, date);
+'''
+
+# Statement costanti: compilati una volta per connessione e riusati dalla cache di sqlite3
+INSERT_DRY_RUN_SQL = '''
+    INSERT INTO dry_runs (strategy_name, start_time, config)
+    VALUES (?, ?, ?)
+'''
+UPDATE_DRY_RUN_STATUS_SQL = '''
+    UPDATE dry_runs
+    SET end_time = ?, status = ?, results = ?
+    WHERE strategy_name = ? AND status = 'running'
+'''
+UPSERT_DAILY_METRICS_SQL = '''
+    INSERT OR REPLACE INTO daily_metrics (strategy_name, date, total_return, sharpe_ratio, max_drawdown,
+                                          win_rate, total_trades, consecutive_losses, daily_return)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SELECT_COMPLETED_SQL = '''
+    SELECT strategy_name, start_time, end_time, results
+    FROM dry_runs
+    WHERE status = 'completed'
+    ORDER BY end_time DESC
+'''
+
 @dataclass
 class DryRunConfig:
     """Configurazione per il dry run."""
@@ -59,12 +115,32 @@ class DryRunManager:
     Gestisce il dry run delle strategie ottimizzate.
     """
     
-    def __init__(self, db_path: str = "dry_run.db"):
+    def __init__(self, db_path: str = "dry_run.db", mode: str = "freqtrade",
+                 host_settings: Optional[Dict[str, Any]] = None, risk_poll_interval: float = 5.0):
         self.db_path = db_path
+        # "freqtrade": un processo freqtrade per strategia; "shared": tutte nel DryRunHost
+        self.mode = mode
+        self.host_settings = host_settings or {}
+        self.host: Optional[DryRunHost] = None
         self.active_runs: Dict[str, DryRunConfig] = {}
+        # Modalità effettiva di ogni run: senza feed live un run "shared" parte come processo freqtrade
+        self.run_modes: Dict[str, str] = {}
         self.performance_metrics: Dict[str, PerformanceMetrics] = {}
+        # Stato incrementale per strategia: ogni aggiornamento legge solo i trade nuovi
+        self.performance_state: Dict[str, IncrementalPerformance] = {}
+        self._state_lock = threading.Lock()
+        # Metriche giornaliere in attesa di scrittura (una riga per strategia e giorno)
+        self._pending_daily_metrics: Dict[Tuple[str, str], Tuple] = {}
+        # Connessioni in sola lettura ai database Freqtrade, riusate tra un controllo e l'altro
+        self._freqtrade_connections: Dict[str, SQLiteConnectionManager] = {}
         self.monitoring_thread = None
         self.is_monitoring = False
+        self._stop_event = threading.Event()
+        self.monitor_interval = 300
+        # Controllo rischi guidato da eventi: trade chiusi nell'host e commit nei database Freqtrade
+        self.risk_poll_interval = risk_poll_interval
+        self._risk_events: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._db_versions: Dict[str, int] = {}
         
         # Inizializza database
         self._init_database()
@@ -79,41 +155,9 @@ class DryRunManager:
         }
     
     def _init_database(self):
-        """Inizializza il database per il dry run."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabella per i dry run
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS dry_runs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                strategy_name TEXT NOT NULL,
-                start_time TIMESTAMP NOT NULL,
-                end_time TIMESTAMP,
-                status TEXT DEFAULT 'running',
-                config TEXT NOT NULL,
-                results TEXT
-            )
-        ''')
-        
-        # Tabella per le metriche giornaliere
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS daily_metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                strategy_name TEXT NOT NULL,
-                date DATE NOT NULL,
-                total_return REAL,
-                sharpe_ratio REAL,
-                max_drawdown REAL,
-                win_rate REAL,
-                total_trades INTEGER,
-                consecutive_losses INTEGER,
-                daily_return REAL
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Inizializza il database per il dry run (WAL, connessioni persistenti)."""
+        self.db = get_connection_manager(self.db_path)
+        self.db.executescript(SCHEMA)
     
     def start_dry_run(self, strategy_name: str, config: Optional[DryRunConfig] = None) -> bool:
         """
@@ -129,6 +173,11 @@ class DryRunManager:
                 logger.error(f"❌ Strategia {strategy_name} non trovata")
                 return False
             
+            if self.mode == "shared":
+                if self._host_has_live_feed():
+                    return self._start_hosted_dry_run(strategy_name, strategy_file, config)
+                logger.warning("⚠️ Nessun feed live per il dry-run host (ccxt non installato): uso freqtrade")
+            
             # Crea configurazione Freqtrade per dry run
             freqtrade_config = self._create_freqtrade_config(config)
             config_file = f"config_dry_run_{strategy_name}.json"
@@ -157,10 +206,12 @@ class DryRunManager:
             
             # Salva configurazione
             self.active_runs[strategy_name] = config
+            self.run_modes[strategy_name] = "freqtrade"
             self.performance_metrics[strategy_name] = PerformanceMetrics(
                 strategy_name=strategy_name,
                 start_time=datetime.now()
             )
+            self.performance_state[strategy_name] = IncrementalPerformance(wallet=freqtrade_config["dry_run_wallet"])
             
             # Salva nel database
             self._save_dry_run_to_db(strategy_name, config, process.pid)
@@ -172,6 +223,99 @@ class DryRunManager:
             logger.error(f"❌ Errore nell'avvio dry run per {strategy_name}: {e}")
             return False
     
+    def _is_hosted(self, strategy_name: str) -> bool:
+        """True se il run gira nel DryRunHost, False se è un processo freqtrade."""
+        return self.run_modes.get(strategy_name, self.mode) == "shared"
+    
+    def _host_has_live_feed(self) -> bool:
+        """In follow l'host ha bisogno di un feed che aggiorni lo store OHLCV."""
+        return CCXT_AVAILABLE or not self.host_settings.get('follow', True)
+    
+    def _live_data_refresh(self, timeframe: str):
+        """Sync incrementale delle coppie seguite, eseguita prima di ogni lettura dello store."""
+        settings = self.host_settings
+        syncer = MarketDataSync(
+            settings.get('data_dir', 'user_data/data/binance'),
+            CCXTFeed(settings.get('exchange', 'binance'), trading_mode='futures'),
+            timeframe=timeframe,
+            trading_mode='futures'
+        )
+        step = timeframe_to_ms(timeframe)
+        
+        def refresh(pairs: List[str]):
+            now_ms = int(time.time() * 1000)
+            end_ms = now_ms - now_ms % step  # solo candele chiuse
+            syncer.sync(pairs, end_ms - self.host.window * step, end_ms)
+        
+        return refresh
+    
+    def _ensure_host_running(self, pairs: List[str]):
+        """
+        Avvia il flusso di candele dello store OHLCV, o vi aggiunge le coppie
+        non ancora seguite: l'host segue l'unione delle coppie dei run attivi.
+        """
+        settings = self.host_settings
+        timeframe = settings.get('timeframe', '5m')
+        follow = settings.get('follow', True)
+        step = timeframe_to_ms(timeframe)
+        now_ms = int(time.time() * 1000)
+        # Senza un punto di partenza esplicito riparte dalla finestra di warm-up più recente
+        start_ms = settings.get('start_ms')
+        if start_ms is None:
+            start_ms = now_ms - self.host.window * step
+        # Lo storico riempie solo le finestre: si opera dalla prima candela chiusa dopo l'avvio
+        trade_from_ms = now_ms - step + 1
+        
+        if self.host.is_running:
+            added = self.host.source.add_pairs(pairs, start_ms)
+            if follow:
+                for pair in added:
+                    self.host.pair_trade_from_ms[pair] = trade_from_ms
+            if added:
+                logger.info(f"➕ Dry-run host: nuove coppie seguite {', '.join(added)}")
+            return
+        
+        if follow:
+            self.host.trade_from_ms = trade_from_ms
+        source = OHLCVReplaySource(
+            settings.get('data_dir', 'user_data/data/binance'),
+            sorted({pair for name, config in self.active_runs.items() if self._is_hosted(name)
+                    for pair in config.pairs} | set(pairs)),
+            timeframe=timeframe,
+            start_ms=start_ms,
+            follow=follow,
+            poll_interval=settings.get('poll_interval', 60.0),
+            refresh=self._live_data_refresh(timeframe) if follow and CCXT_AVAILABLE else None
+        )
+        self.host.start(source)
+    
+    def _start_hosted_dry_run(self, strategy_name: str, strategy_file: str, config: DryRunConfig) -> bool:
+        """Aggiunge la strategia al DryRunHost invece di avviare un processo freqtrade."""
+        runner = IStrategyRunner.from_file(strategy_file, class_name=strategy_name)
+        if self.host is None:
+            self.host = DryRunHost(self.db_path, window=self.host_settings.get('window', 300))
+            self.host.add_trade_listener(self._on_host_trade)
+        self.host.add_strategy(
+            strategy_name, runner,
+            wallet=self.host_settings.get('wallet', 1000.0),
+            stake_amount=config.stake_amount,
+            max_open_trades=config.max_open_trades,
+            pairs=config.pairs
+        )
+        self._ensure_host_running(config.pairs)
+        
+        self.active_runs[strategy_name] = config
+        self.run_modes[strategy_name] = "shared"
+        self.performance_metrics[strategy_name] = PerformanceMetrics(
+            strategy_name=strategy_name,
+            start_time=datetime.now()
+        )
+        self.performance_state[strategy_name] = IncrementalPerformance(wallet=self.host_settings.get('wallet', 1000.0))
+        self._save_dry_run_to_db(strategy_name, config, os.getpid())
+        
+        logger.info(f"✅ Dry run avviato per {strategy_name} nel dry-run host ({len(self.host.strategies)} strategie)")
+        return True
+    
     def _create_freqtrade_config(self, config: DryRunConfig) -> Dict[str, Any]:
         """Crea configurazione Freqtrade per dry run."""
         base_config = {
@@ -249,16 +393,7 @@ class DryRunManager:
     
     def _save_dry_run_to_db(self, strategy_name: str, config: DryRunConfig, pid: int):
         """Salva informazioni del dry run nel database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO dry_runs (strategy_name, start_time, config)
-            VALUES (?, ?, ?)
-        ''', (strategy_name, datetime.now(), json.dumps(config.__dict__)))
-        
-        conn.commit()
-        conn.close()
+        self.db.execute(INSERT_DRY_RUN_SQL, (strategy_name, datetime.now(), json.dumps(config.__dict__)))
     
     def stop_dry_run(self, strategy_name: str) -> bool:
         """
@@ -269,20 +404,34 @@ class DryRunManager:
                 logger.warning(f"⚠️ Dry run {strategy_name} non attivo")
                 return False
             
-            # Ferma processo Freqtrade
-            cmd = f"pkill -f 'freqtrade.*{strategy_name}'"
-            subprocess.run(cmd, shell=True)
+            if self._is_hosted(strategy_name):
+                # Metriche finali dal conto simulato, poi rimozione dall'host
+                self._update_performance_metrics(strategy_name)
+                if self.host:
+                    self.host.remove_strategy(strategy_name)
+            else:
+                # Ferma processo Freqtrade
+                cmd = f"pkill -f 'freqtrade.*{strategy_name}'"
+                subprocess.run(cmd, shell=True)
             
             # Genera report finale
             report = self.generate_report(strategy_name)
+            self.flush_daily_metrics()
             
             # Aggiorna database
-            self._update_dry_run_status(strategy_name, "completed", report)
+            self._update_dry_run_status(strategy_name, "completed", json.dumps(report))
             
             # Rimuovi da attivi
             del self.active_runs[strategy_name]
+            self.run_modes.pop(strategy_name, None)
             if strategy_name in self.performance_metrics:
                 del self.performance_metrics[strategy_name]
+            with self._state_lock:
+                self.performance_state.pop(strategy_name, None)
+            connections = self._freqtrade_connections.pop(strategy_name, None)
+            if connections:
+                connections.close()
+            self._db_versions.pop(strategy_name, None)
             
             logger.info(f"✅ Dry run fermato per {strategy_name}")
             return True
@@ -293,69 +442,155 @@ class DryRunManager:
     
     def _update_dry_run_status(self, strategy_name: str, status: str, results: str = None):
         """Aggiorna status del dry run nel database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE dry_runs 
-            SET end_time = ?, status = ?, results = ?
-            WHERE strategy_name = ? AND status = 'running'
-        ''', (datetime.now(), status, results, strategy_name))
-        
-        conn.commit()
-        conn.close()
+        self.db.execute(UPDATE_DRY_RUN_STATUS_SQL, (datetime.now(), status, results, strategy_name))
     
     def monitor_performance(self):
         """
         Monitora performance dei dry run attivi.
+        
+        I limiti di rischio vengono controllati appena arriva un evento (trade
+        chiuso nel DryRunHost o nuovo commit nel database Freqtrade), entro
+        risk_poll_interval secondi; ogni monitor_interval si fa comunque un
+        giro completo e si salvano le metriche giornaliere.
         """
+        next_sweep = time.monotonic()
         while self.is_monitoring:
             try:
-                for strategy_name in list(self.active_runs.keys()):
-                    self._update_performance_metrics(strategy_name)
-                    self._check_risk_limits(strategy_name)
+                changed = self._wait_risk_events(self.risk_poll_interval)
+                changed.update(self._changed_freqtrade_dbs())
+                
+                sweep = time.monotonic() >= next_sweep
+                if sweep:
+                    changed.update(self.active_runs.keys())
+                    next_sweep = time.monotonic() + self.monitor_interval
                 
-                time.sleep(300)  # Controlla ogni 5 minuti
+                for strategy_name in changed:
+                    if strategy_name in self.active_runs:
+                        self._update_performance_metrics(strategy_name)
+                        self._check_risk_limits(strategy_name)
+                
+                if sweep:
+                    # Un'unica transazione per tutte le strategie del giro
+                    self.flush_daily_metrics()
                 
             except Exception as e:
                 logger.error(f"❌ Errore nel monitoraggio: {e}")
-                time.sleep(60)
+                self._stop_event.wait(60)
     
-    def _update_performance_metrics(self, strategy_name: str):
-        """Aggiorna metriche di performance per una strategia."""
+    def _wait_risk_events(self, timeout: float) -> set:
+        """Attende il primo evento (fino a timeout) e svuota la coda: strategie da ricontrollare."""
+        changed = set()
         try:
-            # Leggi metriche da database Freqtrade
+            event = self._risk_events.get(timeout=timeout)
+            while True:
+                if event is not None:
+                    changed.add(event)
+                event = self._risk_events.get_nowait()
+        except queue.Empty:
+            pass
+        return changed
+    
+    def _changed_freqtrade_dbs(self) -> List[str]:
+        """Strategie il cui database Freqtrade ha ricevuto commit dall'ultimo controllo (PRAGMA data_version)."""
+        changed = []
+        for strategy_name in list(self.active_runs.keys()):
+            if self._is_hosted(strategy_name):
+                continue
+            connections = self._freqtrade_db(strategy_name)
+            if connections is None:
+                continue
+            try:
+                version = connections.query("PRAGMA data_version")[0][0]
+            except sqlite3.Error as e:
+                logger.debug(f"data_version non disponibile per {strategy_name}: {e}")
+                continue
+            if self._db_versions.get(strategy_name) != version:
+                self._db_versions[strategy_name] = version
+                changed.append(strategy_name)
+        return changed
+    
+    def _queue_daily_metrics(self, metrics: PerformanceMetrics):
+        """Accoda lo snapshot giornaliero; la scrittura avviene a lotti in flush_daily_metrics."""
+        today = datetime.now().date().isoformat()
+        row = (metrics.strategy_name, today, metrics.total_return, metrics.sharpe_ratio, metrics.max_drawdown,
+               metrics.win_rate, metrics.total_trades, metrics.consecutive_losses, metrics.daily_return)
+        with self._state_lock:
+            self._pending_daily_metrics[(metrics.strategy_name, today)] = row
+    
+    def flush_daily_metrics(self) -> int:
+        """Scrive le metriche giornaliere accodate con un solo executemany."""
+        with self._state_lock:
+            rows = list(self._pending_daily_metrics.values())
+            self._pending_daily_metrics.clear()
+        try:
+            return self.db.executemany(UPSERT_DAILY_METRICS_SQL, rows)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Errore nel salvataggio metriche giornaliere: {e}")
+            return 0
+    
+    def _freqtrade_db(self, strategy_name: str) -> Optional[SQLiteConnectionManager]:
+        """Connessione in sola lettura al database Freqtrade della strategia, se esiste."""
+        connections = self._freqtrade_connections.get(strategy_name)
+        if connections is None:
             db_path = f"dry_run_{strategy_name}.db"
             if not os.path.exists(db_path):
-                return
-            
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Calcola metriche
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_trades,
-                    SUM(CASE WHEN profit > 0 THEN 1 ELSE 0 END) as winning_trades,
-                    SUM(profit) as total_profit,
-                    MAX(profit) as max_profit,
-                    MIN(profit) as max_loss
-                FROM trades 
-                WHERE strategy = ?
-            ''', (strategy_name,))
-            
-            result = cursor.fetchone()
-            if result:
-                total_trades, winning_trades, total_profit, max_profit, max_loss = result
-                
-                if strategy_name in self.performance_metrics:
-                    metrics = self.performance_metrics[strategy_name]
-                    metrics.total_trades = total_trades or 0
-                    metrics.win_rate = (winning_trades / total_trades) if total_trades > 0 else 0
-                    metrics.total_return = total_profit or 0
-                    metrics.max_drawdown = abs(max_loss) if max_loss else 0
+                return None
+            connections = SQLiteConnectionManager(db_path, readonly=True)
+            self._freqtrade_connections[strategy_name] = connections
+        return connections
+    
+    def _on_host_trade(self, trade: SimulatedTrade):
+        """Trade chiuso nel DryRunHost: aggiorna subito lo stato incrementale della strategia."""
+        closed = ClosedTrade(
+            trade_id=f"{trade.pair}@{trade.open_time}",
+            close_time=parse_close_time(trade.close_time),
+            profit_abs=trade.profit_abs,
+            profit_ratio=trade.profit_ratio
+        )
+        with self._state_lock:
+            state = self.performance_state.get(trade.strategy_name)
+            if state is not None:
+                state.add_trade(closed)
+        if state is not None:
+            # Il controllo rischi avviene nel thread di monitoraggio, non dentro il ciclo dell'host
+            self._risk_events.put(trade.strategy_name)
+    
+    def _update_performance_metrics(self, strategy_name: str):
+        """Aggiorna metriche di performance per una strategia (solo i trade chiusi dall'ultimo aggiornamento)."""
+        state = self.performance_state.get(strategy_name)
+        metrics = self.performance_metrics.get(strategy_name)
+        if state is None or metrics is None:
+            return
+        try:
+            if self._is_hosted(strategy_name):
+                # I trade arrivano già in push dal DryRunHost (_on_host_trade)
+                summary = self.host.get_summary(strategy_name) if self.host else None
+                if summary and summary['status'] == 'failed':
+                    metrics.status = 'failed'
+            else:
+                # Trade chiusi nel database Freqtrade dopo il watermark
+                connections = self._freqtrade_db(strategy_name)
+                if connections is not None:
+                    new_trades = read_freqtrade_trades_since(connections.db_path, strategy_name,
+                                                             state.watermark, connections=connections)
+                    with self._state_lock:
+                        state.add_trades(new_trades)
             
-            conn.close()
+            # Il giorno avanza col calendario, tranne per l'host in replay di dati storici
+            live_clock = not self._is_hosted(strategy_name) or self.host_settings.get('follow', True)
+            as_of = datetime.now(timezone.utc).date() if live_clock else None
+            with self._state_lock:
+                snapshot = state.snapshot(as_of=as_of)
+            metrics.total_trades = snapshot['total_trades']
+            metrics.win_rate = snapshot['win_rate']
+            metrics.total_return = snapshot['total_return']
+            metrics.sharpe_ratio = snapshot['sharpe_ratio']
+            metrics.max_drawdown = snapshot['max_drawdown']
+            metrics.current_drawdown = snapshot['current_drawdown']
+            metrics.consecutive_losses = snapshot['consecutive_losses']
+            metrics.daily_return = snapshot['daily_return']
+            DRY_RUN_PNL.labels(strategy=strategy_name).set(snapshot['total_profit'])
+            self._queue_daily_metrics(metrics)
             
         except Exception as e:
             logger.error(f"❌ Errore nell'aggiornamento metriche {strategy_name}: {e}")
@@ -385,11 +620,19 @@ class DryRunManager:
             logger.warning(f"🚨 Win rate troppo basso per {strategy_name}: {metrics.win_rate:.2%}")
             self.stop_dry_run(strategy_name)
             return
+        
+        # Controlla perdita giornaliera
+        max_daily_loss = config.risk_limits.get("max_daily_loss")
+        if max_daily_loss is not None and metrics.daily_return < -max_daily_loss:
+            logger.warning(f"🚨 Perdita giornaliera oltre il limite per {strategy_name}: {metrics.daily_return:.2%}")
+            self.stop_dry_run(strategy_name)
+            return
     
     def start_monitoring(self):
         """Avvia il monitoraggio in background."""
         if self.monitoring_thread is None or not self.monitoring_thread.is_alive():
             self.is_monitoring = True
+            self._stop_event.clear()
             self.monitoring_thread = threading.Thread(target=self.monitor_performance, daemon=True)
             self.monitoring_thread.start()
             logger.info("✅ Monitoraggio dry run avviato")
@@ -397,8 +640,13 @@ class DryRunManager:
     def stop_monitoring(self):
         """Ferma il monitoraggio."""
         self.is_monitoring = False
+        self._stop_event.set()
+        self._risk_events.put(None)
         if self.monitoring_thread:
             self.monitoring_thread.join(timeout=5)
+        if self.host:
+            self.host.stop()
+        self.flush_daily_metrics()
         logger.info("🛑 Monitoraggio dry run fermato")
     
     def get_status(self) -> Dict[str, Any]:
@@ -406,8 +654,15 @@ class DryRunManager:
         status = {
             'active_runs': len(self.active_runs),
             'total_runs': len(self.performance_metrics),
-            'monitoring_active': self.is_monitoring
+            'monitoring_active': self.is_monitoring,
+            'mode': self.mode
         }
+        if self.host:
+            status['host'] = {
+                'running': self.host.is_running,
+                'strategies': len(self.host.strategies),
+                'candles_processed': self.host.candles_processed
+            }
         
         # Dettagli dry run attivi
         active_details = {}
@@ -460,25 +715,27 @@ class DryRunManager:
     
     def get_all_reports(self) -> List[Dict[str, Any]]:
         """Restituisce tutti i report completati."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT strategy_name, start_time, end_time, results
-            FROM dry_runs 
-            WHERE status = 'completed'
-            ORDER BY end_time DESC
-        ''')
-        
         reports = []
-        for row in cursor.fetchall():
+        for row in self.db.query(SELECT_COMPLETED_SQL):
             strategy_name, start_time, end_time, results = row
             if results:
                 report = json.loads(results)
                 reports.append(report)
         
-        conn.close()
         return reports
+    
+    def get_daily_metrics(self, strategy_name: str) -> List[Dict[str, Any]]:
+        """Storico delle metriche giornaliere di una strategia (lookup su indice)."""
+        rows = self.db.query('''
+            SELECT date, total_return, sharpe_ratio, max_drawdown, win_rate, total_trades,
+                   consecutive_losses, daily_return
+            FROM daily_metrics
+            WHERE strategy_name = ?
+            ORDER BY date
+        ''', (strategy_name,))
+        columns = ('date', 'total_return', 'sharpe_ratio', 'max_drawdown', 'win_rate', 'total_trades',
+                   'consecutive_losses', 'daily_return')
+        return [dict(zip(columns, row)) for row in rows]
 
 def main():
     """Funzione principale per testare il Dry Run Manager."""
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Metriche incrementali del dry run.
+Ogni aggiornamento elabora solo i trade chiusi dopo l'ultimo watermark e
+mantiene equity, picco, drawdown corrente e massimo, serie di perdite e
+media/varianza online (Welford) dei rendimenti giornalieri per lo Sharpe:
+costo O(nuovi trade), indipendente dalla lunghezza dello storico.
+"""
+
+import math
+import sqlite3
+import logging
+from datetime import datetime, date, timezone
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlite_pool import SQLiteConnectionManager
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS_PER_YEAR = 365
+
+
+@dataclass
+class ClosedTrade:
+    """Trade chiuso, nella forma minima necessaria alle metriche."""
+    trade_id: Any
+    close_time: datetime
+    profit_abs: float
+    profit_ratio: float
+    close_key: Optional[str] = None  # close_date così come salvata nel database (per il watermark)
+
+
+@dataclass
+class _RunningMoments:
+    """Media e varianza online (algoritmo di Welford)."""
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def push(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def with_value(self, value: float) -> "_RunningMoments":
+        moments = _RunningMoments(self.count, self.mean, self.m2)
+        moments.push(value)
+        return moments
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+@dataclass
+class IncrementalPerformance:
+    """
+    Stato cumulativo delle performance di una strategia.
+
+    I trade vanno forniti in ordine di chiusura; lo Sharpe è annualizzato
+    sui rendimenti giornalieri (profitto del giorno / wallet iniziale), con
+    il giorno corrente incluso in modo provvisorio. Il giorno avanza con i
+    trade o con il calendario (roll_to), così un giorno senza trade vale zero.
+    """
+    wallet: float = 1000.0
+    total_trades: int = 0
+    winning_trades: int = 0
+    total_profit: float = 0.0
+    peak_equity: float = 0.0
+    max_drawdown: float = 0.0
+    current_drawdown: float = 0.0
+    consecutive_losses: int = 0
+    max_consecutive_losses: int = 0
+    current_day: Optional[date] = None
+    current_day_profit: float = 0.0
+    daily_returns: _RunningMoments = field(default_factory=_RunningMoments)
+    watermark: Optional[Tuple[str, Any]] = None  # (close_date, trade_id) dell'ultimo trade elaborato
+
+    def __post_init__(self):
+        if not self.peak_equity:
+            self.peak_equity = self.wallet
+
+    @property
+    def equity(self) -> float:
+        return self.wallet + self.total_profit
+
+    def add_trade(self, trade: ClosedTrade):
+        """Aggiorna lo stato con un trade chiuso (O(1))."""
+        trade_day = trade.close_time.date()
+        if self.current_day is None:
+            self.current_day = trade_day
+        else:
+            # Un trade arrivato dopo il cambio di giorno conta sul giorno corrente
+            self.roll_to(trade_day)
+
+        self.total_trades += 1
+        self.total_profit += trade.profit_abs
+        self.current_day_profit += trade.profit_abs
+        if trade.profit_abs > 0:
+            self.winning_trades += 1
+            self.consecutive_losses = 0
+        else:
+            self.consecutive_losses += 1
+            self.max_consecutive_losses = max(self.max_consecutive_losses, self.consecutive_losses)
+
+        equity = self.equity
+        self.peak_equity = max(self.peak_equity, equity)
+        self.current_drawdown = (self.peak_equity - equity) / self.peak_equity if self.peak_equity > 0 else 0.0
+        self.max_drawdown = max(self.max_drawdown, self.current_drawdown)
+        self.watermark = (trade.close_key or trade.close_time.isoformat(), trade.trade_id)
+
+    def roll_to(self, day: date):
+        """Chiude i giorni precedenti a `day` (quelli senza trade valgono zero)."""
+        if self.current_day is None or day <= self.current_day:
+            return
+        self.daily_returns.push(self.current_day_profit / self.wallet)
+        for _ in range(min((day - self.current_day).days - 1, TRADING_DAYS_PER_YEAR)):
+            self.daily_returns.push(0.0)
+        self.current_day = day
+        self.current_day_profit = 0.0
+
+    def add_trades(self, trades: Iterable[ClosedTrade]) -> int:
+        count = 0
+        for trade in trades:
+            self.add_trade(trade)
+            count += 1
+        return count
+
+    @property
+    def win_rate(self) -> float:
+        return self.winning_trades / self.total_trades if self.total_trades else 0.0
+
+    @property
+    def total_return(self) -> float:
+        return self.total_profit / self.wallet if self.wallet else 0.0
+
+    @property
+    def daily_return(self) -> float:
+        """Rendimento del giorno corrente (zero se oggi non ci sono trade, dopo roll_to)."""
+        return self.current_day_profit / self.wallet if self.wallet else 0.0
+
+    @property
+    def sharpe_ratio(self) -> float:
+        if self.current_day is None:
+            return 0.0
+        moments = self.daily_returns.with_value(self.daily_return)
+        std = moments.std
+        return moments.mean / std * math.sqrt(TRADING_DAYS_PER_YEAR) if std > 0 else 0.0
+
+    def snapshot(self, as_of: Optional[date] = None) -> Dict[str, Any]:
+        """Metriche correnti; `as_of` è il giorno di calendario (UTC) a cui avanzare prima."""
+        if as_of is not None:
+            self.roll_to(as_of)
+        return {
+            "total_trades": self.total_trades,
+            "win_rate": self.win_rate,
+            "total_profit": self.total_profit,
+            "total_return": self.total_return,
+            "equity": self.equity,
+            "max_drawdown": self.max_drawdown,
+            "current_drawdown": self.current_drawdown,
+            "consecutive_losses": self.consecutive_losses,
+            "daily_return": self.daily_return,
+            "sharpe_ratio": self.sharpe_ratio,
+        }
+
+
+def parse_close_time(value: Any) -> datetime:
+    """close_date da database (stringa ISO) o timestamp in millisecondi, come datetime UTC naive."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def read_freqtrade_trades_since(db_path: str, strategy_name: str,
+                                watermark: Optional[Tuple[str, Any]] = None,
+                                connections: Optional[SQLiteConnectionManager] = None) -> List[ClosedTrade]:
+    """
+    Trade chiusi nel database Freqtrade dopo il watermark (close_date, id).
+
+    Il watermark è composto perché un trade aperto prima può chiudersi dopo:
+    l'id da solo non è monotono rispetto alla chiusura. Con `connections`
+    la lettura riusa una connessione persistente (in sola lettura).
+    """
+    query = '''
+        SELECT id, close_date, close_profit_abs, close_profit
+        FROM trades
+        WHERE is_open = 0 AND strategy = ? AND close_date IS NOT NULL
+    '''
+    params: List[Any] = [strategy_name]
+    if watermark is not None:
+        query += " AND (close_date > ? OR (close_date = ? AND id > ?))"
+        params += [watermark[0], watermark[0], watermark[1]]
+    query += " ORDER BY close_date, id"
+
+    if connections is not None:
+        rows = connections.query(query, params)
+    else:
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+    return [ClosedTrade(trade_id, parse_close_time(close_date), profit_abs or 0.0, profit_ratio or 0.0,
+                        close_key=str(close_date))
+            for trade_id, close_date, profit_abs, profit_ratio in rows]
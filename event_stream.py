@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Canale Server-Sent Events per le dashboard dei monitor.
+I monitor pubblicano solo le variazioni (richiesta avviata/conclusa,
+round di sessione, statistiche cambiate) e ogni client connesso le riceve
+in push: il carico dipende dal numero di eventi, non dalla dimensione
+dello storico moltiplicata per la frequenza di aggiornamento.
+"""
+
+import json
+import queue
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _serialize(data: Any) -> str:
+    return json.dumps(data, default=str)
+
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Serializza un evento nel formato text/event-stream."""
+    return _format_payload(_serialize(data), event, event_id)
+
+
+def _format_payload(payload: str, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in payload.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBroker:
+    """
+    Distribuisce gli eventi ai client SSE.
+
+    Ogni sottoscrittore ha una coda limitata: un client lento perde gli
+    eventi più vecchi e riceve un evento `reset` (ricarica lo snapshot)
+    invece di rallentare il monitor. Gli ultimi `replay_size` eventi
+    vengono conservati per le riconnessioni con Last-Event-ID.
+
+    I dati vengono serializzati al momento della pubblicazione: i monitor
+    possono continuare a modificare gli oggetti pubblicati (es. le
+    statistiche) senza alterare gli eventi già in coda o nel replay.
+    """
+
+    def __init__(self, replay_size: int = 256, subscriber_queue_size: int = 512):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._replay: Deque[Tuple[int, str, str]] = deque(maxlen=replay_size)
+        self._subscribers: List["queue.Queue"] = []
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._last_values: Dict[str, str] = {}
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_id
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data: Any) -> int:
+        """Pubblica un evento a tutti i sottoscrittori; restituisce il suo id."""
+        return self._publish_payload(event, _serialize(data))
+
+    def _publish_payload(self, event: str, payload: str) -> int:
+        with self._lock:
+            self._last_id += 1
+            item = (self._last_id, event, payload)
+            self._replay.append(item)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(item)
+            except queue.Full:
+                self._overflow(subscriber)
+        return item[0]
+
+    def publish_if_changed(self, event: str, data: Any) -> Optional[int]:
+        """Pubblica solo se il valore è diverso dall'ultimo pubblicato per lo stesso evento."""
+        payload = _serialize(data)
+        with self._lock:
+            if self._last_values.get(event) == payload:
+                return None
+            self._last_values[event] = payload
+        return self._publish_payload(event, payload)
+
+    def _overflow(self, subscriber: "queue.Queue"):
+        """Svuota la coda di un client troppo lento e gli chiede di ricaricare lo snapshot."""
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait((self._last_id, "reset", _serialize({"reason": "overflow"})))
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> "queue.Queue":
+        """Registra un client; con last_event_id rimanda gli eventi persi se ancora disponibili."""
+        subscriber: "queue.Queue" = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            if last_event_id is not None and last_event_id < self._last_id:
+                missed = [item for item in self._replay if item[0] > last_event_id]
+                if missed and missed[0][0] == last_event_id + 1 and len(missed) < self.subscriber_queue_size:
+                    for item in missed:
+                        subscriber.put_nowait(item)
+                else:
+                    subscriber.put_nowait((self._last_id, "reset", _serialize({"reason": "replay_unavailable"})))
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: "queue.Queue"):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def stream(self, last_event_id: Optional[int] = None, heartbeat: float = 15.0) -> Iterator[str]:
+        """Generatore text/event-stream per una risposta HTTP in streaming."""
+        subscriber = self.subscribe(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_id, event, payload = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Commento SSE: mantiene viva la connessione attraverso i proxy
+                    yield ": keepalive\n\n"
+                    continue
+                yield _format_payload(payload, event, event_id)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Interpreta l'header Last-Event-ID inviato da EventSource alla riconnessione."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
@@ -6,9 +6,11 @@ Assicura che il nome della classe corrisponda al nome del file.
 
 import os
 import re
-import glob
 from pathlib import Path
 
+from agents.strategy_validation_service import get_validation_service
+from strategy_watcher import get_strategy_watcher
+
 def fix_strategy_class_name(file_path: str) -> bool:
     """
     Corregge il nome della classe in una strategia per corrispondere al nome del file.
@@ -81,8 +83,8 @@ def fix_all_strategies():
         print(f"❌ Directory {strategies_dir} non trovata")
         return
     
-    # Trova tutti i file .py nella directory delle strategie
-    strategy_files = glob.glob(os.path.join(strategies_dir, "*.py"))
+    # File .py dall'indice del watcher (riletto su richiesta se non avviato)
+    strategy_files = get_strategy_watcher(strategies_dir).strategy_files()
     
     if not strategy_files:
         print(f"❌ Nessuna strategia trovata in {strategies_dir}")
@@ -110,7 +112,7 @@ def validate_strategies():
         print(f"❌ Directory {strategies_dir} non trovata")
         return
     
-    strategy_files = glob.glob(os.path.join(strategies_dir, "*.py"))
+    strategy_files = get_strategy_watcher(strategies_dir).strategy_files()
     
     if not strategy_files:
         print(f"❌ Nessuna strategia trovata in {strategies_dir}")
@@ -121,19 +123,20 @@ def validate_strategies():
     valid_count = 0
     invalid_files = []
     
+    # Analisi parallela e incrementale di tutti i file
+    facts_by_file = get_validation_service().validate_files(strategy_files)
+    
     for file_path in strategy_files:
+        file_name = Path(file_path).stem
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            facts = facts_by_file.get(file_path)
+            if facts is None:
+                facts = get_validation_service().validate_file(file_path)
             
-            file_name = Path(file_path).stem
             expected_class_name = file_name.replace('_', '').title()
             
-            class_pattern = r'class\s+(\w+)\s*\(IStrategy\)'
-            match = re.search(class_pattern, content)
-            
-            if match:
-                current_class_name = match.group(1)
+            if facts.has_istrategy_class or (not facts.syntax_valid and facts.class_name):
+                current_class_name = facts.class_name
                 if current_class_name == expected_class_name:
                     print(f"✅ {file_name}: {current_class_name}")
                     valid_count += 1
@@ -5,6 +5,10 @@ import logging
 from typing import Dict, Optional, List
 from pathlib import Path
 
+from pipeline_tracing import span
+from market_data_sync import CCXT_AVAILABLE, CCXTFeed, MarketDataSync
+from strategy_watcher import get_strategy_watcher
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -61,10 +65,18 @@ class FreqtradeManager:
         return strategy_path
     
     def download_data(self, pairs: List[str], timeframe: str = "5m", 
-                     timerange: str = "20240101-20241231") -> bool:
+                     timerange: str = "20240101-20241231", incremental: bool = True) -> bool:
         """
         Scarica i dati storici per le coppie specificate.
+        Con `incremental` (e ccxt disponibile) scarica in parallelo solo le
+        candele mancanti; altrimenti usa `freqtrade download-data`.
         """
+        if incremental:
+            syncer = self.market_data_sync(timeframe)
+            if syncer is not None:
+                results = syncer.sync_timerange(pairs, timerange)
+                return all(result.ok for result in results.values())
+        
         try:
             cmd = [
                 *self._cmd("download-data"),
@@ -85,12 +97,35 @@ class FreqtradeManager:
             logger.error(f"Error: {e.stderr}")
             return False
     
+    def market_data_sync(self, timeframe: str = "5m") -> Optional[MarketDataSync]:
+        """Sincronizzatore incrementale configurato come Freqtrade, None se non utilizzabile."""
+        if not CCXT_AVAILABLE:
+            return None
+        try:
+            with open(self.config_path, "r", encoding='utf-8') as f:
+                config = json.load(f)
+            exchange_name = config.get("exchange", {}).get("name", "binance")
+            trading_mode = config.get("trading_mode", "spot")
+            data_format = config.get("dataformat_ohlcv", "feather")
+            if data_format == "feather":
+                import pandas  # noqa: F401  (necessario per scrivere feather)
+            datadir = config.get("datadir", f"{self.data_dir}/{exchange_name}")
+            return MarketDataSync(datadir, CCXTFeed(exchange_name, trading_mode), timeframe=timeframe,
+                                  trading_mode=trading_mode, data_format=data_format)
+        except Exception as e:
+            logger.warning(f"Sync incrementale non disponibile, uso freqtrade download-data: {e}")
+            return None
+    
     def run_backtest(self, strategy_path: str, timerange: str = "20240101-20241231") -> Dict[str, float]:
         """
         Esegue il backtest Freqtrade e restituisce metriche chiave.
         """
         strategy_name = os.path.splitext(os.path.basename(strategy_path))[0]
         
+        with span("backtest", strategy=strategy_name, timerange=timerange):
+            return self._run_backtest(strategy_name, timerange)
+    
+    def _run_backtest(self, strategy_name: str, timerange: str) -> Dict[str, float]:
         try:
             cmd = [
                 *self._cmd("backtesting"),
@@ -254,12 +289,7 @@ class FreqtradeManager:
         """
         Lista tutte le strategie disponibili.
         """
-        strategies = []
-        if os.path.exists(self.strategies_dir):
-            for file in os.listdir(self.strategies_dir):
-                if file.endswith('.py') and not file.startswith('__'):
-                    strategies.append(file[:-3])  # Remove .py extension
-        return strategies
+        return get_strategy_watcher(self.strategies_dir, self.backtest_results_dir).strategy_names()
     
     def validate_strategy(self, strategy_path: str) -> bool:
         """
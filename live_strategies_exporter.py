@@ -6,14 +6,54 @@ Live Strategies Exporter: Esporta automaticamente le strategie migliori per il l
 import os
 import json
 import shutil
+import hashlib
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from pathlib import Path
 
+from pipeline_tracing import traced
+from agents.strategy_validation_service import content_hash
+
+try:
+    from portfolio_selection import build_return_matrix, load_trade_profits, select_portfolio
+    PORTFOLIO_SELECTION_AVAILABLE = True
+except ImportError:
+    PORTFOLIO_SELECTION_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+
+def _atomic_write(path: Path, data: bytes):
+    """Scrive su file temporaneo nella stessa directory e rinomina: chi legge vede il file vecchio o quello nuovo."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _age_bucket(generation_time: str) -> Optional[str]:
+    """Fascia di età della strategia usata nella valutazione (recent ≤ 7 giorni, moderate ≤ 30, poi old).
+
+    Entra nell'impronta della valutazione: le fasce devono restare costanti
+    nel tempo, altrimenti ogni giorno invaliderebbe la cache.
+    """
+    if not generation_time:
+        return None
+    try:
+        gen_dt = datetime.fromisoformat(generation_time.replace('Z', '+00:00'))
+        age_days = (datetime.now() - gen_dt).days
+    except Exception:
+        return 'invalid'
+    if age_days <= 7:
+        return 'recent'
+    if age_days <= 30:
+        return 'moderate'
+    return 'old'
+
 @dataclass
 class LiveStrategyConfig:
     """Configurazione per l'esportazione delle strategie live."""
@@ -26,6 +66,8 @@ class LiveStrategyConfig:
     export_interval_hours: int = 24
     max_live_strategies: int = 10
     backup_old_strategies: bool = True
+    portfolio_selection: bool = True  # scelta per bassa correlazione delle equity curve
+    max_pair_correlation: float = 0.7
 
 class LiveStrategiesExporter:
     """
@@ -37,6 +79,8 @@ class LiveStrategiesExporter:
         self.live_dir = Path("live_strategies")
         self.backup_dir = Path("live_strategies_backup")
         self.metadata_file = self.live_dir / "live_strategies_metadata.json"
+        # Watermark delle valutazioni: (strategia, hash del codice, metadati) → valutazione
+        self.evaluation_cache_file = self.live_dir / "live_evaluation_cache.json"
         
         # Crea directory se non esistono
         self.live_dir.mkdir(exist_ok=True)
@@ -44,6 +88,8 @@ class LiveStrategiesExporter:
         
         # Carica metadati esistenti
         self.live_metadata = self._load_live_metadata()
+        self.evaluation_cache = self._load_evaluation_cache()
+        self._evaluation_cache_dirty = False
     
     def _load_live_metadata(self) -> Dict[str, Any]:
         """Carica i metadati delle strategie live esistenti."""
@@ -58,11 +104,58 @@ class LiveStrategiesExporter:
     def _save_live_metadata(self):
         """Salva i metadati delle strategie live."""
         try:
-            with open(self.metadata_file, 'w') as f:
-                json.dump(self.live_metadata, f, indent=2)
+            _atomic_write(self.metadata_file, json.dumps(self.live_metadata, indent=2).encode('utf-8'))
         except Exception as e:
             logger.error(f"Errore nel salvataggio metadati live: {e}")
     
+    def _load_evaluation_cache(self) -> Dict[str, Any]:
+        """Carica le valutazioni precedenti e gli hash dei file strategia."""
+        if self.evaluation_cache_file.exists():
+            try:
+                with open(self.evaluation_cache_file, 'r') as f:
+                    cache = json.load(f)
+                return {'evaluations': cache.get('evaluations', {}), 'files': cache.get('files', {})}
+            except Exception as e:
+                logger.warning(f"Cache valutazioni live non leggibile, verrà ricostruita: {e}")
+        return {'evaluations': {}, 'files': {}}
+    
+    def _save_evaluation_cache(self):
+        """Salva la cache delle valutazioni (solo se modificata)."""
+        if not self._evaluation_cache_dirty:
+            return
+        try:
+            _atomic_write(self.evaluation_cache_file, json.dumps(self.evaluation_cache).encode('utf-8'))
+            self._evaluation_cache_dirty = False
+        except Exception as e:
+            logger.error(f"Errore nel salvataggio cache valutazioni live: {e}")
+    
+    def _strategy_code_hash(self, strategy_file: str) -> Optional[str]:
+        """Hash del sorgente; il file viene riletto solo se mtime o dimensione sono cambiati."""
+        try:
+            stat = os.stat(strategy_file)
+        except OSError:
+            return None
+        entry = self.evaluation_cache['files'].get(strategy_file)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['hash']
+        with open(strategy_file, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            code_hash = content_hash(f.read())
+        self.evaluation_cache['files'][strategy_file] = {
+            'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': code_hash
+        }
+        self._evaluation_cache_dirty = True
+        return code_hash
+    
+    def _evaluation_fingerprint(self, metadata: Dict[str, Any], code_hash: Optional[str]) -> str:
+        """Tutto ciò da cui dipende la valutazione: metadati, codice, fascia di età e soglie."""
+        payload = {
+            'metadata': metadata,
+            'code_hash': code_hash,
+            'age_bucket': _age_bucket(metadata.get('generation_time', '')),
+            'config': asdict(self.config)
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
     def evaluate_strategy_for_live(self, strategy_name: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
         Valuta se una strategia è adatta per il live trading.
@@ -119,20 +212,17 @@ class LiveStrategiesExporter:
         score += model_score
         
         # 4. Età della strategia (10% del peso)
-        if generation_time:
-            try:
-                gen_dt = datetime.fromisoformat(generation_time.replace('Z', '+00:00'))
-                age_days = (datetime.now() - gen_dt).days
-                if age_days <= 7:
-                    score += 0.1
-                    evaluation['strengths'].append("Strategia recente")
-                elif age_days <= 30:
-                    score += 0.05
-                    evaluation['strengths'].append("Strategia moderatamente recente")
-                else:
-                    evaluation['weaknesses'].append(f"Strategia vecchia ({age_days} giorni)")
-            except:
-                evaluation['weaknesses'].append("Data generazione non valida")
+        age_bucket = _age_bucket(generation_time)
+        if age_bucket == 'recent':
+            score += 0.1
+            evaluation['strengths'].append("Strategia recente")
+        elif age_bucket == 'moderate':
+            score += 0.05
+            evaluation['strengths'].append("Strategia moderatamente recente")
+        elif age_bucket == 'invalid':
+            evaluation['weaknesses'].append("Data generazione non valida")
+        elif age_bucket == 'old':
+            evaluation['weaknesses'].append("Strategia vecchia (oltre 30 giorni)")
         
         # 5. Tipo di strategia (10% del peso)
         if strategy_type in ['volatility', 'momentum']:
@@ -167,23 +257,78 @@ class LiveStrategiesExporter:
             with open("strategies_metadata.json", 'r') as f:
                 strategies_data = json.load(f)
             
-            # Valuta tutte le strategie
+            # Valuta solo le strategie cambiate dall'ultima esportazione
+            cached_evaluations = self.evaluation_cache['evaluations']
             evaluations = []
+            reevaluated = 0
             for strategy_name, metadata in strategies_data.items():
-                evaluation = self.evaluate_strategy_for_live(strategy_name, metadata)
+                code_hash = self._strategy_code_hash(f"user_data/strategies/{strategy_name.lower()}.py")
+                fingerprint = self._evaluation_fingerprint(metadata, code_hash)
+                cached = cached_evaluations.get(strategy_name)
+                if cached and cached['fingerprint'] == fingerprint:
+                    evaluation = dict(cached['evaluation'])
+                else:
+                    evaluation = self.evaluate_strategy_for_live(strategy_name, metadata)
+                    evaluation['code_hash'] = code_hash
+                    cached_evaluations[strategy_name] = {'fingerprint': fingerprint, 'evaluation': evaluation}
+                    evaluation = dict(evaluation)
+                    reevaluated += 1
                 if evaluation['eligible']:
                     evaluations.append(evaluation)
             
+            # Rimuove dalla cache le strategie non più presenti
+            removed = set(cached_evaluations) - set(strategies_data)
+            for strategy_name in removed:
+                del cached_evaluations[strategy_name]
+            if reevaluated or removed:
+                self._evaluation_cache_dirty = True
+            self._save_evaluation_cache()
+            
             # Ordina per punteggio (migliori prima)
             evaluations.sort(key=lambda x: x['score'], reverse=True)
             
-            logger.info(f"Trovate {len(evaluations)} strategie candidate per live trading")
+            logger.info(f"Trovate {len(evaluations)} strategie candidate per live trading "
+                        f"({reevaluated} rivalutate, {len(strategies_data) - reevaluated} invariate)")
             return evaluations
             
         except Exception as e:
             logger.error(f"Errore nella ricerca strategie migliori: {e}")
             return []
     
+    def select_live_portfolio(self, evaluations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Sceglie fino a max_live_strategies candidate poco correlate tra loro.
+        Le candidate senza trade (né backtest né dry run) occupano i posti
+        rimasti, in ordine di punteggio.
+        """
+        max_strategies = self.config.max_live_strategies
+        if not self.config.portfolio_selection or not PORTFOLIO_SELECTION_AVAILABLE:
+            return evaluations[:max_strategies]
+        
+        by_name = {evaluation['strategy_name']: evaluation for evaluation in evaluations}
+        trades = {name: load_trade_profits(name) for name in by_name}
+        names, _, returns = build_return_matrix(trades)
+        selection = select_portfolio(
+            names, [by_name[name]['score'] for name in names], returns, max_strategies,
+            max_correlation=self.config.max_pair_correlation,
+            max_drawdown=self.config.max_drawdown_threshold
+        )
+        
+        selected = []
+        for name in selection.selected:
+            evaluation = by_name[name]
+            evaluation['max_correlation'] = selection.max_correlation[name]
+            selected.append(evaluation)
+        with_curve = set(names)
+        without_curve = [e for e in evaluations if e['strategy_name'] not in with_curve]
+        selected.extend(without_curve[:max_strategies - len(selected)])
+        
+        logger.info(f"📊 Portafoglio live: {len(selection.selected)} strategie con equity curve "
+                    f"(drawdown {selection.portfolio_drawdown:.2%}), {len(selected) - len(selection.selected)} senza, "
+                    f"{len(selection.rejected)} scartate")
+        return selected
+    
+    @traced("export.strategy")
     def export_strategy_to_live(self, strategy_name: str, evaluation: Dict[str, Any]) -> bool:
         """
         Esporta una strategia nella cartella live.
@@ -199,14 +344,25 @@ class LiveStrategiesExporter:
             live_filename = f"live_{strategy_name}.py"
             live_filepath = self.live_dir / live_filename
             
-            # Backup strategia esistente se presente
-            if live_filepath.exists() and self.config.backup_old_strategies:
-                backup_filepath = self.backup_dir / f"{live_filename}.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                shutil.copy2(live_filepath, backup_filepath)
-                logger.info(f"Backup strategia esistente: {backup_filepath}")
+            with open(strategy_file, 'rb') as f:
+                code = f.read()
+            code_hash = hashlib.sha256(code).hexdigest()
+            live_hash = None
+            if live_filepath.exists():
+                with open(live_filepath, 'rb') as f:
+                    live_hash = hashlib.sha256(f.read()).hexdigest()
             
-            # Copia strategia
-            shutil.copy2(strategy_file, live_filepath)
+            if live_hash == code_hash:
+                logger.info(f"ℹ️ Codice live invariato, nessuna copia: {strategy_name}")
+            else:
+                # Backup strategia esistente se presente
+                if live_hash is not None and self.config.backup_old_strategies:
+                    backup_filepath = self.backup_dir / f"{live_filename}.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                    shutil.copy2(live_filepath, backup_filepath)
+                    logger.info(f"Backup strategia esistente: {backup_filepath}")
+                
+                # Scrittura atomica: Freqtrade non legge mai un file a metà
+                _atomic_write(live_filepath, code)
             
             # Aggiorna metadati live
             self.live_metadata[strategy_name] = {
@@ -215,6 +371,7 @@ class LiveStrategiesExporter:
                 'strengths': evaluation['strengths'],
                 'weaknesses': evaluation['weaknesses'],
                 'live_filename': live_filename,
+                'code_hash': evaluation.get('code_hash') or content_hash(code.decode('utf-8', errors='surrogateescape')),
                 'status': 'active'
             }
             
@@ -230,6 +387,7 @@ class LiveStrategiesExporter:
             logger.error(f"Errore nell'esportazione strategia {strategy_name}: {e}")
             return False
     
+    @traced("export", strategy_arg=None)
     def export_best_strategies(self) -> Dict[str, Any]:
         """
         Esporta le migliori strategie per il live trading.
@@ -243,27 +401,42 @@ class LiveStrategiesExporter:
             logger.warning("Nessuna strategia candidata trovata")
             return {'exported': 0, 'total_candidates': 0}
         
-        # Limita il numero di strategie da esportare
-        max_strategies = min(self.config.max_live_strategies, len(evaluations))
-        evaluations = evaluations[:max_strategies]
+        # Limita il numero di strategie da esportare, scegliendo un portafoglio diversificato
+        evaluations = self.select_live_portfolio(evaluations)
         
         # Esporta strategie
         exported_count = 0
+        unchanged_count = 0
+        metadata_changed = False
         for evaluation in evaluations:
             strategy_name = evaluation['strategy_name']
             
-            # Controlla se già esportata
-            if strategy_name in self.live_metadata:
-                logger.info(f"ℹ️ Strategia già esportata: {strategy_name}")
+            # Già esportata con lo stesso codice: aggiorna solo il punteggio
+            existing = self.live_metadata.get(strategy_name)
+            if (existing and existing.get('code_hash') and existing.get('code_hash') == evaluation.get('code_hash')
+                    and (self.live_dir / existing.get('live_filename', '')).is_file()):
+                if existing.get('evaluation_score') != evaluation['score']:
+                    existing.update({
+                        'evaluation_score': evaluation['score'],
+                        'strengths': evaluation['strengths'],
+                        'weaknesses': evaluation['weaknesses']
+                    })
+                    metadata_changed = True
+                unchanged_count += 1
                 continue
             
             if self.export_strategy_to_live(strategy_name, evaluation):
                 exported_count += 1
         
-        logger.info(f"✅ Esportazione completata: {exported_count}/{len(evaluations)} strategie")
+        if metadata_changed:
+            self._save_live_metadata()
+        
+        logger.info(f"✅ Esportazione completata: {exported_count}/{len(evaluations)} strategie "
+                    f"({unchanged_count} invariate)")
         
         return {
             'exported': exported_count,
+            'unchanged': unchanged_count,
             'total_candidates': len(evaluations),
             'evaluations': evaluations
         }
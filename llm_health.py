@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Probing della salute dei modelli Ollama senza inferenza.
+Disponibilità e residenza in memoria arrivano da /api/tags e /api/ps,
+la latenza viene misurata passivamente sul traffico reale dei client, che
+può girare in altri processi: i campioni passano da un piccolo database
+SQLite condiviso (LatencySampleStore) letto dal monitor ad ogni controllo.
+Una generazione di prova viene inviata solo ai modelli rimasti inattivi
+e non verificati oltre la finestra configurata.
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Tuple
+
+from sqlite_pool import get_connection_manager
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODELS = ["phi3", "llama2", "mistral", "cogito:8b"]
+LATENCY_DB_PATH = "llm_latency.db"
+SAMPLE_RETENTION_SECONDS = 86400
+PRUNE_EVERY = 1000
+
+
+def normalize_model_name(name: str) -> str:
+    """Nome modello senza il tag implicito ':latest'."""
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+
+@dataclass
+class ModelHealth:
+    """Stato di salute di un modello, aggiornato senza inferenza."""
+    name: str
+    installed: bool = False
+    resident: bool = False
+    last_latency: Optional[float] = None
+    avg_latency: Optional[float] = None
+    success_count: int = 0
+    error_count: int = 0
+    last_traffic: Optional[float] = None  # time.time() dell'ultima richiesta reale
+    last_verified: Optional[float] = None  # ultima risposta riuscita (reale o probe)
+    last_probe: Optional[float] = None
+    probe_count: int = 0
+
+    @property
+    def is_available(self) -> bool:
+        return self.installed and (self.last_verified is not None or self.error_count == 0)
+
+
+class LatencySampleStore:
+    """
+    Campioni di latenza condivisi tra processi.
+
+    I client (pipeline, agente cooperativo) inseriscono una riga per
+    richiesta; ogni lettore tiene il proprio cursore sull'id e legge solo
+    le righe nuove. Le righe più vecchie di `retention` secondi vengono
+    eliminate periodicamente.
+    """
+
+    def __init__(self, db_path: str = LATENCY_DB_PATH, retention: float = SAMPLE_RETENTION_SECONDS):
+        self.db_path = db_path
+        self.retention = retention
+        self.last_id = 0
+        self.db = get_connection_manager(db_path)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS latency_samples (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                seconds REAL,
+                success INTEGER NOT NULL
+            )
+        ''')
+
+    def add(self, model: str, seconds: Optional[float], success: bool = True, timestamp: Optional[float] = None):
+        now = timestamp if timestamp is not None else time.time()
+        cursor = self.db.execute(
+            "INSERT INTO latency_samples (model, timestamp, seconds, success) VALUES (?, ?, ?, ?)",
+            (model, now, seconds, int(success)))
+        if cursor.lastrowid and cursor.lastrowid % PRUNE_EVERY == 0:
+            self.db.execute("DELETE FROM latency_samples WHERE timestamp < ?", (now - self.retention,))
+
+    def read_new(self) -> List[Tuple[str, float, Optional[float], bool]]:
+        """Campioni inseriti (da qualsiasi processo) dopo l'ultima lettura: (modello, istante, secondi, esito)."""
+        rows = self.db.query(
+            "SELECT id, model, timestamp, seconds, success FROM latency_samples WHERE id > ? ORDER BY id",
+            (self.last_id,))
+        if rows:
+            self.last_id = rows[-1][0]
+        return [(model, timestamp, seconds, bool(success)) for _, model, timestamp, seconds, success in rows]
+
+
+class ModelHealthProber:
+    """
+    Sottosistema di probing per LLMMonitor.
+
+    Args:
+        models: Modelli da monitorare
+        base_url: URL dell'istanza Ollama
+        probe_idle_window: Secondi di inattività (senza verifiche) dopo cui
+            è consentito un probe attivo; None disabilita i probe attivi
+        request_timeout: Timeout delle chiamate /api/tags e /api/ps
+        probe_timeout: Timeout della generazione di prova
+        session: Oggetto con metodi get/post compatibili con requests
+        sample_store: Campioni di latenza scritti dai client di altri processi
+    """
+
+    def __init__(self, models: Optional[List[str]] = None, base_url: str = OLLAMA_URL,
+                 probe_idle_window: Optional[float] = 900.0, request_timeout: float = 2.0,
+                 probe_timeout: float = 10.0, session: Any = None, ewma_alpha: float = 0.2,
+                 sample_store: Optional[LatencySampleStore] = None):
+        self.base_url = base_url.rstrip("/")
+        self.probe_idle_window = probe_idle_window
+        self.request_timeout = request_timeout
+        self.probe_timeout = probe_timeout
+        self.ewma_alpha = ewma_alpha
+        self._session = session
+        self.sample_store = sample_store
+        self._lock = threading.Lock()
+        self.server_reachable = False
+        self.health: Dict[str, ModelHealth] = {
+            name: ModelHealth(name=name) for name in (models or DEFAULT_MODELS)
+        }
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            self._session = requests
+        return self._session
+
+    def _entry(self, model: str) -> ModelHealth:
+        name = normalize_model_name(model)
+        if name not in self.health:
+            self.health[name] = ModelHealth(name=name)
+        return self.health[name]
+
+    # -- latenza passiva -------------------------------------------------
+
+    def record_latency(self, model: str, seconds: Optional[float], success: bool = True,
+                       timestamp: Optional[float] = None):
+        """Registra l'esito di una richiesta reale (chiamato dai client)."""
+        now = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            entry = self._entry(model)
+            entry.last_traffic = now
+            if not success:
+                entry.error_count += 1
+                return
+            entry.success_count += 1
+            entry.last_verified = now
+            if seconds is not None:
+                entry.last_latency = seconds
+                entry.avg_latency = seconds if entry.avg_latency is None else (
+                    self.ewma_alpha * seconds + (1 - self.ewma_alpha) * entry.avg_latency
+                )
+
+    def ingest_shared_samples(self) -> int:
+        """Applica i campioni registrati dagli altri processi dall'ultima lettura."""
+        if self.sample_store is None:
+            return 0
+        try:
+            samples = self.sample_store.read_new()
+        except sqlite3.Error as e:
+            logger.debug(f"Campioni di latenza non leggibili: {e}")
+            return 0
+        for model, timestamp, seconds, success in samples:
+            self.record_latency(model, seconds, success, timestamp=timestamp)
+        return len(samples)
+
+    # -- disponibilità e residenza ----------------------------------------
+
+    def _model_names(self, endpoint: str) -> Optional[set]:
+        try:
+            response = self.session.get(f"{self.base_url}{endpoint}", timeout=self.request_timeout)
+            if response.status_code != 200:
+                return None
+            models = response.json().get("models", [])
+            return {normalize_model_name(m.get("name") or m.get("model", "")) for m in models}
+        except Exception as e:
+            logger.debug(f"Ollama {endpoint} non raggiungibile: {e}")
+            return None
+
+    def refresh(self) -> bool:
+        """Aggiorna installazione e residenza con /api/tags e /api/ps (nessuna inferenza)."""
+        installed = self._model_names("/api/tags")
+        resident = self._model_names("/api/ps") if installed is not None else None
+        with self._lock:
+            self.server_reachable = installed is not None
+            for name, entry in self.health.items():
+                entry.installed = installed is not None and name in installed
+                entry.resident = resident is not None and name in resident
+        return self.server_reachable
+
+    # -- probe attivo ------------------------------------------------------
+
+    def needs_active_probe(self, model: str, now: Optional[float] = None) -> bool:
+        """True se il modello è installato ma inattivo e non verificato oltre la finestra."""
+        if self.probe_idle_window is None:
+            return False
+        now = now if now is not None else time.time()
+        entry = self._entry(model)
+        if not entry.installed:
+            return False
+        reference = max(filter(None, [entry.last_traffic, entry.last_verified, entry.last_probe]), default=None)
+        return reference is None or now - reference >= self.probe_idle_window
+
+    def probe(self, model: str) -> bool:
+        """Generazione di prova di un solo token."""
+        entry = self._entry(model)
+        start = time.time()
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json={"model": entry.name, "prompt": "ok", "stream": False, "options": {"num_predict": 1}},
+                timeout=self.probe_timeout
+            )
+            success = response.status_code == 200
+        except Exception as e:
+            logger.debug(f"Probe {entry.name} fallito: {e}")
+            success = False
+        with self._lock:
+            entry.last_probe = time.time()
+            entry.probe_count += 1
+            if success:
+                entry.last_verified = entry.last_probe
+                entry.last_latency = entry.last_probe - start
+            else:
+                entry.error_count += 1
+        return success
+
+    def check(self) -> Dict[str, ModelHealth]:
+        """Ciclo di controllo: refresh passivo e probe solo dove necessario."""
+        self.ingest_shared_samples()
+        if self.refresh():
+            now = time.time()
+            for name in list(self.health):
+                if self.needs_active_probe(name, now):
+                    logger.info(f"🔎 Probe attivo per {name} (inattivo e non verificato)")
+                    self.probe(name)
+        return self.health
+
+
+# Istanze globali del processo
+_prober_instance = None
+_store_instance = None
+
+
+def get_latency_store() -> LatencySampleStore:
+    """Restituisce lo store condiviso dei campioni di latenza."""
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = LatencySampleStore()
+    return _store_instance
+
+
+def get_health_prober() -> ModelHealthProber:
+    """Restituisce l'istanza globale del prober (legge i campioni dallo store condiviso)."""
+    global _prober_instance
+    if _prober_instance is None:
+        _prober_instance = ModelHealthProber(sample_store=get_latency_store())
+    return _prober_instance
+
+
+def record_model_latency(model: str, seconds: Optional[float], success: bool = True):
+    """
+    Registra la latenza di una richiesta reale (chiamato da llm_utils per ogni risposta).
+
+    Il campione va nello store condiviso: il monitor, anche in un altro
+    processo, lo applica al prossimo controllo.
+    """
+    try:
+        get_latency_store().add(model, seconds, success)
+    except sqlite3.Error as e:
+        logger.debug(f"Campione di latenza non registrato per {model}: {e}")
@@ -17,9 +17,16 @@ from dataclasses import dataclass, asdict
 from pathlib import Path
 import queue
 import subprocess
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 import webbrowser
 
+from llm_health import ModelHealthProber, get_health_prober, DEFAULT_MODELS
+from llm_stats import QuantileSketch, RequestHistory, ResponseLog
+from event_stream import EventBroker, parse_last_event_id
+
+# Caratteri della risposta mantenuti in memoria (il resto va su disco)
+RESPONSE_PREVIEW_CHARS = 200
+
 # Configurazione logging
 logging.basicConfig(
     level=logging.INFO,
@@ -47,6 +54,7 @@ class LLMRequest:
     tokens_generated: Optional[int] = None
     cpu_usage: Optional[float] = None
     memory_usage: Optional[float] = None
+    response_ref: Optional[str] = None  # riferimento nel ResponseLog
 
 @dataclass
 class ModelStatus:
@@ -59,15 +67,32 @@ class ModelStatus:
     success_count: int = 0
     total_requests: int = 0
     avg_response_time: Optional[float] = None
+    p50_response_time: Optional[float] = None
+    p95_response_time: Optional[float] = None
+    p99_response_time: Optional[float] = None
+    p50_tokens_per_second: Optional[float] = None
+    is_loaded: bool = False
+    last_verified: Optional[datetime] = None
 
 class LLMMonitor:
     """
     Monitor completo per gli LLM in esecuzione.
     """
     
-    def __init__(self, port: int = 8080):
+    def __init__(self, port: int = 8080, health_prober: Optional[ModelHealthProber] = None,
+                 history_size: int = 1000, per_model_history: int = 200,
+                 response_log_file: str = "llm_responses.jsonl.gz"):
         self.port = port
-        self.requests: Dict[str, LLMRequest] = {}
+        # Disponibilità da /api/tags e /api/ps, latenza dal traffico reale
+        self.health_prober = health_prober or get_health_prober()
+        # Storico a capacità fissa: memoria costante anche dopo settimane di uptime
+        self.requests = RequestHistory(history_size, per_model_history)
+        self.response_log = ResponseLog(response_log_file)
+        self.latency_sketches: Dict[str, QuantileSketch] = {}
+        self.throughput_sketches: Dict[str, QuantileSketch] = {}
+        self.latency_sketch = QuantileSketch()
+        # Variazioni inviate in push alle dashboard (SSE)
+        self.events = EventBroker()
         self.model_status: Dict[str, ModelStatus] = {}
         self.active_requests: Dict[str, LLMRequest] = {}
         self.request_queue = queue.Queue()
@@ -83,6 +108,9 @@ class LLMMonitor:
             "failed_requests": 0,
             "total_tokens": 0,
             "avg_response_time": 0.0,
+            "p50_response_time": None,
+            "p95_response_time": None,
+            "p99_response_time": None,
             "start_time": datetime.now()
         }
         
@@ -91,8 +119,7 @@ class LLMMonitor:
         
     def _init_model_status(self):
         """Inizializza lo stato dei modelli disponibili."""
-        models = ["phi3", "llama2", "mistral", "cogito:8b"]
-        for model in models:
+        for model in DEFAULT_MODELS:
             self.model_status[model] = ModelStatus(
                 name=model,
                 is_available=False,
@@ -144,7 +171,12 @@ class LLMMonitor:
         
         @self.flask_app.route('/api/requests')
         def api_requests():
-            return jsonify([asdict(req) for req in self.requests.values()])
+            limit = request.args.get('limit', 100, type=int)
+            return jsonify(self.get_recent_requests(limit, model=request.args.get('model')))
+        
+        @self.flask_app.route('/api/requests/<request_id>/response')
+        def api_request_response(request_id):
+            return jsonify({"id": request_id, "response": self.get_full_response(request_id)})
         
         @self.flask_app.route('/api/models')
         def api_models():
@@ -158,6 +190,15 @@ class LLMMonitor:
         def api_active():
             return jsonify([asdict(req) for req in self.active_requests.values()])
         
+        @self.flask_app.route('/api/events')
+        def api_events():
+            last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID'))
+            return Response(
+                stream_with_context(self.events.stream(last_event_id)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
         @self.flask_app.route('/api/stop', methods=['POST'])
         def api_stop():
             logger.info("🛑 Arresto richiesto via API web. Il monitor si fermerà ora.")
@@ -170,7 +211,7 @@ class LLMMonitor:
         
         # Avvia Flask in thread separato
         self.flask_thread = threading.Thread(
-            target=lambda: self.flask_app.run(host='0.0.0.0', port=self.port, debug=False),
+            target=lambda: self.flask_app.run(host='0.0.0.0', port=self.port, debug=False, threaded=True),
             daemon=True
         )
         self.flask_thread.start()
@@ -185,9 +226,6 @@ class LLMMonitor:
                 # Aggiorna metriche sistema
                 self._update_system_metrics()
                 
-                # Pulisci richieste vecchie
-                self._cleanup_old_requests()
-                
                 time.sleep(5)  # Controlla ogni 5 secondi
                 
             except Exception as e:
@@ -195,44 +233,34 @@ class LLMMonitor:
                 time.sleep(10)
     
     def _check_model_status(self):
-        """Controlla lo stato di disponibilità dei modelli."""
+        """
+        Controlla lo stato di disponibilità dei modelli.
+        
+        Nessuna generazione viene inviata ai modelli attivi: il prober interroga
+        /api/tags e /api/ps e usa le latenze registrate dai client; un probe
+        attivo parte solo per i modelli inattivi e non verificati da tempo.
+        """
+        health = self.health_prober.check()
         for model_name, status in self.model_status.items():
-            try:
-                start_time = time.time()
-                response = requests.post(
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": model_name,
-                        "prompt": "test",
-                        "stream": False,
-                        "options": {"num_predict": 1}
-                    },
-                    timeout=10
-                )
-                
-                response_time = time.time() - start_time
-                
-                if response.status_code == 200:
-                    status.is_available = True
-                    status.response_time = response_time
-                    status.success_count += 1
-                    status.last_check = datetime.now()
-                    
-                    # Aggiorna tempo medio di risposta
-                    if status.avg_response_time is None:
-                        status.avg_response_time = response_time
-                    else:
-                        status.avg_response_time = (status.avg_response_time + response_time) / 2
-                else:
-                    status.is_available = False
-                    status.error_count += 1
-                    
-            except Exception as e:
-                status.is_available = False
-                status.error_count += 1
-                logger.debug(f"Modello {model_name} non disponibile: {e}")
-            
+            entry = health.get(model_name)
+            if entry is None:
+                continue
+            status.is_available = self.health_prober.server_reachable and entry.is_available
+            status.is_loaded = entry.resident
+            status.response_time = entry.last_latency
+            status.avg_response_time = entry.avg_latency
+            status.success_count = entry.success_count
+            status.error_count = entry.error_count
             status.total_requests = status.success_count + status.error_count
+            status.last_check = datetime.now()
+            if entry.last_verified is not None:
+                status.last_verified = datetime.fromtimestamp(entry.last_verified)
+        
+        # Solo i cambiamenti effettivi raggiungono le dashboard
+        self.events.publish_if_changed("models", [
+            {k: v for k, v in asdict(status).items() if k != "last_check"}
+            for status in self.model_status.values()
+        ])
     
     def _update_system_metrics(self):
         """Aggiorna le metriche del sistema."""
@@ -248,17 +276,6 @@ class LLMMonitor:
         except Exception as e:
             logger.debug(f"Errore nell'aggiornamento metriche sistema: {e}")
     
-    def _cleanup_old_requests(self):
-        """Pulisce le richieste vecchie dalla memoria."""
-        cutoff_time = datetime.now() - timedelta(hours=24)
-        old_requests = [
-            req_id for req_id, req in self.requests.items()
-            if req.start_time < cutoff_time
-        ]
-        
-        for req_id in old_requests:
-            del self.requests[req_id]
-    
     def track_request(self, request_id: str, model: str, prompt: str, timeout: int = 1800):
         """Traccia una nuova richiesta LLM."""
         request = LLMRequest(
@@ -270,54 +287,86 @@ class LLMMonitor:
             status="running"
         )
         
-        self.requests[request_id] = request
         self.active_requests[request_id] = request
         self.stats["total_requests"] += 1
         
+        self.events.publish("request_started", asdict(request))
+        self._publish_status()
+        
         logger.info(f"📊 Tracciamento richiesta {request_id} per modello {model}")
     
     def update_request_status(self, request_id: str, status: str, response: str = None, error: str = None):
-        """Aggiorna lo stato di una richiesta."""
-        if request_id in self.requests:
-            request = self.requests[request_id]
-            request.status = status
-            request.end_time = datetime.now()
-            request.duration = (request.end_time - request.start_time).total_seconds()
-            
-            if response:
-                request.response = response
-                # Stima token generati (approssimativo)
-                request.tokens_generated = len(response.split()) * 1.3
-                self.stats["total_tokens"] += request.tokens_generated
-            
-            if error:
-                request.error = error
-                self.stats["failed_requests"] += 1
-            else:
-                self.stats["successful_requests"] += 1
-            
-            # Rimuovi dalle richieste attive
-            if request_id in self.active_requests:
-                del self.active_requests[request_id]
-            
-            # Aggiorna tempo medio di risposta
-            if request.duration:
-                if self.stats["avg_response_time"] == 0:
-                    self.stats["avg_response_time"] = request.duration
-                else:
-                    total_requests = self.stats["successful_requests"] + self.stats["failed_requests"]
-                    self.stats["avg_response_time"] = (
-                        (self.stats["avg_response_time"] * (total_requests - 1) + request.duration) / total_requests
-                    )
-            
-            logger.info(f"📊 Aggiornamento richiesta {request_id}: {status}")
+        """Aggiorna lo stato di una richiesta e la sposta nello storico."""
+        request = self.active_requests.pop(request_id, None)
+        if request is None:
+            return
+        request.status = status
+        request.end_time = datetime.now()
+        request.duration = (request.end_time - request.start_time).total_seconds()
+        
+        if response:
+            # Stima token generati (approssimativo)
+            request.tokens_generated = len(response.split()) * 1.3
+            self.stats["total_tokens"] += request.tokens_generated
+            # Risposta completa su disco, anteprima in memoria
+            request.response_ref = self.response_log.append({"id": request_id, "model": request.model, "response": response})
+            request.response = response[:RESPONSE_PREVIEW_CHARS]
+        
+        if error:
+            request.error = error
+            self.stats["failed_requests"] += 1
+        else:
+            self.stats["successful_requests"] += 1
+        
+        self.requests.add(request)
+        self._record_request_metrics(request)
+        self.events.publish("request_finished", asdict(request))
+        self._publish_status()
+        
+        logger.info(f"📊 Aggiornamento richiesta {request_id}: {status}")
+    
+    def _record_request_metrics(self, request: LLMRequest):
+        """Aggiorna gli sketch di latenza e throughput (p50/p95/p99)."""
+        if not request.duration:
+            return
+        latency = self.latency_sketches.setdefault(request.model, QuantileSketch())
+        latency.add(request.duration)
+        self.latency_sketch.add(request.duration)
+        if request.tokens_generated:
+            throughput = self.throughput_sketches.setdefault(request.model, QuantileSketch())
+            throughput.add(request.tokens_generated / request.duration)
+        
+        self.stats["avg_response_time"] = self.latency_sketch.mean
+        self.stats["p50_response_time"] = self.latency_sketch.quantile(0.50)
+        self.stats["p95_response_time"] = self.latency_sketch.quantile(0.95)
+        self.stats["p99_response_time"] = self.latency_sketch.quantile(0.99)
+        
+        status = self.model_status.get(request.model)
+        if status is not None:
+            status.p50_response_time = latency.quantile(0.50)
+            status.p95_response_time = latency.quantile(0.95)
+            status.p99_response_time = latency.quantile(0.99)
+            if request.model in self.throughput_sketches:
+                status.p50_tokens_per_second = self.throughput_sketches[request.model].quantile(0.50)
+    
+    def get_full_response(self, request_id: str) -> Optional[str]:
+        """Rilegge dal log su disco la risposta completa di una richiesta."""
+        request = self.requests.get(request_id)
+        if request is None or request.response_ref is None:
+            return None
+        record = self.response_log.read(request.response_ref)
+        return record.get("response") if record else None
+    
+    def _publish_status(self):
+        """Invia alle dashboard lo stato e le statistiche aggiornate."""
+        self.events.publish("status", {"status": self.get_status(), "stats": self.stats})
     
     def get_status(self) -> Dict[str, Any]:
         """Restituisce lo stato completo del monitor."""
         return {
             "is_running": self.is_running,
             "active_requests_count": len(self.active_requests),
-            "total_requests_count": len(self.requests),
+            "total_requests_count": len(self.requests) + len(self.active_requests),
             "models_available": sum(1 for s in self.model_status.values() if s.is_available),
             "models_total": len(self.model_status),
             "stats": self.stats,
@@ -328,14 +377,9 @@ class LLMMonitor:
         """Restituisce le richieste attualmente in corso."""
         return [asdict(req) for req in self.active_requests.values()]
     
-    def get_recent_requests(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Restituisce le richieste più recenti."""
-        sorted_requests = sorted(
-            self.requests.values(),
-            key=lambda x: x.start_time,
-            reverse=True
-        )
-        return [asdict(req) for req in sorted_requests[:limit]]
+    def get_recent_requests(self, limit: int = 10, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Restituisce le richieste più recenti (O(limit), senza ordinamenti)."""
+        return [asdict(req) for req in self.requests.recent(limit, model)]
     
     def get_model_performance(self) -> Dict[str, Any]:
         """Restituisce le performance dei modelli."""
@@ -343,8 +387,11 @@ class LLMMonitor:
         for model_name, status in self.model_status.items():
             performance[model_name] = {
                 "availability": status.is_available,
+                "loaded": status.is_loaded,
                 "success_rate": (status.success_count / status.total_requests * 100) if status.total_requests > 0 else 0,
                 "avg_response_time": status.avg_response_time,
+                "latency": self.latency_sketches[model_name].summary() if model_name in self.latency_sketches else None,
+                "tokens_per_second": self.throughput_sketches[model_name].summary() if model_name in self.throughput_sketches else None,
                 "total_requests": status.total_requests,
                 "last_check": status.last_check.isoformat()
             }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Strutture a memoria limitata per le statistiche del monitor LLM:
+storico richieste in ring buffer per modello, sketch di quantili in
+streaming (p50/p95/p99) e log compresso su disco per le risposte complete.
+"""
+
+import os
+import json
+import gzip
+import math
+import logging
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QuantileSketch:
+    """
+    Sketch di quantili a errore relativo limitato (bucket logaritmici).
+
+    Ogni valore positivo finisce nel bucket ceil(log_gamma(x)): il quantile
+    stimato ha errore relativo <= relative_accuracy e la memoria è limitata
+    da max_buckets (i bucket più bassi vengono fusi se necessario).
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float):
+        if value is None:
+            return
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        """Fonde i due bucket più bassi (perdita di precisione solo sulla coda bassa)."""
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class RequestHistory:
+    """
+    Storico delle richieste concluse a capacità fissa.
+
+    Un ring buffer globale e uno per modello; le query sulle ultime k
+    richieste costano O(k), l'accesso per id O(1).
+    """
+
+    def __init__(self, capacity: int = 1000, per_model_capacity: int = 200):
+        self.capacity = capacity
+        self.per_model_capacity = per_model_capacity
+        self._all: Deque[Any] = deque()
+        self._by_model: Dict[str, Deque[Any]] = {}
+        self._index: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def add(self, request: Any):
+        with self._lock:
+            if len(self._all) >= self.capacity:
+                evicted = self._all.popleft()
+                self._index.pop(evicted.id, None)
+            self._all.append(request)
+            self._index[request.id] = request
+            per_model = self._by_model.setdefault(
+                request.model, deque(maxlen=self.per_model_capacity)
+            )
+            per_model.append(request)
+
+    def get(self, request_id: str) -> Optional[Any]:
+        return self._index.get(request_id)
+
+    def recent(self, limit: int = 10, model: Optional[str] = None) -> List[Any]:
+        """Le ultime `limit` richieste (più recenti prima)."""
+        with self._lock:
+            source = self._by_model.get(model, ()) if model else self._all
+            return list(islice(reversed(source), limit))
+
+    def models(self) -> List[str]:
+        return list(self._by_model)
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def __iter__(self):
+        return iter(list(self._all))
+
+
+class ResponseLog:
+    """
+    Log su disco delle risposte complete, compresso con gzip.
+
+    Ogni risposta è un membro gzip indipendente: il riferimento restituito da
+    append permette di rileggerla senza decomprimere il resto del file.
+    Raggiunta max_bytes il file viene ruotato (un solo file precedente).
+    """
+
+    def __init__(self, path: str = "llm_responses.jsonl.gz", max_bytes: int = 100 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def append(self, record: Dict[str, Any]) -> Optional[str]:
+        """Scrive un record e restituisce il riferimento "generazione:offset"."""
+        data = gzip.compress((json.dumps(record, default=str) + "\n").encode("utf-8"))
+        with self._lock:
+            try:
+                offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                if offset + len(data) > self.max_bytes and offset > 0:
+                    os.replace(self.path, self.path + ".1")
+                    self.generation += 1
+                    offset = 0
+                with open(self.path, "ab") as f:
+                    f.write(data)
+                return f"{self.generation}:{offset}"
+            except OSError as e:
+                logger.warning(f"⚠️ Impossibile salvare la risposta su disco: {e}")
+                return None
+
+    def read(self, ref: str) -> Optional[Dict[str, Any]]:
+        """Rilegge il record indicato da append (None se ruotato via)."""
+        try:
+            generation, offset = (int(part) for part in ref.split(":"))
+        except (AttributeError, ValueError):
+            return None
+        if generation == self.generation:
+            path = self.path
+        elif generation == self.generation - 1:
+            path = self.path + ".1"
+        else:
+            return None
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                with gzip.GzipFile(fileobj=f) as member:
+                    line = member.readline()
+            return json.loads(line) if line else None
+        except (OSError, ValueError, EOFError) as e:
+            logger.debug(f"Record {ref} non leggibile: {e}")
+            return None
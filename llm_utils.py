@@ -1,5 +1,32 @@
+import time
 import requests
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from pipeline_metrics import observe_llm_response, observe_llm_failure
+from llm_health import record_model_latency
+from context_budget import context_for_prompt, count_tokens
+from prompt_sessions import PromptSession
+from agents.timeout_manager import record_eval_metrics, timeout_manager, BASE_TIMEOUTS
+from deadlines import call_timeout
+
+# Timeout di query_ollama_unlimited: nessun limite pratico se non la scadenza della pipeline
+UNLIMITED_TIMEOUT = 36000
+
+def _policy_timeout(model: str, prompt: str, num_predict: int, phase: str = "cooperative") -> float:
+    """Timeout dalla politica unica di TimeoutManager (quantili, token/s o base del modello)."""
+    return timeout_manager.get_optimal_timeout(model, phase, prompt_tokens=count_tokens(prompt),
+                                               num_predict=num_predict)
+
+def _observe_success(model: str, start_time: float, result: Dict):
+    """Metriche della richiesta e latenza passiva per il prober di salute dei modelli."""
+    seconds = time.time() - start_time
+    observe_llm_response(model, seconds, result)
+    record_model_latency(model, seconds)
+
+def _observe_failure(model: str, start_time: float, status: str = "error"):
+    seconds = time.time() - start_time
+    observe_llm_failure(model, seconds, status)
+    record_model_latency(model, seconds, success=False)
 
 def query_ollama(prompt: str, model: str = "mistral", timeout: int = 1800) -> str:
     """
@@ -9,9 +36,11 @@ def query_ollama(prompt: str, model: str = "mistral", timeout: int = 1800) -> st
     Args:
         prompt: Il prompt da inviare al modello
         model: Il nome del modello da utilizzare
-        timeout: Timeout in secondi (default: 1800 = 30 minuti)
+        timeout: Timeout in secondi (default: 1800 = 30 minuti), ridotto al tempo
+            rimasto della scadenza corrente della pipeline
     """
     url = "http://localhost:11434/api/generate"
+    timeout = call_timeout(timeout)
     
     # Configurazioni ottimizzate per velocità
     payload = {
@@ -24,7 +53,7 @@ def query_ollama(prompt: str, model: str = "mistral", timeout: int = 1800) -> st
             "top_k": 40,              # Limita le scelte
             "num_predict": 1024,      # Ridotto per velocità
             "repeat_penalty": 1.1,    # Evita ripetizioni
-            "num_ctx": 2048,          # Contesto ridotto per velocità
+            "num_ctx": context_for_prompt(prompt, 1024, min_ctx=2048),  # Contesto minimo sufficiente
             "num_thread": 8,          # Usa più thread se disponibili
             "num_gpu": 1,             # Usa GPU se disponibile
             "num_batch": 512,         # Batch size ottimizzato
@@ -33,24 +62,30 @@ def query_ollama(prompt: str, model: str = "mistral", timeout: int = 1800) -> st
         }
     }
     
+    start_time = time.time()
     try:
         print(f"🤖 Invio richiesta a {model} (configurazione veloce)...")
         response = requests.post(url, json=payload, timeout=timeout)
         response.raise_for_status()
         result = response.json()
+        _observe_success(model, start_time, result)
+        record_eval_metrics(model, result)
         print(f"✅ Risposta ricevuta da {model}")
         return result["response"]
     except requests.exceptions.Timeout:
-        print(f"⏰ Timeout per {model} dopo {timeout} secondi")
+        _observe_failure(model, start_time, "timeout")
+        print(f"⏰ Timeout per {model} dopo {timeout:.0f} secondi")
         raise
     except requests.exceptions.RequestException as e:
+        _observe_failure(model, start_time)
         print(f"❌ Errore nella richiesta a {model}: {e}")
         raise
 
 def query_ollama_unlimited(prompt: str, model: str = "mistral") -> str:
     """
     Versione senza timeout per cooperazione libera tra LLM.
-    Permette ai modelli di prendersi tutto il tempo necessario per generare strategie complesse.
+    Permette ai modelli di prendersi tutto il tempo necessario per generare strategie complesse,
+    entro la scadenza corrente della pipeline se presente.
     
     Args:
         prompt: Il prompt da inviare al modello
@@ -72,7 +107,7 @@ def query_ollama_unlimited(prompt: str, model: str = "mistral") -> str:
             "top_k": 50,              # Più scelte disponibili
             "num_predict": 2048,      # Output più lungo per strategie complete
             "repeat_penalty": 1.1,    # Evita ripetizioni
-            "num_ctx": 4096,          # Contesto più ampio
+            "num_ctx": context_for_prompt(prompt, 2048, min_ctx=2048),  # Contesto minimo sufficiente
             "num_thread": 8,          # Usa più thread se disponibili
             "num_gpu": 1,             # Usa GPU se disponibile
             "num_batch": 512,         # Batch size ottimizzato
@@ -81,23 +116,31 @@ def query_ollama_unlimited(prompt: str, model: str = "mistral") -> str:
         }
     }
     
+    start_time = time.time()
     try:
         print(f"🤝 Invio richiesta cooperativa a {model} (senza timeout)...")
-        response = requests.post(url, json=payload, timeout=36000)  # 10 ore di timeout
+        response = requests.post(url, json=payload, timeout=call_timeout(UNLIMITED_TIMEOUT))
         response.raise_for_status()
         result = response.json()
+        _observe_success(model, start_time, result)
+        record_eval_metrics(model, result)
         print(f"✅ Risposta cooperativa ricevuta da {model}")
         return result["response"]
     except requests.exceptions.RequestException as e:
+        _observe_failure(model, start_time)
         print(f"❌ Errore nella richiesta cooperativa a {model}: {e}")
         raise
 
+FAST_NUM_PREDICT = 512  # token di risposta di query_ollama_fast
+
 def query_ollama_fast(prompt: str, model: str = "phi3", timeout: int = 600) -> str:
     """
     Versione ultra-veloce per prompt semplici e decisioni rapide.
     Usa phi3 che è più veloce per operazioni semplici.
+    Il timeout viene ridotto al tempo rimasto della scadenza corrente.
     """
     url = "http://localhost:11434/api/generate"
+    timeout = call_timeout(timeout)
     
     # Configurazione ultra-veloce
     payload = {
@@ -107,25 +150,44 @@ def query_ollama_fast(prompt: str, model: str = "phi3", timeout: int = 600) -> s
         "options": {
             "temperature": 0.1,        # Molto deterministico
             "top_p": 0.5,             # Molto focalizzato
-            "num_predict": 512,       # Output molto breve
-            "num_ctx": 1024,          # Contesto minimo
+            "num_predict": FAST_NUM_PREDICT,  # Output molto breve
+            "num_ctx": context_for_prompt(prompt, FAST_NUM_PREDICT, min_ctx=1024),  # Contesto minimo sufficiente
             "num_thread": 8,
             "num_batch": 256
         }
     }
     
+    start_time = time.time()
     try:
         print(f"⚡ Invio richiesta veloce a {model}...")
         response = requests.post(url, json=payload, timeout=timeout)
         response.raise_for_status()
         result = response.json()
+        _observe_success(model, start_time, result)
+        record_eval_metrics(model, result)
         print(f"✅ Risposta veloce ricevuta da {model}")
         return result["response"]
     except Exception as e:
+        _observe_failure(model, start_time)
         print(f"❌ Errore nella richiesta veloce a {model}: {e}")
         raise
 
-def query_ollama_cooperative(prompt: str, model: str = "cogito:8b", session_id: str = None) -> str:
+# Configurazione ottimizzata per cooperazione (num_ctx scelto per richiesta o fissato dalla sessione)
+COOPERATIVE_OPTIONS = {
+    "temperature": 0.5,        # Bilanciato per creatività e coerenza
+    "top_p": 0.85,            # Ampio ma controllato
+    "top_k": 45,              # Buona varietà
+    "num_predict": 3072,      # Output molto lungo per strategie complete
+    "repeat_penalty": 1.15,   # Evita ripetizioni
+    "num_thread": 8,          # Usa più thread se disponibili
+    "num_gpu": 1,             # Usa GPU se disponibile
+    "num_batch": 1024,        # Batch size maggiore per cooperazione
+    "rope_freq_base": 10000,  # Parametri ROPE ottimizzati
+    "rope_freq_scale": 0.5
+}
+
+def query_ollama_cooperative(prompt: str, model: str = "cogito:8b", session_id: str = None,
+                             timeout: Optional[float] = None) -> str:
     """
     Versione specializzata per cooperazione tra LLM.
     Ottimizzata per generazione di strategie complesse e interazioni cooperative.
@@ -134,44 +196,82 @@ def query_ollama_cooperative(prompt: str, model: str = "cogito:8b", session_id:
         prompt: Il prompt da inviare al modello
         model: Il nome del modello da utilizzare (default: cogito:8b per cooperazione)
         session_id: ID della sessione cooperativa per logging
+        timeout: Timeout in secondi (default: politica di TimeoutManager), sempre
+            entro la scadenza corrente della pipeline
         
     Returns:
         Risposta del modello ottimizzata per cooperazione
     """
     url = "http://localhost:11434/api/generate"
+    timeout = call_timeout(timeout or _policy_timeout(model, prompt, COOPERATIVE_OPTIONS["num_predict"]))
     
-    # Configurazione ottimizzata per cooperazione
     payload = {
         "model": model,
         "prompt": prompt,
         "stream": False,
         "options": {
-            "temperature": 0.5,        # Bilanciato per creatività e coerenza
-            "top_p": 0.85,            # Ampio ma controllato
-            "top_k": 45,              # Buona varietà
-            "num_predict": 3072,      # Output molto lungo per strategie complete
-            "repeat_penalty": 1.15,   # Evita ripetizioni
-            "num_ctx": 8192,          # Contesto molto ampio per cooperazione
-            "num_thread": 8,          # Usa più thread se disponibili
-            "num_gpu": 1,             # Usa GPU se disponibile
-            "num_batch": 1024,        # Batch size maggiore per cooperazione
-            "rope_freq_base": 10000,  # Parametri ROPE ottimizzati
-            "rope_freq_scale": 0.5
+            **COOPERATIVE_OPTIONS,
+            "num_ctx": context_for_prompt(prompt, COOPERATIVE_OPTIONS["num_predict"], min_ctx=2048),
         }
     }
     
+    start_time = time.time()
     try:
         session_info = f" (sessione: {session_id})" if session_id else ""
         print(f"🤝 Invio richiesta cooperativa a {model}{session_info}...")
-        response = requests.post(url, json=payload, timeout=36000)  # 10 ore di timeout per cooperazione
+        response = requests.post(url, json=payload, timeout=timeout)
         response.raise_for_status()
         result = response.json()
+        _observe_success(model, start_time, result)
+        record_eval_metrics(model, result)
         print(f"✅ Risposta cooperativa ricevuta da {model}{session_info}")
         return result["response"]
     except requests.exceptions.RequestException as e:
+        _observe_failure(model, start_time)
         print(f"❌ Errore nella richiesta cooperativa a {model}: {e}")
         raise
 
+def query_ollama_session(session: PromptSession, prompt: str, num_predict: Optional[int] = None,
+                         timeout: Optional[float] = None, session_id: str = None,
+                         fresh_prompt: Optional[str] = None) -> str:
+    """
+    Round di una sessione con prefisso condiviso: invia solo il suffisso del
+    round e riporta il contesto Ollama della risposta precedente.
+
+    Args:
+        session: Sessione del modello (prompt di sistema, opzioni, contesto)
+        prompt: Suffisso specifico del round
+        num_predict: Token di risposta per questo round (default della sessione)
+        timeout: Timeout in secondi (default: politica di TimeoutManager), sempre
+            entro la scadenza corrente della pipeline
+        session_id: ID della sessione cooperativa per logging
+        fresh_prompt: Suffisso da inviare se il round parte senza contesto
+    """
+    url = "http://localhost:11434/api/generate"
+    payload = session.payload(prompt, num_predict, fresh_prompt=fresh_prompt)
+    model = session.model
+    prompt = payload["prompt"]
+    timeout = call_timeout(timeout or _policy_timeout(model, prompt, payload["options"].get("num_predict", 0)))
+    
+    start_time = time.time()
+    try:
+        session_info = f" (sessione: {session_id})" if session_id else ""
+        reuse = f", contesto riportato: {len(payload['context'])} token" if "context" in payload else ""
+        print(f"🔁 Invio round a {model}{session_info}{reuse}...")
+        response = requests.post(url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        result = response.json()
+        _observe_success(model, start_time, result)
+        record_eval_metrics(model, result)
+        session.record(result)
+        print(f"✅ Risposta del round ricevuta da {model}{session_info}")
+        return result["response"]
+    except requests.exceptions.RequestException as e:
+        _observe_failure(model, start_time)
+        session.reset()
+        print(f"❌ Errore nel round con {model}: {e}")
+        raise
+
 def test_model_availability(model: str = "mistral") -> bool:
     """
     Testa se un modello è disponibile e risponde.
@@ -218,30 +318,20 @@ def get_model_speed_ranking() -> List[str]:
 
 def get_model_timeout_config() -> Dict[str, Dict[str, int]]:
     """
-    Restituisce la configurazione dei timeout ottimali per ogni modello.
-    Basato su test reali di velocità dei modelli.
+    Restituisce la configurazione dei timeout iniziali per ogni modello,
+    derivata dalla tabella unica di TimeoutManager.
     """
+    levels = {"fast": "simple", "normal": "normal", "complex": "complex"}
     return {
-        "phi3": {
-            "fast": 300,      # 5 minuti per prompt semplici
-            "normal": 600,    # 10 minuti per prompt normali
-            "complex": 900    # 15 minuti per prompt complessi
-        },
-        "llama2": {
-            "fast": 600,      # 10 minuti per prompt semplici
-            "normal": 1200,   # 20 minuti per prompt normali
-            "complex": 1800   # 30 minuti per prompt complessi
-        },
-        "mistral": {
-            "fast": 900,      # 15 minuti per prompt semplici
-            "normal": 1800,   # 30 minuti per prompt normali
-            "complex": 2700   # 45 minuti per prompt complessi
-        }
+        model: {level: int(base * timeout_manager.complexity_multipliers[complexity])
+                for level, complexity in levels.items()}
+        for model, base in BASE_TIMEOUTS.items()
     }
 
 def get_optimal_timeout(model: str, prompt_complexity: str = "normal") -> int:
     """
     Calcola il timeout ottimale basato sul modello e sulla complessità del prompt.
+    Delega a TimeoutManager (storia delle latenze o timeout base del modello).
     
     Args:
         model: Nome del modello LLM
@@ -250,13 +340,8 @@ def get_optimal_timeout(model: str, prompt_complexity: str = "normal") -> int:
     Returns:
         Timeout in secondi
     """
-    config = get_model_timeout_config()
-    
-    # Default per modelli sconosciuti
-    if model not in config:
-        return 1800  # 30 minuti di default
-    
-    return config[model].get(prompt_complexity, config[model]["normal"])
+    complexity = {"fast": "simple"}.get(prompt_complexity, prompt_complexity)
+    return timeout_manager.get_optimal_timeout(model, phase="generic", complexity=complexity)
 
 def estimate_prompt_complexity(prompt: str) -> str:
     """
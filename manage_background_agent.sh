@@ -152,9 +152,11 @@ show_status() {
     
     if [ -f "strategies_metadata.json" ]; then
         echo -e "   ✅ Metadati strategie: strategies_metadata.json"
-        # Conta le strategie
-        STRATEGY_COUNT=$(python3 -c "import json; data=json.load(open('strategies_metadata.json')); print(len(data))" 2>/dev/null || echo "0")
+        # Conta le strategie (percorso leggero: legge solo lo stato persistito)
+        read STRATEGY_COUNT VALIDATED_COUNT BACKTESTED_COUNT <<< $(python3 background_agent.py --status 2>/dev/null | python3 -c "import json,sys; s=json.load(sys.stdin); print(s['total_strategies'], s['validated_strategies'], s['backtested_strategies'])" 2>/dev/null || echo "0 0 0")
         echo -e "   📊 Strategie totali: $STRATEGY_COUNT"
+        echo -e "   ✅ Strategie validate: $VALIDATED_COUNT"
+        echo -e "   📈 Strategie con backtest: $BACKTESTED_COUNT"
     else
         echo -e "   ❌ Metadati strategie: mancante"
     fi
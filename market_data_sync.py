@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Sincronizzazione incrementale dei dati di mercato.
+Un manifest registra, per coppia e timeframe, gli intervalli di candele già
+presenti su disco: ogni sync scarica solo i buchi mancanti, le coppie vengono
+scaricate in parallelo sotto un rate limit comune e al termine si verifica
+la continuità delle candele. I file restano nel formato di Freqtrade.
+"""
+
+import os
+import json
+import gzip
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Protocol, Tuple
+
+from dry_run_host import load_ohlcv_rows, ohlcv_filename, timeframe_to_ms
+
+try:
+    import ccxt
+    CCXT_AVAILABLE = True
+except ImportError:
+    CCXT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {"feather": ".feather", "json": ".json", "jsongz": ".json.gz"}
+MANIFEST_FILENAME = ".sync_manifest.json"
+
+Range = Tuple[int, int]  # [inizio, fine) in millisecondi
+
+
+class CandleFeed(Protocol):
+    """Sorgente di candele con la firma di ccxt: righe [ms, o, h, l, c, v] da `since` in poi."""
+
+    def fetch_ohlcv(self, pair: str, timeframe: str, since: int, limit: int) -> List[List[float]]:
+        ...
+
+
+def parse_timerange(timerange: str) -> Range:
+    """Timerange Freqtrade ("20240101-20241231", estremi opzionali) in millisecondi, fine esclusa."""
+    start, _, end = timerange.partition("-")
+
+    def to_ms(value: str, default: int) -> int:
+        if not value:
+            return default
+        return int(datetime.strptime(value, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+    return to_ms(start, 0), to_ms(end, int(time.time() * 1000))
+
+
+def merge_ranges(ranges: List[Range]) -> List[Range]:
+    """Unisce intervalli sovrapposti o adiacenti."""
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_ranges(start: int, end: int, covered: List[Range]) -> List[Range]:
+    """Parti di [start, end) non coperte dagli intervalli (già uniti e ordinati)."""
+    missing: List[Range] = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+def find_gaps(rows: List[List[float]], step: int, start: Optional[int] = None,
+              end: Optional[int] = None) -> List[Range]:
+    """Buchi tra candele consecutive (e rispetto a start/end, se indicati)."""
+    timestamps = [int(row[0]) for row in rows]
+    gaps: List[Range] = []
+    if start is not None and (not timestamps or timestamps[0] > start):
+        gaps.append((start, timestamps[0] if timestamps else end))
+    for previous, current in zip(timestamps, timestamps[1:]):
+        if current - previous > step:
+            gaps.append((previous + step, current))
+    if end is not None and timestamps and timestamps[-1] + step < end:
+        gaps.append((timestamps[-1] + step, end))
+    return gaps
+
+
+def contiguous_ranges(rows: List[List[float]], step: int) -> List[Range]:
+    """Intervalli coperti da candele consecutive (per ricostruire il manifest da file esistenti)."""
+    ranges: List[Range] = []
+    for row in rows:
+        ts = int(row[0])
+        if ranges and ts == ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], ts + step)
+        else:
+            ranges.append((ts, ts + step))
+    return ranges
+
+
+def save_ohlcv_rows(path: str, rows: List[List[float]]):
+    """Scrive le righe OHLCV nel formato indicato dall'estensione (scrittura atomica)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if path.endswith(".feather"):
+        import pandas as pd
+        df = pd.DataFrame(rows, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+        df['date'] = pd.to_datetime(df['date'], unit='ms', utc=True)
+        df.to_feather(tmp_path)
+    else:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(rows, f)
+    os.replace(tmp_path, path)
+
+
+class RateLimiter:
+    """Token bucket condiviso tra i thread: al massimo `rate` richieste al secondo (con burst)."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DataManifest:
+    """Intervalli di candele presenti su disco, per file OHLCV (salvato in JSON accanto ai dati)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ranges: Dict[str, List[Range]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._ranges = {key: [tuple(r) for r in ranges] for key, ranges in data.get("ranges", {}).items()}
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Manifest dati non leggibile, verrà ricostruito: {e}")
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._ranges
+
+    def ranges(self, key: str) -> List[Range]:
+        with self._lock:
+            return list(self._ranges.get(key, []))
+
+    def missing(self, key: str, start: int, end: int) -> List[Range]:
+        return subtract_ranges(start, end, self.ranges(key))
+
+    def set_ranges(self, key: str, ranges: List[Range]):
+        with self._lock:
+            self._ranges[key] = merge_ranges(ranges)
+
+    def add(self, key: str, start: int, end: int):
+        with self._lock:
+            self._ranges[key] = merge_ranges(self._ranges.get(key, []) + [(start, end)])
+
+    def save(self):
+        with self._lock:
+            data = {"ranges": {key: [list(r) for r in ranges] for key, ranges in self._ranges.items()}}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class PairSyncResult:
+    """Esito della sincronizzazione di una coppia."""
+    pair: str
+    timeframe: str
+    candles_fetched: int = 0
+    requests: int = 0
+    gaps_fetched: List[Range] = field(default_factory=list)
+    holes: List[Range] = field(default_factory=list)  # buchi rimasti anche dopo il download
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class CCXTFeed:
+    """Feed reale via ccxt (dipendenza opzionale)."""
+
+    def __init__(self, exchange_name: str, trading_mode: str = "futures"):
+        if not CCXT_AVAILABLE:
+            raise ImportError("ccxt non installato")
+        options = {"defaultType": "swap"} if trading_mode == "futures" else {}
+        self.exchange = getattr(ccxt, exchange_name)({"enableRateLimit": False, "options": options})
+
+    def fetch_ohlcv(self, pair: str, timeframe: str, since: int, limit: int) -> List[List[float]]:
+        return self.exchange.fetch_ohlcv(pair, timeframe, since=since, limit=limit)
+
+
+class MarketDataSync:
+    """
+    Scarica in parallelo solo le candele mancanti per un insieme di coppie.
+
+    Il rate limit è condiviso tra i worker; ogni coppia è gestita da un solo
+    worker, quindi i file non richiedono lock. Il manifest viene salvato una
+    volta al termine di ogni sync.
+    """
+
+    def __init__(self, data_dir: str, feed: CandleFeed, timeframe: str = "5m", trading_mode: str = "futures",
+                 data_format: str = "json", max_workers: int = 8, requests_per_second: float = 10.0,
+                 batch_limit: int = 1000, manifest_path: Optional[str] = None):
+        if data_format not in FORMAT_EXTENSIONS:
+            # parquet/hdf5: il chiamante ripiega su `freqtrade download-data`
+            raise ValueError(f"Formato OHLCV non supportato dal sync incrementale: {data_format}")
+        self.data_dir = data_dir
+        self.feed = feed
+        self.timeframe = timeframe
+        self.trading_mode = trading_mode
+        self.data_format = data_format
+        self.max_workers = max_workers
+        self.batch_limit = batch_limit
+        self.step = timeframe_to_ms(timeframe)
+        self.limiter = RateLimiter(requests_per_second)
+        self.manifest = DataManifest(manifest_path or os.path.join(data_dir, MANIFEST_FILENAME))
+
+    def file_path(self, pair: str) -> str:
+        """File OHLCV della coppia: quello già presente (qualsiasi formato) o uno nuovo nel formato configurato."""
+        name = ohlcv_filename(pair, self.timeframe, self.trading_mode)
+        directory = os.path.join(self.data_dir, self.trading_mode) if self.trading_mode == "futures" else self.data_dir
+        for extension in FORMAT_EXTENSIONS.values():
+            path = os.path.join(directory, name + extension)
+            if os.path.exists(path):
+                return path
+        return os.path.join(directory, name + FORMAT_EXTENSIONS[self.data_format])
+
+    def _manifest_key(self, pair: str) -> str:
+        return f"{pair}|{self.timeframe}|{self.trading_mode}"
+
+    def _fetch_range(self, pair: str, start: int, end: int, result: PairSyncResult) -> List[List[float]]:
+        """Scarica [start, end) a pagine di batch_limit candele."""
+        rows: List[List[float]] = []
+        since = start
+        while since < end:
+            self.limiter.acquire()
+            batch = self.feed.fetch_ohlcv(pair, self.timeframe, since, self.batch_limit)
+            result.requests += 1
+            if not batch:
+                break
+            rows.extend(row for row in batch if start <= int(row[0]) < end)
+            next_since = int(batch[-1][0]) + self.step
+            if next_since <= since:
+                break
+            since = next_since
+        return rows
+
+    def sync_pair(self, pair: str, start_ms: int, end_ms: int) -> PairSyncResult:
+        """Porta su disco [start_ms, end_ms) per una coppia, scaricando solo i buchi."""
+        result = PairSyncResult(pair, self.timeframe)
+        # Solo candele chiuse
+        end_ms = min(end_ms, int(time.time() * 1000) // self.step * self.step)
+        start_ms = start_ms // self.step * self.step
+        if end_ms <= start_ms:
+            return result
+
+        key = self._manifest_key(pair)
+        path = self.file_path(pair)
+        try:
+            existing = load_ohlcv_rows(path) if os.path.exists(path) else []
+            if key not in self.manifest:
+                # File scaricati prima del manifest (es. freqtrade download-data)
+                self.manifest.set_ranges(key, contiguous_ranges(existing, self.step))
+
+            missing = self.manifest.missing(key, start_ms, end_ms)
+            if missing:
+                candles = {int(row[0]): row for row in existing}
+                received: List[List[float]] = []
+                for gap_start, gap_end in missing:
+                    fetched = self._fetch_range(pair, gap_start, gap_end, result)
+                    for row in fetched:
+                        candles[int(row[0])] = [int(row[0]), *map(float, row[1:6])]
+                    received.extend(fetched)
+                    result.candles_fetched += len(fetched)
+                    result.gaps_fetched.append((gap_start, gap_end))
+                existing = [candles[ts] for ts in sorted(candles)]
+                save_ohlcv_rows(path, existing)
+                # Coperto solo ciò che è arrivato: le candele non ancora pubblicate
+                # restano mancanti e vengono richieste al sync successivo
+                received_ts = sorted({int(row[0]) for row in received})
+                for run_start, run_end in contiguous_ranges([[ts] for ts in received_ts], self.step):
+                    self.manifest.add(key, run_start, run_end)
+
+            in_range = [row for row in existing if start_ms <= int(row[0]) < end_ms]
+            result.holes = find_gaps(in_range, self.step, start_ms, end_ms)
+            if result.holes:
+                logger.warning(f"⚠️ {pair} {self.timeframe}: {len(result.holes)} buchi non coperti dall'exchange")
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            logger.error(f"❌ Errore nella sincronizzazione di {pair}: {result.error}")
+        return result
+
+    def sync(self, pairs: List[str], start_ms: int, end_ms: int) -> Dict[str, PairSyncResult]:
+        """Sincronizza tutte le coppie in parallelo."""
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(pairs)))) as executor:
+            futures = {pair: executor.submit(self.sync_pair, pair, start_ms, end_ms) for pair in pairs}
+            results = {pair: future.result() for pair, future in futures.items()}
+        self.manifest.save()
+
+        fetched = sum(r.candles_fetched for r in results.values())
+        requests = sum(r.requests for r in results.values())
+        logger.info(f"📥 Sync {len(pairs)} coppie {self.timeframe}: {fetched} candele in {requests} richieste "
+                    f"({time.monotonic() - started:.1f}s)")
+        return results
+
+    def sync_timerange(self, pairs: List[str], timerange: str) -> Dict[str, PairSyncResult]:
+        start_ms, end_ms = parse_timerange(timerange)
+        return self.sync(pairs, start_ms, end_ms)
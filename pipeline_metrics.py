@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Metriche Prometheus/OpenMetrics per l'intera pipeline.
+Registro in-process (solo libreria standard) con counter, gauge e
+istogrammi etichettati, esposti in formato testo su /metrics: latenza e
+token delle richieste LLM, attesa in coda, caricamenti dei modelli,
+strategie generate/validate/fallite, durata dei backtest, epoche/sec di
+hyperopt e PnL del dry-run.
+
+Il registro vive nel processo del background agent, l'unico che lo
+aggiorna: lo scrape va fatto sul server avviato dall'agente
+(config "metrics", default http://127.0.0.1:9108/metrics). Il monitor LLM
+gira in un processo separato e non espone /metrics.
+"""
+
+import math
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+BACKTEST_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 3600.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base comune: nome, help, etichette e figli per combinazione di etichette."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: attese etichette {self.labelnames}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name}: specificare le etichette con labels()")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(self._samples(values, child))
+        return lines
+
+    def _samples(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = float(value)
+
+
+class Counter(_Metric):
+    """Contatore monotono."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        # In formato testo i counter sono esposti con suffisso _total
+        super().__init__(name if name.endswith("_total") else name + "_total", documentation, labelnames)
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Un counter può solo aumentare")
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """Valore istantaneo."""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    return
+            self.counts[-1] += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(_Metric):
+    """Istogramma a bucket cumulativi."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _samples(self, values, child) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registro delle metriche; registrare di nuovo un nome restituisce la metrica esistente."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def generate_latest(self) -> str:
+        """Esposizione in formato testo Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ----------------------------------------------------------------------
+# Metriche della pipeline
+# ----------------------------------------------------------------------
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Durata delle richieste LLM lato client", ["model", "status"], LLM_BUCKETS)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Token elaborati dagli LLM", ["model", "kind"])
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "llm_queue_wait_seconds", "Attesa prima dell'elaborazione (tempo client meno tempo Ollama)", ["model"], LLM_BUCKETS)
+LLM_MODEL_LOADS = REGISTRY.counter(
+    "llm_model_loads_total", "Caricamenti in memoria dei modelli", ["model"])
+LLM_MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "llm_model_load_seconds", "Durata dei caricamenti dei modelli", ["model"], LLM_BUCKETS)
+STRATEGIES_GENERATED = REGISTRY.counter(
+    "strategies_generated_total", "Strategie generate", ["model", "strategy_type"])
+STRATEGIES_VALIDATED = REGISTRY.counter(
+    "strategies_validated_total", "Strategie che hanno superato la validazione", ["stage"])
+STRATEGIES_FAILED = REGISTRY.counter(
+    "strategies_failed_total", "Strategie scartate o fallite", ["stage"])
+BACKTEST_SECONDS = REGISTRY.histogram(
+    "backtest_duration_seconds", "Durata dei backtest", ["status"], BACKTEST_BUCKETS)
+HYPEROPT_EPOCHS = REGISTRY.counter(
+    "hyperopt_epochs_total", "Epoche hyperopt completate", ["strategy"])
+HYPEROPT_EPOCHS_PER_SECOND = REGISTRY.gauge(
+    "hyperopt_epochs_per_second", "Velocità dell'ultima esecuzione hyperopt", ["strategy"])
+DRY_RUN_PNL = REGISTRY.gauge(
+    "dry_run_pnl", "Profitto totale corrente del dry-run", ["strategy"])
+
+# Soglia oltre la quale load_duration indica un vero caricamento del modello
+MODEL_LOAD_THRESHOLD_SECONDS = 0.5
+
+
+def observe_llm_response(model: str, wall_seconds: float, payload: Optional[Dict[str, Any]] = None):
+    """
+    Registra una risposta di /api/generate.
+
+    Ollama riporta le durate lato server in nanosecondi: la differenza tra il
+    tempo misurato dal client e total_duration è l'attesa in coda.
+    """
+    LLM_REQUEST_SECONDS.labels(model=model, status="success").observe(wall_seconds)
+    if not payload:
+        return
+    if payload.get("prompt_eval_count"):
+        LLM_TOKENS.labels(model=model, kind="prompt").inc(payload["prompt_eval_count"])
+    if payload.get("eval_count"):
+        LLM_TOKENS.labels(model=model, kind="completion").inc(payload["eval_count"])
+    total = payload.get("total_duration")
+    if total:
+        LLM_QUEUE_WAIT_SECONDS.labels(model=model).observe(max(0.0, wall_seconds - total / 1e9))
+    load = (payload.get("load_duration") or 0) / 1e9
+    if load >= MODEL_LOAD_THRESHOLD_SECONDS:
+        LLM_MODEL_LOADS.labels(model=model).inc()
+        LLM_MODEL_LOAD_SECONDS.labels(model=model).observe(load)
+
+
+def observe_llm_failure(model: str, wall_seconds: float, status: str = "error"):
+    """Registra una richiesta LLM fallita (errore o timeout)."""
+    LLM_REQUEST_SECONDS.labels(model=model, status=status).observe(wall_seconds)
+
+
+# ----------------------------------------------------------------------
+# Server /metrics
+# ----------------------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.generate_latest().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format % args)
+
+
+def start_metrics_server(port: int = 9108, host: str = "127.0.0.1",
+                         registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Avvia in un thread daemon un server HTTP che espone /metrics."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    logger.info(f"📈 Metriche Prometheus su http://{host}:{server.server_address[1]}/metrics")
+    return server
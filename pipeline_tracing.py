@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Tracing a span della pipeline: generazione → validazione → backtest →
+hyperopt → export.
+Gli span si annidano tramite contextvars e sono raggruppati per nome
+della strategia (ereditato dallo span padre), così da vedere come il
+tempo di una strategia si divide tra le fasi. Ogni span concluso viene
+accodato a un file JSONL; la CLI lo riassume o lo converte in formato
+Chrome trace (chrome://tracing, Perfetto) o OTLP/JSON.
+
+Uso:
+    python pipeline_tracing.py summary [--strategy NOME]
+    python pipeline_tracing.py chrome trace.json
+    python pipeline_tracing.py otlp spans.json
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import logging
+import argparse
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = "user_data/traces/pipeline_spans.jsonl"
+SERVICE_NAME = "freqtrade-llm-pipeline"
+
+
+@dataclass
+class Span:
+    """Uno span concluso (tempi in nanosecondi dall'epoch)."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    strategy: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    status: str = "ok"  # "ok", "error"
+    error: Optional[str] = None
+    pid: int = 0
+    thread_id: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("pipeline_span", default=None)
+
+
+def _new_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+class Tracer:
+    """
+    Registra gli span su file JSONL (una riga per span concluso).
+
+    Disabilitato, `span()` non fa nulla oltre a eseguire il blocco: le
+    funzioni strumentate non pagano costi quando il tracing è spento.
+    """
+
+    def __init__(self, path: str = DEFAULT_TRACE_FILE, enabled: bool = True, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, strategy: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+        """Apre uno span figlio di quello corrente; la strategia si eredita dal padre."""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else _new_id(32),
+            span_id=_new_id(16),
+            parent_id=parent.span_id if parent else None,
+            strategy=strategy or (parent.strategy if parent else None),
+            start_ns=time.time_ns(),
+            pid=os.getpid(),
+            thread_id=threading.get_ident(),
+            attributes={k: v for k, v in attributes.items() if v is not None},
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._export(span)
+
+    def _export(self, span: Span):
+        line = json.dumps(asdict(span), default=str) + "\n"
+        try:
+            with self._lock:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            logger.warning(f"⚠️ Impossibile scrivere lo span {span.name}: {e}")
+
+
+_tracer = Tracer(os.environ.get("PIPELINE_TRACE_FILE", DEFAULT_TRACE_FILE),
+                 enabled=bool(os.environ.get("PIPELINE_TRACE_FILE")))
+
+
+def get_tracer() -> Tracer:
+    """Restituisce il tracer globale (disabilitato finché non viene configurato)."""
+    return _tracer
+
+
+def configure_tracing(path: Optional[str] = None, enabled: bool = True) -> Tracer:
+    """Abilita o disabilita il tracer globale e ne imposta il file di destinazione."""
+    if path:
+        _tracer.path = path
+    _tracer.enabled = enabled
+    if enabled:
+        logger.info(f"🧭 Tracing pipeline attivo: {_tracer.path}")
+    return _tracer
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def span(name: str, strategy: Optional[str] = None, **attributes):
+    """Scorciatoia per `get_tracer().span(...)`."""
+    return _tracer.span(name, strategy, **attributes)
+
+
+def traced(name: str, strategy_arg: Optional[str] = "strategy_name"):
+    """
+    Decoratore: esegue la funzione dentro uno span.
+
+    `strategy_arg` è il parametro della funzione che contiene il nome della
+    strategia; se assente o None la strategia si eredita dallo span padre.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            strategy = None
+            if strategy_arg:
+                try:
+                    bound = signature.bind(*args, **kwargs)
+                    bound.apply_defaults()
+                    strategy = bound.arguments.get(strategy_arg)
+                except TypeError:
+                    pass
+            with _tracer.span(name, strategy=strategy):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------------------------------------
+# Lettura, riepilogo ed esportazione
+# ----------------------------------------------------------------------
+
+def load_spans(path: str = DEFAULT_TRACE_FILE) -> List[Span]:
+    """Legge gli span dal file JSONL (incluso il file ruotato, se presente)."""
+    spans = []
+    for candidate in (path + ".1", path):
+        if not os.path.exists(candidate):
+            continue
+        with open(candidate, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    spans.append(Span(**json.loads(line)))
+                except (ValueError, TypeError):
+                    continue
+    return spans
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(spans: List[Span], strategy: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Riepilogo per fase (nome dello span) e per strategia.
+
+    Il tempo "self" di uno span esclude quello dei figli diretti: la somma
+    dei tempi self di una strategia è il suo tempo totale senza doppi conteggi.
+    """
+    if strategy:
+        spans = [s for s in spans if s.strategy == strategy]
+    children_time: Dict[str, float] = {}
+    for s in spans:
+        if s.parent_id:
+            children_time[s.parent_id] = children_time.get(s.parent_id, 0.0) + s.duration
+
+    stages: Dict[str, Dict[str, Any]] = {}
+    strategies: Dict[str, Dict[str, float]] = {}
+    for s in spans:
+        self_time = max(0.0, s.duration - children_time.get(s.span_id, 0.0))
+        stage = stages.setdefault(s.name, {"count": 0, "errors": 0, "durations": [], "self_seconds": 0.0})
+        stage["count"] += 1
+        stage["errors"] += s.status == "error"
+        stage["durations"].append(s.duration)
+        stage["self_seconds"] += self_time
+        per_strategy = strategies.setdefault(s.strategy or "-", {})
+        per_strategy[s.name] = per_strategy.get(s.name, 0.0) + self_time
+
+    for stage in stages.values():
+        durations = stage.pop("durations")
+        stage["total_seconds"] = sum(durations)
+        stage["mean_seconds"] = stage["total_seconds"] / len(durations)
+        stage["p50_seconds"] = _percentile(durations, 0.5)
+        stage["p95_seconds"] = _percentile(durations, 0.95)
+    return {"stages": stages, "strategies": strategies}
+
+
+def to_chrome_trace(spans: List[Span]) -> Dict[str, Any]:
+    """Eventi "complete" (ph=X) del formato Chrome trace, con la strategia come categoria."""
+    events = []
+    for s in spans:
+        events.append({
+            "name": s.name,
+            "cat": s.strategy or "pipeline",
+            "ph": "X",
+            "ts": s.start_ns / 1000,
+            "dur": (s.end_ns - s.start_ns) / 1000,
+            "pid": s.pid,
+            "tid": s.thread_id,
+            "args": {"strategy": s.strategy, "trace_id": s.trace_id, "span_id": s.span_id,
+                     "parent_id": s.parent_id, "status": s.status, "error": s.error, **s.attributes},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    """Span nel formato OTLP/JSON (ExportTraceServiceRequest)."""
+    otlp_spans = []
+    for s in spans:
+        attributes = dict(s.attributes)
+        if s.strategy:
+            attributes["strategy.name"] = s.strategy
+        otlp_span = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()],
+            "status": {"code": 2, "message": s.error or ""} if s.status == "error" else {"code": 1},
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        otlp_spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+    }]}
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = ["📊 Fasi della pipeline",
+             f"{'fase':<28}{'n':>6}{'errori':>8}{'totale s':>12}{'self s':>12}{'media s':>10}{'p50 s':>10}{'p95 s':>10}"]
+    stages = sorted(summary["stages"].items(), key=lambda item: item[1]["self_seconds"], reverse=True)
+    for name, stage in stages:
+        lines.append(f"{name:<28}{stage['count']:>6}{stage['errors']:>8}{stage['total_seconds']:>12.2f}"
+                     f"{stage['self_seconds']:>12.2f}{stage['mean_seconds']:>10.2f}"
+                     f"{stage['p50_seconds']:>10.2f}{stage['p95_seconds']:>10.2f}")
+    lines.append("")
+    lines.append("🧩 Tempo per strategia (self, s)")
+    strategies = sorted(summary["strategies"].items(), key=lambda item: sum(item[1].values()), reverse=True)
+    for strategy, per_stage in strategies:
+        breakdown = ", ".join(f"{name}={seconds:.1f}" for name, seconds in
+                              sorted(per_stage.items(), key=lambda item: item[1], reverse=True))
+        lines.append(f"  {strategy}: {sum(per_stage.values()):.1f} ({breakdown})")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Riepilogo ed esportazione degli span della pipeline")
+    parser.add_argument("--file", default=os.environ.get("PIPELINE_TRACE_FILE", DEFAULT_TRACE_FILE),
+                        help="File JSONL degli span")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="Tempo per fase e per strategia")
+    summary_parser.add_argument("--strategy", help="Filtra su una strategia")
+    summary_parser.add_argument("--json", action="store_true", help="Output JSON")
+    for command, help_text in (("chrome", "Esporta in formato Chrome trace"), ("otlp", "Esporta in formato OTLP/JSON")):
+        export_parser = subparsers.add_parser(command, help=help_text)
+        export_parser.add_argument("output")
+        export_parser.add_argument("--strategy", help="Filtra su una strategia")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.file)
+    if not spans:
+        print(f"❌ Nessuno span in {args.file}")
+        return 1
+
+    if args.command == "summary":
+        summary = summarize(spans, args.strategy)
+        print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
+        return 0
+
+    if args.strategy:
+        spans = [s for s in spans if s.strategy == args.strategy]
+    document = to_chrome_trace(spans) if args.command == "chrome" else to_otlp(spans)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(document, f, default=str)
+    print(f"✅ {len(spans)} span esportati in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
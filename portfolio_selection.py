@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Selezione del portafoglio di strategie live.
+Le equity curve di tutte le candidate (backtest o dry run) vengono messe in
+un'unica matrice di rendimenti giornalieri: correlazioni a coppie e drawdown
+di portafoglio si calcolano in NumPy su tutte le candidate insieme, poi una
+scelta greedy privilegia le strategie con punteggio alto e poco correlate
+con quelle già scelte.
+"""
+
+import os
+import glob
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dry_run_metrics import parse_close_time, read_freqtrade_trades_since
+
+logger = logging.getLogger(__name__)
+
+TradeProfits = List[Tuple[datetime, float]]  # (chiusura, profitto assoluto)
+
+
+def load_backtest_trades(strategy_name: str, results_dir: str = "user_data/backtest_results") -> TradeProfits:
+    """Trade dell'ultimo backtest esportato da Freqtrade (backtest_<strategia>.json o backtest_<strategia>-*.json)."""
+    prefix = os.path.join(glob.escape(results_dir), f"backtest_{glob.escape(strategy_name)}")
+    paths = [p for p in glob.glob(prefix + ".json") + glob.glob(prefix + "-*.json")
+             if not p.endswith(".meta.json")]
+    if not paths:
+        return []
+    path = max(paths, key=os.path.getmtime)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Risultati backtest non leggibili per {strategy_name}: {e}")
+        return []
+
+    strategies = data.get("strategy", {}) if isinstance(data, dict) else {}
+    result = strategies.get(strategy_name, {})
+    trades = result.get("trades", []) if isinstance(result, dict) else []
+    return [(parse_close_time(t["close_date"]), float(t.get("profit_abs") or 0.0))
+            for t in trades if t.get("close_date")]
+
+
+def load_dry_run_trades(strategy_name: str, db_dir: str = ".") -> TradeProfits:
+    """Trade chiusi del dry run Freqtrade della strategia (dry_run_<strategia>.db)."""
+    db_path = os.path.join(db_dir, f"dry_run_{strategy_name}.db")
+    if not os.path.exists(db_path):
+        return []
+    try:
+        return [(t.close_time, t.profit_abs) for t in read_freqtrade_trades_since(db_path, strategy_name)]
+    except Exception as e:
+        logger.warning(f"⚠️ Trade dry run non leggibili per {strategy_name}: {e}")
+        return []
+
+
+def load_trade_profits(strategy_name: str, results_dir: str = "user_data/backtest_results",
+                       db_dir: str = ".") -> TradeProfits:
+    """Trade del dry run se presenti (più recenti e realistici), altrimenti del backtest."""
+    return load_dry_run_trades(strategy_name, db_dir) or load_backtest_trades(strategy_name, results_dir)
+
+
+def build_return_matrix(trades: Dict[str, TradeProfits], wallet: float = 1000.0) -> Tuple[List[str], List[date], np.ndarray]:
+    """
+    Matrice (strategie × giorni) dei rendimenti giornalieri su un calendario comune.
+
+    I giorni senza trade valgono zero; strategie senza trade vengono escluse.
+    """
+    names = [name for name, rows in trades.items() if rows]
+    if not names:
+        return [], [], np.zeros((0, 0))
+    all_days = sorted({closed.date() for name in names for closed, _ in trades[name]})
+    first = all_days[0].toordinal()
+    days = [date.fromordinal(o) for o in range(first, all_days[-1].toordinal() + 1)]
+
+    row_index, col_index, values = [], [], []
+    for i, name in enumerate(names):
+        for closed, profit in trades[name]:
+            row_index.append(i)
+            col_index.append(closed.date().toordinal() - first)
+            values.append(profit)
+    matrix = np.zeros((len(names), len(days)))
+    np.add.at(matrix, (np.array(row_index), np.array(col_index)), np.array(values) / wallet)
+    return names, days, matrix
+
+
+def correlation_matrix(returns: np.ndarray) -> np.ndarray:
+    """Correlazioni di Pearson tra le righe; righe a varianza nulla hanno correlazione 0."""
+    centered = returns - returns.mean(axis=1, keepdims=True)
+    norms = np.sqrt((centered ** 2).sum(axis=1))
+    safe = np.where(norms > 0, norms, 1.0)
+    corr = (centered @ centered.T) / np.outer(safe, safe)
+    corr[norms == 0, :] = 0.0
+    corr[:, norms == 0] = 0.0
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def max_drawdowns(returns: np.ndarray) -> np.ndarray:
+    """Drawdown massimo (relativo al picco) di ogni riga, equity iniziale 1."""
+    equity = 1.0 + np.cumsum(returns, axis=-1)
+    peaks = np.maximum.accumulate(np.maximum(equity, 1.0), axis=-1)
+    return ((peaks - equity) / peaks).max(axis=-1) if returns.shape[-1] else np.zeros(returns.shape[:-1])
+
+
+@dataclass
+class PortfolioSelection:
+    """Esito della selezione: strategie scelte e diagnostica."""
+    selected: List[str] = field(default_factory=list)
+    max_correlation: Dict[str, float] = field(default_factory=dict)  # con le strategie scelte prima
+    portfolio_drawdown: float = 0.0
+    rejected: Dict[str, str] = field(default_factory=dict)
+
+
+def select_portfolio(names: Sequence[str], scores: Sequence[float], returns: np.ndarray, max_strategies: int,
+                     max_correlation: float = 0.7, max_drawdown: Optional[float] = None) -> PortfolioSelection:
+    """
+    Scelta greedy: a ogni passo la candidata con punteggio × (1 - correlazione
+    massima con le scelte) più alto, scartando quelle troppo correlate o che
+    porterebbero il drawdown del portafoglio (pesi uguali) oltre max_drawdown.
+    Ogni passo è vettoriale su tutte le candidate rimaste.
+    """
+    result = PortfolioSelection()
+    n = len(names)
+    if n == 0 or max_strategies <= 0:
+        return result
+
+    scores = np.asarray(scores, dtype=float)
+    corr = np.abs(correlation_matrix(returns)) if returns.shape[1] > 1 else np.zeros((n, n))
+    worst_corr = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    portfolio = np.zeros(returns.shape[1])
+
+    while len(result.selected) < max_strategies and available.any():
+        k = len(result.selected) + 1
+        objective = scores * (1.0 - worst_corr)
+        allowed = available & (worst_corr <= max_correlation)
+        if max_drawdown is not None and returns.shape[1]:
+            # Drawdown del portafoglio a pesi uguali con ciascuna candidata aggiunta
+            candidate_dd = max_drawdowns((portfolio + returns) / k)
+            allowed &= candidate_dd <= max_drawdown
+        if not allowed.any():
+            break
+        best = int(np.argmax(np.where(allowed, objective, -np.inf)))
+
+        result.selected.append(names[best])
+        result.max_correlation[names[best]] = float(worst_corr[best])
+        available[best] = False
+        portfolio += returns[best]
+        worst_corr = np.maximum(worst_corr, corr[best])
+
+    chosen = len(result.selected)
+    result.portfolio_drawdown = float(max_drawdowns(portfolio / chosen)) if chosen and returns.shape[1] else 0.0
+    for i in np.flatnonzero(available):
+        if worst_corr[i] > max_correlation:
+            result.rejected[names[i]] = f"correlazione {worst_corr[i]:.2f} con il portafoglio"
+        elif chosen < max_strategies:
+            result.rejected[names[i]] = "drawdown di portafoglio oltre il limite"
+    return result
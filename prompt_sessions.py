@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Sessioni di prompt con prefisso condiviso per i flussi cooperativi.
+Le istruzioni comuni vanno una sola volta nel prompt di sistema; ogni round
+invia solo un breve suffisso. Il `context` restituito da Ollama viene
+riportato nel round successivo dello stesso modello, così il modello non
+rivaluta le istruzioni e le proprie risposte precedenti. `num_ctx` resta
+fisso per sessione: un valore diverso farebbe ricaricare il modello e
+perdere la cache del prefisso.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from context_budget import CTX_MARGIN, MAX_NUM_CTX, count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionStats:
+    """Token valutati e risparmiati nei round di una sessione."""
+    rounds: int = 0
+    prompt_eval_tokens: int = 0
+    reused_tokens: int = 0       # token di contesto riportati invece di essere reinviati
+    context_resets: int = 0
+
+
+class PromptSession:
+    """Round successivi verso uno stesso modello con prefisso di sistema stabile."""
+
+    def __init__(self, model: str, system: str, options: Dict[str, Any], num_ctx: int = MAX_NUM_CTX,
+                 carry_context: bool = True):
+        self.model = model
+        self.system = system
+        self.options = {**options, "num_ctx": num_ctx}
+        self.num_ctx = num_ctx
+        self.carry_context = carry_context
+        self.context: List[int] = []
+        self.stats = SessionStats()
+        self._lock = threading.Lock()
+
+    @property
+    def has_context(self) -> bool:
+        return bool(self.context)
+
+    def payload(self, prompt: str, num_predict: Optional[int] = None,
+                fresh_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Richiesta /api/generate per un round; num_predict si può cambiare senza ricaricare il modello.
+
+        `fresh_prompt` sostituisce `prompt` quando il round parte senza contesto
+        (sessione nuova o contesto azzerato): serve a reinviare ciò che il
+        prompt dà per già presente nel contesto.
+        """
+        options = dict(self.options)
+        if num_predict is not None:
+            options["num_predict"] = num_predict
+        with self._lock:
+            needed = len(self.context) + count_tokens(prompt) + options.get("num_predict", 0) + CTX_MARGIN
+            if self.context and needed > self.num_ctx:
+                logger.info(f"🔄 Contesto di {self.model} azzerato ({len(self.context)} token, num_ctx={self.num_ctx})")
+                self.context = []
+                self.stats.context_resets += 1
+            if not self.context and fresh_prompt is not None:
+                prompt = fresh_prompt
+            payload = {"model": self.model, "prompt": prompt, "stream": False, "options": options}
+            if self.context:
+                # Con il contesto riportato il prompt di sistema è già nei token precedenti:
+                # Ollama lo anteporrebbe di nuovo
+                payload["context"] = list(self.context)
+            else:
+                payload["system"] = self.system
+            return payload
+
+    def record(self, result: Dict[str, Any]):
+        """Aggiorna il contesto e le statistiche con la risposta di Ollama."""
+        with self._lock:
+            self.stats.rounds += 1
+            self.stats.prompt_eval_tokens += int(result.get("prompt_eval_count") or 0)
+            self.stats.reused_tokens += len(self.context)
+            if self.carry_context and result.get("context"):
+                self.context = list(result["context"])
+
+    def reset(self):
+        """Nuova conversazione: il prefisso di sistema resta (e con esso la cache di Ollama)."""
+        with self._lock:
+            self.context = []
+
+
+class PromptSessionPool:
+    """Una sessione per modello, tutte con lo stesso prompt di sistema."""
+
+    def __init__(self, system: str, options: Dict[str, Any], num_ctx: int = MAX_NUM_CTX):
+        self.system = system
+        self.options = dict(options)
+        self.num_ctx = num_ctx
+        self._sessions: Dict[str, PromptSession] = {}
+        self._lock = threading.Lock()
+
+    def session(self, model: str) -> PromptSession:
+        with self._lock:
+            if model not in self._sessions:
+                self._sessions[model] = PromptSession(model, self.system, self.options, self.num_ctx)
+            return self._sessions[model]
+
+    def reset(self):
+        """Azzera i contesti all'inizio di una nuova sessione cooperativa."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.reset()
+
+    def stats(self) -> Dict[str, SessionStats]:
+        with self._lock:
+            return {model: session.stats for model, session in self._sessions.items()}
@@ -7,11 +7,16 @@ Genera prompt dinamici, casuali e personalizzati basati su vari fattori.
 import random
 import json
 import os
+import threading
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cached_property
 import logging
 
+from prompts.prompt_templates import (DEFAULT_NUM_CTX, DEFAULT_NUM_PREDICT, TemplateLibrary, get_template_library,
+                                      prompt_token_budget, trim_to_budget)
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -32,16 +37,23 @@ class AdaptivePromptGenerator:
     
     def __init__(self):
         self.prompt_templates = self._load_prompt_templates()
-        self.performance_history = self._load_performance_history()
         self.model_capabilities = self._get_model_capabilities()
         self.strategy_components = self._get_strategy_components()
+        # Sezioni deterministiche per (sezione, strategy_type, complexity, style, model_capability)
+        self._section_cache: Dict[Tuple[str, str, str, str, str], str] = {}
+    
+    @cached_property
+    def performance_history(self) -> Dict[str, Any]:
+        """Storico performance, letto solo al primo utilizzo."""
+        return self._load_performance_history()
         
     def generate_adaptive_prompt(self, 
                                strategy_type: str,
                                model: str,
                                complexity: str = "normal",
                                style: str = "technical",
-                               randomization: float = 0.3) -> str:
+                               randomization: float = 0.3,
+                               num_ctx: int = DEFAULT_NUM_CTX) -> str:
         """
         Genera un prompt adattivo basato sui parametri forniti.
         
@@ -51,6 +63,7 @@ class AdaptivePromptGenerator:
             complexity: Livello di complessità ("simple", "normal", "complex")
             style: Stile del prompt ("technical", "creative", "conservative", "aggressive")
             randomization: Livello di randomizzazione (0.0-1.0)
+            num_ctx: Contesto della richiesta Ollama; il prompt viene ridotto per starci
             
         Returns:
             Prompt personalizzato
@@ -70,11 +83,28 @@ class AdaptivePromptGenerator:
         
         # Genera prompt adattivo
         if randomization > 0.7:
-            return self._generate_random_prompt(config)
+            prompt = self._generate_random_prompt(config)
         elif randomization > 0.3:
-            return self._generate_hybrid_prompt(config)
+            prompt = self._generate_hybrid_prompt(config)
         else:
-            return self._generate_structured_prompt(config)
+            prompt = self._generate_structured_prompt(config)
+        
+        return trim_to_budget(prompt, self.prompt_token_budget(model, num_ctx))
+    
+    def prompt_token_budget(self, model: str, num_ctx: int = DEFAULT_NUM_CTX) -> int:
+        """Token disponibili per il prompt: num_ctx della richiesta, limitato dal contesto del modello."""
+        model_ctx = next((caps['num_ctx'] for name, caps in self.model_capabilities.items()
+                          if name in model.lower() and 'num_ctx' in caps), num_ctx)
+        return prompt_token_budget(min(num_ctx, model_ctx), DEFAULT_NUM_PREDICT)
+    
+    def _cached_section(self, kind: str, config: PromptConfig, build) -> str:
+        """Memoizza le parti che non dipendono dalla randomizzazione."""
+        key = (kind, config.strategy_type, config.complexity, config.style, config.model_capability)
+        section = self._section_cache.get(key)
+        if section is None:
+            section = build()
+            self._section_cache[key] = section
+        return section
     
     def _generate_random_prompt(self, config: PromptConfig) -> str:
         """Genera un prompt completamente casuale."""
@@ -88,50 +118,41 @@ class AdaptivePromptGenerator:
         risk_levels = random.sample(self.strategy_components['risk_levels'], 1)[0]
         
         # Genera prompt casuale
-        prompt = f"""Crea una strategia Freqtrade {config.strategy_type} per futures crypto.
-
-APPROCCIO: {random.choice(['conservative', 'balanced', 'aggressive'])}
-TIMEFRAME: {', '.join(timeframes)}
-FOCUS: {random.choice(['momentum', 'trend', 'volatility', 'breakout'])}
-
-INDICATORI DA USARE:
-{chr(10).join([f"- {ind}" for ind in indicators])}
-
-GESTIONE RISCHIO: {risk_levels}
-
-Genera SOLO codice Python completo e funzionante."""
-        
-        return prompt
+        return self.prompt_templates.render(
+            "random",
+            strategy_type=config.strategy_type,
+            approach=random.choice(['conservative', 'balanced', 'aggressive']),
+            timeframes=', '.join(timeframes),
+            focus=random.choice(['momentum', 'trend', 'volatility', 'breakout']),
+            indicators="\n".join(f"- {ind}" for ind in indicators),
+            risk_level=risk_levels
+        )
     
     def _generate_hybrid_prompt(self, config: PromptConfig) -> str:
         """Genera un prompt ibrido con elementi casuali e strutturati."""
         logger.info(f"🔄 Generazione prompt ibrido per {config.strategy_type}")
         
-        # Base strutturata
-        base_prompt = self._get_base_template(config.strategy_type, config.complexity)
+        # Base strutturata (memoizzata)
+        base_prompt = self._cached_section(
+            "base", config, lambda: self._get_base_template(config.strategy_type, config.complexity))
         
-        # Aggiungi elementi casuali
+        # Aggiungi elementi casuali (gli unici calcolati ad ogni chiamata)
         random_elements = self._get_random_elements(config)
         
         # Combina
-        hybrid_prompt = f"""{base_prompt}
-
-ELEMENTI AGGIUNTIVI:
-{random_elements}
-
-STILE: {config.style.upper()}
-COMPLESSITÀ: {config.complexity.upper()}
-
-Genera SOLO codice Python completo."""
-        
-        return hybrid_prompt
+        return self.prompt_templates.render(
+            "hybrid",
+            base=base_prompt,
+            random_elements=random_elements,
+            style=config.style.upper(),
+            complexity=config.complexity.upper()
+        )
     
     def _generate_structured_prompt(self, config: PromptConfig) -> str:
         """Genera un prompt strutturato e prevedibile."""
         logger.info(f"📋 Generazione prompt strutturato per {config.strategy_type}")
         
-        template = self._get_advanced_template(config)
-        return template
+        return self._cached_section("structured", config, lambda: self._get_advanced_template(config))
     
     def _get_base_template(self, strategy_type: str, complexity: str) -> str:
         """Ottiene un template base per il tipo di strategia."""
@@ -182,65 +203,39 @@ Genera SOLO codice Python completo."""
         # Aggiungi stile
         style_elements = self._get_style_elements(config.style)
         
-        return f"""{base}
-
-{details}
-
-{style_elements}
-
-Genera SOLO codice Python completo e funzionante."""
+        return self.prompt_templates.render("structured", base=base, details=details, style_elements=style_elements)
     
     def _get_complex_details(self, config: PromptConfig) -> str:
         """Dettagli per prompt complessi."""
-        return f"""
-REQUISITI AVANZATI:
-
-1. TIMEFRAME E PARAMETRI:
-   - Timeframe: {self._get_timeframe_for_strategy(config.strategy_type)}
-   - ROI: {self._get_roi_structure(config.strategy_type)}
-   - Stop loss: {self._get_stop_loss(config.strategy_type)}
-   - Trailing stop: True
-
-2. INDICATORI TECNICI OBBLIGATORI:
-   {self._get_indicators_list(config.strategy_type, "complex")}
-
-3. LOGICA DI ENTRATA STRETTA:
-   {self._get_entry_logic(config.strategy_type, "complex")}
-
-4. LOGICA DI USCITA:
-   {self._get_exit_logic(config.strategy_type, "complex")}
-
-5. GESTIONE RISCHIO AVANZATA:
-   {self._get_risk_management(config.strategy_type, "complex")}
-
-6. PARAMETRI OTTIMIZZABILI:
-   {self._get_optimizable_params(config.strategy_type)}
-"""
+        return self.prompt_templates.render(
+            "details_complex",
+            timeframe=self._get_timeframe_for_strategy(config.strategy_type),
+            roi=self._get_roi_structure(config.strategy_type),
+            stop_loss=self._get_stop_loss(config.strategy_type),
+            indicators=self._get_indicators_list(config.strategy_type, "complex"),
+            entry_logic=self._get_entry_logic(config.strategy_type, "complex"),
+            exit_logic=self._get_exit_logic(config.strategy_type, "complex"),
+            risk_management=self._get_risk_management(config.strategy_type, "complex"),
+            optimizable_params=self._get_optimizable_params(config.strategy_type)
+        )
     
     def _get_normal_details(self, config: PromptConfig) -> str:
         """Dettagli per prompt normali."""
-        return f"""
-REQUISITI:
-
-1. INDICATORI TECNICI:
-   {self._get_indicators_list(config.strategy_type, "normal")}
-
-2. LOGICA DI TRADING:
-   {self._get_entry_logic(config.strategy_type, "normal")}
-
-3. GESTIONE RISCHIO:
-   {self._get_risk_management(config.strategy_type, "normal")}
-"""
+        return self.prompt_templates.render(
+            "details_normal",
+            indicators=self._get_indicators_list(config.strategy_type, "normal"),
+            entry_logic=self._get_entry_logic(config.strategy_type, "normal"),
+            risk_management=self._get_risk_management(config.strategy_type, "normal")
+        )
     
     def _get_simple_details(self, config: PromptConfig) -> str:
         """Dettagli per prompt semplici."""
-        return f"""
-REQUISITI BASE:
-
-1. INDICATORI: {self._get_indicators_list(config.strategy_type, "simple")}
-2. LOGICA: {self._get_entry_logic(config.strategy_type, "simple")}
-3. RISCHIO: {self._get_risk_management(config.strategy_type, "simple")}
-"""
+        return self.prompt_templates.render(
+            "details_simple",
+            indicators=self._get_indicators_list(config.strategy_type, "simple"),
+            entry_logic=self._get_entry_logic(config.strategy_type, "simple"),
+            risk_management=self._get_risk_management(config.strategy_type, "simple")
+        )
     
     def _get_timeframe_for_strategy(self, strategy_type: str) -> str:
         """Ottiene il timeframe appropriato per la strategia."""
@@ -465,10 +460,9 @@ REQUISITI BASE:
         
         return base_areas
     
-    def _load_prompt_templates(self) -> Dict[str, Any]:
-        """Carica template di prompt da file."""
-        # Per ora usa template hardcoded, in futuro può caricare da file
-        return {}
+    def _load_prompt_templates(self) -> TemplateLibrary:
+        """Template di prompt da prompts/templates (caricati e compilati una volta per processo)."""
+        return get_template_library()
     
     def _load_performance_history(self) -> Dict[str, Any]:
         """Carica storico performance per ottimizzazione prompt."""
@@ -484,11 +478,11 @@ REQUISITI BASE:
     def _get_model_capabilities(self) -> Dict[str, Dict[str, Any]]:
         """Ottiene le capacità dei modelli."""
         return {
-            "phi3": {"speed": "fast", "quality": "good", "complexity": "simple"},
-            "llama2:7b": {"speed": "fast", "quality": "good", "complexity": "normal"},
-            "mistral:7b": {"speed": "balanced", "quality": "excellent", "complexity": "normal"},
-            "cogito:8b": {"speed": "balanced", "quality": "excellent", "complexity": "complex"},
-            "llama2:70b": {"speed": "slow", "quality": "excellent", "complexity": "complex"}
+            "phi3": {"speed": "fast", "quality": "good", "complexity": "simple", "num_ctx": 4096},
+            "llama2:7b": {"speed": "fast", "quality": "good", "complexity": "normal", "num_ctx": 4096},
+            "mistral:7b": {"speed": "balanced", "quality": "excellent", "complexity": "normal", "num_ctx": 8192},
+            "cogito:8b": {"speed": "balanced", "quality": "excellent", "complexity": "complex", "num_ctx": 8192},
+            "llama2:70b": {"speed": "slow", "quality": "excellent", "complexity": "complex", "num_ctx": 4096}
         }
     
     def _get_strategy_components(self) -> Dict[str, List[str]]:
@@ -507,10 +501,23 @@ REQUISITI BASE:
             ]
         }
 
+_generator: Optional[AdaptivePromptGenerator] = None
+_generator_lock = threading.Lock()
+
+
+def get_prompt_generator() -> AdaptivePromptGenerator:
+    """Generatore condiviso: template e sezioni memoizzate sopravvivono tra le chiamate."""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = AdaptivePromptGenerator()
+    return _generator
+
 # Funzioni di utilità per uso esterno
 def generate_simple_prompt(strategy_type: str, model: str) -> str:
     """Genera un prompt semplice."""
-    generator = AdaptivePromptGenerator()
+    generator = get_prompt_generator()
     return generator.generate_adaptive_prompt(
         strategy_type=strategy_type,
         model=model,
@@ -521,7 +528,7 @@ def generate_simple_prompt(strategy_type: str, model: str) -> str:
 
 def generate_complex_prompt(strategy_type: str, model: str) -> str:
     """Genera un prompt complesso."""
-    generator = AdaptivePromptGenerator()
+    generator = get_prompt_generator()
     return generator.generate_adaptive_prompt(
         strategy_type=strategy_type,
         model=model,
@@ -532,7 +539,7 @@ def generate_complex_prompt(strategy_type: str, model: str) -> str:
 
 def generate_random_prompt(strategy_type: str, model: str) -> str:
     """Genera un prompt completamente casuale."""
-    generator = AdaptivePromptGenerator()
+    generator = get_prompt_generator()
     return generator.generate_adaptive_prompt(
         strategy_type=strategy_type,
         model=model,
@@ -545,7 +552,7 @@ def generate_adaptive_prompt(strategy_type: str, model: str,
                            complexity: str = "normal", style: str = "technical",
                            randomization: float = 0.3) -> str:
     """Genera un prompt adattivo personalizzato."""
-    generator = AdaptivePromptGenerator()
+    generator = get_prompt_generator()
     return generator.generate_adaptive_prompt(
         strategy_type=strategy_type,
         model=model,
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Template dei prompt caricati da file e compilati una sola volta.
+Ogni file `prompts/templates/<nome>.txt` è un template con segnaposto
+`{campo}`: il testo viene scomposto all'avvio in parti letterali e campi,
+così il rendering è una semplice concatenazione. I token si contano con
+`context_budget` per adattare i prompt al contesto (`num_ctx`) del modello.
+"""
+
+import os
+import logging
+import threading
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+from context_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Caratteri per token usati solo per troncare il testo (il conteggio è di count_tokens)
+CHARS_PER_TOKEN = 3.5
+DEFAULT_NUM_CTX = 2048      # num_ctx di query_ollama
+DEFAULT_NUM_PREDICT = 1024  # token riservati alla risposta
+
+
+def estimate_tokens(text: str) -> int:
+    """Numero di token di un testo (tokenizer locale o stima, vedi context_budget)."""
+    return count_tokens(text)
+
+
+class CompiledTemplate:
+    """Template scomposto una volta in (letterale, campo); render senza parsing."""
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field_name) for literal, field_name, _, _ in Formatter().parse(source)
+        ]
+        self.fields = {field_name for _, field_name in self._parts if field_name}
+
+    def render(self, **values) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Template '{self.name}': campi mancanti {sorted(missing)}")
+        return "".join(literal + (str(values[field_name]) if field_name else "")
+                       for literal, field_name in self._parts)
+
+
+class TemplateLibrary:
+    """Tutti i template di una directory, letti e compilati al primo accesso."""
+
+    def __init__(self, directory: str = TEMPLATES_DIR):
+        self.directory = directory
+        self.templates: Dict[str, CompiledTemplate] = {}
+        if os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith(".txt"):
+                    with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                        name = filename[:-4]
+                        self.templates[name] = CompiledTemplate(name, f.read().strip())
+        logger.debug(f"Caricati {len(self.templates)} template di prompt da {directory}")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.templates
+
+    def get(self, name: str) -> CompiledTemplate:
+        return self.templates[name]
+
+    def render(self, name: str, **values) -> str:
+        return self.templates[name].render(**values)
+
+
+_library: Optional[TemplateLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_template_library() -> TemplateLibrary:
+    """Libreria di template condivisa (caricata una volta per processo)."""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = TemplateLibrary()
+    return _library
+
+
+def prompt_token_budget(num_ctx: int = DEFAULT_NUM_CTX, num_predict: int = DEFAULT_NUM_PREDICT) -> int:
+    """Token disponibili per il prompt, lasciando spazio alla risposta."""
+    return max(num_ctx - num_predict, num_ctx // 4)
+
+
+def trim_to_budget(text: str, max_tokens: int) -> str:
+    """
+    Riduce un prompt entro max_tokens.
+
+    Il prompt è diviso in paragrafi (righe vuote): il primo (la richiesta) e
+    l'ultimo (l'istruzione finale) restano sempre; si eliminano i paragrafi
+    intermedi a partire dagli ultimi, che nei template sono i meno essenziali.
+    Se non basta, il testo intermedio viene troncato.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    paragraphs = text.split("\n\n")
+    if len(paragraphs) < 3:
+        return text[:int(max_tokens * CHARS_PER_TOKEN)]
+
+    head, middle, tail = paragraphs[0], paragraphs[1:-1], paragraphs[-1]
+    while middle and estimate_tokens("\n\n".join([head, *middle, tail])) > max_tokens:
+        middle.pop()
+    trimmed = "\n\n".join([head, *middle, tail])
+    if estimate_tokens(trimmed) > max_tokens:
+        body = trimmed[:-len(tail) - 2]
+        room = max(0, int(max_tokens * CHARS_PER_TOKEN) - len(tail) - 2)
+        trimmed = f"{body[:room]}\n\n{tail}"
+        while room and estimate_tokens(trimmed) > max_tokens:
+            room = int(room * 0.9)
+            trimmed = f"{body[:room]}\n\n{tail}"
+    logger.info(f"✂️ Prompt ridotto da ~{estimate_tokens(text)} a ~{estimate_tokens(trimmed)} token")
+    return trimmed
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Gestione connessioni SQLite persistenti.
+Una connessione per thread e per database, aperta una sola volta in modalità
+WAL (i lettori non bloccano lo scrittore e viceversa), con busy_timeout e
+cache degli statement preparati: le query ripetute con lo stesso SQL non
+vengono ricompilate ad ogni chiamata.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_CACHED_STATEMENTS = 256
+
+
+class SQLiteConnectionManager:
+    """
+    Connessioni riutilizzabili verso un singolo database SQLite.
+
+    In scrittura il database viene portato in WAL con synchronous=NORMAL;
+    in sola lettura (readonly=True) si apre con mode=ro e non si modifica
+    il journal, così da poter leggere database di altri processi (Freqtrade).
+    """
+
+    def __init__(self, db_path: str, readonly: bool = False,
+                 busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+                 cached_statements: int = DEFAULT_CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.readonly = readonly
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout_ms / 1000,
+                                   isolation_level=None, check_same_thread=False,
+                                   cached_statements=self.cached_statements)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000,
+                                   isolation_level=None, check_same_thread=False,
+                                   cached_statements=self.cached_statements)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Connessione del thread corrente (creata alla prima richiesta)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError(f"Connection manager chiuso: {self.db_path}")
+                conn = self._connect()
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """Esegue uno statement (autocommit se fuori da transaction())."""
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> int:
+        """Inserimento a lotti in un'unica transazione."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self.transaction() as conn:
+            conn.executemany(sql, rows)
+        return len(rows)
+
+    def executescript(self, script: str):
+        self.connection().executescript(script)
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        return self.connection().execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Transazione esplicita: commit all'uscita, rollback in caso di errore."""
+        conn = self.connection()
+        if conn.in_transaction:
+            # Transazione annidata: lascia il controllo a quella esterna
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if not self.readonly else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        """Chiude le connessioni di tutti i thread."""
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.debug(f"Chiusura connessione {self.db_path}: {e}")
+        self._local = threading.local()
+
+
+_managers: Dict[Tuple[str, bool], SQLiteConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: str, readonly: bool = False) -> SQLiteConnectionManager:
+    """Manager condiviso per database (stesso path e modalità → stesse connessioni)."""
+    key = (os.path.abspath(db_path), readonly)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None or manager._closed:
+            manager = SQLiteConnectionManager(db_path, readonly=readonly)
+            _managers[key] = manager
+        return manager
+
+
+def close_connection_manager(db_path: str, readonly: bool = False):
+    """Chiude e rimuove il manager condiviso di un database, se esiste."""
+    with _managers_lock:
+        manager = _managers.pop((os.path.abspath(db_path), readonly), None)
+    if manager:
+        manager.close()
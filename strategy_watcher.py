@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Watcher delle strategie e dei risultati di backtest.
+Mantiene in memoria l'indice dei file di `user_data/strategies` e
+`user_data/backtest_results`, aggiornato da inotify (Linux, via ctypes) o,
+dove non disponibile, da una scansione periodica. Gli script interrogano
+l'indice invece di rileggere le directory a ogni esecuzione e i file di
+strategia appena creati possono avviare validazione o post-processing.
+"""
+
+import os
+import ctypes
+import ctypes.util
+import select
+import struct
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+STRATEGY = "strategy"
+BACKTEST = "backtest"
+
+DEFAULT_STRATEGIES_DIR = "user_data/strategies"
+DEFAULT_BACKTEST_DIR = "user_data/backtest_results"
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Costanti di <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    INOTIFY_AVAILABLE = True
+except (OSError, AttributeError):
+    _libc = None
+    INOTIFY_AVAILABLE = False
+
+CreatedCallback = Callable[[str, str], None]
+
+
+@dataclass(frozen=True)
+class WatchedFile:
+    """File indicizzato dal watcher."""
+    path: str
+    name: str
+    kind: str
+    mtime_ns: int
+    size: int
+
+
+def _accepts(kind: str, name: str) -> bool:
+    """Filtro dei nomi per tipo di directory."""
+    if name.startswith('.') or name.endswith('.tmp'):
+        return False
+    if kind == STRATEGY:
+        return name.endswith('.py') and not name.startswith('__')
+    return True
+
+
+def backtest_strategy_name(filename: str) -> Optional[str]:
+    """Nome della strategia da un file `backtest-<strategia>-<data>.json`, None se non è un risultato."""
+    if not filename.endswith('.json') or filename.endswith('.meta.json') or not filename.startswith('backtest-'):
+        return None
+    return filename.replace('backtest-', '').split('-')[0]
+
+
+class _Inotify:
+    """Descrittore inotify con un watch per directory."""
+
+    def __init__(self):
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fallita")
+        self.watches: Dict[int, str] = {}
+
+    def add_watch(self, directory: str, kind: str):
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch fallita per {directory}: {os.strerror(err)}")
+        self.watches[wd] = kind
+
+    def read_events(self, timeout: float) -> List[Tuple[str, int, str]]:
+        """Eventi (tipo directory, maschera, nome) arrivati entro `timeout` secondi."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((self.watches.get(wd, ""), mask, name))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class StrategyWatcher:
+    """
+    Indice in memoria di strategie e risultati di backtest.
+
+    Finché il watcher non è avviato ogni interrogazione riscansiona le
+    directory (una sola `scandir` ciascuna); una volta avviato l'indice è
+    aggiornato dagli eventi del filesystem e le interrogazioni non toccano
+    il disco. Nella modalità a polling un file nuovo è segnalato come creato
+    solo quando dimensione e mtime restano stabili tra due scansioni.
+    """
+
+    def __init__(self, strategies_dir: str = DEFAULT_STRATEGIES_DIR, backtest_dir: str = DEFAULT_BACKTEST_DIR,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, use_inotify: bool = True):
+        self.directories = {STRATEGY: strategies_dir, BACKTEST: backtest_dir}
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and INOTIFY_AVAILABLE
+
+        self._files: Dict[str, Dict[str, WatchedFile]] = {STRATEGY: {}, BACKTEST: {}}
+        self._pending: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._callbacks: List[Tuple[Optional[str], CreatedCallback]] = []
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        self.mode: Optional[str] = None
+        self.stats = {'scans': 0, 'events': 0, 'created': 0, 'removed': 0}
+
+    # ------------------------------------------------------------------
+    # Ciclo di vita
+    # ------------------------------------------------------------------
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def on_created(self, callback: CreatedCallback, kind: Optional[str] = STRATEGY):
+        """Registra `callback(kind, path)` per i file creati (kind None: tutti i tipi)."""
+        with self._lock:
+            self._callbacks.append((kind, callback))
+
+    def start(self) -> "StrategyWatcher":
+        """Indicizza le directory e avvia il thread di osservazione."""
+        if self.is_running:
+            return self
+        self.mode = "polling"
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+                for kind, directory in self.directories.items():
+                    self._inotify.add_watch(directory, kind)
+                self.mode = "inotify"
+            except OSError as e:
+                logger.warning(f"⚠️ inotify non disponibile, uso il polling: {e}")
+                self._close_inotify()
+        # Scansione dopo i watch: nessun file creato nel frattempo va perso
+        self.scan()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="strategy-watcher")
+        self._thread.start()
+        logger.info(f"👁️ Watcher strategie avviato ({self.mode})")
+        return self
+
+    def stop(self):
+        """Ferma il thread di osservazione; l'indice torna a essere riletto su richiesta."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(1.0, self.poll_interval * 2))
+            self._thread = None
+        self._close_inotify()
+
+    def _close_inotify(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._inotify is not None:
+                    self._handle_events(self._inotify.read_events(timeout=0.5))
+                else:
+                    self._stop.wait(self.poll_interval)
+                    if not self._stop.is_set():
+                        self._dispatch(self.scan(settle=True))
+            except Exception as e:
+                logger.error(f"❌ Errore nel watcher strategie: {e}")
+                self._stop.wait(self.poll_interval)
+
+    # ------------------------------------------------------------------
+    # Aggiornamento dell'indice
+    # ------------------------------------------------------------------
+
+    def _stat_entry(self, kind: str, name: str) -> Optional[WatchedFile]:
+        path = os.path.join(self.directories[kind], name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return WatchedFile(path, name, kind, stat.st_mtime_ns, stat.st_size)
+
+    def scan(self, settle: bool = False) -> List[WatchedFile]:
+        """
+        Riallinea l'indice al contenuto delle directory.
+
+        Args:
+            settle: Se True (polling) i file nuovi restano in attesa finché
+                dimensione e mtime non risultano stabili tra due scansioni
+
+        Returns:
+            File entrati nell'indice con questa scansione
+        """
+        created = []
+        with self._lock:
+            self.stats['scans'] += 1
+            for kind, directory in self.directories.items():
+                current: Dict[str, WatchedFile] = {}
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if not _accepts(kind, entry.name) or not entry.is_file():
+                                continue
+                            stat = entry.stat()
+                            current[entry.name] = WatchedFile(os.path.join(directory, entry.name), entry.name,
+                                                              kind, stat.st_mtime_ns, stat.st_size)
+                except FileNotFoundError:
+                    pass
+
+                known = self._files[kind]
+                seen = set(current)
+                for name in [name for name in current if name not in known]:
+                    record = current[name]
+                    if settle and self._pending.pop((kind, name), None) != (record.mtime_ns, record.size):
+                        # Ancora in scrittura (o appena comparso): si ricontrolla alla prossima scansione
+                        self._pending[(kind, name)] = (record.mtime_ns, record.size)
+                        del current[name]
+                        continue
+                    created.append(record)
+                for key in [key for key in self._pending if key[0] == kind and key[1] not in seen]:
+                    del self._pending[key]
+
+                self.stats['removed'] += sum(1 for name in known if name not in seen)
+                self._files[kind] = current
+        return created
+
+    def _handle_events(self, events: List[Tuple[str, int, str]]):
+        if not events:
+            return
+        created = []
+        rescan = False
+        with self._lock:
+            for kind, mask, name in events:
+                self.stats['events'] += 1
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    # Directory rimossa o sostituita: il watch non è più valido
+                    logger.warning("⚠️ Directory osservata rimossa o spostata, passo al polling")
+                    self._close_inotify()
+                    self.mode = "polling"
+                    rescan = True
+                    continue
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("⚠️ Coda inotify piena, riscansione completa")
+                    rescan = True
+                    continue
+                if not kind or mask & IN_ISDIR or not _accepts(kind, name):
+                    continue
+                known = self._files[kind]
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    if known.pop(name, None) is not None:
+                        self.stats['removed'] += 1
+                    continue
+                record = self._stat_entry(kind, name)
+                if record is None:
+                    known.pop(name, None)
+                    continue
+                if name not in known:
+                    created.append(record)
+                known[name] = record
+        if rescan:
+            created.extend(self.scan())
+        self._dispatch(created)
+
+    def _dispatch(self, created: List[WatchedFile]):
+        """Chiama i callback per i file creati (fuori dal lock)."""
+        if not created:
+            return
+        with self._lock:
+            self.stats['created'] += len(created)
+            callbacks = list(self._callbacks)
+        for record in created:
+            for kind, callback in callbacks:
+                if kind is not None and kind != record.kind:
+                    continue
+                try:
+                    callback(record.kind, record.path)
+                except Exception as e:
+                    logger.error(f"❌ Errore nel gestire {record.path}: {e}")
+
+    # ------------------------------------------------------------------
+    # Interrogazioni
+    # ------------------------------------------------------------------
+
+    def files(self, kind: str) -> List[WatchedFile]:
+        """File indicizzati di un tipo, ordinati per nome."""
+        with self._lock:
+            if not self.is_running:
+                self.scan()
+            return sorted(self._files[kind].values(), key=lambda record: record.name)
+
+    def strategy_files(self) -> List[str]:
+        """Percorsi dei file di strategia."""
+        return [record.path for record in self.files(STRATEGY)]
+
+    def strategy_names(self) -> List[str]:
+        """Nomi delle strategie (file senza estensione)."""
+        return [record.name[:-3] for record in self.files(STRATEGY)]
+
+    def has_strategy(self, name: str) -> bool:
+        """Verifica se esiste il file di una strategia."""
+        return f"{name}.py" in {record.name for record in self.files(STRATEGY)}
+
+    def backtest_files(self, suffix: str = '.json') -> List[str]:
+        """Percorsi dei risultati di backtest (esclusi i .meta.json)."""
+        return [record.path for record in self.files(BACKTEST)
+                if record.name.endswith(suffix) and not record.name.endswith('.meta.json')]
+
+    def backtested_strategies(self) -> Set[str]:
+        """Strategie che hanno almeno un risultato di backtest."""
+        names = (backtest_strategy_name(record.name) for record in self.files(BACKTEST))
+        return {name for name in names if name}
+
+
+def validate_new_strategy(kind: str, path: str):
+    """Callback: valida la strategia appena creata (scalda la cache di validazione)."""
+    from agents.strategy_validation_service import get_validation_service
+    facts = get_validation_service().validate_file(path)
+    if not facts.syntax_valid:
+        logger.warning(f"⚠️ Nuova strategia non valida {os.path.basename(path)}: {facts.syntax_error}")
+
+
+def postprocess_new_strategy(kind: str, path: str):
+    """Callback: corregge il nome classe e sposta la strategia se non valida."""
+    from agents.strategy_postprocess import postprocess_strategy
+    if os.path.exists(path):
+        postprocess_strategy(path)
+
+
+# Watcher condivisi per coppia di directory
+_watchers: Dict[Tuple[str, str], StrategyWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def get_strategy_watcher(strategies_dir: str = DEFAULT_STRATEGIES_DIR,
+                         backtest_dir: str = DEFAULT_BACKTEST_DIR) -> StrategyWatcher:
+    """Ottiene il watcher condiviso per le directory indicate (non lo avvia)."""
+    key = (os.path.abspath(strategies_dir), os.path.abspath(backtest_dir))
+    with _watchers_lock:
+        if key not in _watchers:
+            _watchers[key] = StrategyWatcher(strategies_dir, backtest_dir)
+        return _watchers[key]
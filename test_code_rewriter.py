@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test del motore di riscrittura strutturata delle strategie
+"""
+
+import ast
+import sys
+import importlib.util
+
+from agents.code_rewriter import StrategyRewriter, CodeTransformError
+
+REQUESTS_AVAILABLE = importlib.util.find_spec("requests") is not None
+
+STRATEGY = '''
+from pandas import DataFrame
+from freqtrade.strategy import IStrategy, IntParameter
+
+
+class SampleStrategy(IStrategy):
+    """Strategia di esempio."""
+    minimal_roi = {"0": 0.05}
+    stoploss = -0.10  # stop largo
+    buy_rsi = IntParameter(10, 40, default=30, space="buy")
+    sell_rsi = 70
+
+    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        # Indicatore personalizzato da preservare
+        dataframe['custom'] = dataframe['close'].rolling(7).mean()
+        return dataframe
+
+    def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe.loc[
+            (dataframe['close'] > dataframe['custom']),
+            'enter_long'] = 1
+        return dataframe
+
+    def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe.loc[(dataframe['close'] < dataframe['custom']), 'exit_long'] = 1
+        return dataframe
+'''
+
+
+def test_transforms_are_idempotent():
+    """Ogni trasformazione applicata due volte produce lo stesso codice."""
+    print("🧪 Test idempotenza")
+
+    def transform(code):
+        rewriter = StrategyRewriter(code)
+        rewriter.set_class_attribute('stoploss', -0.015)
+        rewriter.set_class_attribute('trailing_stop', True)
+        rewriter.set_parameter_default('buy_rsi', 25.0)
+        rewriter.set_parameter_default('sell_rsi', 75)
+        rewriter.add_parameter('atr_period', 'IntParameter', 10, 20, 14, 'buy')
+        rewriter.ensure_module_import('talib.abstract', 'ta')
+        rewriter.add_indicator(['rsi'], ["dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)"])
+        rewriter.add_signal_rule("dataframe['rsi'] < 20")
+        rewriter.add_condition_to_signals("dataframe['volume'] > 0")
+        return rewriter.result()
+
+    first = transform(STRATEGY)
+    ast.parse(first.code)
+    assert "stoploss = -0.015  # stop largo" in first.code
+    assert 'default=25, space="buy"' in first.code
+    assert "sell_rsi = 75" in first.code
+    assert "from freqtrade.strategy import IStrategy, IntParameter" in first.code
+    assert "import talib.abstract as ta" in first.code
+    assert "# Indicatore personalizzato da preservare" in first.code
+    assert "((dataframe['close'] > dataframe['custom']) & (dataframe['volume'] > 0))" in first.code
+    assert "dataframe.loc[(dataframe['rsi'] < 20) & (dataframe['volume'] > 0), 'enter_long'] = 1" in first.code
+
+    second = transform(first.code)
+    assert second.code == first.code
+    assert not second.changed and second.changes == []
+    print("✅ Trasformazioni idempotenti")
+
+
+def test_diff_and_invalid_input():
+    """Il diff riporta solo le righe toccate; il codice non valido viene rifiutato."""
+    print("🧪 Test diff e input non valido")
+    rewriter = StrategyRewriter(STRATEGY)
+    rewriter.set_class_attribute('minimal_roi', {"0": 0.03})
+    diff = rewriter.result().diff()
+    removed = [l for l in diff.splitlines() if l.startswith('-') and not l.startswith('---')]
+    added = [l for l in diff.splitlines() if l.startswith('+') and not l.startswith('+++')]
+    assert removed == ['-    minimal_roi = {"0": 0.05}']
+    assert added == ['+    minimal_roi = {"0": 0.03}']
+
+    try:
+        StrategyRewriter("class Broken(:\n    pass")
+        assert False, "CodeTransformError attesa"
+    except CodeTransformError:
+        pass
+    print("✅ Diff preciso")
+
+
+def test_optimizer_integration():
+    """OptimizerAgent e HyperoptLLMOptimizer usano le trasformazioni strutturate."""
+    print("🧪 Test integrazione ottimizzatori")
+    if not REQUESTS_AVAILABLE:
+        print("⚠️ requests non disponibile, test saltato")
+        return
+    from agents.optimizer import OptimizerAgent
+    from agents.hyperopt_optimizer import HyperoptLLMOptimizer
+
+    agent = OptimizerAgent()
+    suggestions = ["Migliorare le condizioni di entrata", "Migliorare la gestione del rischio",
+                   "Aggiungere indicatori", "Rendere i parametri ottimizzabili", "Aggiungere filtri di trend"]
+    optimized = agent._apply_optimizations(STRATEGY, suggestions, "SampleStrategy")
+    ast.parse(optimized)
+    assert "dataframe['custom'] = dataframe['close'].rolling(7).mean()" in optimized
+    assert "dataframe['trend_up']" in optimized and "dataframe['sma_50']" in optimized
+    assert "atr_multiplier = DecimalParameter(" in optimized
+    assert agent._apply_optimizations(optimized, suggestions, "SampleStrategy") == optimized
+
+    changes = agent._calculate_changes(STRATEGY, optimized)
+    assert changes['optimized_code'] == optimized
+    assert changes['diff'].startswith('--- a/strategy.py')
+
+    optimizer = HyperoptLLMOptimizer.__new__(HyperoptLLMOptimizer)
+    tuned = optimizer._apply_hyperopt_params(STRATEGY, {'roi': 0.04, 'stoploss': -0.05, 'buy_rsi': 35.0})
+    assert 'minimal_roi = {"0": 0.04}' in tuned
+    assert "stoploss = -0.05" in tuned
+    assert 'IntParameter(10, 40, default=35, space="buy")' in tuned
+    print("✅ Ottimizzatori integrati")
+
+
+if __name__ == "__main__":
+    tests = [test_transforms_are_idempotent, test_diff_and_invalid_input, test_optimizer_integration]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test del budget di contesto: conteggio token, num_ctx e compressione del codice
+"""
+
+import sys
+
+from context_budget import (CTX_MARGIN, choose_num_ctx, compress_code, count_tokens, fit_code, fit_prompt,
+                            truncate_code)
+
+STRATEGY = '''
+"""Strategia di esempio."""
+import talib.abstract as ta
+from freqtrade.strategy import IStrategy
+
+
+class Sample(IStrategy):
+    """Docstring lunga della strategia."""
+    # ROI minimo
+    minimal_roi = {"0": 0.05, "30": 0.02}
+    stoploss = -0.1
+    order_types = {"entry": "limit", "exit": "limit", "stoploss": "market"}
+    plot_config = {"main_plot": {"ema": {}}, "subplots": {"RSI": {"rsi": {"color": "red"}}}}
+
+    def populate_indicators(self, dataframe, metadata):
+        """Calcola gli indicatori."""
+        # RSI a 14 periodi
+        dataframe["rsi"] = ta.RSI(dataframe, timeperiod=14)
+
+        return dataframe
+
+    def populate_entry_trend(self, dataframe, metadata):
+        dataframe.loc[dataframe["rsi"] < 30, "enter_long"] = 1
+        return dataframe
+'''
+
+
+def test_count_and_num_ctx():
+    """Il num_ctx scelto è il gradino più piccolo che contiene prompt e risposta."""
+    print("🧪 Test conteggio token e num_ctx")
+    assert count_tokens("") == 0
+    assert count_tokens("a b c") == 3
+    assert count_tokens("x" * 400) > count_tokens("x" * 40) > 0
+    assert count_tokens(STRATEGY) > len(STRATEGY) / 6
+
+    assert choose_num_ctx(100, 512) == 1024
+    assert choose_num_ctx(1024 - 512 - CTX_MARGIN + 1, 512) == 2048
+    assert choose_num_ctx(100, 512, min_ctx=2048) == 2048
+    assert choose_num_ctx(100, 3072) == 4096
+    assert choose_num_ctx(50000, 3072) == 8192
+    assert choose_num_ctx(50000, 3072, max_ctx=16384) == 16384
+    print("✅ Contesto minimo sufficiente")
+
+
+def test_compress_code():
+    """Livelli di compressione: commenti e docstring, poi boilerplate; la logica resta."""
+    print("🧪 Test compressione codice")
+    stripped = compress_code(STRATEGY, 1)
+    assert "#" not in stripped and "Docstring" not in stripped and "Calcola" not in stripped
+    assert "ta.RSI(dataframe, timeperiod=14)" in stripped and "plot_config" in stripped
+    assert "\n\n" not in stripped
+    compile(stripped, "<compresso>", "exec")
+
+    elided = compress_code(STRATEGY, 2)
+    assert "plot_config = ..." in elided and "order_types = ..." in elided and "main_plot" not in elided
+    assert "minimal_roi = {'0': 0.05, '30': 0.02}" in elided
+    assert count_tokens(elided) < count_tokens(stripped) < count_tokens(STRATEGY)
+
+    broken = "def f(:\n    # commento\n\n    return 1\n"
+    assert compress_code(broken, 2) == "def f(:\n    return 1"
+    assert compress_code(STRATEGY, 0) == STRATEGY
+    print("✅ Codice compresso senza perdere la logica")
+
+
+def test_fit_code_and_prompt():
+    """Si comprime solo quanto serve; oltre il livello 2 si tronca tenendo inizio e fine."""
+    print("🧪 Test adattamento al budget")
+    assert fit_code(STRATEGY, 10000).level == 0
+    assert fit_code(STRATEGY, count_tokens(compress_code(STRATEGY, 1))).level == 1
+    assert fit_code(STRATEGY, count_tokens(compress_code(STRATEGY, 2))).level == 2
+
+    long_code = "\n".join(f"value_{i} = compute({i})" for i in range(500))
+    fitted = fit_code(long_code, 300)
+    assert fitted.level == 3 and fitted.tokens <= 300
+    assert fitted.code.startswith("value_0 = compute(0)") and fitted.code.endswith("value_499 = compute(499)")
+    assert "righe omesse" in fitted.code
+    assert truncate_code("a = 1", 100) == "a = 1"
+
+    def render(code):
+        return f"Analizza questa strategia.\n\nCODICE:\n{code}\n\nRispondi con una lista."
+
+    assert fit_prompt(render, STRATEGY, num_predict=512) == render(STRATEGY)
+    prompt = fit_prompt(render, long_code, num_predict=512, max_ctx=1024)
+    assert prompt.startswith("Analizza") and prompt.endswith("Rispondi con una lista.")
+    assert count_tokens(prompt) + 512 + CTX_MARGIN <= 1024
+    print("✅ Prompt entro il contesto")
+
+
+if __name__ == "__main__":
+    tests = [test_count_and_num_ctx, test_compress_code, test_fit_code_and_prompt]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test dell'archivio SQLite delle sessioni cooperative
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from conversation_store import ConversationStore
+
+
+def _populate(store):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    store.save_session({
+        "session_id": "s1", "session_type": "contest", "strategy_type": "momentum",
+        "start_time": start, "status": "completed", "participants": ["cogito:8b", "phi3:mini"],
+        "duration": 12.5, "end_time": start + timedelta(seconds=12.5),
+    })
+    store.save_session({
+        "session_id": "s2", "session_type": "consensus", "strategy_type": "breakout",
+        "start_time": start + timedelta(minutes=5), "status": "running", "participants": ["cogito:8b"],
+    })
+    for i, (session_id, model, role) in enumerate([
+        ("s1", "cogito:8b", "generator"), ("s1", "phi3:mini", "validator"),
+        ("s1", "cogito:8b", "validator"), ("s2", "cogito:8b", "contestant"),
+    ]):
+        store.add_conversation({
+            "conversation_id": f"c{i}", "session_id": session_id, "model": model, "role": role,
+            "prompt": "Genera strategia " * 200, "response": f"risposta {i} " + "x" * 3000,
+            "timestamp": start + timedelta(seconds=i), "duration": 2.0 + i, "tokens_generated": 10.0,
+        })
+    store.add_consensus_round({
+        "round_id": "r1", "session_id": "s2", "round_number": 1, "participants": ["cogito:8b"],
+        "ideas_collected": {"cogito:8b": "usa RSI"}, "synthesis": "RSI + EMA",
+        "timestamp": start, "duration": 1.5,
+    })
+
+
+def test_queries_and_compression():
+    """Query per sessione e per modello, testo completo compresso."""
+    print("🧪 Test query e compressione")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ConversationStore(os.path.join(tmp, "coop.db"))
+        _populate(store)
+
+        conversations = store.conversations_by_session("s1")
+        assert [c["conversation_id"] for c in conversations] == ["c0", "c1", "c2"]
+        assert conversations[0]["prompt"] == "Genera strategia " * 200
+        assert len(conversations[0]["response"]) > 3000
+        assert isinstance(conversations[0]["timestamp"], datetime)
+        assert "prompt" not in store.conversations_by_session("s1", include_text=False)[0]
+
+        stats = store.model_stats("cogito:8b")
+        assert stats["conversations"] == 3
+        assert stats["roles"] == {"contestant": 1, "generator": 1, "validator": 1}
+        assert stats["avg_duration"] == (2.0 + 4.0 + 5.0) / 3
+        assert stats["total_tokens"] == 30.0
+        assert store.model_stats("mistral:7b")["conversations"] == 0
+
+        assert [c["conversation_id"] for c in store.recent_conversations(2)] == ["c3", "c2"]
+        assert [c["conversation_id"] for c in store.recent_conversations(model="phi3:mini")] == ["c1"]
+        assert [s["session_id"] for s in store.recent_sessions(1)] == ["s2"]
+        assert store.rounds_by_session("s2")[0]["ideas_collected"] == {"cogito:8b": "usa RSI"}
+        assert store.participant_counts() == {"cogito:8b": 2, "phi3:mini": 1}
+        assert store.session_counts() == {"completed": 1, "running": 1}
+
+        blob = store._execute("SELECT response FROM conversations WHERE conversation_id = 'c0'")[0][0]
+        assert len(blob) < 500
+        store.close()
+    print("✅ Query e compressione corrette")
+
+
+def test_indexed_lookups():
+    """Le query per sessione e per modello usano gli indici."""
+    print("🧪 Test piani di esecuzione")
+    store = ConversationStore(":memory:")
+    for query, params in [
+        ("SELECT * FROM conversations WHERE session_id = ? ORDER BY timestamp", ("s1",)),
+        ("SELECT role, COUNT(*) FROM conversations WHERE model = ? GROUP BY role", ("m",)),
+        ("SELECT * FROM conversations ORDER BY timestamp DESC LIMIT 5", ()),
+        ("SELECT * FROM consensus_rounds WHERE session_id = ? ORDER BY round_number", ("s1",)),
+    ]:
+        plan = " ".join(row[3] for row in store._execute(f"EXPLAIN QUERY PLAN {query}", params))
+        assert "USING INDEX" in plan or "USING COVERING INDEX" in plan, plan
+    store.close()
+    print("✅ Lookup su indice")
+
+
+def test_persistence_across_restart():
+    """Lo storico sopravvive alla riapertura dell'archivio."""
+    print("🧪 Test persistenza")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "coop.db")
+        store = ConversationStore(path)
+        _populate(store)
+        store.close()
+
+        reopened = ConversationStore(path)
+        assert reopened.count_conversations() == 4
+        assert reopened.count_rounds() == 1
+        session = reopened.get_session("s1")
+        assert session["participants"] == ["cogito:8b", "phi3:mini"]
+        assert session["duration"] == 12.5
+        assert reopened.average_session_duration() == 12.5
+
+        session["status"] = "failed"
+        reopened.save_session(session)
+        assert reopened.session_counts() == {"failed": 1, "running": 1}
+        reopened.close()
+    print("✅ Storico persistente")
+
+
+if __name__ == "__main__":
+    tests = [test_queries_and_compression, test_indexed_lookups, test_persistence_across_restart]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test della propagazione delle scadenze e della ripartizione tra fasi
+"""
+
+import sys
+import threading
+import contextvars
+
+import deadlines
+from deadlines import Deadline, DeadlineExceeded, StagePlan, call_timeout, current_deadline, deadline_scope
+from agents.timeout_manager import TimeoutManager, base_timeout
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_nested_deadlines():
+    """Una scadenza figlia non supera mai quella del padre."""
+    print("🧪 Test scadenze annidate")
+    clock = FakeClock()
+    parent = Deadline(60, "pipeline", clock=clock)
+    child = Deadline(600, "fase", parent)
+    assert child.remaining() == 60 and child.clock is clock
+    clock.now += 45
+    assert parent.remaining() == 15 and not parent.expired
+    clock.now += 20
+    assert parent.expired and parent.remaining() == 0
+
+    assert current_deadline() is None and call_timeout(600) == 600 and call_timeout(None) is None
+    with deadline_scope(100, "pipeline") as outer:
+        assert current_deadline() is outer
+        assert 99 < call_timeout(600) <= 100 and call_timeout(30) == 30
+        with deadline_scope(1000, "fase") as inner:
+            assert inner.remaining() <= 100
+        with deadline_scope(None) as same:
+            assert same is outer
+    assert current_deadline() is None
+
+    with deadline_scope(1):
+        try:
+            call_timeout(600)
+            assert False, "scadenza esaurita non segnalata"
+        except DeadlineExceeded as e:
+            assert isinstance(e, TimeoutError)
+    print("✅ Timeout limitati dal tempo rimasto")
+
+
+def test_stage_plan_rolls_over():
+    """Le quote si calcolano sul tempo rimasto: il tempo risparmiato passa alle fasi successive."""
+    print("🧪 Test ripartizione tra fasi")
+    plan = StagePlan({"stage1_text": 1.0, "stage2_code": 2.0, "fix": 1.0})
+    assert plan.share("stage1_text", 1200) == 300
+
+    clock = FakeClock()
+    token = deadlines._current.set(Deadline(1200, "generation", clock=clock))
+    try:
+        shares = []
+        with plan.stage("stage1_text") as d:
+            shares.append(d.remaining())
+            clock.now += 60             # fase veloce: usa 60s su 300
+        with plan.stage("stage2_code") as d:
+            shares.append(d.remaining())
+            clock.now += d.remaining()  # fase lenta: consuma tutta la quota
+        with plan.stage("fix") as d:
+            shares.append(d.remaining())
+    finally:
+        deadlines._current.reset(token)
+    assert shares == [300, 1140 * 2 / 3, 380], shares
+
+    free = StagePlan({"a": 1.0})
+    with free.stage("a") as d:
+        assert d is None
+    print("✅ Fasi lente non bloccano le successive")
+
+
+def test_threads_inherit_deadline():
+    """I thread avviati con copy_context().run ereditano la scadenza."""
+    print("🧪 Test scadenza nei thread")
+    seen = []
+    with deadline_scope(50, "contest") as deadline:
+        thread = threading.Thread(target=contextvars.copy_context().run,
+                                  args=(lambda: seen.append(current_deadline()),))
+        thread.start()
+        thread.join()
+    assert seen == [deadline]
+    print("✅ Scadenza propagata ai partecipanti")
+
+
+def test_unified_base_timeouts():
+    """Una sola tabella: nomi esatti, famiglie di modelli e valore di default."""
+    print("🧪 Test tabella unica dei timeout")
+    assert base_timeout("phi3") == base_timeout("phi3:latest") == 600
+    assert base_timeout("mistral:7b-instruct-q4_0") == base_timeout("mistral:latest") == 1800
+    assert base_timeout("llama2:13b") == 1200 and base_timeout("sconosciuto") == 1800
+    manager = TimeoutManager("/nonexistent/timeout_config.json")
+    assert manager.get_optimal_timeout("cogito:8b", "cooperative") == int(3000 * 1.5)
+    print("✅ Timeout base coerenti")
+
+
+if __name__ == "__main__":
+    tests = [test_nested_deadlines, test_stage_plan_rolls_over, test_threads_inherit_deadline,
+             test_unified_base_timeouts]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Test del dry-run host multi-strategia
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+
+from dry_run_host import (Candle, DryRunHost, OHLCVReplaySource, PaperAccount, StrategySignals,
+                          ohlcv_filename, timeframe_to_ms)
+
+STEP = timeframe_to_ms("5m")
+
+
+class LevelRunner:
+    """Strategia di prova: segnali quando la chiusura tocca livelli prefissati."""
+
+    def __init__(self, enter_on, exit_on, stoploss=-0.5, minimal_roi=None):
+        self.enter_on = set(enter_on)
+        self.exit_on = set(exit_on)
+        self.stoploss = stoploss
+        self.minimal_roi = minimal_roi or {}
+        self.frames_seen = []
+
+    def signals(self, pair, frame):
+        self.frames_seen.append(id(frame))
+        close = frame[-1].close
+        return StrategySignals(enter_long=close in self.enter_on, exit_long=close in self.exit_on)
+
+
+class BrokenRunner:
+    stoploss = -0.1
+
+    def signals(self, pair, frame):
+        raise KeyError("rsi")
+
+
+def _write_ohlcv(directory, pair, closes, start=0):
+    rows = [[start + i * STEP, c, c * 1.001, c * 0.999, c, 10.0] for i, c in enumerate(closes)]
+    os.makedirs(os.path.join(directory, "futures"), exist_ok=True)
+    with open(os.path.join(directory, "futures", ohlcv_filename(pair, "5m") + ".json"), "w") as f:
+        json.dump(rows, f)
+
+
+def test_replay_source():
+    """Le candele di più coppie escono in ordine di tempo; in follow arrivano solo le nuove."""
+    print("🧪 Test sorgente OHLCV")
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_ohlcv(tmp, "BTC/USDT:USDT", [100, 101, 102])
+        _write_ohlcv(tmp, "ETH/USDT:USDT", [10, 11], start=STEP // 2)
+        source = OHLCVReplaySource(tmp, ["BTC/USDT:USDT", "ETH/USDT:USDT"])
+        candles = list(source)
+        assert [c.timestamp for c in candles] == sorted(c.timestamp for c in candles)
+        assert [c.pair[:3] for c in candles] == ["BTC", "ETH", "BTC", "ETH", "BTC"]
+        assert ohlcv_filename("BTC/USDT:USDT", "5m") == "BTC_USDT_USDT-5m-futures"
+
+        assert source.poll() == []
+        _write_ohlcv(tmp, "BTC/USDT:USDT", [100, 101, 102, 103])
+        assert [c.close for c in source.poll()] == [103.0]
+
+        late = OHLCVReplaySource(tmp, ["BTC/USDT:USDT"], start_ms=2 * STEP)
+        assert [c.close for c in late.poll()] == [102.0, 103.0]
+    print("✅ Flusso ordinato e incrementale")
+
+
+def test_shared_stream_many_strategies():
+    """Una finestra per candela condivisa tra le strategie, conti separati per strategia."""
+    print("🧪 Test host multi-strategia")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "dry_run.db")
+        host = DryRunHost(db_path, window=50, frame_builder=list)
+        runners = {
+            "Eager": LevelRunner(enter_on={101}, exit_on={105}),
+            "Patient": LevelRunner(enter_on={103}, exit_on={105}),
+            "Broken": BrokenRunner(),
+        }
+        for name, runner in runners.items():
+            host.add_strategy(name, runner, stake_amount=100.0, pairs=["BTC/USDT:USDT"])
+
+        closes = [100, 101, 102, 103, 104, 105, 106, 103, 102, 101]
+        candles = [Candle("BTC/USDT:USDT", i * STEP, c, c, c, c, 1.0) for i, c in enumerate(closes)]
+        assert host.run(candles) == len(closes)
+
+        assert runners["Eager"].frames_seen == runners["Patient"].frames_seen
+        eager, patient = host.get_summary("Eager"), host.get_summary("Patient")
+        assert eager["total_trades"] == 1 and patient["total_trades"] == 1
+        assert eager["total_profit"] > patient["total_profit"] > 0
+        assert host.get_summary("Broken")["status"] == "failed"
+        assert host.get_summary("Broken")["last_error"].startswith("KeyError")
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT strategy_name, exit_reason FROM host_trades ORDER BY strategy_name").fetchall()
+        conn.close()
+        assert rows == [("Eager", "exit_signal"), ("Patient", "exit_signal")]
+
+        final = host.remove_strategy("Eager")
+        assert final["strategy_name"] == "Eager" and "Eager" not in host.strategies
+    print("✅ Strategie isolate sullo stesso flusso")
+
+
+def test_warmup_does_not_trade():
+    """Le candele di warm-up riempiono solo la finestra; si opera dalla prima candela dopo l'avvio."""
+    print("🧪 Test warm-up senza trade")
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_ohlcv(tmp, "BTC/USDT:USDT", [101, 105, 101, 102])
+        refreshed = []
+
+        def refresh(pairs):
+            refreshed.append(pairs)
+            _write_ohlcv(tmp, "BTC/USDT:USDT", [101, 105, 101, 102, 103, 105, 104])
+
+        host = DryRunHost(os.path.join(tmp, "dry_run.db"), window=50, frame_builder=list)
+        runner = LevelRunner(enter_on={101, 103}, exit_on={105})
+        host.add_strategy("Warm", runner, stake_amount=100.0, pairs=["BTC/USDT:USDT"])
+        host.trade_from_ms = 4 * STEP
+        source = OHLCVReplaySource(tmp, ["BTC/USDT:USDT"], refresh=refresh)
+
+        assert host.run(source) == 7 and refreshed == [["BTC/USDT:USDT"]]
+        assert host.warmup_candles == 4 and len(host.windows["BTC/USDT:USDT"]) == 7
+        # Solo le candele live generano segnali: un trade aperto su 103, chiuso su 105
+        assert len(runner.frames_seen) == 3
+        summary = host.get_summary("Warm")
+        assert summary["candles_processed"] == 3 and summary["total_trades"] == 1
+        assert summary["open_trades"] == 0
+    print("✅ Warm-up senza ordini")
+
+
+def test_paper_account_exits():
+    """Stoploss sui minimi, ROI per durata, limite di trade aperti."""
+    print("🧪 Test conto simulato")
+    account = PaperAccount("S", wallet=1000, stake_amount=100, max_open_trades=1,
+                           stoploss=-0.05, minimal_roi={"0": 0.10, "10": 0.02}, fee=0.0)
+    enter = StrategySignals(enter_long=True)
+    account.on_candle(Candle("A", 0, 100, 100, 100, 100, 1), enter)
+    account.on_candle(Candle("B", 0, 50, 50, 50, 50, 1), enter)
+    account.on_candle(Candle("A", STEP, 100, 101, 99, 100, 1), None)
+    account.on_candle(Candle("B", STEP, 50, 50, 50, 50, 1), None)
+    assert list(account.open_trades) == ["A"]
+
+    closed = account.on_candle(Candle("A", 2 * STEP, 100, 100, 94, 96, 1), None)
+    assert closed[0].exit_reason == "stop_loss" and abs(closed[0].close_rate - 95) < 1e-9
+    assert account.summary()["consecutive_losses"] == 1
+
+    account.on_candle(Candle("A", 3 * STEP, 96, 96, 96, 96, 1), enter)
+    account.on_candle(Candle("A", 4 * STEP, 100, 100, 100, 100, 1), None)
+    assert account.on_candle(Candle("A", 5 * STEP, 101, 101, 101, 101, 1), None) == []
+    closed = account.on_candle(Candle("A", 6 * STEP, 101, 103, 101, 103, 1), None)
+    assert closed[0].exit_reason == "roi"
+    summary = account.summary()
+    assert summary["total_trades"] == 2 and summary["win_rate"] == 0.5
+    assert summary["max_drawdown"] > 0
+    print("✅ Uscite simulate corrette")
+
+
+if __name__ == "__main__":
+    tests = [test_replay_source, test_shared_stream_many_strategies, test_warmup_does_not_trade,
+             test_paper_account_exits]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Test delle metriche incrementali del dry run
+"""
+
+import os
+import sys
+import math
+import sqlite3
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+from dry_run_metrics import ClosedTrade, IncrementalPerformance, read_freqtrade_trades_since
+import dry_run_manager
+from dry_run_manager import DryRunConfig, DryRunManager, PerformanceMetrics
+from dry_run_host import DryRunHost, SimulatedTrade
+
+PROFITS = [12.0, -5.0, -7.5, 20.0, -30.0, -2.0, -1.0, 40.0, 3.0, -4.0]
+START = datetime(2024, 3, 1, 10, 0, 0)
+
+
+def _trades():
+    # Due trade al giorno, con un giorno senza trade a metà
+    times = [START + timedelta(days=i // 2 + (i >= 6), hours=i % 2) for i in range(len(PROFITS))]
+    return [ClosedTrade(i + 1, t, p, p / 100) for i, (t, p) in enumerate(zip(times, PROFITS))]
+
+
+def _reference(trades, wallet):
+    """Ricalcolo completo dallo storico, da confrontare con lo stato incrementale."""
+    equity = [wallet + sum(t.profit_abs for t in trades[:i + 1]) for i in range(len(trades))]
+    peaks = [max([wallet] + equity[:i + 1]) for i in range(len(equity))]
+    drawdowns = [(p - e) / p for p, e in zip(peaks, equity)]
+    streak = 0
+    for t in trades:
+        streak = streak + 1 if t.profit_abs <= 0 else 0
+    days = {}
+    for t in trades:
+        days[t.close_time.date()] = days.get(t.close_time.date(), 0.0) + t.profit_abs
+    first, last = min(days), max(days)
+    daily = [days.get(first + timedelta(days=i), 0.0) / wallet for i in range((last - first).days + 1)]
+    mean = sum(daily) / len(daily)
+    std = math.sqrt(sum((r - mean) ** 2 for r in daily) / (len(daily) - 1))
+    return {"max_drawdown": max(drawdowns), "current_drawdown": drawdowns[-1], "consecutive_losses": streak,
+            "sharpe_ratio": mean / std * math.sqrt(365), "daily_return": daily[-1]}
+
+
+def test_matches_full_recompute():
+    """Lo stato incrementale coincide con il ricalcolo completo, anche a lotti."""
+    print("🧪 Test metriche incrementali")
+    trades = _trades()
+    performance = IncrementalPerformance(wallet=1000.0)
+    performance.add_trades(trades[:3])
+    performance.add_trades(trades[3:7])
+    performance.add_trades(trades[7:])
+
+    expected = _reference(trades, 1000.0)
+    snapshot = performance.snapshot()
+    for key, value in expected.items():
+        assert abs(snapshot[key] - value) < 1e-9, (key, snapshot[key], value)
+    assert snapshot["total_trades"] == 10 and snapshot["win_rate"] == 0.4
+    assert abs(snapshot["total_return"] - sum(PROFITS) / 1000) < 1e-12
+    assert performance.watermark == (trades[-1].close_time.isoformat(), 10)
+    print("✅ Metriche incrementali corrette")
+
+
+def test_daily_return_rollover():
+    """Il rendimento giornaliero si azzera al cambio di giorno, anche senza trade."""
+    print("🧪 Test cambio di giorno")
+    day = START.date()
+    performance = IncrementalPerformance(wallet=1000.0)
+    performance.add_trade(ClosedTrade(1, START, -50.0, -0.05))
+    assert performance.snapshot(as_of=day)["daily_return"] == -0.05
+
+    snapshot = performance.snapshot(as_of=day + timedelta(days=2))
+    assert snapshot["daily_return"] == 0.0
+    # Tre giorni: -5%, 0 (senza trade), 0 (oggi, provvisorio)
+    assert performance.daily_returns.count == 2
+
+    # Un trade di ieri arrivato in ritardo conta sul giorno corrente
+    performance.add_trade(ClosedTrade(2, START + timedelta(days=1), 20.0, 0.02))
+    assert performance.current_day == day + timedelta(days=2)
+    assert performance.snapshot(as_of=day + timedelta(days=2))["daily_return"] == 0.02
+    print("✅ Rendimento giornaliero per giorno di calendario")
+
+
+def _create_freqtrade_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY, strategy TEXT, is_open BOOLEAN, "
+                 "close_date DATETIME, close_profit FLOAT, close_profit_abs FLOAT)")
+    conn.executemany("INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_watermark_reader():
+    """Solo i trade chiusi dopo il watermark, anche se chiusi fuori ordine di id."""
+    print("🧪 Test watermark")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "dry_run_S.db")
+        _create_freqtrade_db(db_path, [
+            (1, "S", 0, "2024-03-01 10:00:00.000000", 0.01, 1.0),
+            (2, "S", 1, None, None, None),
+            (3, "S", 0, "2024-03-01 09:00:00.000000", -0.02, -2.0),
+            (4, "Other", 0, "2024-03-01 11:00:00.000000", 0.05, 5.0),
+        ])
+        first = read_freqtrade_trades_since(db_path, "S")
+        assert [t.trade_id for t in first] == [3, 1]
+        performance = IncrementalPerformance()
+        performance.add_trades(first)
+        assert read_freqtrade_trades_since(db_path, "S", performance.watermark) == []
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE trades SET is_open = 0, close_date = '2024-03-01 12:00:00.000000', "
+                     "close_profit = 0.03, close_profit_abs = 3.0 WHERE id = 2")
+        conn.commit()
+        conn.close()
+        new = read_freqtrade_trades_since(db_path, "S", performance.watermark)
+        assert [t.trade_id for t in new] == [2]
+        performance.add_trades(new)
+        assert performance.total_trades == 3 and performance.total_profit == 2.0
+    print("✅ Watermark corretto")
+
+
+def test_manager_risk_checks():
+    """Il manager aggiorna le metriche in modo incrementale e i limiti di rischio le usano."""
+    print("🧪 Test manager e limiti di rischio")
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            manager = DryRunManager(db_path="dry_run.db")
+            config = DryRunConfig("S", risk_limits={"max_drawdown": 0.05, "max_consecutive_losses": 5,
+                                                    "min_win_rate": 0.0, "max_daily_loss": 1.0})
+            manager.active_runs["S"] = config
+            manager.performance_metrics["S"] = PerformanceMetrics("S", datetime.now())
+            manager.performance_state["S"] = IncrementalPerformance(wallet=1000.0)
+
+            _create_freqtrade_db("dry_run_S.db", [(1, "S", 0, "2024-03-01 10:00:00.000000", 0.02, 20.0)])
+            manager._update_performance_metrics("S")
+            manager._check_risk_limits("S")
+            assert "S" in manager.active_runs
+            assert manager.performance_metrics["S"].total_return == 0.02
+
+            _create_freqtrade_db("dry_run_S.db", [(2, "S", 0, "2024-03-01 11:00:00.000000", -0.6, -60.0)])
+            manager._update_performance_metrics("S")
+            metrics = manager.performance_metrics["S"]
+            assert metrics.total_trades == 2 and metrics.consecutive_losses == 1
+            assert abs(metrics.current_drawdown - 60 / 1020) < 1e-9
+            manager._check_risk_limits("S")
+            assert "S" not in manager.active_runs and "S" not in manager.performance_state
+
+            # Modalità condivisa: i trade arrivano in push dal DryRunHost
+            manager.performance_state["H"] = IncrementalPerformance(wallet=1000.0)
+            manager._on_host_trade(SimulatedTrade("H", "BTC/USDT:USDT", False, 0, 100.0, 1.0, 100.0,
+                                                  close_time=1709287200000, close_rate=90.0, profit_abs=-10.0))
+            assert manager.performance_state["H"].consecutive_losses == 1
+        finally:
+            os.chdir(cwd)
+    print("✅ Limiti di rischio su metriche corrette")
+
+
+def _wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_event_driven_risk_stop():
+    """Un trade che supera i limiti ferma il dry run subito, senza attendere il giro completo."""
+    print("🧪 Test controllo rischi guidato da eventi")
+    limits = {"max_drawdown": 0.05, "max_consecutive_losses": 5, "min_win_rate": 0.0, "max_daily_loss": 1.0}
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            # Modalità freqtrade: commit nel database della strategia
+            manager = DryRunManager(db_path="dry_run.db", risk_poll_interval=0.05)
+            manager.monitor_interval = 3600
+            _create_freqtrade_db("dry_run_S.db", [(1, "S", 0, "2024-03-01 10:00:00.000000", 0.01, 10.0)])
+            manager.active_runs["S"] = DryRunConfig("S", risk_limits=dict(limits))
+            manager.performance_metrics["S"] = PerformanceMetrics("S", datetime.now())
+            manager.performance_state["S"] = IncrementalPerformance(wallet=1000.0)
+            manager.start_monitoring()
+            assert _wait_until(lambda: manager.performance_metrics["S"].total_trades == 1)
+
+            _create_freqtrade_db("dry_run_S.db", [(2, "S", 0, "2024-03-01 11:00:00.000000", -0.9, -90.0)])
+            assert _wait_until(lambda: "S" not in manager.active_runs), "dry run non fermato"
+            manager.stop_monitoring()
+
+            # Modalità condivisa: evento dal DryRunHost
+            shared = DryRunManager(db_path="dry_run.db", mode="shared", risk_poll_interval=0.05)
+            shared.monitor_interval = 3600
+            shared.active_runs["H"] = DryRunConfig("H", risk_limits=dict(limits))
+            shared.performance_metrics["H"] = PerformanceMetrics("H", datetime.now())
+            shared.performance_state["H"] = IncrementalPerformance(wallet=1000.0)
+            shared.start_monitoring()
+            shared._on_host_trade(SimulatedTrade("H", "BTC/USDT:USDT", False, 0, 100.0, 1.0, 100.0,
+                                                 close_time=1709287200000, close_rate=10.0, profit_abs=-90.0))
+            assert _wait_until(lambda: "H" not in shared.active_runs), "dry run condiviso non fermato"
+            shared.stop_monitoring()
+        finally:
+            os.chdir(cwd)
+    print("✅ Limiti applicati all'arrivo del trade")
+
+
+class _FakeProcess:
+    pid = 4242
+
+
+def test_shared_fallback_is_supervised():
+    """Senza feed live un run "shared" parte come processo freqtrade e viene gestito come tale."""
+    print("🧪 Test fallback a freqtrade")
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        saved = (dry_run_manager.CCXT_AVAILABLE, dry_run_manager.subprocess.Popen, dry_run_manager.subprocess.run)
+        commands = []
+        try:
+            dry_run_manager.CCXT_AVAILABLE = False
+            dry_run_manager.subprocess.Popen = lambda cmd, **kwargs: commands.append(cmd) or _FakeProcess()
+            dry_run_manager.subprocess.run = lambda cmd, **kwargs: commands.append(cmd)
+            os.makedirs("user_data/strategies")
+            open("user_data/strategies/s.py", "w").close()
+
+            manager = DryRunManager(db_path="dry_run.db", mode="shared", host_settings={"follow": True})
+            assert manager.start_dry_run("S")
+            assert commands[0][:2] == ["freqtrade", "trade"] and manager.host is None
+            assert not manager._is_hosted("S")
+
+            _create_freqtrade_db("dry_run_S.db", [(1, "S", 0, "2024-03-01 10:00:00.000000", 0.01, 10.0)])
+            assert manager._changed_freqtrade_dbs() == ["S"]
+
+            assert manager.stop_dry_run("S")
+            assert commands[-1] == "pkill -f 'freqtrade.*S'"
+            assert manager.run_modes == {}
+        finally:
+            dry_run_manager.CCXT_AVAILABLE, dry_run_manager.subprocess.Popen, dry_run_manager.subprocess.run = saved
+            os.chdir(cwd)
+    print("✅ Processo freqtrade fermato allo stop")
+
+
+def test_host_follows_union_of_pairs():
+    """Le coppie di un run aggiunto dopo l'avvio entrano nel flusso, con il loro warm-up."""
+    print("🧪 Test coppie dell'host")
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = dry_run_manager.CCXT_AVAILABLE
+        try:
+            dry_run_manager.CCXT_AVAILABLE = False
+            manager = DryRunManager(db_path=os.path.join(tmp, "dry_run.db"), mode="shared",
+                                    host_settings={"data_dir": tmp, "follow": True, "poll_interval": 3600})
+            manager.host = DryRunHost(manager.db_path, window=10, frame_builder=list)
+            manager._ensure_host_running(["BTC/USDT:USDT"])
+            manager.active_runs["A"] = DryRunConfig("A", pairs=["BTC/USDT:USDT"])
+            manager._ensure_host_running(["BTC/USDT:USDT", "ETH/USDT:USDT"])
+            assert manager.host.source.pairs == ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+            assert set(manager.host.pair_trade_from_ms) == {"ETH/USDT:USDT"}
+            assert manager.host.pair_trade_from_ms["ETH/USDT:USDT"] >= manager.host.trade_from_ms
+        finally:
+            dry_run_manager.CCXT_AVAILABLE = saved
+            if manager.host:
+                manager.host.stop()
+    print("✅ Unione delle coppie dei run attivi")
+
+
+if __name__ == "__main__":
+    tests = [test_matches_full_recompute, test_daily_return_rollover, test_watermark_reader, test_manager_risk_checks,
+             test_event_driven_risk_stop, test_shared_fallback_is_supervised, test_host_follows_union_of_pairs]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test del canale Server-Sent Events delle dashboard
+"""
+
+import sys
+import json
+
+from event_stream import EventBroker, format_sse, parse_last_event_id
+
+
+def _parse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return int(fields["id"]), fields["event"], json.loads(fields["data"])
+
+
+def test_publish_and_stream():
+    """Gli eventi pubblicati arrivano in ordine ai client connessi."""
+    print("🧪 Test pubblicazione eventi")
+    broker = EventBroker()
+    stream = broker.stream(heartbeat=0.05)
+    assert next(stream) == "retry: 3000\n\n"
+    assert broker.subscriber_count() == 1
+
+    broker.publish("request_started", {"id": "a"})
+    broker.publish("request_finished", {"id": "a", "status": "completed"})
+    assert _parse(next(stream)) == (1, "request_started", {"id": "a"})
+    assert _parse(next(stream))[1] == "request_finished"
+    assert next(stream) == ": keepalive\n\n"
+
+    # I dati sono fotografati alla pubblicazione, non quando il client li legge
+    stats = {"total": 1}
+    broker.publish("stats", stats)
+    stats["total"] = 2
+    broker.publish("stats", stats)
+    assert [_parse(next(stream))[2] for _ in range(2)] == [{"total": 1}, {"total": 2}]
+    assert broker.publish_if_changed("stats", stats) is not None
+    stats["total"] = 3
+    assert broker.publish_if_changed("stats", stats) is not None
+
+    stream.close()
+    assert broker.subscriber_count() == 0
+    assert format_sse({"x": 1}, "stats", 7) == 'id: 7\nevent: stats\ndata: {"x": 1}\n\n'
+    print("✅ Eventi ricevuti in ordine")
+
+
+def test_replay_and_reset():
+    """Riconnessione con Last-Event-ID: replay se possibile, altrimenti reset."""
+    print("🧪 Test riconnessione")
+    broker = EventBroker(replay_size=3)
+    for i in range(5):
+        broker.publish("tick", {"i": i})
+
+    resumed = broker.subscribe(last_event_id=parse_last_event_id("3"))
+    assert [resumed.get_nowait()[0] for _ in range(2)] == [4, 5]
+
+    stale = broker.subscribe(last_event_id=1)
+    assert stale.get_nowait()[1] == "reset"
+    assert parse_last_event_id("abc") is None
+    print("✅ Replay e reset corretti")
+
+
+def test_slow_client_and_dedup():
+    """Un client lento riceve un reset; i valori invariati non vengono ripubblicati."""
+    print("🧪 Test client lento e deduplicazione")
+    broker = EventBroker(subscriber_queue_size=4)
+    slow = broker.subscribe()
+    for i in range(10):
+        broker.publish("tick", {"i": i})
+    events = []
+    while not slow.empty():
+        events.append(slow.get_nowait())
+    assert events[0][1] == "reset" and len(events) <= 4
+
+    assert broker.publish_if_changed("models", [{"name": "phi3", "is_available": True}]) is not None
+    assert broker.publish_if_changed("models", [{"name": "phi3", "is_available": True}]) is None
+    assert broker.publish_if_changed("models", [{"name": "phi3", "is_available": False}]) is not None
+    print("✅ Client lenti isolati")
+
+
+if __name__ == "__main__":
+    tests = [test_publish_and_stream, test_replay_and_reset, test_slow_client_and_dedup]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
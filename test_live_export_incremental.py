@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test dell'esportazione live incrementale
+"""
+
+import os
+import sys
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+from live_strategies_exporter import LiveStrategiesExporter, LiveStrategyConfig, _age_bucket
+
+GENERATED = datetime.now().isoformat()
+CODE = "from freqtrade.strategy import IStrategy\n\nclass {name}(IStrategy):\n    timeframe = '5m'\n"
+
+
+def _write_workspace(scores):
+    os.makedirs("user_data/strategies", exist_ok=True)
+    metadata = {}
+    for name, score in scores.items():
+        path = f"user_data/strategies/{name.lower()}.py"
+        if not os.path.exists(path):
+            with open(path, "w") as f:
+                f.write(CODE.format(name=name))
+        metadata[name] = {
+            "backtest_score": score,
+            "validation_status": "optimized",
+            "model_used": "cogito:8b",
+            "strategy_type": "volatility",
+            "generation_time": GENERATED
+        }
+    with open("strategies_metadata.json", "w") as f:
+        json.dump(metadata, f)
+
+
+class CountingExporter(LiveStrategiesExporter):
+    def __init__(self):
+        super().__init__(LiveStrategyConfig(portfolio_selection=False))
+        self.evaluated = []
+
+    def evaluate_strategy_for_live(self, strategy_name, metadata):
+        self.evaluated.append(strategy_name)
+        return super().evaluate_strategy_for_live(strategy_name, metadata)
+
+
+def test_incremental_export():
+    """Seconda esportazione senza cambiamenti: nessuna valutazione e nessuna copia."""
+    print("🧪 Test esportazione incrementale")
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            _write_workspace({"Alpha": 0.8, "Beta": 0.7})
+            exporter = CountingExporter()
+            result = exporter.export_best_strategies()
+            assert result["exported"] == 2 and sorted(exporter.evaluated) == ["Alpha", "Beta"]
+            assert not [f for f in os.listdir("live_strategies") if f.endswith(".tmp")]
+            live_path = "live_strategies/live_Alpha.py"
+            mtime = os.stat(live_path).st_mtime_ns
+
+            again = CountingExporter()
+            result = again.export_best_strategies()
+            assert again.evaluated == [] and result["exported"] == 0 and result["unchanged"] == 2
+            assert os.stat(live_path).st_mtime_ns == mtime
+
+            # Solo il punteggio cambia: rivalutazione senza copia
+            _write_workspace({"Alpha": 0.9, "Beta": 0.7})
+            third = CountingExporter()
+            result = third.export_best_strategies()
+            assert third.evaluated == ["Alpha"] and result["exported"] == 0
+            assert os.stat(live_path).st_mtime_ns == mtime
+            with open("live_strategies/live_strategies_metadata.json") as f:
+                assert json.load(f)["Alpha"]["evaluation_score"] == third.live_metadata["Alpha"]["evaluation_score"]
+
+            # Il codice cambia: rivalutazione, backup e riscrittura
+            with open("user_data/strategies/beta.py", "a") as f:
+                f.write("    stoploss = -0.05\n")
+            fourth = CountingExporter()
+            result = fourth.export_best_strategies()
+            assert fourth.evaluated == ["Beta"] and result["exported"] == 1
+            with open("live_strategies/live_Beta.py") as f:
+                assert "stoploss" in f.read()
+            assert any(name.startswith("live_Beta.py.") for name in os.listdir("live_strategies_backup"))
+        finally:
+            os.chdir(cwd)
+    print("✅ Solo le strategie cambiate vengono rivalutate e copiate")
+
+
+def test_identical_content_not_copied():
+    """Metadati live persi ma file identico: niente backup né riscrittura."""
+    print("🧪 Test contenuto identico")
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            _write_workspace({"Gamma": 0.8})
+            CountingExporter().export_best_strategies()
+            os.remove("live_strategies/live_strategies_metadata.json")
+            mtime = os.stat("live_strategies/live_Gamma.py").st_mtime_ns
+
+            exporter = CountingExporter()
+            assert exporter.export_best_strategies()["exported"] == 1
+            assert os.stat("live_strategies/live_Gamma.py").st_mtime_ns == mtime
+            assert os.listdir("live_strategies_backup") == []
+            assert exporter.live_metadata["Gamma"]["code_hash"]
+        finally:
+            os.chdir(cwd)
+    print("✅ Nessuna copia per contenuto identico")
+
+
+def test_age_bucket_stable():
+    """Le strategie vecchie restano nella stessa fascia: l'impronta non cambia ogni giorno."""
+    print("🧪 Test fascia di età stabile")
+    now = datetime.now()
+    assert _age_bucket((now - timedelta(days=2)).isoformat()) == "recent"
+    assert _age_bucket((now - timedelta(days=20)).isoformat()) == "moderate"
+    assert _age_bucket((now - timedelta(days=40)).isoformat()) == "old"
+    assert _age_bucket((now - timedelta(days=41)).isoformat()) == "old"
+    assert _age_bucket("non-una-data") == "invalid"
+    print("✅ Fascia di età costante oltre la soglia")
+
+
+if __name__ == "__main__":
+    tests = [test_incremental_export, test_identical_content_not_copied, test_age_bucket_stable]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test del probing dei modelli senza inferenza
+"""
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+from llm_health import ModelHealthProber, LatencySampleStore
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+
+class FakeOllama:
+    """Simula /api/tags, /api/ps e /api/generate registrando le chiamate."""
+
+    def __init__(self, installed, resident):
+        self.installed = installed
+        self.resident = resident
+        self.generate_calls = []
+
+    def get(self, url, timeout=None):
+        names = self.installed if url.endswith("/api/tags") else self.resident
+        return FakeResponse({"models": [{"name": name} for name in names]})
+
+    def post(self, url, json=None, timeout=None):
+        self.generate_calls.append(json["model"])
+        return FakeResponse({"response": "ok"})
+
+
+def test_check_without_inference():
+    """Modelli usati di recente non ricevono generazioni di prova."""
+    print("🧪 Test controllo senza inferenza")
+    ollama = FakeOllama(installed=["phi3:latest", "mistral:latest"], resident=["mistral:latest"])
+    prober = ModelHealthProber(models=["phi3", "mistral", "llama2"], session=ollama, probe_idle_window=60)
+    prober.record_latency("phi3", 1.5)
+    prober.record_latency("mistral", 2.0)
+
+    health = prober.check()
+    assert ollama.generate_calls == []
+    assert health["mistral"].installed and health["mistral"].resident
+    assert health["phi3"].installed and not health["phi3"].resident
+    assert not health["llama2"].installed and not health["llama2"].is_available
+    assert health["phi3"].avg_latency == 1.5
+    print("✅ Nessuna generazione inviata")
+
+
+def test_probe_only_idle_unverified():
+    """Il probe attivo parte solo dopo la finestra di inattività."""
+    print("🧪 Test probe su modelli inattivi")
+    ollama = FakeOllama(installed=["phi3", "mistral"], resident=[])
+    prober = ModelHealthProber(models=["phi3", "mistral"], session=ollama, probe_idle_window=60)
+    prober.record_latency("mistral", 3.0, timestamp=time.time() - 120)
+    prober.record_latency("phi3", 1.0)
+
+    prober.check()
+    assert ollama.generate_calls == ["mistral"]
+    assert prober.health["mistral"].probe_count == 1
+
+    # Appena verificato: nessun nuovo probe al ciclo successivo
+    prober.check()
+    assert ollama.generate_calls == ["mistral"]
+
+    disabled = ModelHealthProber(models=["phi3"], session=FakeOllama(["phi3"], []), probe_idle_window=None)
+    disabled.check()
+    assert disabled.session.generate_calls == []
+    print("✅ Probe solo dove necessario")
+
+
+def test_passive_failures_and_ewma():
+    """Errori e latenze dal traffico reale aggiornano lo stato."""
+    print("🧪 Test metriche passive")
+    prober = ModelHealthProber(models=["phi3"], session=FakeOllama(["phi3"], []), ewma_alpha=0.5)
+    prober.record_latency("phi3", 2.0)
+    prober.record_latency("phi3", 4.0)
+    prober.record_latency("phi3:latest", None, success=False)
+    entry = prober.health["phi3"]
+    assert entry.avg_latency == 3.0 and entry.last_latency == 4.0
+    assert entry.success_count == 2 and entry.error_count == 1
+    print("✅ Metriche passive aggiornate")
+
+
+def test_samples_shared_across_processes():
+    """Le latenze registrate da un altro processo arrivano al monitor."""
+    print("🧪 Test campioni condivisi tra processi")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "latency.db")
+        monitor_store = LatencySampleStore(db_path)
+        ollama = FakeOllama(installed=["phi3", "mistral"], resident=[])
+        prober = ModelHealthProber(models=["phi3", "mistral"], session=ollama,
+                                   probe_idle_window=60, sample_store=monitor_store)
+
+        client = (
+            "import sys, llm_health\n"
+            "llm_health._store_instance = llm_health.LatencySampleStore(sys.argv[1])\n"
+            "llm_health.record_model_latency('phi3:latest', 1.5)\n"
+            "llm_health.record_model_latency('phi3', None, success=False)\n"
+        )
+        subprocess.run([sys.executable, "-c", client, db_path], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        prober.check()
+        assert prober.health["phi3"].avg_latency == 1.5
+        assert prober.health["phi3"].error_count == 1
+        # phi3 ha traffico recente, solo mistral riceve il probe
+        assert ollama.generate_calls == ["mistral"]
+
+        # I campioni già letti non vengono riapplicati
+        assert prober.ingest_shared_samples() == 0
+        assert prober.health["phi3"].success_count == 1
+    print("✅ Campioni del client visti dal monitor")
+
+
+if __name__ == "__main__":
+    tests = [test_check_without_inference, test_probe_only_idle_unverified, test_passive_failures_and_ewma,
+             test_samples_shared_across_processes]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
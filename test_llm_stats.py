@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test delle strutture a memoria limitata del monitor LLM
+"""
+
+import os
+import sys
+import random
+import tempfile
+from types import SimpleNamespace
+
+from llm_stats import QuantileSketch, RequestHistory, ResponseLog
+
+
+def test_quantile_sketch_accuracy():
+    """I quantili stimati restano entro l'errore relativo dichiarato."""
+    print("🧪 Test sketch dei quantili")
+    rng = random.Random(7)
+    values = [rng.lognormvariate(1.0, 1.2) for _ in range(50000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    ordered = sorted(values)
+    for q in (0.5, 0.95, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(sketch.quantile(q) - exact) / exact <= 0.02, q
+    assert len(sketch.buckets) < 1000
+    assert abs(sketch.mean - sum(values) / len(values)) < 1e-6
+
+    bounded = QuantileSketch(max_buckets=16)
+    for value in values:
+        bounded.add(value)
+    assert len(bounded.buckets) <= 16
+    print("✅ Quantili accurati con memoria limitata")
+
+
+def test_request_history_is_bounded():
+    """Lo storico mantiene solo le ultime richieste, globali e per modello."""
+    print("🧪 Test ring buffer richieste")
+    history = RequestHistory(capacity=100, per_model_capacity=10)
+    for i in range(1000):
+        history.add(SimpleNamespace(id=str(i), model="phi3" if i % 2 else "mistral"))
+
+    assert len(history) == 100
+    assert [r.id for r in history.recent(3)] == ["999", "998", "997"]
+    assert [r.id for r in history.recent(2, model="mistral")] == ["998", "996"]
+    assert len(history.recent(50, model="phi3")) == 10
+    assert history.get("0") is None and history.get("950").id == "950"
+    print("✅ Storico limitato")
+
+
+def test_response_log_roundtrip():
+    """Le risposte complete vengono rilette dal log compresso tramite riferimento."""
+    print("🧪 Test log risposte compresso")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = ResponseLog(os.path.join(tmp, "responses.jsonl.gz"), max_bytes=300)
+        refs = [log.append({"id": str(i), "response": f"risposta {i} " * 50}) for i in range(20)]
+        assert log.generation > 0
+        latest = log.read(refs[-1])
+        assert latest["id"] == "19" and latest["response"].startswith("risposta 19")
+        # I record ruotati via oltre il file precedente non sono più leggibili
+        assert log.read(refs[0]) is None
+    print("✅ Risposte su disco")
+
+
+if __name__ == "__main__":
+    tests = [test_quantile_sketch_accuracy, test_request_history_is_bounded, test_response_log_roundtrip]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Test della sincronizzazione incrementale dei dati di mercato
+"""
+
+import os
+import sys
+import time
+import json
+import tempfile
+import threading
+
+from market_data_sync import (DataManifest, MarketDataSync, RateLimiter, find_gaps, parse_timerange,
+                              subtract_ranges)
+from dry_run_host import load_ohlcv_rows, timeframe_to_ms
+
+STEP = timeframe_to_ms("5m")
+START, _ = parse_timerange("20240101-")
+PAIRS = [f"{coin}/USDT:USDT" for coin in ("BTC", "ETH", "SOL", "BNB", "XRP", "ADA", "DOGE", "AVAX", "DOT", "LINK")]
+
+
+class FakeExchangeFeed:
+    """Exchange locale: candele sintetiche deterministiche, latenza simulata e buchi opzionali."""
+
+    def __init__(self, latency=0.0, holes=None, published_until=None):
+        self.latency = latency
+        self.holes = holes or {}
+        self.published_until = published_until
+        self.calls = []
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def fetch_ohlcv(self, pair, timeframe, since, limit):
+        with self._lock:
+            self.calls.append((pair, since))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        now = int(time.time() * 1000)
+        if self.published_until is not None:
+            now = min(now, self.published_until)
+        ts = (since + STEP - 1) // STEP * STEP
+        rows = []
+        while len(rows) < limit and ts + STEP <= now:
+            if not any(start <= ts < end for start, end in self.holes.get(pair, [])):
+                price = 100.0 + (ts // STEP) % 50
+                rows.append([ts, price, price + 1, price - 1, price + 0.5, 10.0])
+            ts += STEP
+        with self._lock:
+            self.in_flight -= 1
+        return rows
+
+
+def test_ranges():
+    """Intervalli mancanti e buchi di continuità."""
+    print("🧪 Test intervalli")
+    assert subtract_ranges(0, 100, [(10, 20), (30, 40)]) == [(0, 10), (20, 30), (40, 100)]
+    assert subtract_ranges(0, 100, [(0, 100)]) == []
+    rows = [[0], [STEP], [4 * STEP], [5 * STEP]]
+    assert find_gaps(rows, STEP, 0, 7 * STEP) == [(2 * STEP, 4 * STEP), (6 * STEP, 7 * STEP)]
+    print("✅ Intervalli corretti")
+
+
+def test_incremental_sync():
+    """Il secondo sync non scarica nulla; estendere l'intervallo scarica solo la coda."""
+    print("🧪 Test sync incrementale")
+    with tempfile.TemporaryDirectory() as tmp:
+        feed = FakeExchangeFeed()
+        end = START + 3000 * STEP
+        syncer = MarketDataSync(tmp, feed, requests_per_second=0)
+        results = syncer.sync(PAIRS[:2], START, end)
+        assert all(r.ok and r.candles_fetched == 3000 and not r.holes for r in results.values())
+        assert results[PAIRS[0]].requests == 3
+
+        path = syncer.file_path(PAIRS[0])
+        assert path.endswith(os.path.join("futures", "BTC_USDT_USDT-5m-futures.json"))
+        rows = load_ohlcv_rows(path)
+        assert len(rows) == 3000 and rows[0][0] == START
+
+        calls = len(feed.calls)
+        reloaded = MarketDataSync(tmp, feed, requests_per_second=0)
+        again = reloaded.sync(PAIRS[:2], START, end)
+        assert len(feed.calls) == calls and all(r.requests == 0 for r in again.values())
+
+        extended = reloaded.sync(PAIRS[:1], START, end + 100 * STEP)
+        assert extended[PAIRS[0]].candles_fetched == 100
+        assert extended[PAIRS[0]].gaps_fetched == [(end, end + 100 * STEP)]
+        assert len(load_ohlcv_rows(path)) == 3100
+    print("✅ Solo i buchi vengono scaricati")
+
+
+def test_manifest_bootstrap_and_holes():
+    """File già presenti senza manifest e buchi lato exchange."""
+    print("🧪 Test manifest da file esistenti e buchi")
+    with tempfile.TemporaryDirectory() as tmp:
+        pair = PAIRS[0]
+        syncer = MarketDataSync(tmp, FakeExchangeFeed(), requests_per_second=0)
+        path = syncer.file_path(pair)
+        os.makedirs(os.path.dirname(path))
+        existing = [[START + i * STEP, 1, 1, 1, 1, 1] for i in range(100) if not 40 <= i < 50]
+        with open(path, "w") as f:
+            json.dump(existing, f)
+
+        hole = (START + 150 * STEP, START + 160 * STEP)
+        feed = FakeExchangeFeed(holes={pair: [hole]})
+        syncer = MarketDataSync(tmp, feed, requests_per_second=0)
+        result = syncer.sync([pair], START, START + 200 * STEP)[pair]
+        assert result.gaps_fetched == [(START + 40 * STEP, START + 50 * STEP), (START + 100 * STEP, START + 200 * STEP)]
+        assert result.candles_fetched == 10 + 90
+        assert result.holes == [hole]
+
+        # Il buco non arrivato non viene segnato come coperto
+        manifest = DataManifest(syncer.manifest.path)
+        assert manifest.ranges(f"{pair}|5m|futures") == [(START, hole[0]), (hole[1], START + 200 * STEP)]
+        assert syncer.sync([pair], START, START + 200 * STEP)[pair].gaps_fetched == [hole]
+    print("✅ Manifest ricostruito, buchi segnalati")
+
+
+def test_unpublished_candles_fetched_later():
+    """Le candele non ancora pubblicate dall'exchange vengono scaricate al sync successivo."""
+    print("🧪 Test candele non ancora pubblicate")
+    with tempfile.TemporaryDirectory() as tmp:
+        pair = PAIRS[0]
+        feed = FakeExchangeFeed(published_until=START + 95 * STEP)
+        syncer = MarketDataSync(tmp, feed, requests_per_second=0)
+        first = syncer.sync([pair], START, START + 100 * STEP)[pair]
+        assert first.candles_fetched == 95 and first.holes == [(START + 95 * STEP, START + 100 * STEP)]
+
+        feed.published_until = None
+        second = syncer.sync([pair], START, START + 100 * STEP)[pair]
+        assert second.requests > 0 and second.candles_fetched == 5 and not second.holes
+        assert len(load_ohlcv_rows(syncer.file_path(pair))) == 100
+
+        try:
+            MarketDataSync(tmp, feed, data_format="parquet")
+            assert False, "formato non supportato accettato"
+        except ValueError:
+            pass
+    print("✅ Nessun buco permanente in coda")
+
+
+def test_parallel_refresh_under_rate_limit():
+    """10 coppie scaricate in parallelo: tempo vicino a una coppia sola, rate limit rispettato."""
+    print("🧪 Test download parallelo")
+    with tempfile.TemporaryDirectory() as tmp:
+        feed = FakeExchangeFeed(latency=0.1)
+        syncer = MarketDataSync(tmp, feed, max_workers=10, requests_per_second=0)
+        started = time.monotonic()
+        syncer.sync(PAIRS, START, START + 2000 * STEP)
+        elapsed = time.monotonic() - started
+        assert feed.max_in_flight > 1
+        assert elapsed < 0.1 * len(feed.calls) / 2, elapsed
+
+        limiter = RateLimiter(rate=50, burst=1)
+        started = time.monotonic()
+        for _ in range(11):
+            limiter.acquire()
+        assert time.monotonic() - started >= 0.18
+    print("✅ Download parallelo corretto")
+
+
+if __name__ == "__main__":
+    tests = [test_ranges, test_incremental_sync, test_manifest_bootstrap_and_holes,
+             test_unpublished_candles_fetched_later, test_parallel_refresh_under_rate_limit]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
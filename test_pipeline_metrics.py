@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test dell'endpoint /metrics della pipeline
+"""
+
+import sys
+import urllib.request
+
+import pipeline_metrics
+from pipeline_metrics import MetricsRegistry, start_metrics_server
+
+
+def test_text_exposition():
+    """Counter, gauge e istogrammi vengono esposti nel formato testo Prometheus."""
+    print("🧪 Test formato di esposizione")
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs", "Lavori eseguiti", ["kind"])
+    gauge = registry.gauge("pnl", "Profitto", ["strategy"])
+    histogram = registry.histogram("duration_seconds", "Durata", ["kind"], buckets=(1.0, 5.0))
+
+    counter.labels(kind="backtest").inc()
+    counter.labels(kind="backtest").inc(2)
+    gauge.labels(strategy='Strat"A').set(-1.5)
+    for value in (0.5, 3.0, 10.0):
+        histogram.labels(kind="backtest").observe(value)
+
+    text = registry.generate_latest()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="backtest"} 3' in text
+    assert 'pnl{strategy="Strat\\"A"} -1.5' in text
+    assert 'duration_seconds_bucket{kind="backtest",le="1"} 1' in text
+    assert 'duration_seconds_bucket{kind="backtest",le="5"} 2' in text
+    assert 'duration_seconds_bucket{kind="backtest",le="+Inf"} 3' in text
+    assert 'duration_seconds_count{kind="backtest"} 3' in text
+    assert registry.counter("jobs", "Lavori eseguiti", ["kind"]) is counter
+    print("✅ Formato corretto")
+
+
+def test_llm_response_metrics():
+    """Token, attesa in coda e caricamenti vengono ricavati dalla risposta Ollama."""
+    print("🧪 Test metriche LLM")
+    payload = {
+        "prompt_eval_count": 120, "eval_count": 300,
+        "total_duration": 8_000_000_000, "load_duration": 2_500_000_000,
+    }
+    pipeline_metrics.observe_llm_response("test-model", 10.0, payload)
+    pipeline_metrics.observe_llm_failure("test-model", 30.0, "timeout")
+
+    text = pipeline_metrics.REGISTRY.generate_latest()
+    assert 'llm_tokens_total{model="test-model",kind="completion"} 300' in text
+    assert 'llm_queue_wait_seconds_sum{model="test-model"} 2' in text
+    assert 'llm_model_loads_total{model="test-model"} 1' in text
+    assert 'llm_request_duration_seconds_count{model="test-model",status="timeout"} 1' in text
+    print("✅ Metriche LLM registrate")
+
+
+def test_metrics_server():
+    """Il server HTTP espone /metrics e risponde 404 altrove."""
+    print("🧪 Test server /metrics")
+    server = start_metrics_server(port=0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode()
+            assert response.headers["Content-Type"].startswith("text/plain")
+        assert "# TYPE backtest_duration_seconds histogram" in body
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other", timeout=5)
+            assert False, "404 atteso"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.shutdown()
+    print("✅ Endpoint /metrics attivo")
+
+
+if __name__ == "__main__":
+    tests = [test_text_exposition, test_llm_response_metrics, test_metrics_server]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test del tracing a span della pipeline
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+import pipeline_tracing
+from pipeline_tracing import Tracer, load_spans, summarize, to_chrome_trace, to_otlp
+
+
+def _traced_pipeline(tracer):
+    """Simula generazione → validazione (con errore gestito) → backtest per una strategia."""
+    with tracer.span("generation", strategy="MomentumA", strategy_type="momentum"):
+        with tracer.span("generation.stage1_text", model="phi3:mini"):
+            pass
+        with tracer.span("generation.stage2_code"):
+            pass
+    try:
+        with tracer.span("validation", strategy="MomentumA"):
+            raise ValueError("codice non valido")
+    except ValueError:
+        pass
+    with tracer.span("backtest", strategy="BreakoutB"):
+        pass
+
+
+def test_nesting_and_export():
+    """Gli span figli ereditano trace e strategia; errori registrati nello stato."""
+    print("🧪 Test annidamento span")
+    with tempfile.TemporaryDirectory() as tmp:
+        tracer = Tracer(os.path.join(tmp, "traces", "spans.jsonl"))
+        _traced_pipeline(tracer)
+        spans = {s.name: s for s in load_spans(tracer.path)}
+
+        root, child = spans["generation"], spans["generation.stage1_text"]
+        assert child.parent_id == root.span_id and child.trace_id == root.trace_id
+        assert child.strategy == "MomentumA"
+        assert child.attributes == {"model": "phi3:mini"}
+        assert root.parent_id is None and root.end_ns >= child.end_ns
+        assert spans["validation"].status == "error"
+        assert "codice non valido" in spans["validation"].error
+        assert spans["backtest"].trace_id != root.trace_id
+        assert pipeline_tracing.current_span() is None
+    print("✅ Span annidati ed esportati")
+
+
+def test_disabled_and_decorator():
+    """Tracer disabilitato: nessun file; decoratore legge la strategia dagli argomenti."""
+    print("🧪 Test decoratore")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "spans.jsonl")
+        tracer = pipeline_tracing.get_tracer()
+        previous = (tracer.path, tracer.enabled)
+
+        @pipeline_tracing.traced("validation")
+        def validate(code, strategy_name="LLMStrategy"):
+            return pipeline_tracing.current_span()
+
+        try:
+            pipeline_tracing.configure_tracing(path, enabled=False)
+            assert validate("x") is None
+            assert not os.path.exists(path)
+
+            pipeline_tracing.configure_tracing(path)
+            assert validate("x", strategy_name="ScalpC").strategy == "ScalpC"
+            assert validate("x").strategy == "LLMStrategy"
+            assert [s.strategy for s in load_spans(path)] == ["ScalpC", "LLMStrategy"]
+        finally:
+            tracer.path, tracer.enabled = previous
+    print("✅ Decoratore corretto")
+
+
+def test_summary_and_formats():
+    """Riepilogo per fase/strategia e conversione Chrome trace / OTLP."""
+    print("🧪 Test riepilogo ed esportazione")
+    with tempfile.TemporaryDirectory() as tmp:
+        tracer = Tracer(os.path.join(tmp, "spans.jsonl"))
+        _traced_pipeline(tracer)
+        spans = load_spans(tracer.path)
+
+        summary = summarize(spans)
+        assert summary["stages"]["generation"]["count"] == 1
+        assert summary["stages"]["validation"]["errors"] == 1
+        assert set(summary["strategies"]) == {"MomentumA", "BreakoutB"}
+        generation_total = summary["stages"]["generation"]["total_seconds"]
+        momentum_self = sum(v for k, v in summary["strategies"]["MomentumA"].items() if k.startswith("generation"))
+        assert abs(momentum_self - generation_total) < 1e-6
+        assert set(summarize(spans, "BreakoutB")["stages"]) == {"backtest"}
+
+        chrome = to_chrome_trace(spans)
+        event = next(e for e in chrome["traceEvents"] if e["name"] == "generation.stage1_text")
+        assert event["ph"] == "X" and event["cat"] == "MomentumA" and event["args"]["model"] == "phi3:mini"
+
+        otlp = to_otlp(spans)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert all(len(s["traceId"]) == 32 and len(s["spanId"]) == 16 for s in otlp)
+        failed = next(s for s in otlp if s["name"] == "validation")
+        assert failed["status"]["code"] == 2
+
+        output = os.path.join(tmp, "trace.json")
+        assert pipeline_tracing.main(["--file", tracer.path, "chrome", output]) == 0
+        with open(output) as f:
+            assert len(json.load(f)["traceEvents"]) == len(spans)
+        assert pipeline_tracing.main(["--file", tracer.path, "summary"]) == 0
+    print("✅ Riepilogo ed esportazione corretti")
+
+
+if __name__ == "__main__":
+    tests = [test_nesting_and_export, test_disabled_and_decorator, test_summary_and_formats]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test della selezione di portafoglio per le strategie live
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from portfolio_selection import (build_return_matrix, correlation_matrix, load_backtest_trades, max_drawdowns,
+                                 select_portfolio)
+from live_strategies_exporter import LiveStrategiesExporter
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def _clustered_returns(clusters, per_cluster, days, seed=7):
+    """Gruppi di strategie quasi identiche: stesso fattore di rendimento più un piccolo rumore."""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0.001, 0.01, size=(clusters, days))
+    rows = [factors[c] + rng.normal(0, 0.001, size=days) for c in range(clusters) for _ in range(per_cluster)]
+    return np.array(rows)
+
+
+def test_low_correlation_selection():
+    """Una strategia per gruppo, la migliore del gruppo, anche se i cloni hanno punteggi più alti."""
+    print("🧪 Test selezione poco correlata")
+    returns = _clustered_returns(clusters=3, per_cluster=4, days=120)
+    names = [f"S{i}" for i in range(12)]
+    scores = [0.95, 0.94, 0.93, 0.92, 0.7, 0.9, 0.6, 0.6, 0.8, 0.5, 0.5, 0.5]
+    selection = select_portfolio(names, scores, returns, max_strategies=5, max_correlation=0.7)
+    assert selection.selected == ["S0", "S5", "S8"], selection.selected
+    assert all(selection.max_correlation[name] < 0.7 for name in selection.selected)
+    assert selection.rejected["S1"].startswith("correlazione")
+
+    corr = correlation_matrix(np.vstack([returns[:2], np.zeros(120)]))
+    assert corr[0, 1] > 0.9 and corr[2, 0] == 0.0 and corr[2, 2] == 1.0
+    print("✅ Portafoglio diversificato")
+
+
+def test_drawdown_limit_and_matrix():
+    """Matrice dai trade su calendario comune e limite di drawdown del portafoglio."""
+    print("🧪 Test matrice e drawdown")
+    trades = {
+        "A": [(START, 10.0), (START + timedelta(days=2), -5.0)],
+        "B": [(START + timedelta(days=1), 20.0), (START + timedelta(days=1, hours=3), 5.0)],
+        "C": [],
+    }
+    names, days, matrix = build_return_matrix(trades, wallet=1000.0)
+    assert names == ["A", "B"] and len(days) == 3
+    assert np.allclose(matrix, [[0.01, 0.0, -0.005], [0.0, 0.025, 0.0]])
+
+    assert np.allclose(max_drawdowns(np.array([[0.1, -0.22, 0.05]])), [0.2])
+    crash = np.array([[0.01] * 10, [0.02] * 5 + [-0.5] + [0.0] * 4])
+    selection = select_portfolio(["Steady", "Crash"], [0.5, 0.9], crash, max_strategies=2, max_drawdown=0.15)
+    assert selection.selected == ["Steady"] and "Crash" in selection.rejected
+    print("✅ Drawdown di portafoglio rispettato")
+
+
+def test_scales_to_hundreds():
+    """Centinaia di candidate su un anno di rendimenti in molto meno di un secondo."""
+    print("🧪 Test scalabilità")
+    returns = _clustered_returns(clusters=50, per_cluster=10, days=365)
+    names = [f"S{i}" for i in range(len(returns))]
+    scores = np.random.default_rng(1).uniform(0.6, 1.0, len(returns))
+    started = time.perf_counter()
+    selection = select_portfolio(names, scores, returns, max_strategies=20, max_drawdown=0.5)
+    elapsed = time.perf_counter() - started
+    assert len(selection.selected) == 20 and elapsed < 0.5, elapsed
+    clusters = {int(name[1:]) // 10 for name in selection.selected}
+    assert len(clusters) == 20
+    print(f"✅ 500 candidate in {elapsed * 1000:.0f} ms")
+
+
+def test_exporter_uses_backtest_curves():
+    """L'exporter legge i trade dei backtest Freqtrade e non esporta cloni."""
+    print("🧪 Test exporter")
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            os.makedirs("user_data/backtest_results")
+            returns = _clustered_returns(clusters=2, per_cluster=2, days=30)
+            for i, row in enumerate(returns):
+                name = f"Strat{i}"
+                trades = [{"close_date": (START + timedelta(days=d)).isoformat(), "profit_abs": float(r * 1000)}
+                          for d, r in enumerate(row)]
+                with open(f"user_data/backtest_results/backtest_{name}-2024-06-01_10-00-00.json", "w") as f:
+                    json.dump({"strategy": {name: {"trades": trades}}}, f)
+            assert len(load_backtest_trades("Strat0")) == 30
+            # Nessun match per prefisso né fallback su un'altra strategia del file
+            assert load_backtest_trades("Strat") == []
+            with open("user_data/backtest_results/backtest_Other.json", "w") as f:
+                json.dump({"strategy": {"Strat0": {"trades": [{"close_date": START.isoformat()}]}}}, f)
+            assert load_backtest_trades("Other") == []
+
+            exporter = LiveStrategiesExporter()
+            evaluations = [{"strategy_name": f"Strat{i}", "score": s} for i, s in enumerate([0.9, 0.85, 0.8, 0.7])]
+            evaluations.append({"strategy_name": "NoCurve", "score": 0.65})
+            chosen = [e["strategy_name"] for e in exporter.select_live_portfolio(evaluations)]
+            assert chosen == ["Strat0", "Strat2", "NoCurve"], chosen
+        finally:
+            os.chdir(cwd)
+    print("✅ Exporter con selezione di portafoglio")
+
+
+if __name__ == "__main__":
+    tests = [test_low_correlation_selection, test_drawdown_limit_and_matrix, test_scales_to_hundreds,
+             test_exporter_uses_backtest_curves]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test delle sessioni di prompt con prefisso condiviso e contesto riportato
+"""
+
+import sys
+
+from prompt_sessions import PromptSession, PromptSessionPool
+from prompts.prompt_templates import get_template_library
+
+SYSTEM = "Sei un esperto di strategie Freqtrade.\n" * 20
+OPTIONS = {"temperature": 0.5, "num_predict": 512}
+
+
+def test_context_carried_between_rounds():
+    """Il primo round invia il sistema, i successivi solo suffisso e contesto."""
+    print("🧪 Test contesto riportato")
+    session = PromptSession("cogito:8b", SYSTEM, OPTIONS, num_ctx=4096)
+    first = session.payload("Descrivi 3 idee.")
+    assert first["system"] == SYSTEM and "context" not in first
+    assert first["options"]["num_ctx"] == 4096 and first["options"]["num_predict"] == 512
+    session.record({"response": "idee", "context": list(range(300)), "prompt_eval_count": 310})
+
+    second = session.payload("Crea la strategia.", num_predict=2048)
+    assert "system" not in second and second["context"] == list(range(300))
+    assert second["options"]["num_predict"] == 2048 and session.options["num_predict"] == 512
+    session.record({"response": "codice", "context": list(range(900)), "prompt_eval_count": 12})
+    assert session.stats.rounds == 2 and session.stats.prompt_eval_tokens == 322
+    assert session.stats.reused_tokens == 300
+
+    session.reset()
+    assert "context" not in session.payload("Nuova sessione") and not session.has_context
+    print("✅ Prefisso valutato una volta per sessione")
+
+
+def test_context_dropped_when_full():
+    """Se contesto, suffisso e risposta non entrano in num_ctx si riparte dal prefisso."""
+    print("🧪 Test contesto pieno")
+    session = PromptSession("phi3", SYSTEM, OPTIONS, num_ctx=1024)
+    session.record({"context": list(range(800))})
+    payload = session.payload("Crea la strategia.")
+    assert "context" not in payload and payload["system"] == SYSTEM
+    assert session.stats.context_resets == 1
+
+    # Il prompt alternativo reinvia ciò che era solo nel contesto azzerato
+    session.record({"context": list(range(800))})
+    payload = session.payload("Sintetizza le altre.", fresh_prompt="Sintetizza la tua e le altre.")
+    assert "context" not in payload and payload["prompt"] == "Sintetizza la tua e le altre."
+    session.record({"context": list(range(100))})
+    payload = session.payload("Sintetizza le altre.", fresh_prompt="Sintetizza la tua e le altre.")
+    assert payload["context"] == list(range(100)) and payload["prompt"] == "Sintetizza le altre."
+
+    no_carry = PromptSession("phi3", SYSTEM, OPTIONS, carry_context=False)
+    no_carry.record({"context": [1, 2, 3]})
+    assert not no_carry.has_context
+    print("✅ Contesto azzerato oltre num_ctx")
+
+
+def test_pool_per_model():
+    """Una sessione per modello, stesso prefisso; reset azzera i contesti ma non le sessioni."""
+    print("🧪 Test pool di sessioni")
+    system = get_template_library().render("cooperative_system")
+    assert "IStrategy" in system
+    pool = PromptSessionPool(system, OPTIONS, num_ctx=8192)
+    a, b = pool.session("cogito:8b"), pool.session("mistral")
+    assert a is pool.session("cogito:8b") and a is not b
+    assert a.payload("x")["system"] == b.payload("y")["system"] == system
+    a.record({"context": [1, 2]})
+    pool.reset()
+    assert not a.has_context and pool.session("cogito:8b") is a
+    assert set(pool.stats()) == {"cogito:8b", "mistral"}
+    print("✅ Sessioni condivise per modello")
+
+
+if __name__ == "__main__":
+    tests = [test_context_carried_between_rounds, test_context_dropped_when_full, test_pool_per_model]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test dei template di prompt precompilati e del budget di token
+"""
+
+import sys
+import random
+
+from prompts.prompt_templates import (CompiledTemplate, TemplateLibrary, estimate_tokens, get_template_library,
+                                      trim_to_budget)
+from prompts.adaptive_prompt_generator import AdaptivePromptGenerator, get_prompt_generator
+
+
+class CountingGenerator(AdaptivePromptGenerator):
+    def __init__(self):
+        super().__init__()
+        self.detail_builds = 0
+
+    def _get_indicators_list(self, strategy_type, complexity):
+        self.detail_builds += 1
+        return super()._get_indicators_list(strategy_type, complexity)
+
+
+def test_compiled_templates():
+    """Template da file compilati una volta, campi obbligatori."""
+    print("🧪 Test template compilati")
+    template = CompiledTemplate("t", "A {x} e {y}!")
+    assert template.fields == {"x", "y"}
+    assert template.render(x=1, y="due") == "A 1 e due!"
+    try:
+        template.render(x=1)
+        assert False, "campo mancante accettato"
+    except KeyError:
+        pass
+
+    library = get_template_library()
+    assert library is get_template_library()
+    assert {"random", "hybrid", "structured", "details_simple", "details_normal", "details_complex"} <= set(
+        library.templates)
+    assert TemplateLibrary("/percorso/inesistente").templates == {}
+    print("✅ Template caricati da file")
+
+
+def test_memoized_sections():
+    """Le sezioni deterministiche si costruiscono una volta; quelle casuali ad ogni chiamata."""
+    print("🧪 Test sezioni memoizzate")
+    generator = CountingGenerator()
+    assert "performance_history" not in generator.__dict__
+
+    first = generator.generate_adaptive_prompt("momentum", "cogito:8b", "complex", "technical", 0.1)
+    builds = generator.detail_builds
+    second = generator.generate_adaptive_prompt("momentum", "cogito:8b", "complex", "technical", 0.1)
+    assert first == second and generator.detail_builds == builds == 1
+    assert "EMA(20,50,200)" in first and first.endswith("Genera SOLO codice Python completo e funzionante.")
+
+    generator.generate_adaptive_prompt("momentum", "cogito:8b", "complex", "aggressive", 0.1)
+    assert generator.detail_builds == 2
+
+    random.seed(1)
+    hybrids = {generator.generate_adaptive_prompt("scalping", "phi3", "normal", "technical", 0.5) for _ in range(5)}
+    assert len(hybrids) > 1
+    assert all(h.startswith("Crea una strategia di scalping per futures crypto con gestione rischio.") for h in hybrids)
+    assert get_prompt_generator() is get_prompt_generator()
+    print("✅ Solo i frammenti casuali vengono ricalcolati")
+
+
+def test_token_budget():
+    """I prompt vengono ridotti al contesto disponibile mantenendo richiesta e istruzione finale."""
+    print("🧪 Test budget di token")
+    assert estimate_tokens("") == 0 and estimate_tokens("a b c") == 3
+    generator = AdaptivePromptGenerator()
+    full = generator.generate_adaptive_prompt("breakout", "cogito:8b", "complex", "technical", 0.1)
+    assert generator.prompt_token_budget("cogito:8b") >= estimate_tokens(full)
+
+    short = generator.generate_adaptive_prompt("breakout", "cogito:8b", "complex", "technical", 0.1, num_ctx=1300)
+    assert estimate_tokens(short) <= generator.prompt_token_budget("cogito:8b", num_ctx=1300)
+    assert len(short) < len(full)
+    assert short.startswith("Crea una strategia di breakout avanzata")
+    assert short.endswith("Genera SOLO codice Python completo e funzionante.")
+    assert "PARAMETRI OTTIMIZZABILI" not in short and "REQUISITI AVANZATI" in short
+
+    text = "testa\n\n" + "x" * 1000 + "\n\ncoda"
+    trimmed = trim_to_budget(text, 20)
+    assert trimmed.startswith("testa") and trimmed.endswith("coda") and estimate_tokens(trimmed) <= 20
+    print("✅ Prompt entro il budget")
+
+
+if __name__ == "__main__":
+    tests = [test_compiled_templates, test_memoized_sections, test_token_budget]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
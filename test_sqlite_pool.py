@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test del connection manager SQLite e del suo uso nel DryRunManager
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+from sqlite_pool import SQLiteConnectionManager, close_connection_manager, get_connection_manager
+from dry_run_manager import DryRunConfig, DryRunManager, PerformanceMetrics
+
+
+def test_wal_and_thread_connections():
+    """WAL attivo, una connessione per thread riusata, lettura concorrente a una transazione aperta."""
+    print("🧪 Test connessioni WAL")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "pool.db")
+        manager = SQLiteConnectionManager(db_path)
+        assert manager.query("PRAGMA journal_mode")[0][0] == "wal"
+        assert manager.connection() is manager.connection()
+        manager.execute("CREATE TABLE t (v INTEGER)")
+        assert manager.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(100)]) == 100
+
+        seen = []
+        with manager.transaction() as conn:
+            conn.execute("INSERT INTO t VALUES (1000)")
+            # Un lettore su un altro thread non viene bloccato dallo scrittore
+            reader = threading.Thread(target=lambda: seen.append(manager.query("SELECT COUNT(*) FROM t")[0][0]))
+            reader.start()
+            reader.join(timeout=2)
+        assert seen == [100]
+        assert manager.query("SELECT COUNT(*) FROM t")[0][0] == 101
+
+        try:
+            with manager.transaction() as conn:
+                conn.execute("INSERT INTO t VALUES (2000)")
+                raise ValueError("rollback")
+        except ValueError:
+            pass
+        assert manager.query("SELECT COUNT(*) FROM t WHERE v = 2000")[0][0] == 0
+
+        readonly = SQLiteConnectionManager(db_path, readonly=True)
+        try:
+            readonly.execute("INSERT INTO t VALUES (1)")
+            assert False, "scrittura in sola lettura"
+        except sqlite3.OperationalError:
+            pass
+        readonly.close()
+        manager.close()
+        assert len(manager._connections) == 0
+    print("✅ Connessioni persistenti corrette")
+
+
+def test_shared_registry():
+    """Stesso database → stesso manager; dopo la chiusura se ne crea uno nuovo."""
+    print("🧪 Test registro condiviso")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "shared.db")
+        first = get_connection_manager(db_path)
+        assert get_connection_manager(os.path.join(tmp, ".", "shared.db")) is first
+        assert get_connection_manager(db_path, readonly=True) is not first
+        close_connection_manager(db_path)
+        close_connection_manager(db_path, readonly=True)
+        assert get_connection_manager(db_path) is not first
+        close_connection_manager(db_path)
+    print("✅ Registro condiviso corretto")
+
+
+def test_manager_batched_daily_metrics():
+    """Il DryRunManager crea gli indici e scrive le metriche giornaliere a lotti."""
+    print("🧪 Test metriche giornaliere a lotti")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "dry_run.db")
+        manager = DryRunManager(db_path=db_path)
+        indexes = {row[0] for row in manager.db.query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_dry_runs_strategy_status", "idx_daily_metrics_strategy_date"} <= indexes
+
+        for name in ("A", "B"):
+            manager._save_dry_run_to_db(name, DryRunConfig(name), pid=0)
+            metrics = PerformanceMetrics(name, datetime.now(), total_return=0.01, total_trades=3)
+            manager._queue_daily_metrics(metrics)
+            metrics.total_trades = 4
+            manager._queue_daily_metrics(metrics)
+        assert manager.db.query("SELECT COUNT(*) FROM daily_metrics")[0][0] == 0
+        assert manager.flush_daily_metrics() == 2
+        assert manager.flush_daily_metrics() == 0
+        assert [m["total_trades"] for m in manager.get_daily_metrics("A")] == [4]
+
+        manager._update_dry_run_status("A", "completed", '{"strategy_name": "A"}')
+        assert manager.get_all_reports() == [{"strategy_name": "A"}]
+        close_connection_manager(db_path)
+    print("✅ Metriche giornaliere salvate")
+
+
+if __name__ == "__main__":
+    tests = [test_wal_and_thread_connections, test_shared_registry, test_manager_batched_daily_metrics]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
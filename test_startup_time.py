@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark del tempo di avvio del Background Agent e del percorso --status
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Soglie generose: l'import deve restare nell'ordine delle decine di millisecondi
+MAX_IMPORT_SECONDS = 1.0
+MAX_STATUS_SECONDS = 2.0
+
+HEAVY_MODULES = [
+    "schedule", "pandas", "numpy", "requests", "flask", "psutil",
+    "agents.generator", "agents.strategy_converter", "agents.optimizer",
+    "freqtrade_utils", "dry_run_manager", "backtest_monitor", "live_strategies_exporter",
+]
+
+
+def _run_python(code: str, cwd: str = PROJECT_DIR) -> subprocess.CompletedProcess:
+    """Esegue codice Python in un interprete pulito."""
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    return subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_import_is_lightweight():
+    """L'import di background_agent non deve caricare i componenti pesanti."""
+    print("🧪 Test import leggero di background_agent")
+    code = (
+        "import sys, time, json\n"
+        "t = time.perf_counter()\n"
+        "import background_agent\n"
+        "elapsed = time.perf_counter() - t\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+    result = _run_python(code)
+    assert result.returncode == 0, result.stderr
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"   ⏱️ Import: {data['elapsed'] * 1000:.1f} ms")
+    assert not data['heavy'], f"Moduli pesanti importati all'avvio: {data['heavy']}"
+    assert data['elapsed'] < MAX_IMPORT_SECONDS
+    print("✅ Import leggero")
+
+
+def test_no_signal_handlers_on_import():
+    """L'import non deve registrare gestori di segnale."""
+    print("🧪 Test assenza gestori di segnale all'import")
+    code = (
+        "import signal\n"
+        "before = signal.getsignal(signal.SIGTERM)\n"
+        "import background_agent\n"
+        "print(signal.getsignal(signal.SIGTERM) is before)\n"
+    )
+    result = _run_python(code)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "True"
+    print("✅ Nessun gestore registrato all'import")
+
+
+def test_status_reads_persisted_state():
+    """--status legge solo i file persistiti, senza creare nulla."""
+    print("🧪 Test percorso --status")
+    with tempfile.TemporaryDirectory() as tmp:
+        metadata = {
+            "A": {"name": "A", "validation_status": "validated", "backtest_score": 0.3, "is_active": True},
+            "B": {"name": "B", "validation_status": "optimized", "backtest_score": None, "is_active": False},
+            "C": {"name": "C", "validation_status": "failed", "backtest_score": None, "is_active": False},
+        }
+        with open(os.path.join(tmp, "strategies_metadata.json"), "w") as f:
+            json.dump(metadata, f)
+
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, os.path.join(PROJECT_DIR, "background_agent.py"), "--status"],
+            cwd=tmp, capture_output=True, text=True, timeout=60,
+            env=dict(os.environ, PYTHONPATH=PROJECT_DIR),
+        )
+        elapsed = time.perf_counter() - start
+        assert result.returncode == 0, result.stderr
+
+        # Gli avvisi vanno su stderr: stdout è JSON puro
+        status = json.loads(result.stdout)
+        print(f"   ⏱️ --status: {elapsed * 1000:.1f} ms")
+        assert status["total_strategies"] == 3
+        assert status["validated_strategies"] == 1
+        assert status["optimized_strategies"] == 1
+        assert status["backtested_strategies"] == 1
+        assert status["active_strategies"] == 1
+        assert not status["config_present"]
+        # Nessun file di configurazione o log creato dal percorso di sola lettura
+        assert sorted(os.listdir(tmp)) == ["strategies_metadata.json"]
+        assert elapsed < MAX_STATUS_SECONDS
+    print("✅ Stato letto dai file persistiti")
+
+
+if __name__ == "__main__":
+    tests = [test_import_is_lightweight, test_no_signal_handlers_on_import, test_status_reads_persisted_state]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test del motore di analisi incrementale delle strategie LLM
+"""
+
+import os
+import sys
+import tempfile
+
+from agents.strategy_analytics import StrategyAnalyticsEngine, StrategyAggregate, analyze_content, describe_filename
+from analyze_llm_strategies import LLMStrategyAnalyzer
+
+STRATEGY = '''
+from freqtrade.strategy import IStrategy, IntParameter
+from pandas import DataFrame
+import talib.abstract as ta
+
+class SampleStrategy(IStrategy):
+    """Strategia di esempio."""
+    minimal_roi = {"0": 0.05}
+    stoploss = -0.02
+    trailing_stop = True
+    buy_rsi = IntParameter(10, 40, default=30, space="buy")
+
+    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
+        dataframe['ema'] = ta.EMA(dataframe, timeperiod=20)
+        dataframe['adx'] = ta.ADX(dataframe)
+        return dataframe
+
+    def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        if metadata and self.buy_rsi.value:
+            dataframe.loc[(dataframe['rsi'] < self.buy_rsi.value) & (dataframe['adx'] > 25), 'enter_long'] = 1
+        return dataframe
+
+    def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        if metadata or True:
+            dataframe.loc[dataframe['rsi'] > 70, 'exit_long'] = 1
+        return dataframe
+'''
+
+BROKEN = "class Broken(IStrategy):\n    def populate_indicators(self):\n    return 1\n"
+
+
+def _write(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _engine(tmp, strategies_dir):
+    return StrategyAnalyticsEngine(strategies_dir, cache_file=os.path.join(tmp, "cache.json"),
+                                   max_workers=2, parallel_threshold=2)
+
+
+def test_content_analysis():
+    """Analisi del contenuto e metadati dal nome del file."""
+    print("🧪 Test analisi contenuto")
+    analysis = analyze_content(STRATEGY)
+    assert analysis["syntax_valid"] and analysis["class_name"] == "SampleStrategy"
+    assert analysis["indicators_used"] == ["ADX", "EMA", "RSI"]
+    assert analysis["risk_management"] == {"stoploss": True, "trailing_stop": True, "roi": True}
+    assert analysis["entry_conditions"] and analysis["exit_conditions"]
+    assert "Usa multipli indicatori" in analysis["strengths"]
+    assert analysis["code_quality"]["has_docstrings"]
+
+    broken = analyze_content(BROKEN)
+    assert not broken["syntax_valid"] and broken["potential_issues"][0].startswith("Errore di sintassi")
+
+    meta = describe_filename("cogito_momentum_20240101_120000.py")
+    assert meta["model_used"] == "cogito" and meta["strategy_type"] == "momentum"
+    assert meta["generation_date"] == "20240101_120000"
+    print("✅ Analisi per file corretta")
+
+
+def test_incremental_refresh():
+    """Solo i file nuovi o modificati vengono analizzati; gli aggregati seguono le modifiche."""
+    print("🧪 Test analisi incrementale")
+    with tempfile.TemporaryDirectory() as tmp:
+        strategies = os.path.join(tmp, "strategies")
+        os.makedirs(strategies)
+        for i in range(5):
+            _write(os.path.join(strategies, f"cogito_momentum_2024010{i}_120000.py"),
+                   STRATEGY.replace("SampleStrategy", f"Sample{i}"))
+        _write(os.path.join(strategies, "mistral_scalping_llm.py"), BROKEN)
+        _write(os.path.join(strategies, "ManualStrategy.py"), STRATEGY)
+
+        engine = _engine(tmp, strategies)
+        assert engine.refresh()
+        assert engine.stats["analyzed"] == 6
+        report = engine.aggregate.to_report()
+        assert report["total_strategies"] == 6 and report["syntax_valid_count"] == 5
+        assert report["models_used"] == {"cogito": 5, "mistral": 1}
+        assert report["common_indicators"]["RSI"] == 5
+
+        # Nuova istanza: nessun file riletto, aggregati dalla cache
+        engine = _engine(tmp, strategies)
+        assert not engine.refresh()
+        assert engine.stats["analyzed"] == 0 and engine.stats["unchanged"] == 6
+        assert engine.aggregate.to_report() == report
+
+        # Un file aggiunto, uno corretto, uno rimosso
+        _write(os.path.join(strategies, "phi_breakout_20240201_120000.py"), STRATEGY)
+        _write(os.path.join(strategies, "mistral_scalping_llm.py"), STRATEGY.replace("SampleStrategy", "Fixed"))
+        os.remove(os.path.join(strategies, "cogito_momentum_20240100_120000.py"))
+        assert engine.refresh()
+        assert engine.stats["analyzed"] == 2 and engine.stats["removed"] == 1
+
+        updated = engine.aggregate.to_report()
+        rebuilt = StrategyAggregate()
+        for analysis in engine.individual_strategies().values():
+            rebuilt.add(analysis)
+        assert updated == rebuilt.to_report()
+        assert updated["total_strategies"] == 6 and updated["syntax_valid_count"] == 6
+        assert updated["models_used"] == {"cogito": 4, "mistral": 1, "phi": 1}
+        assert not any(issue.startswith("Errore di sintassi") for issue in updated["common_issues"])
+
+        # Stesso contenuto in un nuovo file: riusato per hash, non rianalizzato
+        _write(os.path.join(strategies, "cooperative_adaptive_llm.py"), STRATEGY)
+        engine.refresh()
+        assert engine.stats["analyzed"] == 2 and engine.stats["reused"] == 1
+    print("✅ Analisi proporzionale ai file cambiati")
+
+
+def test_analyzer_report():
+    """L'analizzatore produce il report nel formato di sempre."""
+    print("🧪 Test report analizzatore")
+    with tempfile.TemporaryDirectory() as tmp:
+        strategies = os.path.join(tmp, "strategies")
+        os.makedirs(strategies)
+        _write(os.path.join(strategies, "cogito_volatility_20240101_120000.py"), STRATEGY)
+        analyzer = LLMStrategyAnalyzer(strategies, cache_file=os.path.join(tmp, "cache.json"))
+        analysis = analyzer.analyze_all_strategies()
+        individual = analysis["individual_strategies"]
+        assert list(individual) == [os.path.join(strategies, "cogito_volatility_20240101_120000.py")]
+        assert analysis["aggregate_analysis"]["strategy_types"] == {"volatility": 1}
+        assert any(rec.startswith("Modello più utilizzato: cogito") for rec in analysis["recommendations"])
+        assert analyzer.changed
+
+        again = LLMStrategyAnalyzer(strategies, cache_file=os.path.join(tmp, "cache.json"))
+        assert again.analyze_all_strategies()["aggregate_analysis"] == analysis["aggregate_analysis"]
+        assert not again.changed
+    print("✅ Report invariato")
+
+
+if __name__ == "__main__":
+    tests = [test_content_analysis, test_incremental_refresh, test_analyzer_report]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
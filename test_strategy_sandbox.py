@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test della sandbox di smoke test per le strategie generate
+"""
+
+import os
+import sys
+import tempfile
+import importlib.util
+
+from agents.strategy_sandbox import StrategySandboxPool
+
+PANDAS_AVAILABLE = importlib.util.find_spec("pandas") is not None
+
+WORKING_STRATEGY = '''
+from pandas import DataFrame
+
+class SandboxStrategy:
+    startup_candle_count = 20
+
+    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe['sma'] = dataframe['close'].rolling(20).mean()
+        return dataframe
+
+    def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe['enter_long'] = (dataframe['close'] > dataframe['sma']).astype(int)
+        return dataframe
+
+    def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe['exit_long'] = (dataframe['close'] < dataframe['sma']).astype(int)
+        return dataframe
+'''
+
+WRONG_COLUMN_STRATEGY = WORKING_STRATEGY.replace("dataframe['close'].rolling", "dataframe['closing'].rolling")
+
+UNDEFINED_NAME_STRATEGY = '''
+THRESHOLD = undefined_threshold * 2
+
+class BrokenStrategy:
+    def populate_indicators(self, dataframe, metadata):
+        return dataframe
+'''
+
+SLOW_STRATEGY = '''
+while True:
+    pass
+'''
+
+SWALLOWING_STRATEGY = '''
+while True:
+    try:
+        while True:
+            pass
+    except Exception:
+        pass
+'''
+
+
+def _write(directory: str, name: str, code: str) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(code)
+    return path
+
+
+def test_import_failures_and_timeouts():
+    """Import falliti e strategie bloccate vengono scartati senza fermare il pool."""
+    print("🧪 Test import falliti e timeout")
+    with tempfile.TemporaryDirectory() as tmp:
+        broken = _write(tmp, "broken.py", UNDEFINED_NAME_STRATEGY)
+        slow = _write(tmp, "slow.py", SLOW_STRATEGY)
+        swallowing = _write(tmp, "swallowing.py", SWALLOWING_STRATEGY)
+        working = _write(tmp, "working.py", WORKING_STRATEGY)
+
+        with StrategySandboxPool(workers=1, task_timeout=1.0) as pool:
+            verdict = pool.smoke_test(broken)
+            assert verdict.status == "failed"
+            assert "NameError" in verdict.errors[0]
+
+            verdict = pool.smoke_test(slow)
+            assert verdict.status == "timeout"
+            assert verdict.duration_ms < 5000
+
+            # Un `except Exception` nella strategia non intercetta il timeout
+            verdict = pool.smoke_test(swallowing)
+            assert verdict.status == "timeout"
+            assert verdict.duration_ms < 5000
+
+            # Lo stesso worker resta utilizzabile dopo il timeout
+            verdict = pool.smoke_test(working)
+            assert verdict.passed
+            assert verdict.status == ("passed" if PANDAS_AVAILABLE else "skipped")
+    print("✅ Import falliti e timeout gestiti")
+
+
+def test_populate_checks():
+    """Le colonne sbagliate vengono rilevate eseguendo i populate_* sui dati sintetici."""
+    print("🧪 Test esecuzione populate_*")
+    if not PANDAS_AVAILABLE:
+        print("⚠️ pandas non disponibile, test saltato")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        working = _write(tmp, "working.py", WORKING_STRATEGY)
+        wrong = _write(tmp, "wrong.py", WRONG_COLUMN_STRATEGY)
+
+        with StrategySandboxPool(workers=2, task_timeout=5.0) as pool:
+            results = pool.smoke_test_many([working, wrong])
+            assert results[working].passed
+            assert results[working].entry_signals > 0
+            assert results[wrong].status == "failed"
+            assert "KeyError" in results[wrong].errors[0]
+    print("✅ populate_* verificati")
+
+
+if __name__ == "__main__":
+    tests = [test_import_failures_and_timeouts, test_populate_checks]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test del watcher di strategie e risultati di backtest (inotify e polling)
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from strategy_watcher import (INOTIFY_AVAILABLE, STRATEGY, StrategyWatcher, backtest_strategy_name,
+                              get_strategy_watcher)
+
+STRATEGY_CODE = "from freqtrade.strategy import IStrategy\n\nclass {name}(IStrategy):\n    pass\n"
+
+
+def _dirs(tmp):
+    strategies = os.path.join(tmp, "strategies")
+    backtests = os.path.join(tmp, "backtest_results")
+    os.makedirs(strategies)
+    os.makedirs(backtests)
+    return strategies, backtests
+
+
+def _write(path, content="x"):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_on_demand_queries():
+    """Senza thread avviato le interrogazioni riscansionano le directory."""
+    print("🧪 Test interrogazioni su richiesta")
+    with tempfile.TemporaryDirectory() as tmp:
+        strategies, backtests = _dirs(tmp)
+        _write(os.path.join(strategies, "alpha.py"))
+        _write(os.path.join(strategies, "__init__.py"))
+        _write(os.path.join(strategies, "notes.txt"))
+        _write(os.path.join(backtests, "backtest-alpha-2024-01-01.json"))
+        _write(os.path.join(backtests, "backtest-alpha-2024-01-01.meta.json"))
+
+        watcher = StrategyWatcher(strategies, backtests)
+        assert watcher.strategy_names() == ["alpha"]
+        assert watcher.strategy_files() == [os.path.join(strategies, "alpha.py")]
+        assert watcher.backtest_files() == [os.path.join(backtests, "backtest-alpha-2024-01-01.json")]
+        assert watcher.backtested_strategies() == {"alpha"}
+
+        _write(os.path.join(strategies, "beta.py"))
+        assert watcher.strategy_names() == ["alpha", "beta"] and watcher.has_strategy("beta")
+
+        assert backtest_strategy_name("backtest-gamma-2024.json") == "gamma"
+        assert backtest_strategy_name("backtest-gamma-2024.meta.json") is None
+        assert get_strategy_watcher(strategies, backtests) is get_strategy_watcher(strategies, backtests)
+    print("✅ Indice coerente con le directory")
+
+
+def _exercise_running_watcher(use_inotify):
+    with tempfile.TemporaryDirectory() as tmp:
+        strategies, backtests = _dirs(tmp)
+        _write(os.path.join(strategies, "existing.py"))
+        created = []
+        watcher = StrategyWatcher(strategies, backtests, poll_interval=0.1, use_inotify=use_inotify)
+        watcher.on_created(lambda kind, path: created.append(os.path.basename(path)))
+        watcher.start()
+        try:
+            assert watcher.mode == ("inotify" if use_inotify else "polling")
+            assert watcher.strategy_names() == ["existing"] and created == []
+
+            _write(os.path.join(strategies, "fresh.py"), STRATEGY_CODE.format(name="Fresh"))
+            # Scrittura atomica tmp + replace: un solo evento di creazione
+            _write(os.path.join(strategies, "atomic.py.tmp"))
+            os.replace(os.path.join(strategies, "atomic.py.tmp"), os.path.join(strategies, "atomic.py"))
+            _write(os.path.join(backtests, "backtest-fresh-2024.json"))
+            assert _wait_for(lambda: sorted(created) == ["atomic.py", "fresh.py"]), created
+            assert _wait_for(lambda: watcher.backtested_strategies() == {"fresh"})
+
+            # Modifica di un file esistente: nessuna nuova creazione
+            _write(os.path.join(strategies, "existing.py"), "changed")
+            os.remove(os.path.join(strategies, "fresh.py"))
+            assert _wait_for(lambda: watcher.strategy_names() == ["atomic", "existing"])
+            assert sorted(created) == ["atomic.py", "fresh.py"]
+        finally:
+            watcher.stop()
+        assert not watcher.is_running
+
+
+def test_polling_watcher():
+    """Il polling segnala i file nuovi quando sono stabili e aggiorna l'indice."""
+    print("🧪 Test watcher a polling")
+    _exercise_running_watcher(use_inotify=False)
+    print("✅ Polling corretto")
+
+
+def test_inotify_watcher():
+    """Con inotify l'indice segue creazioni, rinomine e rimozioni."""
+    print("🧪 Test watcher inotify")
+    if not INOTIFY_AVAILABLE:
+        print("⚠️ inotify non disponibile, test saltato")
+        return
+    _exercise_running_watcher(use_inotify=True)
+    print("✅ Eventi inotify gestiti")
+
+
+def test_postprocess_on_create():
+    """Una strategia creata con nome classe errato viene corretta dal callback."""
+    print("🧪 Test post-processing alla creazione")
+    from strategy_watcher import postprocess_new_strategy
+    with tempfile.TemporaryDirectory() as tmp:
+        strategies, backtests = _dirs(tmp)
+        watcher = StrategyWatcher(strategies, backtests, poll_interval=0.1)
+        handled = []
+        watcher.on_created(postprocess_new_strategy, kind=STRATEGY)
+        watcher.on_created(lambda kind, path: handled.append(path), kind=STRATEGY)
+        watcher.start()
+        try:
+            path = os.path.join(strategies, "renamed_strategy.py")
+            _write(path, STRATEGY_CODE.format(name="WrongName"))
+            assert _wait_for(lambda: handled == [path]), handled
+            with open(path, encoding="utf-8") as f:
+                assert "class renamed_strategy(IStrategy)" in f.read()
+        finally:
+            watcher.stop()
+    print("✅ Strategia corretta alla creazione")
+
+
+if __name__ == "__main__":
+    tests = [test_on_demand_queries, test_polling_watcher, test_inotify_watcher, test_postprocess_on_create]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
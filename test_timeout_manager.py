@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test dei timeout adattivi basati su quantili in streaming e token/s
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+
+from agents.timeout_manager import (MAX_TIMEOUT, MIN_TIMEOUT, DecayedQuantiles, ModelThroughput, TimeoutManager,
+                                    token_bucket)
+
+
+def _manager(tmp):
+    return TimeoutManager(os.path.join(tmp, "timeout_config.json"))
+
+
+def test_decayed_quantiles():
+    """p95/p99 seguono le latenze e dimenticano il passato con il decadimento."""
+    print("🧪 Test quantili con decadimento")
+    rng = random.Random(3)
+    hist = DecayedQuantiles()
+    for _ in range(200):
+        hist.observe(rng.uniform(20, 40))
+    assert 36 <= hist.quantile(0.95) <= 46 and 36 <= hist.quantile(0.99) <= 48
+    assert 25 <= hist.quantile(0.5) <= 35 and 25 <= hist.mean <= 35
+
+    for _ in range(100):
+        hist.observe(rng.uniform(200, 220))
+    assert hist.quantile(0.5) > 180, hist.quantile(0.5)
+
+    copy = DecayedQuantiles.from_dict(json.loads(json.dumps(hist.to_dict())))
+    assert abs(copy.quantile(0.99) - hist.quantile(0.99)) < 1e-6
+    assert token_bucket(None) == "*" and token_bucket(100) == "<=256" and token_bucket(1500) == "<=2048"
+    print("✅ Quantili stabili e reattivi")
+
+
+def test_timeout_from_history():
+    """Chiamate phi3 da ~30s: timeout di pochi minuti invece di mezz'ora."""
+    print("🧪 Test timeout dalla storia")
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = _manager(tmp)
+        cold = manager.get_optimal_timeout("phi3", "text_generation", strategy_type="momentum")
+        assert cold == int(600 * 0.8)
+
+        for i in range(20):
+            manager.record_performance("phi3", "text_generation", "momentum", 25 + i % 10, True, cold,
+                                       prompt_tokens=400)
+        warm = manager.get_optimal_timeout("phi3", "text_generation", strategy_type="momentum", prompt_tokens=400)
+        assert 40 <= warm <= 90, warm
+
+        # Altro tipo di strategia: si usa l'aggregato per (modello, fase)
+        other = manager.get_optimal_timeout("phi3", "text_generation", strategy_type="scalping")
+        assert 40 <= other <= 90, other
+
+        # Storia persistita e ricaricata
+        reloaded = _manager(tmp)
+        assert reloaded.get_optimal_timeout("phi3", "text_generation", strategy_type="momentum",
+                                            prompt_tokens=400) == warm
+        assert reloaded.get_model_recommendations()["phi3"]["phases"]["text_generation"]["success_rate"] == 1.0
+
+        # Timeout scaduti: la stima cresce
+        for _ in range(5):
+            manager.record_performance("phi3", "text_generation", "momentum", warm, False, warm, prompt_tokens=400)
+        assert manager.get_optimal_timeout("phi3", "text_generation", strategy_type="momentum",
+                                           prompt_tokens=400) > warm
+    print("✅ Timeout adattati alle latenze reali")
+
+
+def test_timeout_from_throughput():
+    """Con i token/s di Ollama il timeout copre num_predict token, entro i limiti."""
+    print("🧪 Test timeout da token/s")
+    throughput = ModelThroughput()
+    throughput.observe({"eval_count": 200, "eval_duration": 10 * 10**9,
+                        "prompt_eval_count": 1000, "prompt_eval_duration": 2 * 10**9, "load_duration": 10**9})
+    assert throughput.eval_tps == 20 and throughput.prompt_tps == 500
+    assert abs(throughput.expected_seconds(1000, 512) - (1 + 2 + 25.6)) < 1e-6
+    throughput.observe({"eval_count": 0})
+    assert throughput.samples == 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = _manager(tmp)
+        manager.record_eval_metrics("cogito:8b", {"eval_count": 400, "eval_duration": 10 * 10**9})
+        timeout = manager.get_optimal_timeout("cogito:8b", "code_conversion", prompt_tokens=800, num_predict=3072)
+        assert timeout == int(3072 / 40 * 1.5) + 1, timeout
+        assert manager.get_optimal_timeout("cogito:8b", "code_conversion", num_predict=10) == MIN_TIMEOUT
+
+        slow = _manager(tmp)
+        slow.record_eval_metrics("big", {"eval_count": 1, "eval_duration": 10 * 10**9})
+        assert slow.get_optimal_timeout("big", num_predict=4096) == MAX_TIMEOUT
+    print("✅ Timeout dal tempo atteso di generazione")
+
+
+def test_legacy_history_migrated():
+    """La storia nel vecchio formato a liste viene convertita."""
+    print("🧪 Test migrazione storia")
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "timeout_config.json"), "w") as f:
+            json.dump({"phi3_text_generation_momentum": {
+                "times": [30.0] * 10, "successes": [True] * 10, "timeouts": [1440] * 10,
+                "last_updated": "2024-01-01T00:00:00"}}, f)
+        manager = _manager(tmp)
+        assert manager.get_optimal_timeout("phi3", "text_generation", strategy_type="momentum") < 120
+    print("✅ Storia convertita")
+
+
+if __name__ == "__main__":
+    tests = [test_decayed_quantiles, test_timeout_from_history, test_timeout_from_throughput,
+             test_legacy_history_migrated]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
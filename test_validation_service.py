@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test del servizio di validazione condiviso (cache per hash + process pool)
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+
+from agents.strategy_validation_service import StrategyValidationService, extract_facts
+
+VALID_STRATEGY = '''
+from freqtrade.strategy import IStrategy, IntParameter
+from pandas import DataFrame
+import talib.abstract as ta
+
+class SampleStrategy(IStrategy):
+    minimal_roi = {"0": 0.05}
+    stoploss = -0.02
+    buy_rsi = IntParameter(10, 40, default=30, space="buy")
+
+    def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
+        dataframe['ema'] = ta.EMA(dataframe, timeperiod=20)
+        return dataframe
+
+    def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe.loc[dataframe['rsi'] < self.buy_rsi.value, 'enter_long'] = 1
+        return dataframe
+
+    def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        dataframe.loc[dataframe['rsi'] > 70, 'exit_long'] = 1
+        return dataframe
+'''
+
+BROKEN_STRATEGY = '''
+from freqtrade.strategy import IStrategy
+
+class BrokenStrategy(IStrategy):
+    def populate_indicators(self, dataframe, metadata):
+    return dataframe
+'''
+
+
+def test_extract_facts():
+    """I fatti estratti dall'AST sono corretti."""
+    print("🧪 Test estrazione fatti")
+    facts = extract_facts(VALID_STRATEGY)
+    assert facts.syntax_valid
+    assert facts.class_name == "SampleStrategy"
+    assert facts.has_istrategy_class
+    assert facts.missing_populate_methods == []
+    assert facts.indicators == ["EMA", "RSI"]
+    assert facts.parameters == ["buy_rsi"]
+    assert "stoploss" in facts.class_attributes
+    assert facts.has_import("talib") and facts.has_import("freqtrade.strategy")
+
+    broken = extract_facts(BROKEN_STRATEGY)
+    assert not broken.syntax_valid
+    assert broken.syntax_error.startswith("Errore di sintassi alla riga")
+    # Il nome classe viene recuperato anche da codice non valido
+    assert broken.class_name == "BrokenStrategy"
+    print("✅ Fatti estratti correttamente")
+
+
+def test_parallel_and_incremental():
+    """Il pool analizza solo i file nuovi o modificati, la cache è persistita."""
+    print("🧪 Test validazione parallela e incrementale")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(6):
+            path = os.path.join(tmp, f"strategy_{i}.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(BROKEN_STRATEGY if i == 0 else VALID_STRATEGY.replace("SampleStrategy", f"Sample{i}"))
+            paths.append(path)
+
+        cache_file = os.path.join(tmp, "cache.json")
+        service = StrategyValidationService(cache_file=cache_file, max_workers=2, parallel_threshold=2)
+        results = service.validate_files(paths)
+        assert len(results) == 6
+        assert not results[paths[0]].syntax_valid
+        assert results[paths[3]].class_name == "Sample3"
+        assert service.stats["misses"] == 6
+        assert os.path.exists(cache_file)
+
+        # Una nuova istanza riusa la cache su disco senza rianalizzare
+        service = StrategyValidationService(cache_file=cache_file, max_workers=2, parallel_threshold=2)
+        service.validate_files(paths)
+        assert service.stats == {"hits": 6, "misses": 0}
+
+        # Modificando un file viene rianalizzato solo quello
+        with open(paths[0], "w", encoding="utf-8") as f:
+            f.write(VALID_STRATEGY)
+        results = service.validate_files(paths)
+        assert service.stats["misses"] == 1
+        assert results[paths[0]].syntax_valid
+
+        # Il contenuto già visto viene riconosciuto per hash anche in memoria
+        assert service.validate_code(VALID_STRATEGY) is results[paths[0]]
+    print("✅ Validazione incrementale corretta")
+
+
+def test_moved_files_and_threads():
+    """Un file spostato con contenuto noto non viene rianalizzato; accessi concorrenti coerenti."""
+    print("🧪 Test file spostati e accesso concorrente")
+    with tempfile.TemporaryDirectory() as tmp:
+        original = os.path.join(tmp, "original.py")
+        with open(original, "w", encoding="utf-8") as f:
+            f.write(VALID_STRATEGY)
+        service = StrategyValidationService(cache_file=os.path.join(tmp, "cache.json"), max_workers=1)
+        first = service.validate_files([original])[original]
+
+        moved = os.path.join(tmp, "moved.py")
+        shutil.copy(original, moved)
+        results = service.validate_files([original, moved])
+        assert results[moved] is first
+        assert service.stats == {"hits": 2, "misses": 1}
+
+        paths = []
+        for i in range(20):
+            path = os.path.join(tmp, f"strategy_{i}.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(VALID_STRATEGY.replace("SampleStrategy", f"Sample{i}"))
+            paths.append(path)
+
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(5):
+                    service.validate_files(paths)
+                    service.validate_code(VALID_STRATEGY)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        # Ogni chiamata conta ogni file esattamente una volta
+        assert service.stats["hits"] + service.stats["misses"] == 3 + 4 * 5 * (len(paths) + 1)
+        assert all(service.validate_files(paths)[p].class_name == f"Sample{i}" for i, p in enumerate(paths))
+    print("✅ Cache coerente tra thread e percorsi")
+
+
+if __name__ == "__main__":
+    tests = [test_extract_facts, test_parallel_and_incremental, test_moved_files_and_threads]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} fallito: {e}")
+    print(f"\n📊 Risultato: {passed}/{len(tests)} test superati")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -4,30 +4,20 @@ Script per validare tutte le strategie e identificare errori di codice
 """
 
 import os
-import ast
-import importlib.util
 import sys
 import glob
 from typing import List, Dict, Any
 
+from agents.strategy_validation_service import get_validation_service
+
 def validate_strategy_syntax(file_path: str) -> Dict[str, Any]:
     """Valida la sintassi di una strategia."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code = f.read()
-        
-        # Verifica sintassi Python
-        ast.parse(code)
+        facts = get_validation_service().validate_file(file_path)
         
         return {
-            'valid': True,
-            'syntax_error': None,
-            'file_path': file_path
-        }
-    except SyntaxError as e:
-        return {
-            'valid': False,
-            'syntax_error': f"Errore di sintassi alla riga {e.lineno}: {e.msg}",
+            'valid': facts.syntax_valid,
+            'syntax_error': facts.syntax_error,
             'file_path': file_path
         }
     except Exception as e:
@@ -40,35 +30,18 @@ def validate_strategy_syntax(file_path: str) -> Dict[str, Any]:
 def validate_strategy_structure(file_path: str) -> Dict[str, Any]:
     """Valida la struttura della strategia FreqTrade."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code = f.read()
+        facts = get_validation_service().validate_file(file_path)
         
         # Verifica elementi essenziali
-        required_elements = [
-            'class',
-            'IStrategy',
-            'populate_indicators',
-            'populate_entry_trend',
-            'populate_exit_trend'
-        ]
-        
         missing_elements = []
-        for element in required_elements:
-            if element not in code:
-                missing_elements.append(element)
+        if not facts.class_names:
+            missing_elements.append('class')
+        if not facts.has_istrategy_class:
+            missing_elements.append('IStrategy')
+        missing_elements.extend(facts.missing_populate_methods)
         
         # Verifica che ci sia almeno una classe che eredita da IStrategy
-        has_valid_class = False
-        try:
-            tree = ast.parse(code)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.ClassDef):
-                    for base in node.bases:
-                        if isinstance(base, ast.Name) and base.id == 'IStrategy':
-                            has_valid_class = True
-                            break
-        except:
-            pass
+        has_valid_class = facts.has_istrategy_class
         
         return {
             'valid': len(missing_elements) == 0 and has_valid_class,
@@ -86,8 +59,7 @@ def validate_strategy_structure(file_path: str) -> Dict[str, Any]:
 def validate_strategy_imports(file_path: str) -> Dict[str, Any]:
     """Valida gli import della strategia."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code = f.read()
+        facts = get_validation_service().validate_file(file_path)
         
         # Verifica import essenziali
         required_imports = [
@@ -98,7 +70,7 @@ def validate_strategy_imports(file_path: str) -> Dict[str, Any]:
         
         missing_imports = []
         for imp in required_imports:
-            if imp not in code:
+            if not facts.has_import(imp):
                 missing_imports.append(imp)
         
         return {
@@ -146,6 +118,9 @@ def main():
     
     print(f"\n🔍 Validazione di {len(strategy_files)} strategie...")
     
+    # Analisi parallela e incrementale (i file invariati arrivano dalla cache)
+    get_validation_service().validate_files(strategy_files)
+    
     for i, file_path in enumerate(strategy_files, 1):
         strategy_name = os.path.basename(file_path)
         print(f"\n📊 Progresso: {i}/{len(strategy_files)}")